@@ -11,7 +11,8 @@
 # ═══════════════════════════════════════════════════════════════════════════
 
 from decimal import Decimal
-from django.db.models import Sum, Count
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
@@ -19,6 +20,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
+from erp_project.cuenta_corriente import ExtractoCuentaCorriente, rama, respuesta_csv
+from parametros.models import TipoComprobante
 from .models import Proveedor, ComprobanteCompra, OrdenPago, OrdenPagoImputacion, OrdenPagoValor
 
 
@@ -60,15 +63,26 @@ def _num_op(op):
     return f"OP {int(op.numero or 0):08d}"
 
 
-def _signo_comp(comp):
-    """
-    Retorna +1 si el comprobante es DEBE (Factura de proveedor, ND que nos envían)
-    o -1 si es HABER (Nota de crédito que nos envían a favor).
-    """
-    tc = comp.tipo_comprobante
-    if tc and tc.es_nota_credito:
-        return -1
-    return 1
+def _mov_dict(m):
+    """Movimiento del motor de extractos → fila de la API."""
+    es_comp = m['clase'] == 'comprobante'
+    numero = (
+        f"{(m['letra'] or '').strip()} {int(m['punto_venta'] or 0):05d}-{int(m['numero'] or 0):08d}".strip()
+        if es_comp else f"OP {int(m['numero'] or 0):08d}"
+    )
+    return {
+        'id': m['id'],
+        'fecha': _iso(m['fecha']),
+        'tipo': m['tipo'],
+        'clase': m['clase'],
+        'es_nc': es_comp and m['haber'] > 0,
+        'numero': numero,
+        'debe': _f(m['debe']),
+        'haber': _f(m['haber']),
+        'saldo': _f(m['saldo']),
+        'ref_id': m['id'],
+        'saldo_pendiente': _f(m['saldo_pendiente']) if es_comp else None,
+    }
 
 
 # ─── CuentaCorrienteProveedoresService ─────────────────────────────────────
@@ -77,37 +91,34 @@ class CuentaCorrienteProveedoresService:
 
     @classmethod
     def build_extracto(cls, proveedor, *, fecha_desde=None, fecha_hasta=None,
-                       tipo_filtro='', page=1, page_size=50):
+                       tipo_filtro='', page=1, page_size=50, cursor=None):
+        """Página del extracto con saldo acumulado, resuelta en SQL (ver erp_project.cuenta_corriente)."""
         saldo_anterior = Decimal('0')
         if fecha_desde:
             saldo_anterior = cls._saldo_al_cierre(proveedor, hasta=fecha_desde - timezone.timedelta(days=1))
 
-        movs = cls._movimientos(proveedor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
-                                tipo_filtro=tipo_filtro)
-
-        acum = saldo_anterior
-        for m in movs:
-            acum += _dec(m['debe']) - _dec(m['haber'])
-            m['saldo'] = _f(acum)
+        extracto = cls._extracto(proveedor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                                 tipo_filtro=tipo_filtro)
+        totales = extracto.totales()
 
-        total_movs = len(movs)
+        total_movs = totales['cantidad']
         page_size = min(max(1, page_size), 200)
-        page = max(1, page)
         total_pages = max(1, -(-total_movs // page_size))
-        page = min(page, total_pages)
-        movs_pagina = movs[(page - 1) * page_size: page * page_size]
-
-        saldo_final = _f(acum)
+        page = min(max(1, page), total_pages)
+        movs, siguiente = extracto.pagina(
+            limite=page_size, cursor=cursor, saldo_inicial=saldo_anterior, desplazamiento=(page - 1) * page_size
+        )
 
         return {
             'saldo_anterior': _f(saldo_anterior),
-            'saldo_final': saldo_final,
-            'movimientos': movs_pagina,
+            'saldo_final': _f(saldo_anterior + totales['debe'] - totales['haber']),
+            'movimientos': [_mov_dict(m) for m in movs],
             'paginacion': {
                 'total': total_movs,
                 'page': page,
                 'page_size': page_size,
                 'total_pages': total_pages,
+                'siguiente': siguiente,
             },
         }
 
@@ -117,128 +128,63 @@ class CuentaCorrienteProveedoresService:
         if fecha_desde:
             saldo_anterior = cls._saldo_al_cierre(proveedor, hasta=fecha_desde - timezone.timedelta(days=1))
 
-        movs = cls._movimientos(proveedor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+        desglose = cls._extracto(proveedor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta).desglose()
 
-        total_debe = sum(_dec(m['debe']) for m in movs)
-        total_haber = sum(_dec(m['haber']) for m in movs)
+        total_debe = sum((d['debe'] for d in desglose), Decimal('0'))
+        total_haber = sum((d['haber'] for d in desglose), Decimal('0'))
         saldo_periodo = total_debe - total_haber
         saldo_final = saldo_anterior + saldo_periodo
 
-        desglose = {}
-        for m in movs:
-            key = m['tipo']
-            if key not in desglose:
-                desglose[key] = {'tipo': key, 'clase': m['clase'], 'cantidad': 0, 'debe': 0.0, 'haber': 0.0}
-            desglose[key]['cantidad'] += 1
-            desglose[key]['debe'] = round(desglose[key]['debe'] + _f(m['debe']), 2)
-            desglose[key]['haber'] = round(desglose[key]['haber'] + _f(m['haber']), 2)
-
         return {
             'saldo_anterior': _f(saldo_anterior),
             'total_debe': _f(total_debe),
             'total_haber': _f(total_haber),
             'saldo_periodo': _f(saldo_periodo),
             'saldo_final': _f(saldo_final),
-            'cantidad_movimientos': len(movs),
-            'desglose': sorted(desglose.values(), key=lambda x: x['tipo']),
+            'cantidad_movimientos': sum(d['cantidad'] for d in desglose),
+            'desglose': [
+                {'tipo': d['tipo'], 'clase': d['clase'], 'cantidad': d['cantidad'],
+                 'debe': _f(d['debe']), 'haber': _f(d['haber'])}
+                for d in desglose
+            ],
         }
 
     @classmethod
     def _saldo_al_cierre(cls, proveedor, hasta):
-        comps = ComprobanteCompra.objects.filter(
-            proveedor=proveedor,
-            estado=ComprobanteCompra.Estado.CONFIRMADO,
-            condicion_compra=ComprobanteCompra.CondicionCompra.CTA_CTE,
-            fecha__date__lte=hasta,
-        ).select_related('tipo_comprobante')
-
-        debe_total = Decimal('0')
-        haber_total = Decimal('0')
-        for c in comps:
-            signo = _signo_comp(c)
-            if signo > 0:
-                debe_total += _dec(c.total)
-            else:
-                haber_total += _dec(c.total)
-
-        ordenes = OrdenPago.objects.filter(
-            proveedor=proveedor,
-            estado=OrdenPago.Estado.CONFIRMADO,
-            fecha__date__lte=hasta,
-        ).aggregate(total=Sum('monto_total'))
-
-        haber_total += _dec(ordenes.get('total'))
-
-        return debe_total - haber_total
+        totales = cls._extracto(proveedor, fecha_hasta=hasta).totales()
+        return totales['debe'] - totales['haber']
 
     @classmethod
-    def _movimientos(cls, proveedor, *, fecha_desde=None, fecha_hasta=None, tipo_filtro=''):
-        movs = []
-        incl_comp = tipo_filtro in ('', 'comprobante')
-        incl_op = tipo_filtro in ('', 'orden_pago')
-
-        if incl_comp:
-            qs = (
-                ComprobanteCompra.objects
-                .filter(
-                    proveedor=proveedor,
-                    estado=ComprobanteCompra.Estado.CONFIRMADO,
-                    condicion_compra=ComprobanteCompra.CondicionCompra.CTA_CTE,
-                )
-                .select_related('tipo_comprobante')
-                .order_by('fecha', 'numero')
-            )
+    def _extracto(cls, proveedor, *, fecha_desde=None, fecha_hasta=None, tipo_filtro=''):
+        """Comprobantes CTA_CTE (DEBE, o HABER las NC) y órdenes de pago (HABER), unidos en SQL."""
+        def _periodo(qs):
             if fecha_desde: qs = qs.filter(fecha__date__gte=fecha_desde)
             if fecha_hasta: qs = qs.filter(fecha__date__lte=fecha_hasta)
+            return qs
 
-            for c in qs:
-                signo = _signo_comp(c)
-                tipo_nom = c.tipo_comprobante.nombre if c.tipo_comprobante else 'Factura'
-                debe = _f(c.total) if signo > 0 else 0.0
-                haber = _f(c.total) if signo < 0 else 0.0
-                movs.append({
-                    'id': c.pk,
-                    'fecha': _iso(c.fecha),
-                    'tipo': tipo_nom,
-                    'clase': 'comprobante',
-                    'es_nc': signo < 0,
-                    'numero': _num_comp(c),
-                    'debe': debe,
-                    'haber': haber,
-                    'saldo': 0.0,
-                    'ref_id': c.pk,
-                    'saldo_pendiente': _f(c.saldo_pendiente),
-                })
-
-        if incl_op:
-            qs = (
-                OrdenPago.objects
-                .filter(
-                    proveedor=proveedor,
-                    estado=OrdenPago.Estado.CONFIRMADO,
-                )
-                .order_by('fecha', 'numero')
+        ramas = []
+        if tipo_filtro in ('', 'comprobante'):
+            es_nc = TipoComprobante.q_nota_credito('tipo_comprobante__')
+            comprobantes = ComprobanteCompra.objects.filter(
+                proveedor=proveedor,
+                estado=ComprobanteCompra.Estado.CONFIRMADO,
+                condicion_compra=ComprobanteCompra.CondicionCompra.CTA_CTE,
             )
-            if fecha_desde: qs = qs.filter(fecha__date__gte=fecha_desde)
-            if fecha_hasta: qs = qs.filter(fecha__date__lte=fecha_hasta)
-
-            for op in qs:
-                movs.append({
-                    'id': op.pk,
-                    'fecha': _iso(op.fecha),
-                    'tipo': 'Orden de Pago',
-                    'clase': 'orden_pago',
-                    'es_nc': False,
-                    'numero': _num_op(op),
-                    'debe': 0.0,
-                    'haber': _f(op.monto_total),
-                    'saldo': 0.0,
-                    'ref_id': op.pk,
-                    'saldo_pendiente': None,
-                })
-
-        movs.sort(key=lambda x: (x['fecha'] or '', x['id']))
-        return movs
+            ramas.append(rama(
+                _periodo(comprobantes), clase='comprobante',
+                tipo=Coalesce('tipo_comprobante__nombre', Value('Factura')),
+                debe=Case(When(es_nc, then=Value(0)), default=F('total'), output_field=DecimalField()),
+                haber=Case(When(es_nc, then=F('total')), default=Value(0), output_field=DecimalField()),
+                letra=F('letra'), punto_venta=F('punto_venta'),
+                total=F('total'), saldo_pendiente=F('saldo_pendiente'),
+            ))
+        if tipo_filtro in ('', 'orden_pago'):
+            ordenes = OrdenPago.objects.filter(proveedor=proveedor, estado=OrdenPago.Estado.CONFIRMADO)
+            ramas.append(rama(_periodo(ordenes), clase='orden_pago', tipo='Orden de Pago', debe=0,
+                              haber=F('monto_total')))
+
+        alcance = f"proveedor:{proveedor.pk}:{fecha_desde}:{fecha_hasta}:{tipo_filtro}"
+        return ExtractoCuentaCorriente(ramas, alcance=alcance)
 
     @classmethod
     def comprobantes_impagos(cls, proveedor):
@@ -419,9 +365,12 @@ def cc_proveedor_api(request, pk):
         data['resumen_periodo'] = CuentaCorrienteProveedoresService.build_resumen(proveedor, fecha_desde=fecha_desde,
                                                                                   fecha_hasta=fecha_hasta)
     else:
-        data.update(CuentaCorrienteProveedoresService.build_extracto(proveedor, fecha_desde=fecha_desde,
-                                                                     fecha_hasta=fecha_hasta, tipo_filtro=tipo_filtro,
-                                                                     page=page, page_size=page_size))
+        try:
+            data.update(CuentaCorrienteProveedoresService.build_extracto(
+                proveedor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta, tipo_filtro=tipo_filtro,
+                page=page, page_size=page_size, cursor=request.query_params.get('cursor')))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
     data['kpis'] = CuentaCorrienteProveedoresService.kpis_proveedor(proveedor)
     data['comprobantes_impagos'] = CuentaCorrienteProveedoresService.comprobantes_impagos(proveedor)
@@ -436,6 +385,34 @@ def cc_proveedor_api(request, pk):
     return Response(data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cc_proveedor_exportar_api(request, pk):
+    """Extracto completo del período en CSV, generado y enviado por tramos."""
+    proveedor = get_object_or_404(Proveedor.objects.select_related('entidad'), pk=pk)
+    fecha_desde = _parse_date(request.query_params.get('fecha_desde'))
+    fecha_hasta = _parse_date(request.query_params.get('fecha_hasta'))
+    tipo_filtro = (request.query_params.get('tipo') or '').lower().strip()
+
+    saldo_anterior = Decimal('0')
+    if fecha_desde:
+        saldo_anterior = CuentaCorrienteProveedoresService._saldo_al_cierre(
+            proveedor, hasta=fecha_desde - timezone.timedelta(days=1))
+    extracto = CuentaCorrienteProveedoresService._extracto(
+        proveedor, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta, tipo_filtro=tipo_filtro)
+
+    def _fila(m):
+        mov = _mov_dict(m)
+        return [timezone.localtime(m['fecha']).strftime('%d/%m/%Y'), mov['tipo'], mov['numero'],
+                m['debe'], m['haber'], m['saldo']]
+
+    return respuesta_csv(
+        f"cuenta_corriente_{proveedor.codigo_proveedor or proveedor.pk}.csv",
+        ['fecha', 'tipo', 'numero', 'debe', 'haber', 'saldo'],
+        (_fila(m) for m in extracto.iterar(saldo_inicial=saldo_anterior)),
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def compras_impagas_api(request, pk):
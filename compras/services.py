@@ -64,6 +64,49 @@ class PriceListService:
 
         return None
 
+    @staticmethod
+    def get_active_price_items_lote(pares, fecha=None):
+        """
+        Versión por lote de get_active_price_item, con la misma prioridad.
+        pares: iterable de (proveedor_id, articulo_id, cantidad).
+        Devuelve {(proveedor_id, articulo_id, cantidad): ItemListaPreciosProveedor | None}
+        con una sola consulta (ítems con su lista y moneda resueltas).
+        """
+        from .models import ItemListaPreciosProveedor
+
+        if fecha is None:
+            fecha = timezone.now().date()
+        pares = set(pares)
+        if not pares:
+            return {}
+
+        items = ItemListaPreciosProveedor.objects.filter(
+            articulo_id__in={articulo_id for _, articulo_id, _ in pares},
+            lista_precios__proveedor_id__in={proveedor_id for proveedor_id, _, _ in pares},
+            lista_precios__is_active=True,
+            lista_precios__vigente_desde__lte=fecha,
+        ).filter(
+            Q(lista_precios__vigente_hasta__isnull=True) | Q(lista_precios__vigente_hasta__gte=fecha)
+        ).select_related('lista_precios', 'precio_lista_moneda')
+
+        # Orden de prioridad: principal primero, luego las demás por vigencia más reciente
+        por_clave = {}
+        for item in items:
+            por_clave.setdefault((item.lista_precios.proveedor_id, item.articulo_id), []).append(item)
+        for candidatos in por_clave.values():
+            candidatos.sort(key=lambda i: (
+                not i.lista_precios.es_principal, -i.lista_precios.vigente_desde.toordinal(),
+                i.lista_precios_id, -i.cantidad_minima
+            ))
+
+        resultado = {}
+        for proveedor_id, articulo_id, cantidad in pares:
+            resultado[(proveedor_id, articulo_id, cantidad)] = next(
+                (i for i in por_clave.get((proveedor_id, articulo_id), ()) if i.cantidad_minima <= cantidad),
+                None
+            )
+        return resultado
+
 
 class CostCalculatorService:
     """
@@ -84,7 +127,11 @@ class CostCalculatorService:
         return final_amount.quantize(Decimal('0.0001'))
 
     @classmethod
-    def calculate_effective_cost(cls, item_precio: 'ItemListaPreciosProveedor') -> Money:
+    def calculate_effective_cost(cls, item_precio: 'ItemListaPreciosProveedor', conversiones=None) -> Money:
+        """
+        conversiones: {(articulo_id, unidad_id): factor} precargado (ver factores_conversion)
+        para no consultar ConversionUnidadMedida por ítem.
+        """
         # Nota: item_precio se pasa como argumento, no necesitamos importar la clase para usar sus atributos
         costo_base = item_precio.precio_lista.amount
         currency = item_precio.precio_lista.currency
@@ -99,20 +146,36 @@ class CostCalculatorService:
         if item_precio.descuentos_financieros:
             costo_base = cls.apply_cascading_discounts(costo_base, item_precio.descuentos_financieros)
 
-        try:
-            conversion = ConversionUnidadMedida.objects.get(
-                articulo=item_precio.articulo,
-                unidad_externa=item_precio.unidad_medida_compra
-            )
-            if conversion.factor_conversion > 0:
-                costo_unitario_stock = costo_base / conversion.factor_conversion
-            else:
-                costo_unitario_stock = costo_base
-        except ObjectDoesNotExist:
+        if conversiones is not None:
+            factor = conversiones.get((item_precio.articulo_id, item_precio.unidad_medida_compra_id))
+        else:
+            try:
+                factor = ConversionUnidadMedida.objects.get(
+                    articulo=item_precio.articulo,
+                    unidad_externa=item_precio.unidad_medida_compra
+                ).factor_conversion
+            except ObjectDoesNotExist:
+                factor = None
+
+        if factor and factor > 0:
+            costo_unitario_stock = costo_base / factor
+        else:
             costo_unitario_stock = costo_base
 
         return Money(costo_unitario_stock, currency)
 
+    @staticmethod
+    def factores_conversion(items_precio):
+        """{(articulo_id, unidad_id): factor} para los ítems de lista dados, en una consulta."""
+        items_precio = [i for i in items_precio if i is not None]
+        if not items_precio:
+            return {}
+        filas = ConversionUnidadMedida.objects.filter(
+            articulo_id__in={i.articulo_id for i in items_precio},
+            unidad_externa_id__in={i.unidad_medida_compra_id for i in items_precio},
+        ).values_list('articulo_id', 'unidad_externa_id', 'factor_conversion')
+        return {(articulo_id, unidad_id): factor for articulo_id, unidad_id, factor in filas}
+
     @classmethod
     def get_latest_price(cls, proveedor_pk: int, articulo_pk: str, cantidad: Decimal = Decimal(1)):
         """
@@ -158,16 +221,20 @@ class ComprasStockService:
         # Validamos que sea una OC o similar (Si NO mueve stock físico directo, es una OC/Preventa)
         if not comprobante.tipo_comprobante.afecta_stock_fisico:
             ref = f"OC #{comprobante.numero}"
-            for item in comprobante.items.all():
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo,
-                    deposito=comprobante.deposito,
-                    codigo_tipo='RCPT',  # Aumenta "A Recibir"
-                    cantidad=item.cantidad,  # Positivo
-                    origen_sistema='COMPRAS',
-                    origen_referencia=ref,
-                    usuario=None
-                )
+            StockManager.registrar_movimientos_lote(
+                [
+                    {
+                        'articulo': item.articulo,
+                        'deposito': comprobante.deposito,
+                        'codigo_tipo': 'RCPT',  # Aumenta "A Recibir"
+                        'cantidad': item.cantidad,  # Positivo
+                    }
+                    for item in comprobante.items.select_related('articulo')
+                ],
+                origen_sistema='COMPRAS',
+                origen_referencia=ref,
+                usuario=None
+            )
             # NOTA: Podrías necesitar un flag específico 'stock_previsto_aplicado' en el modelo
             # si quieres controlar idempotencia solo para la OC, separado del stock real.
             from .models import ComprobanteCompra
@@ -192,31 +259,31 @@ class ComprasStockService:
 
         ref = f"Recepción {comprobante.tipo_comprobante.nombre} #{comprobante.numero}"
 
-        for item in comprobante.items.all():
+        lineas = []
+        for item in comprobante.items.select_related('articulo'):
             # 1. Ingreso Físico (REAL)
-            StockManager.registrar_movimiento(
-                articulo=item.articulo,
-                deposito=comprobante.deposito,
-                codigo_tipo='REAL',
-                cantidad=item.cantidad,  # Positivo (Entrada)
-                origen_sistema='COMPRAS',
-                origen_referencia=ref,
-                usuario=None
-            )
+            lineas.append({
+                'articulo': item.articulo,
+                'deposito': comprobante.deposito,
+                'codigo_tipo': 'REAL',
+                'cantidad': item.cantidad,  # Positivo (Entrada)
+            })
 
             # 2. Cancelación de Expectativa (RCPT) - Si existe enlace con OC
             if comprobante.comprobante_origen:
                 # Si viene de una OC, asumimos que esa OC generó RCPT. Lo restamos.
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo,
-                    deposito=comprobante.deposito,
-                    codigo_tipo='RCPT',
-                    cantidad=-item.cantidad,  # Negativo (Descargamos la expectativa)
-                    origen_sistema='COMPRAS',
-                    origen_referencia=f"Cierre OC por Recep. #{comprobante.numero}",
-                    usuario=None,
-                    permitir_stock_negativo=True  # Permitimos negativo por diferencias menores
-                )
+                lineas.append({
+                    'articulo': item.articulo,
+                    'deposito': comprobante.deposito,
+                    'codigo_tipo': 'RCPT',
+                    'cantidad': -item.cantidad,  # Negativo (Descargamos la expectativa)
+                    'origen_referencia': f"Cierre OC por Recep. #{comprobante.numero}",
+                    'permitir_stock_negativo': True  # Permitimos negativo por diferencias menores
+                })
+
+        StockManager.registrar_movimientos_lote(
+            lineas, origen_sistema='COMPRAS', origen_referencia=ref, usuario=None
+        )
 
         # Bloqueamos para no duplicar
         comprobante.stock_aplicado = True
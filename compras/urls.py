@@ -15,6 +15,7 @@ from .views import (
 # Nuevas vistas de Cuenta Corriente (API)
 from .cuenta_corriente_api import (
     cc_proveedor_api,
+    cc_proveedor_exportar_api,
     compras_impagas_api,
     ordenes_pago_api,
     resumen_cartera_proveedores_api
@@ -33,6 +34,8 @@ urlpatterns = [
 
     # ¡FÍJATE BIEN EN ESTAS RUTAS PARA QUE COINCIDAN CON AXIOS!
     path('proveedores-admin/<int:pk>/cuenta-corriente/', cc_proveedor_api, name='proveedor-cuenta-corriente-api'),
+    path('proveedores-admin/<int:pk>/cuenta-corriente/exportar/', cc_proveedor_exportar_api,
+         name='proveedor-cuenta-corriente-exportar-api'),
     path('proveedores-admin/<int:pk>/comprobantes-impagos/', compras_impagas_api,
          name='proveedor-comprobantes-impagos-api'),
     path('proveedores-admin/<int:pk>/ordenes-pago/', ordenes_pago_api, name='proveedor-ordenes-pago-api'),
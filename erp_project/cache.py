@@ -0,0 +1,72 @@
+# erp_project/cache.py
+"""
+Caché de resultados calculados (dashboards, reportes) con protección contra estampidas.
+
+`obtener_o_calcular` guarda (valor, vence_en) con un TTL extendido por una ventana
+de gracia. Cuando el valor vence, un solo proceso (el que toma el lock) lo
+recalcula; el resto sigue sirviendo el valor vencido mientras tanto
+(stale-while-revalidate). Si no hay valor, los que no toman el lock esperan un
+momento a que aparezca antes de calcular por su cuenta.
+
+Las claves quedan prefijadas por el schema del tenant (KEY_FUNCTION en settings).
+"""
+import logging
+import time
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def _clave_lock(clave):
+    return f"{clave}:lock"
+
+
+def _calcular_y_guardar(cache, clave, calcular, ttl, gracia):
+    valor = calcular()
+    cache.set(clave, (valor, time.time() + ttl), ttl + gracia)
+    return valor
+
+
+def obtener_o_calcular(clave, calcular, ttl, gracia=None, alias='reportes', espera=5.0, bloqueo=60):
+    """
+    Devuelve el valor cacheado en `clave` o el resultado de `calcular()`.
+
+    - ttl: segundos que el valor se considera fresco.
+    - gracia: segundos extra en que se sirve vencido mientras otro lo recalcula (por defecto, ttl).
+    - espera: segundos que espera un proceso sin lock cuando no hay ningún valor.
+    - bloqueo: vida máxima del lock (si el que calcula muere, otro lo retoma).
+    """
+    cache = caches[alias]
+    gracia = ttl if gracia is None else gracia
+    lock = _clave_lock(clave)
+
+    entrada = cache.get(clave)
+    if entrada is not None:
+        valor, vence_en = entrada
+        if time.time() < vence_en or not cache.add(lock, 1, bloqueo):
+            return valor
+        try:
+            return _calcular_y_guardar(cache, clave, calcular, ttl, gracia)
+        finally:
+            cache.delete(lock)
+
+    if cache.add(lock, 1, bloqueo):
+        try:
+            return _calcular_y_guardar(cache, clave, calcular, ttl, gracia)
+        finally:
+            cache.delete(lock)
+
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        time.sleep(0.1)
+        entrada = cache.get(clave)
+        if entrada is not None:
+            return entrada[0]
+    logger.warning(f"Caché '{clave}': sin valor tras {espera}s de espera, se calcula sin lock.")
+    return calcular()
+
+
+def invalidar(clave, alias='reportes'):
+    """Descarta el valor cacheado (el próximo lector lo recalcula)."""
+    caches[alias].delete(clave)
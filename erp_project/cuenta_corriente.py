@@ -0,0 +1,213 @@
+# erp_project/cuenta_corriente.py
+"""
+Motor de extractos de cuenta corriente, compartido por clientes (ventas) y
+proveedores (compras).
+
+Cada módulo describe sus movimientos como ramas: querysets armados con `rama()`,
+que anotan las mismas columnas (comprobantes, recibos, órdenes de pago). El motor
+las une con UNION ALL y resuelve en la base el orden cronológico y el saldo
+acumulado (SUM() OVER): a Python llega solo la página pedida.
+
+Paginación por cursor (keyset): el cursor, firmado, lleva la posición del último
+movimiento entregado (fecha, clase, id) y el saldo hasta ahí. La página siguiente
+filtra desde esa posición y no vuelve a recorrer los movimientos anteriores.
+"""
+import csv
+import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connection
+from django.db.models import CharField, DecimalField, F, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.http import StreamingHttpResponse
+
+COLUMNAS = (
+    'mov_fecha', 'mov_clase', 'mov_id', 'mov_tipo', 'mov_letra', 'mov_punto_venta', 'mov_numero',
+    'mov_debe', 'mov_haber', 'mov_total', 'mov_saldo_pendiente',
+)
+ORDEN = 'mov_fecha, mov_clase, mov_id'
+ORDEN_INVERSO = 'mov_fecha DESC, mov_clase DESC, mov_id DESC'
+_SALT_CURSOR = 'erp_project.cuenta_corriente'
+
+
+def _expresion(valor, campo):
+    return valor if hasattr(valor, 'resolve_expression') else Value(valor, output_field=campo)
+
+
+def rama(qs, *, clase, tipo, debe, haber, letra='', punto_venta=0, total=None, saldo_pendiente=None):
+    """
+    Movimientos de un modelo con las columnas del motor. `clase` es fija por rama
+    ('comprobante', 'recibo', 'orden_pago'); el resto, expresiones o valores fijos.
+    Todas las columnas son anotaciones en el mismo orden: la unión va por posición.
+    """
+    importe = DecimalField(max_digits=15, decimal_places=2)
+    columnas = {
+        'mov_fecha': F('fecha'),
+        'mov_clase': Value(clase, output_field=CharField()),
+        'mov_id': F('pk'),
+        'mov_tipo': _expresion(tipo, CharField()),
+        'mov_letra': _expresion(letra, CharField()),
+        'mov_punto_venta': _expresion(punto_venta, IntegerField()),
+        'mov_numero': Coalesce(F('numero'), Value(0)),
+        'mov_debe': Cast(_expresion(debe, importe), importe),
+        'mov_haber': Cast(_expresion(haber, importe), importe),
+        'mov_total': Cast(_expresion(total, importe), importe),
+        'mov_saldo_pendiente': Cast(_expresion(saldo_pendiente, importe), importe),
+    }
+    return qs.order_by().annotate(**columnas).values(*COLUMNAS)
+
+
+class ExtractoCuentaCorriente:
+    """
+    Extracto sobre las ramas dadas. `alcance` identifica la consulta (cuenta,
+    período, filtro): un cursor solo vale para el alcance con el que se emitió.
+    """
+
+    def __init__(self, ramas, alcance=''):
+        self.ramas = list(ramas)
+        self.alcance = str(alcance)
+
+    # ── SQL ──────────────────────────────────────────────────────────────
+    def _union(self):
+        partes, params = [], []
+        for qs in self.ramas:
+            sql, parametros = qs.query.sql_with_params()
+            partes.append(f'({sql})')
+            params.extend(parametros)
+        return ' UNION ALL '.join(partes), params
+
+    @staticmethod
+    def _filas(sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            nombres = [columna[0] for columna in cursor.description]
+            return [dict(zip(nombres, fila)) for fila in cursor.fetchall()]
+
+    @staticmethod
+    def _movimiento(fila, saldo):
+        mov = {nombre[len('mov_'):]: fila[nombre] for nombre in COLUMNAS}
+        mov['saldo'] = saldo
+        return mov
+
+    def _tramo(self, posicion, saldo_inicial, limite, desplazamiento=0):
+        """Hasta `limite` movimientos después de `posicion` (fecha, clase, id), con su saldo acumulado."""
+        if not self.ramas:
+            return []
+        union, params = self._union()
+        donde = ''
+        if posicion is not None:
+            donde = f'WHERE ({ORDEN}) > (%s, %s, %s)'
+            params = params + list(posicion)
+        sql = (
+            f'SELECT m.*, SUM(m.mov_debe - m.mov_haber) OVER (ORDER BY {ORDEN} ROWS UNBOUNDED PRECEDING) '
+            f'AS mov_acumulado FROM ({union}) m {donde} ORDER BY {ORDEN} LIMIT %s OFFSET %s'
+        )
+        filas = self._filas(sql, params + [limite, desplazamiento])
+        return [self._movimiento(fila, saldo_inicial + fila['mov_acumulado']) for fila in filas]
+
+    # ── Cursor ───────────────────────────────────────────────────────────
+    def _cursor(self, mov):
+        return signing.dumps({
+            'alcance': self.alcance, 'fecha': mov['fecha'].isoformat(), 'clase': mov['clase'],
+            'id': mov['id'], 'saldo': str(mov['saldo']),
+        }, salt=_SALT_CURSOR)
+
+    def _leer_cursor(self, cursor):
+        try:
+            datos = signing.loads(cursor, salt=_SALT_CURSOR)
+            if datos['alcance'] != self.alcance:
+                raise ValueError
+            posicion = (datetime.datetime.fromisoformat(datos['fecha']), datos['clase'], datos['id'])
+            return posicion, Decimal(datos['saldo'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError, ArithmeticError):
+            raise ValueError("Cursor de paginación inválido para esta consulta.")
+
+    # ── Lecturas ─────────────────────────────────────────────────────────
+    def pagina(self, *, limite=50, cursor=None, saldo_inicial=Decimal('0'), desplazamiento=0):
+        """
+        (movimientos, cursor de la página siguiente o None). Con `cursor` sigue
+        desde la página anterior; sin él arranca en `desplazamiento` (paginación
+        por número, que sí recorre los movimientos salteados). ValueError si el
+        cursor no es de esta consulta.
+        """
+        posicion = None
+        if cursor:
+            posicion, saldo_inicial = self._leer_cursor(cursor)
+            desplazamiento = 0
+        movs = self._tramo(posicion, saldo_inicial, limite + 1, desplazamiento)
+        siguiente = self._cursor(movs[limite - 1]) if len(movs) > limite else None
+        return movs[:limite], siguiente
+
+    def iterar(self, saldo_inicial=Decimal('0'), lote=1000):
+        """Todos los movimientos en orden, de a `lote` por consulta (para exportar sin cargarlos juntos)."""
+        posicion, saldo = None, saldo_inicial
+        while True:
+            movs = self._tramo(posicion, saldo, lote)
+            yield from movs
+            if len(movs) < lote:
+                return
+            ultimo = movs[-1]
+            posicion, saldo = (ultimo['fecha'], ultimo['clase'], ultimo['id']), ultimo['saldo']
+
+    def ultimos(self, limite, saldo_final):
+        """Los `limite` movimientos más recientes, en orden cronológico; `saldo_final` es el saldo después del último."""
+        if not self.ramas:
+            return []
+        union, params = self._union()
+        sql = (
+            f'SELECT m.*, SUM(m.mov_debe - m.mov_haber) OVER (ORDER BY {ORDEN_INVERSO} ROWS UNBOUNDED PRECEDING) '
+            f'AS mov_posterior FROM ({union}) m ORDER BY {ORDEN_INVERSO} LIMIT %s'
+        )
+        filas = self._filas(sql, params + [limite])
+        movs = [
+            self._movimiento(fila, saldo_final - fila['mov_posterior'] + fila['mov_debe'] - fila['mov_haber'])
+            for fila in filas
+        ]
+        movs.reverse()
+        return movs
+
+    def desglose(self):
+        """[{'clase', 'tipo', 'cantidad', 'debe', 'haber'}] agrupado por tipo de movimiento (una consulta)."""
+        if not self.ramas:
+            return []
+        union, params = self._union()
+        sql = (
+            'SELECT m.mov_clase AS clase, m.mov_tipo AS tipo, COUNT(*) AS cantidad, '
+            'COALESCE(SUM(m.mov_debe), 0) AS debe, COALESCE(SUM(m.mov_haber), 0) AS haber '
+            f'FROM ({union}) m GROUP BY m.mov_clase, m.mov_tipo ORDER BY m.mov_tipo'
+        )
+        return self._filas(sql, params)
+
+    def totales(self):
+        """{'cantidad', 'debe', 'haber'} de todos los movimientos."""
+        totales = {'cantidad': 0, 'debe': Decimal('0'), 'haber': Decimal('0')}
+        for fila in self.desglose():
+            for clave in totales:
+                totales[clave] += fila[clave]
+        return totales
+
+
+# ─── Exportación ───────────────────────────────────────────────────────────
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve cada línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    """CSV (';', coma decimal como el resto de las exportaciones) que se envía a medida que se genera."""
+    writer = csv.writer(_Eco(), delimiter=';')
+
+    def _lineas():
+        yield '\ufeff' + writer.writerow(encabezados)
+        for fila in filas:
+            yield writer.writerow([
+                str(valor).replace('.', ',') if isinstance(valor, Decimal) else valor for valor in fila
+            ])
+
+    respuesta = StreamingHttpResponse(_lineas(), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return respuesta
@@ -174,8 +174,8 @@ REST_FRAMEWORK = {
     # Protege contra abuso. Valores razonables para ERP de uso interno.
     # Aumentar en producción si es necesario.
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'erp_project.throttling.AnonRateThrottleCompartido',
+        'erp_project.throttling.UserRateThrottleCompartido',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '60/hour',      # Usuarios no autenticados (login, etc.)
@@ -279,6 +279,118 @@ CELERY_TASK_SERIALIZER   = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE          = 'America/Argentina/Buenos_Aires'
 
+# Tareas periódicas (Celery Beat). Las tareas sin schema_name se abren por tenant.
+CELERY_BEAT_SCHEDULE = {
+    'compactar-balances-fragmentados': {
+        'task': 'inventario.tasks.compactar_balances_fragmentados_task',
+        'schedule': timedelta(minutes=5),
+    },
+    'actualizar-cortes-stock': {
+        'task': 'inventario.tasks.actualizar_cortes_stock_task',
+        'schedule': timedelta(hours=6),
+    },
+    'crear-particiones-ledger': {
+        'task': 'inventario.tasks.crear_particiones_ledger_task',
+        'schedule': timedelta(days=1),
+    },
+    'conciliar-stock': {
+        'task': 'inventario.tasks.conciliar_stock_task',
+        'schedule': timedelta(days=1),
+    },
+    'procesar-posteos-stock': {
+        'task': 'ventas.tasks.procesar_posteos_stock_task',
+        'schedule': timedelta(seconds=15),
+    },
+    'recalcular-precios-efectivos': {
+        'task': 'ventas.tasks.recalcular_precios_efectivos_task',
+        'schedule': timedelta(days=1),
+    },
+    'reconstruir-saldos-clientes': {
+        'task': 'ventas.tasks.reconstruir_saldos_clientes_task',
+        'schedule': timedelta(days=1),
+    },
+    'cerrar-saldos-mensuales': {
+        'task': 'ventas.tasks.cerrar_saldos_mensuales_task',
+        'schedule': timedelta(days=1),
+    },
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CACHÉ
+# ═══════════════════════════════════════════════════════════════════════════
+#
+# Redis compartido entre todos los procesos (web y workers). La key function de
+# django-tenants antepone el schema del tenant activo a cada clave, así ningún
+# tenant lee ni invalida lo de otro aunque usen la misma clave lógica.
+#
+# Alias separados para poder dimensionar, vaciar o mover cada uso por separado:
+#   default    → uso general.
+#   throttling → contadores de rate limiting de DRF (muchas escrituras chicas).
+#   reportes   → resultados calculados (dashboards, reportes); ver erp_project/cache.py.
+#   maestros   → datos maestros por tenant (parametros/maestros.py).
+#
+# Sin Redis (USE_REDIS_CACHE=False) cada alias usa memoria local del proceso.
+
+USE_REDIS_CACHE = config('USE_REDIS_CACHE', default=True, cast=bool)
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default=REDIS_URL)
+
+
+def _cache(prefijo, timeout):
+    if not USE_REDIS_CACHE:
+        return {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': prefijo,
+            'TIMEOUT': timeout,
+            'KEY_FUNCTION': 'django_tenants.cache.make_key',
+            'REVERSE_KEY_FUNCTION': 'django_tenants.cache.reverse_key',
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+        'KEY_PREFIX': prefijo,
+        'TIMEOUT': timeout,
+        'KEY_FUNCTION': 'django_tenants.cache.make_key',
+        'REVERSE_KEY_FUNCTION': 'django_tenants.cache.reverse_key',
+    }
+
+
+CACHES = {
+    'default':    _cache('erp', 300),
+    'throttling': _cache('thr', 3600),
+    'reportes':   _cache('rep', 600),
+    'maestros':   _cache('mae', None),
+}
+
+# Datos maestros: vida en Redis y revalidación del caché en memoria del proceso (segundos)
+MAESTROS_CACHE_TTL = config('MAESTROS_CACHE_TTL', default=3600, cast=int)
+MAESTROS_CACHE_TTL_LOCAL = config('MAESTROS_CACHE_TTL_LOCAL', default=5, cast=int)
+
+# Dashboard de clientes: segundos que el valor cacheado se sirve fresco, y cuánto
+# más se sigue sirviendo vencido mientras una tarea lo rehace.
+DASHBOARD_CLIENTE_CACHE_TTL = config('DASHBOARD_CLIENTE_CACHE_TTL', default=300, cast=int)
+DASHBOARD_CLIENTE_CACHE_GRACIA = config('DASHBOARD_CLIENTE_CACHE_GRACIA', default=86400, cast=int)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# INVENTARIO
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Cantidad de contadores por (articulo, deposito, tipo) para artículos/depósitos
+# con balance fragmentado (hot SKUs). Más slots = menos contención, lecturas algo más caras.
+STOCK_BALANCE_SLOTS = config('STOCK_BALANCE_SLOTS', default=8, cast=int)
+
+# Particionado mensual del Ledger: meses creados por adelantado y meses que
+# `archivar_ledger` conserva adjuntos por defecto.
+LEDGER_MESES_PARTICIONES_ADELANTE = config('LEDGER_MESES_PARTICIONES_ADELANTE', default=3, cast=int)
+LEDGER_MESES_RETENCION = config('LEDGER_MESES_RETENCION', default=24, cast=int)
+
+# Posteo de stock diferido de ventas (outbox): documentos por lote, lotes por
+# corrida del consumidor y reintentos antes de dejar un documento bloqueado.
+STOCK_OUTBOX_LOTE = config('STOCK_OUTBOX_LOTE', default=500, cast=int)
+STOCK_OUTBOX_LOTES_POR_CORRIDA = config('STOCK_OUTBOX_LOTES_POR_CORRIDA', default=20, cast=int)
+STOCK_OUTBOX_MAX_INTENTOS = config('STOCK_OUTBOX_MAX_INTENTOS', default=5, cast=int)
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # ALMACENAMIENTO (S3 / MINIO)
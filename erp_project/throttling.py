@@ -0,0 +1,18 @@
+# erp_project/throttling.py
+"""
+Throttles de DRF sobre el alias de caché 'throttling'.
+
+Los de DRF usan el caché default; estos guardan sus contadores en un alias
+propio (Redis compartido entre workers, claves prefijadas por tenant), así los
+límites valen para todo el despliegue y no compiten con otros usos del caché.
+"""
+from django.core.cache import caches
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+
+class AnonRateThrottleCompartido(AnonRateThrottle):
+    cache = caches['throttling']
+
+
+class UserRateThrottleCompartido(UserRateThrottle):
+    cache = caches['throttling']
@@ -58,7 +58,7 @@ class RubroAdmin(admin.ModelAdmin):
 
 @admin.register(Deposito)
 class DepositoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'direccion', 'es_principal')
+    list_display = ('nombre', 'direccion', 'es_principal', 'balance_fragmentado')
     search_fields = ['nombre']
 
 
@@ -79,9 +79,12 @@ class StockArticuloInline(admin.TabularInline):
     model = StockArticulo
     extra = 0
     fields = ('deposito', 'cantidad_real', 'cantidad_comprometida', 'cantidad_disponible')
-    readonly_fields = ('cantidad_disponible',)  # Es calculado, solo lectura
+    readonly_fields = ('deposito', 'cantidad_real', 'cantidad_comprometida', 'cantidad_disponible')
     can_delete = False
 
+    # Derivado de BalanceStock: puede ser una vista (ver inventario/legacy.py)
+    def has_add_permission(self, request, obj=None): return False
+
     def cantidad_disponible(self, obj):
         return obj.cantidad_disponible
 
@@ -130,6 +133,7 @@ class ArticuloAdmin(admin.ModelAdmin):
         ('Gestión de Inventario y Unidades',
          {'fields': (
              ('administra_stock', 'permite_stock_negativo'),
+             ('balance_fragmentado', 'stock_tiempo_real'),
              'grupo_unidades',
              'unidad_medida_stock',
              'unidad_medida_venta'
@@ -488,6 +492,12 @@ class StockArticuloAdmin(admin.ModelAdmin):
     # Solo lectura en Admin para forzar uso de Movimientos
     list_editable = []
 
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+    def has_delete_permission(self, request, obj=None): return False
+
 
 auditlog.register(Articulo)
 auditlog.register(Marca)
\ No newline at end of file
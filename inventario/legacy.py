@@ -0,0 +1,194 @@
+# inventario/legacy.py
+"""
+Retiro de la doble escritura a los modelos legacy (StockArticulo / HistoricoMovimientos).
+
+Con ConfiguracionEmpresa.stock_legacy_derivado activo, el StockManager deja de
+escribir esas tablas: sus nombres pasan a ser vistas de solo lectura derivadas de
+BalanceStock (+ slots) y del Ledger, así `Articulo.stock_total`, el admin y los
+reportes viejos siguen leyendo lo mismo sin costo en el camino de escritura.
+
+Las tablas originales no se borran: quedan renombradas como *_archivo.
+El cambio se hace por tenant con `manage.py migrar_stock_legacy`, que verifica
+la equivalencia antes de conmutar.
+"""
+import logging
+
+from django.db import connection, transaction
+
+from parametros.models import ConfiguracionEmpresa
+
+from .models import (
+    BalanceStock, BalanceStockSlot, HistoricoMovimientos, MovimientoStockLedger, StockArticulo, TipoStock
+)
+
+logger = logging.getLogger(__name__)
+
+TABLA_STOCK = StockArticulo._meta.db_table
+TABLA_HISTORICO = HistoricoMovimientos._meta.db_table
+
+
+def _q(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def _archivo(tabla):
+    return f"{tabla}_archivo"
+
+
+def _bloquear_conmutacion(cursor, exclusivo=False):
+    """
+    Advisory lock de transacción por tenant: compartido para quien decide si escribe
+    las tablas legacy, exclusivo para activar_vistas()/desactivar_vistas().
+    """
+    funcion = 'pg_advisory_xact_lock' if exclusivo else 'pg_advisory_xact_lock_shared'
+    cursor.execute(f"SELECT {funcion}(hashtext(%s))", [f"stock_legacy:{connection.schema_name}"])
+
+
+def legacy_derivado():
+    """
+    True si el tenant activo sirve StockArticulo/HistoricoMovimientos como vistas.
+    Se decide en la base y no en el caché de maestros: otro proceso puede tener el
+    valor viejo hasta su TTL, y escribiría sobre la vista (o sobre la tabla ya
+    archivada). Con el lock compartido tomado, una conmutación espera al fin de la
+    transacción en curso: la respuesta vale hasta entonces.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        _bloquear_conmutacion(cursor)
+        # Sentencia aparte: en READ COMMITTED ve lo confirmado mientras se esperaba el lock
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLA_STOCK])
+        fila = cursor.fetchone()
+    return bool(fila) and fila[0] == 'v'
+
+
+def _sql_stock_derivado():
+    return f"""
+        SELECT MIN(s.id) AS id, s.articulo_id, s.deposito_id,
+               CAST(COALESCE(SUM(s.cantidad) FILTER (WHERE t.codigo = 'REAL'), 0) AS numeric(12, 3))
+                   AS cantidad_real,
+               CAST(COALESCE(SUM(s.cantidad) FILTER (WHERE t.codigo = 'RSRV'), 0) AS numeric(12, 3))
+                   AS cantidad_comprometida
+        FROM (
+            SELECT id, articulo_id, deposito_id, tipo_stock_id, cantidad
+            FROM {_q(BalanceStock._meta.db_table)}
+            UNION ALL
+            SELECT NULL, articulo_id, deposito_id, tipo_stock_id, cantidad
+            FROM {_q(BalanceStockSlot._meta.db_table)}
+        ) s
+        JOIN {_q(TipoStock._meta.db_table)} t ON t.id = s.tipo_stock_id
+        WHERE t.codigo IN ('REAL', 'RSRV')
+        GROUP BY s.articulo_id, s.deposito_id
+    """
+
+
+def _sql_historico_derivado():
+    # saldo_post_movimiento: saldo acumulado en orden de registro, como lo escribía el dual-write
+    return f"""
+        SELECT l.id, l.fecha_registro AS fecha, l.articulo_id, l.deposito_id,
+               CAST(ABS(l.cantidad) AS numeric(12, 3)) AS cantidad,
+               CAST(CASE WHEN t.codigo = 'REAL' THEN 'REAL' ELSE 'COMPROMETIDO' END AS varchar(15)) AS tipo_stock,
+               CAST(CASE WHEN l.cantidad > 0 THEN 'SUMAR' ELSE 'RESTAR' END AS varchar(10)) AS operacion,
+               CAST(SUM(l.cantidad) OVER (
+                   PARTITION BY l.articulo_id, l.deposito_id, l.tipo_stock_id
+                   ORDER BY l.fecha_registro, l.id
+               ) AS numeric(12, 3)) AS saldo_post_movimiento,
+               CAST(l.origen_referencia AS varchar(150)) AS referencia,
+               l.usuario_id
+        FROM {_q(MovimientoStockLedger._meta.db_table)} l
+        JOIN {_q(TipoStock._meta.db_table)} t ON t.id = l.tipo_stock_id
+        WHERE t.codigo IN ('REAL', 'RSRV')
+    """
+
+
+def verificar_equivalencia():
+    """
+    Compara las tablas legacy con lo que servirían las vistas. Devuelve un dict:
+    - stock: pares (articulo, deposito) cuyo saldo difiere.
+    - historico: claves (articulo, deposito, tipo) cuyo neto de movimientos difiere
+      del Ledger (típicamente, historia previa a la existencia del Ledger).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM {_q(TABLA_STOCK)} a
+            FULL OUTER JOIN ({_sql_stock_derivado()}) d
+                ON d.articulo_id = a.articulo_id AND d.deposito_id = a.deposito_id
+            WHERE COALESCE(a.cantidad_real, 0) <> COALESCE(d.cantidad_real, 0)
+               OR COALESCE(a.cantidad_comprometida, 0) <> COALESCE(d.cantidad_comprometida, 0)
+        """)
+        stock = cursor.fetchone()[0]
+
+        neto = "SUM(CASE WHEN operacion = 'SUMAR' THEN cantidad ELSE -cantidad END)"
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT articulo_id, deposito_id, tipo_stock, {neto} AS neto
+                FROM {_q(TABLA_HISTORICO)} GROUP BY 1, 2, 3
+            ) a
+            FULL OUTER JOIN (
+                SELECT articulo_id, deposito_id, tipo_stock, {neto} AS neto
+                FROM ({_sql_historico_derivado()}) h GROUP BY 1, 2, 3
+            ) d USING (articulo_id, deposito_id, tipo_stock)
+            WHERE COALESCE(a.neto, 0) <> COALESCE(d.neto, 0)
+        """)
+        historico = cursor.fetchone()[0]
+    return {'stock': stock, 'historico': historico}
+
+
+@transaction.atomic
+def activar_vistas(forzar=False):
+    """
+    Conmuta el tenant activo a vistas derivadas. Bloquea las tablas legacy (los
+    registros de stock en curso esperan), verifica equivalencia y reemplaza.
+    Devuelve el resultado de la verificación. ValueError si no es equivalente.
+    """
+    with connection.cursor() as cursor:
+        _bloquear_conmutacion(cursor, exclusivo=True)
+    config = ConfiguracionEmpresa.objects.select_for_update().first()
+    if config is None:
+        raise ValueError("El tenant no tiene ConfiguracionEmpresa.")
+    if config.stock_legacy_derivado:
+        return {'stock': 0, 'historico': 0}
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {_q(TABLA_STOCK)}, {_q(TABLA_HISTORICO)} IN EXCLUSIVE MODE")
+        resultado = verificar_equivalencia()
+        if any(resultado.values()) and not forzar:
+            raise ValueError(f"Las tablas legacy no son equivalentes al Ledger: {resultado}")
+
+        for tabla, sql in ((TABLA_STOCK, _sql_stock_derivado()), (TABLA_HISTORICO, _sql_historico_derivado())):
+            cursor.execute(f"ALTER TABLE {_q(tabla)} RENAME TO {_q(_archivo(tabla))}")
+            cursor.execute(f"CREATE VIEW {_q(tabla)} AS {sql}")
+
+    config.stock_legacy_derivado = True
+    config.save(update_fields=['stock_legacy_derivado'])
+    logger.info(f"Stock legacy servido por vistas en {connection.schema_name}: {resultado}")
+    return resultado
+
+
+@transaction.atomic
+def desactivar_vistas():
+    """
+    Vuelve a las tablas físicas. StockArticulo se recalcula desde BalanceStock;
+    HistoricoMovimientos recupera la tabla archivada (sin los movimientos del período con vistas).
+    """
+    from .services import StockManager
+
+    with connection.cursor() as cursor:
+        _bloquear_conmutacion(cursor, exclusivo=True)
+    config = ConfiguracionEmpresa.objects.select_for_update().first()
+    if config is None or not config.stock_legacy_derivado:
+        return False
+
+    with connection.cursor() as cursor:
+        for tabla in (TABLA_STOCK, TABLA_HISTORICO):
+            cursor.execute(f"DROP VIEW {_q(tabla)}")
+            cursor.execute(f"ALTER TABLE {_q(_archivo(tabla))} RENAME TO {_q(tabla)}")
+
+    config.stock_legacy_derivado = False
+    config.save(update_fields=['stock_legacy_derivado'])
+
+    claves = set(BalanceStock.objects.values_list('articulo_id', 'deposito_id').distinct())
+    if claves:
+        StockManager._recalcular_legacy(claves)
+    logger.info(f"Stock legacy vuelve a tablas físicas en {connection.schema_name}.")
+    return True
@@ -0,0 +1,78 @@
+# inventario/management/commands/archivar_ledger.py
+"""
+Desacopla y archiva las particiones mensuales viejas del Ledger de stock.
+
+Por cada tenant, las particiones anteriores a la ventana de retención se
+desacoplan de MovimientoStockLedger y:
+  - sin --directorio: quedan como tablas sueltas (..._arch_YYYYMM) en el schema;
+  - con --directorio: se exportan a CSV y se eliminan.
+
+Solo se archiva un mes si existe un SaldoStockCorte en su cierre o posterior:
+así saldo_a_fecha() sigue siendo correcto para fechas posteriores al archivo.
+No archivar meses que todavía puedan recibir movimientos con fecha retroactiva.
+
+Uso:
+    python manage.py archivar_ledger --meses-retencion 24
+    python manage.py archivar_ledger --schema demo --directorio /backups/ledger --dry-run
+"""
+import calendar
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from inventario.models import SaldoStockCorte
+from inventario.particiones import archivar_particion, ledger_particionado, particiones_ledger
+from inventario.tasks import schemas_de_tenants
+
+
+class Command(BaseCommand):
+    help = 'Desacopla y archiva las particiones del Ledger anteriores a la ventana de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Schema del tenant. Por defecto, todos los tenants.')
+        parser.add_argument('--meses-retencion', type=int, default=None,
+                            help='Meses que se conservan adjuntos (default: LEDGER_MESES_RETENCION).')
+        parser.add_argument('--directorio', help='Exporta cada partición a CSV en este directorio y la elimina.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo lista lo que se archivaría.')
+
+    def handle(self, *args, **opts):
+        retencion = opts['meses_retencion']
+        if retencion is None:
+            retencion = getattr(settings, 'LEDGER_MESES_RETENCION', 24)
+        if retencion < 1:
+            raise CommandError('--meses-retencion debe ser al menos 1.')
+
+        directorio = opts['directorio']
+        if directorio and not os.path.isdir(directorio):
+            raise CommandError(f'No existe el directorio {directorio}.')
+
+        hoy = timezone.localdate()
+        indice = hoy.year * 12 + hoy.month - 1 - retencion
+        limite = hoy.replace(year=indice // 12, month=indice % 12 + 1, day=1)
+
+        schemas = [opts['schema']] if opts['schema'] else schemas_de_tenants()
+        for schema in schemas:
+            with schema_context(schema):
+                if not ledger_particionado():
+                    self.stdout.write(self.style.WARNING(f'[{schema}] Ledger sin particionar, se omite.'))
+                    continue
+
+                for mes in particiones_ledger():
+                    if mes >= limite:
+                        break
+                    cierre = mes.replace(day=calendar.monthrange(mes.year, mes.month)[1])
+                    if not SaldoStockCorte.objects.filter(fecha_corte__gte=cierre).exists():
+                        self.stdout.write(self.style.WARNING(
+                            f'[{schema}] {mes:%Y-%m}: sin corte de saldos posterior, no se archiva '
+                            f'(ejecutar actualizar_cortes_stock).'
+                        ))
+                        break
+
+                    if opts['dry_run']:
+                        self.stdout.write(f'[{schema}] {mes:%Y-%m}: se archivaría.')
+                        continue
+                    destino = archivar_particion(mes, directorio)
+                    self.stdout.write(self.style.SUCCESS(f'[{schema}] {mes:%Y-%m} archivado en {destino}.'))
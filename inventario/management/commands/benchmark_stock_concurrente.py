@@ -0,0 +1,104 @@
+# inventario/management/commands/benchmark_stock_concurrente.py
+"""
+Benchmark de concurrencia sobre un artículo "caliente".
+
+Lanza N hilos que descuentan stock del mismo (articulo, deposito, REAL) con la
+regla de negativos activa, igual que un POS vendiendo el mismo SKU en varias cajas.
+Reporta throughput y verifica que no haya sobreventa.
+
+ATENCIÓN: escribe en el Ledger del tenant indicado (origen_sistema='BENCHMARK')
+y al finalizar registra el contrasiento para dejar el saldo como estaba.
+
+Uso:
+    python manage.py benchmark_stock_concurrente --schema demo --articulo A00001 --deposito 1 \
+        --hilos 8 --stock-inicial 500 --operaciones 100
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django_tenants.utils import schema_context
+
+from inventario.models import Articulo, Deposito
+from inventario.services import StockManager
+
+
+class Command(BaseCommand):
+    help = 'Mide el throughput de egresos concurrentes sobre un artículo caliente y verifica que no haya sobreventa'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', required=True, help='Schema del tenant sobre el que se ejecuta.')
+        parser.add_argument('--articulo', required=True, help='cod_articulo del artículo caliente.')
+        parser.add_argument('--deposito', type=int, required=True, help='ID del depósito.')
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--operaciones', type=int, default=100, help='Egresos por hilo.')
+        parser.add_argument('--stock-inicial', type=Decimal, default=Decimal('500'))
+
+    def handle(self, *args, **opts):
+        schema = opts['schema']
+        with schema_context(schema):
+            try:
+                articulo = Articulo.objects.get(cod_articulo=opts['articulo'])
+                deposito = Deposito.objects.get(pk=opts['deposito'])
+            except (Articulo.DoesNotExist, Deposito.DoesNotExist) as exc:
+                raise CommandError(str(exc))
+
+            saldo_previo = StockManager.obtener_saldo_actual(articulo, deposito, 'REAL')
+            StockManager.registrar_movimiento(
+                articulo, deposito, 'REAL', opts['stock_inicial'] - saldo_previo,
+                origen_sistema='BENCHMARK', origen_referencia='Seed', permitir_stock_negativo=True
+            )
+
+        exitos = []
+        rechazos = []
+        lock = threading.Lock()
+
+        def trabajador():
+            ok = rechazados = 0
+            with schema_context(schema):
+                for _ in range(opts['operaciones']):
+                    try:
+                        StockManager.registrar_movimiento(
+                            articulo, deposito, 'REAL', Decimal('-1'),
+                            origen_sistema='BENCHMARK', origen_referencia='Egreso concurrente',
+                            permitir_stock_negativo=False
+                        )
+                        ok += 1
+                    except ValidationError:
+                        rechazados += 1
+            connection.close()
+            with lock:
+                exitos.append(ok)
+                rechazos.append(rechazados)
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(opts['hilos'])]
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        duracion = time.perf_counter() - inicio
+
+        total_ok = sum(exitos)
+        total_operaciones = total_ok + sum(rechazos)
+
+        with schema_context(schema):
+            saldo_final = StockManager.obtener_saldo_actual(articulo, deposito, 'REAL')
+            esperado = opts['stock_inicial'] - total_ok
+
+            # Contrasiento: dejamos el saldo como estaba antes del benchmark
+            StockManager.registrar_movimiento(
+                articulo, deposito, 'REAL', saldo_previo - saldo_final,
+                origen_sistema='BENCHMARK', origen_referencia='Restauración', permitir_stock_negativo=True
+            )
+
+        self.stdout.write(f"Hilos: {opts['hilos']} | Operaciones: {total_operaciones} | Duración: {duracion:.2f}s")
+        self.stdout.write(f"Throughput: {total_operaciones / duracion:.1f} ops/s")
+        self.stdout.write(f"Egresos aceptados: {total_ok} | Rechazados por stock: {sum(rechazos)}")
+
+        if saldo_final < 0 or saldo_final != esperado:
+            raise CommandError(f"Inconsistencia: saldo final {saldo_final}, esperado {esperado}.")
+        self.stdout.write(self.style.SUCCESS(f"✅ Sin sobreventa. Saldo final {saldo_final}."))
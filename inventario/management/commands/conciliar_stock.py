@@ -0,0 +1,90 @@
+# inventario/management/commands/conciliar_stock.py
+"""
+Conciliación Ledger -> BalanceStock / StockArticulo.
+
+Recorre el Ledger agregado de cada depósito (cursor server-side) y lo compara
+con las vistas materializadas. Los depósitos se procesan en paralelo en un
+pool de procesos, cada uno con su propia conexión a la base.
+
+Uso:
+    python manage.py conciliar_stock                        # todos los tenants, solo reporte
+    python manage.py conciliar_stock --schema demo --reparar --procesos 4
+    python manage.py conciliar_stock --schema demo --deposito 1 --deposito 3 --reporte /tmp/desvios.csv
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django_tenants.utils import schema_context
+
+from inventario.models import Deposito
+from inventario.services import ConciliacionStockService
+from inventario.tasks import schemas_de_tenants
+
+COLUMNAS_REPORTE = ['schema', 'modelo', 'deposito_id', 'articulo_id', 'tipo', 'esperado', 'actual', 'diferencia']
+
+
+def _inicializar_worker():
+    # Con 'spawn' el proceso hijo arranca sin Django configurado
+    django.setup()
+
+
+def _conciliar_en_worker(schema, deposito_id, reparar):
+    with schema_context(schema):
+        resumen = ConciliacionStockService.conciliar_deposito(deposito_id, reparar=reparar)
+    connections.close_all()
+    resumen['schema'] = schema
+    return resumen
+
+
+class Command(BaseCommand):
+    help = 'Detecta (y opcionalmente repara) desvíos entre el Ledger de stock y los balances materializados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Schema del tenant. Por defecto, todos los tenants.')
+        parser.add_argument('--deposito', type=int, action='append', help='ID de depósito (repetible).')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--reparar', action='store_true', help='Reconstruye desde el Ledger las claves desviadas.')
+        parser.add_argument('--reporte', help='Ruta del CSV con el detalle de desvíos.')
+
+    def handle(self, *args, **opts):
+        if opts['procesos'] < 1:
+            raise CommandError('--procesos debe ser al menos 1.')
+
+        schemas = [opts['schema']] if opts['schema'] else schemas_de_tenants()
+        trabajos = []
+        for schema in schemas:
+            with schema_context(schema):
+                depositos = Deposito.objects.order_by('pk').values_list('pk', flat=True)
+                if opts['deposito']:
+                    depositos = depositos.filter(pk__in=opts['deposito'])
+                trabajos.extend((schema, pk, opts['reparar']) for pk in depositos)
+
+        # Los hijos no deben heredar la conexión abierta del proceso padre
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=opts['procesos'], initializer=_inicializar_worker) as pool:
+            resultados = list(pool.map(_conciliar_en_worker, *zip(*trabajos))) if trabajos else []
+
+        total_desvios = 0
+        for resumen in resultados:
+            cantidad = len(resumen['desvios'])
+            total_desvios += cantidad
+            estilo = self.style.WARNING if cantidad else self.style.SUCCESS
+            self.stdout.write(estilo(
+                f"[{resumen['schema']}] Depósito {resumen['deposito_id']}: "
+                f"{cantidad} desvíos, {resumen['reparados']} claves reconstruidas."
+            ))
+
+        if opts['reporte']:
+            with open(opts['reporte'], 'w', newline='', encoding='utf-8') as archivo:
+                writer = csv.DictWriter(archivo, fieldnames=COLUMNAS_REPORTE, extrasaction='ignore')
+                writer.writeheader()
+                for resumen in resultados:
+                    for desvio in resumen['desvios']:
+                        writer.writerow({**desvio, 'schema': resumen['schema']})
+            self.stdout.write(f"Reporte de desvíos: {opts['reporte']}")
+
+        self.stdout.write(f"Depósitos conciliados: {len(resultados)} | Desvíos: {total_desvios}")
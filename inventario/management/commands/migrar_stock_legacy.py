@@ -0,0 +1,65 @@
+# inventario/management/commands/migrar_stock_legacy.py
+"""
+Retira la doble escritura a StockArticulo / HistoricoMovimientos.
+
+Por cada tenant verifica que las tablas legacy coincidan con lo derivable de
+BalanceStock y del Ledger y, si coinciden, las reemplaza por vistas de solo
+lectura con el mismo nombre (las tablas quedan como *_archivo). Desde ese
+momento el StockManager deja de escribirlas.
+
+Uso:
+    python manage.py migrar_stock_legacy --verificar-solo
+    python manage.py migrar_stock_legacy --schema demo
+    python manage.py migrar_stock_legacy --schema demo --revertir
+"""
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context
+
+from inventario.legacy import activar_vistas, desactivar_vistas, legacy_derivado, verificar_equivalencia
+from inventario.tasks import schemas_de_tenants
+
+
+class Command(BaseCommand):
+    help = 'Reemplaza las tablas legacy de stock por vistas derivadas del Ledger (o revierte)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Schema del tenant. Por defecto, todos los tenants.')
+        parser.add_argument('--verificar-solo', action='store_true',
+                            help='Solo informa las diferencias, no conmuta.')
+        parser.add_argument('--revertir', action='store_true',
+                            help='Vuelve a las tablas físicas y recalcula StockArticulo.')
+        parser.add_argument('--forzar', action='store_true',
+                            help='Conmuta aunque haya diferencias (la vista pasa a ser la verdad).')
+
+    def handle(self, *args, **opts):
+        schemas = [opts['schema']] if opts['schema'] else schemas_de_tenants()
+        for schema in schemas:
+            with schema_context(schema):
+                if opts['revertir']:
+                    if desactivar_vistas():
+                        self.stdout.write(self.style.SUCCESS(f'[{schema}] Tablas legacy restauradas.'))
+                    else:
+                        self.stdout.write(f'[{schema}] Ya usa tablas físicas.')
+                    continue
+
+                if legacy_derivado():
+                    self.stdout.write(f'[{schema}] Ya usa vistas derivadas.')
+                    continue
+
+                if opts['verificar_solo']:
+                    resultado = verificar_equivalencia()
+                    estilo = self.style.WARNING if any(resultado.values()) else self.style.SUCCESS
+                    self.stdout.write(estilo(
+                        f"[{schema}] Diferencias: stock={resultado['stock']} historico={resultado['historico']}"
+                    ))
+                    continue
+
+                try:
+                    resultado = activar_vistas(forzar=opts['forzar'])
+                except ValueError as e:
+                    self.stdout.write(self.style.ERROR(f'[{schema}] {e}'))
+                    continue
+                self.stdout.write(self.style.SUCCESS(
+                    f"[{schema}] Vistas activas (diferencias: stock={resultado['stock']} "
+                    f"historico={resultado['historico']})."
+                ))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_remove_ajustestock_creado_por_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulo',
+            name='balance_fragmentado',
+            field=models.BooleanField(default=False, help_text='Para artículos muy vendidos: reparte el saldo en varios contadores y reduce la contención.', verbose_name='¿Balance Fragmentado?'),
+        ),
+        migrations.AddField(
+            model_name='deposito',
+            name='balance_fragmentado',
+            field=models.BooleanField(default=False, help_text='Reparte el saldo en varios contadores para reducir la contención en depósitos de alto volumen (POS).', verbose_name='¿Balance Fragmentado?'),
+        ),
+        migrations.CreateModel(
+            name='BalanceStockSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('cantidad', models.DecimalField(decimal_places=4, default=0, max_digits=15)),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='balances_stock_slots', to='inventario.articulo')),
+                ('deposito', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='balances_stock_slots', to='inventario.deposito')),
+                ('tipo_stock', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='inventario.tipostock')),
+            ],
+            options={
+                'verbose_name': 'Slot de Balance de Stock',
+                'verbose_name_plural': 'Slots de Balance de Stock',
+                'unique_together': {('articulo', 'deposito', 'tipo_stock', 'slot')},
+            },
+        ),
+    ]
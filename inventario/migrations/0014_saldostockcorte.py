@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_balance_fragmentado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoStockCorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_corte', models.DateField()),
+                ('cantidad', models.DecimalField(decimal_places=4, max_digits=15)),
+                ('calculado_en', models.DateTimeField(auto_now_add=True)),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes_stock', to='inventario.articulo')),
+                ('deposito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes_stock', to='inventario.deposito')),
+                ('tipo_stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventario.tipostock')),
+            ],
+            options={
+                'verbose_name': 'Corte de Saldo de Stock',
+                'verbose_name_plural': 'Cortes de Saldo de Stock',
+                'indexes': [models.Index(fields=['articulo', 'fecha_corte'], name='inventario__articul_3f1c2e_idx')],
+                'unique_together': {('fecha_corte', 'articulo', 'deposito', 'tipo_stock')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:20
+
+from django.db import migrations
+
+
+def particionar(apps, schema_editor):
+    from inventario.particiones import particionar_ledger
+    particionar_ledger(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_saldostockcorte'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='movimientostockledger',
+            options={'ordering': ['-fecha_movimiento', '-id'], 'verbose_name': 'Movimiento de Stock (Ledger)', 'verbose_name_plural': 'Ledger de Stock'},
+        ),
+        # Conversión física a tabla particionada por mes (solo PostgreSQL). El estado
+        # de Django no cambia: mismas columnas, índices y FKs.
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_particionar_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articulo',
+            name='stock_tiempo_real',
+            field=models.BooleanField(default=False, help_text='Los comprobantes con este artículo descuentan stock al confirmar aunque la empresa use posteo diferido.', verbose_name='¿Stock en Tiempo Real?'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:05
+
+import inventario.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_articulo_stock_tiempo_real'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockarticulo',
+            name='articulo',
+            field=models.ForeignKey(on_delete=inventario.models.cascada_legacy, related_name='stocks', to='inventario.articulo'),
+        ),
+        migrations.AlterField(
+            model_name='stockarticulo',
+            name='deposito',
+            field=models.ForeignKey(on_delete=inventario.models.cascada_legacy, to='inventario.deposito'),
+        ),
+        migrations.AlterField(
+            model_name='historicomovimientos',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=inventario.models.set_null_legacy, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,7 +1,8 @@
 # inventario/models.py
 
 from django.db import models, transaction
-from django.db.models import Sum, Q, F
+from django.db.models import Sum, Q, F, OuterRef, Subquery, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from djmoney.money import Money
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
@@ -15,6 +16,7 @@ from parametros.models import (
     Contador, Moneda, UnidadMedida, get_default_unidad_medida,
     Impuesto, get_default_moneda_pk, GrupoUnidadMedida, CategoriaImpositiva
 )
+from parametros.maestros import get_moneda
 
 # ==========================================
 # CONSTANTES Y DOCUMENTACIÓN
@@ -98,10 +100,43 @@ class BalanceStock(models.Model):
         return f"{self.articulo} | {self.tipo_stock.codigo}: {self.cantidad}"
 
 
+class BalanceStockSlot(models.Model):
+    """
+    CONTADOR FRAGMENTADO (Hot SKUs).
+    -------------------------------------------------------------------------
+    Para artículos/depósitos con `balance_fragmentado=True`, los ingresos y los
+    egresos que no validan negativos se reparten en N slots por clave
+    (articulo, deposito, tipo_stock) en lugar de contender por la fila única
+    de BalanceStock. Saldo real = BalanceStock.cantidad + SUM(slots).
+
+    Los egresos que validan stock negativo siguen pasando por BalanceStock
+    (el chequeo necesita un único punto de serialización).
+    La tarea de compactación pliega los slots de vuelta en BalanceStock.
+    Al igual que BalanceStock, solo StockManager escribe aquí.
+    -------------------------------------------------------------------------
+    """
+    articulo = models.ForeignKey('Articulo', on_delete=models.PROTECT, related_name='balances_stock_slots')
+    deposito = models.ForeignKey('Deposito', on_delete=models.PROTECT, related_name='balances_stock_slots')
+    tipo_stock = models.ForeignKey(TipoStock, on_delete=models.PROTECT)
+    slot = models.PositiveSmallIntegerField()
+
+    cantidad = models.DecimalField(max_digits=15, decimal_places=4, default=0)
+
+    class Meta:
+        unique_together = ['articulo', 'deposito', 'tipo_stock', 'slot']
+        verbose_name = "Slot de Balance de Stock"
+        verbose_name_plural = "Slots de Balance de Stock"
+
+    def __str__(self):
+        return f"{self.articulo_id}/{self.deposito_id}/{self.tipo_stock_id} #{self.slot}: {self.cantidad}"
+
+
 class MovimientoStockLedger(models.Model):
     """
     FUENTE DE LA VERDAD. Bitácora inmutable. Append-Only.
     Registra cada impacto. Referencia débil al documento origen.
+    En PostgreSQL la tabla está particionada por mes de `fecha_movimiento`
+    (ver inventario/particiones.py): filtrar por esa columna habilita el pruning.
     """
     fecha_registro = models.DateTimeField(auto_now_add=True, db_index=True)
     fecha_movimiento = models.DateTimeField(default=timezone.now, verbose_name="Fecha Efectiva", db_index=True)
@@ -120,7 +155,8 @@ class MovimientoStockLedger(models.Model):
     observaciones = models.CharField(max_length=200, blank=True)
 
     class Meta:
-        ordering = ['-fecha_registro']
+        # Ordenar por la clave de partición permite recorrer solo las particiones recientes
+        ordering = ['-fecha_movimiento', '-id']
         verbose_name = "Movimiento de Stock (Ledger)"
         verbose_name_plural = "Ledger de Stock"
         indexes = [
@@ -129,6 +165,37 @@ class MovimientoStockLedger(models.Model):
         ]
 
 
+class SaldoStockCorte(models.Model):
+    """
+    SNAPSHOT MENSUAL DEL LEDGER (Stock a fecha).
+    -------------------------------------------------------------------------
+    Saldo acumulado de cada (articulo, deposito, tipo_stock) al cierre de
+    `fecha_corte` (último día del mes). Todas las claves comparten los mismos
+    cortes; las claves sin fila tienen saldo 0.
+    Lo construye y mantiene StockManager.actualizar_cortes_stock() (Celery Beat).
+    Consultas históricas: corte más cercano + delta del Ledger posterior.
+    -------------------------------------------------------------------------
+    """
+    fecha_corte = models.DateField()
+    articulo = models.ForeignKey('Articulo', on_delete=models.CASCADE, related_name='cortes_stock')
+    deposito = models.ForeignKey('Deposito', on_delete=models.CASCADE, related_name='cortes_stock')
+    tipo_stock = models.ForeignKey(TipoStock, on_delete=models.CASCADE)
+
+    cantidad = models.DecimalField(max_digits=15, decimal_places=4)
+    calculado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['fecha_corte', 'articulo', 'deposito', 'tipo_stock']
+        indexes = [
+            models.Index(fields=['articulo', 'fecha_corte']),
+        ]
+        verbose_name = "Corte de Saldo de Stock"
+        verbose_name_plural = "Cortes de Saldo de Stock"
+
+    def __str__(self):
+        return f"{self.articulo_id}/{self.deposito_id}/{self.tipo_stock_id} al {self.fecha_corte}: {self.cantidad}"
+
+
 # ==========================================
 # MODELOS EXISTENTES (LEGACY & MAESTROS)
 # ==========================================
@@ -164,6 +231,11 @@ class Deposito(models.Model):
         verbose_name="¿Permite Stock Negativo?",
         help_text="Si está marcado, este depósito permite egresos sin stock suficiente, salvo override manual."
     )
+    balance_fragmentado = models.BooleanField(
+        default=False,
+        verbose_name="¿Balance Fragmentado?",
+        help_text="Reparte el saldo en varios contadores para reducir la contención en depósitos de alto volumen (POS)."
+    )
 
     def __str__(self):
         return self.nombre
@@ -173,14 +245,32 @@ class Deposito(models.Model):
         verbose_name_plural = "Depósitos"
 
 
+def cascada_legacy(collector, field, sub_objs, using):
+    """
+    CASCADE hacia los modelos legacy mientras sean tablas. Con el tenant en vistas
+    derivadas (inventario/legacy.py) sus filas salen de BalanceStock y del Ledger:
+    no hay nada que borrar, y PostgreSQL rechaza el DELETE sobre la vista.
+    """
+    from .legacy import legacy_derivado
+    if not legacy_derivado():
+        models.CASCADE(collector, field, sub_objs, using)
+
+
+def set_null_legacy(collector, field, sub_objs, using):
+    """SET_NULL hacia los modelos legacy mientras sean tablas (ver cascada_legacy)."""
+    from .legacy import legacy_derivado
+    if not legacy_derivado():
+        models.SET_NULL(collector, field, sub_objs, using)
+
+
 class StockArticulo(models.Model):
     """
     MODELO LEGACY / VISTA MATERIALIZADA.
     Se mantiene por compatibilidad hacia atrás.
     Se actualiza automáticamente desde el StockManager junto con el Ledger.
     """
-    articulo = models.ForeignKey('Articulo', on_delete=models.CASCADE, related_name="stocks")
-    deposito = models.ForeignKey(Deposito, on_delete=models.CASCADE)
+    articulo = models.ForeignKey('Articulo', on_delete=cascada_legacy, related_name="stocks")
+    deposito = models.ForeignKey(Deposito, on_delete=cascada_legacy)
 
     cantidad_real = models.DecimalField(
         max_digits=12, decimal_places=3, default=0,
@@ -204,6 +294,44 @@ class StockArticulo(models.Model):
         verbose_name_plural = "Stocks por Depósito (Legacy)"
 
 
+def _disponible_por_articulo(modelo):
+    """Subquery: Σ vendibles - Σ reservados de `modelo` (BalanceStock o slots) para el artículo externo."""
+    salida = models.DecimalField(max_digits=15, decimal_places=4)
+    cero = Value(Decimal(0), output_field=salida)
+    suma = modelo.objects.filter(articulo=OuterRef('pk')).order_by().values('articulo').annotate(
+        total=Coalesce(Sum('cantidad', filter=Q(tipo_stock__es_vendible=True)), cero)
+        - Coalesce(Sum('cantidad', filter=Q(tipo_stock__es_reservado=True)), cero)
+    ).values('total')[:1]
+    return Coalesce(Subquery(suma, output_field=salida), cero, output_field=salida)
+
+
+class ArticuloQuerySet(models.QuerySet):
+
+    def with_disponible(self):
+        """
+        Anota en SQL lo mismo que stock_disponible_calculado / necesita_reposicion:
+        - `disponible`: Σ vendibles - Σ reservados (BalanceStock + slots); 0 si no administra stock.
+        - `bajo_minimo`: disponible <= stock_minimo (con stock_minimo > 0).
+        Ambas anotaciones sirven para filter() / order_by() / aggregate().
+        """
+        salida = models.DecimalField(max_digits=15, decimal_places=4)
+        return self.annotate(
+            disponible=models.Case(
+                models.When(
+                    administra_stock=True,
+                    then=_disponible_por_articulo(BalanceStock) + _disponible_por_articulo(BalanceStockSlot),
+                ),
+                default=Value(Decimal(0), output_field=salida),
+                output_field=salida,
+            )
+        ).annotate(
+            bajo_minimo=ExpressionWrapper(
+                Q(administra_stock=True, stock_minimo__gt=0, disponible__lte=F('stock_minimo')),
+                output_field=models.BooleanField(),
+            )
+        )
+
+
 class Articulo(models.Model):
     class Perfil(models.TextChoices):
         COMPRA_VENTA = 'CV', 'Compra/Venta'
@@ -318,6 +446,16 @@ class Articulo(models.Model):
         verbose_name="¿Permite Stock Negativo?",
         help_text="Define si este artículo específico puede quedar en saldo negativo."
     )
+    balance_fragmentado = models.BooleanField(
+        default=False,
+        verbose_name="¿Balance Fragmentado?",
+        help_text="Para artículos muy vendidos: reparte el saldo en varios contadores y reduce la contención."
+    )
+    stock_tiempo_real = models.BooleanField(
+        default=False,
+        verbose_name="¿Stock en Tiempo Real?",
+        help_text="Los comprobantes con este artículo descuentan stock al confirmar aunque la empresa use posteo diferido."
+    )
     stock_minimo = models.DecimalField(
         max_digits=10, decimal_places=3, default=0,
         verbose_name="Stock Mínimo (Punto de Reposición)",
@@ -383,6 +521,8 @@ class Articulo(models.Model):
     observaciones = models.TextField(blank=True, null=True, verbose_name="Observaciones")
     nota = models.TextField(blank=True, null=True, verbose_name="Nota Interna")
 
+    objects = ArticuloQuerySet.as_manager()
+
     # ── Properties ────────────────────────────────────────────────
     @property
     def precio_costo(self):
@@ -413,12 +553,17 @@ class Articulo(models.Model):
     def stock_disponible_calculado(self):
         """
         Calcula disponibilidad real basada en Tipos de Stock.
-        Formula: Sum(Vendibles) - Sum(Reservados) usando BalanceStock.
+        Formula: Sum(Vendibles) - Sum(Reservados) usando BalanceStock
+        (incluye los slots de balance fragmentado, si los hubiera).
         """
         if not self.administra_stock:
             return Decimal(0)
+        # Calculado en SQL por Articulo.objects.with_disponible()
+        if 'disponible' in self.__dict__:
+            return self.disponible
 
-        balances = self.balances_stock.all().select_related('tipo_stock')
+        balances = list(self.balances_stock.all().select_related('tipo_stock'))
+        balances += list(self.balances_stock_slots.all().select_related('tipo_stock'))
         total = Decimal(0)
         for b in balances:
             cant = b.cantidad if isinstance(b.cantidad, Decimal) else Decimal(str(b.cantidad))
@@ -433,10 +578,21 @@ class Articulo(models.Model):
         """
         Devuelve True si el stock disponible está por debajo del mínimo configurado.
         """
+        if 'bajo_minimo' in self.__dict__:
+            return self.bajo_minimo
         if not self.administra_stock or self.stock_minimo == 0:
             return False
         return self.stock_disponible_calculado <= self.stock_minimo
 
+    CAMPOS_PRECIO = ('precio_venta_monto', 'precio_venta_moneda_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Precio en la base: ventas/signals.py rehace los precios efectivos solo si cambia
+        instancia._precio_leido = tuple(instancia.__dict__.get(campo) for campo in cls.CAMPOS_PRECIO)
+        return instancia
+
     def save(self, *args, **kwargs):
         if not self.cod_articulo:
             try:
@@ -457,8 +613,10 @@ class Articulo(models.Model):
 
         if self.precio_costo_monto > 0 and self.utilidad is not None:
             # ── FIX: Casting seguro de variables financieras a Decimal ──
-            cotizacion_costo = Decimal(str(self.precio_costo_moneda.cotizacion or 1))
-            cotizacion_venta = Decimal(str(self.precio_venta_moneda.cotizacion or 1))
+            moneda_costo = get_moneda(self.precio_costo_moneda_id) or self.precio_costo_moneda
+            moneda_venta = get_moneda(self.precio_venta_moneda_id) or self.precio_venta_moneda
+            cotizacion_costo = Decimal(str(moneda_costo.cotizacion or 1))
+            cotizacion_venta = Decimal(str(moneda_venta.cotizacion or 1))
             utilidad_decimal = Decimal(str(self.utilidad or 0))
 
             costo_en_base = self.precio_costo_monto * cotizacion_costo
@@ -470,6 +628,7 @@ class Articulo(models.Model):
                 self.precio_venta_monto = venta_en_base
 
         super().save(*args, **kwargs)
+        self._precio_leido = tuple(getattr(self, campo) for campo in self.CAMPOS_PRECIO)
 
     def __str__(self):
         return f"{self.descripcion} ({self.cod_articulo})"
@@ -631,37 +790,25 @@ class MovimientoStock(models.Model):
         from .services import StockManager
 
         ref = f"Mov. Interno #{self.numero}"
-        usuario = self.created_by
         CODIGO_TIPO_STD = 'REAL'
 
-        for item in self.items.all():
+        lineas = []
+        for item in self.items.select_related('articulo'):
+            salida = {'articulo': item.articulo, 'deposito': self.deposito_origen, 'codigo_tipo': CODIGO_TIPO_STD,
+                      'cantidad': -item.cantidad, 'permitir_stock_negativo': None}
+            entrada = {'articulo': item.articulo, 'deposito': self.deposito_destino, 'codigo_tipo': CODIGO_TIPO_STD,
+                       'cantidad': item.cantidad, 'permitir_stock_negativo': None}
             if self.tipo_movimiento == self.Tipo.SALIDA:
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_origen,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=-item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=usuario,
-                    permitir_stock_negativo=None
-                )
+                lineas.append(salida)
             elif self.tipo_movimiento == self.Tipo.ENTRADA:
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_destino,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=usuario,
-                    permitir_stock_negativo=None
-                )
+                lineas.append(entrada)
             elif self.tipo_movimiento == self.Tipo.TRANSFERENCIA:
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_origen,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=-item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref + " (Salida)", usuario=usuario,
-                    permitir_stock_negativo=None
-                )
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_destino,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref + " (Entrada)", usuario=usuario,
-                    permitir_stock_negativo=None
-                )
+                lineas.append(dict(salida, origen_referencia=ref + " (Salida)"))
+                lineas.append(dict(entrada, origen_referencia=ref + " (Entrada)"))
+
+        StockManager.registrar_movimientos_lote(
+            lineas, origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=self.created_by
+        )
 
         self.stock_aplicado = True
         MovimientoStock.objects.filter(pk=self.pk).update(stock_aplicado=True)
@@ -676,37 +823,26 @@ class MovimientoStock(models.Model):
 
         from .services import StockManager
         ref = f"Reversión Mov. #{self.numero}"
-        usuario = self.created_by
         CODIGO_TIPO_STD = 'REAL'
 
-        for item in self.items.all():
+        lineas = []
+        for item in self.items.select_related('articulo'):
+            # Contrasiento exacto: signos invertidos y sin validar negativos
+            reingreso = {'articulo': item.articulo, 'deposito': self.deposito_origen, 'codigo_tipo': CODIGO_TIPO_STD,
+                         'cantidad': item.cantidad, 'permitir_stock_negativo': True}
+            retiro = {'articulo': item.articulo, 'deposito': self.deposito_destino, 'codigo_tipo': CODIGO_TIPO_STD,
+                      'cantidad': -item.cantidad, 'permitir_stock_negativo': True}
             if self.tipo_movimiento == self.Tipo.SALIDA:
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_origen,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=usuario,
-                    permitir_stock_negativo=True
-                )
+                lineas.append(reingreso)
             elif self.tipo_movimiento == self.Tipo.ENTRADA:
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_destino,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=-item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=usuario,
-                    permitir_stock_negativo=True
-                )
+                lineas.append(retiro)
             elif self.tipo_movimiento == self.Tipo.TRANSFERENCIA:
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_origen,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=usuario,
-                    permitir_stock_negativo=True
-                )
-                StockManager.registrar_movimiento(
-                    articulo=item.articulo, deposito=self.deposito_destino,
-                    codigo_tipo=CODIGO_TIPO_STD, cantidad=-item.cantidad,
-                    origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=usuario,
-                    permitir_stock_negativo=True
-                )
+                lineas.append(reingreso)
+                lineas.append(retiro)
+
+        StockManager.registrar_movimientos_lote(
+            lineas, origen_sistema='MOV_INTERNO', origen_referencia=ref, usuario=self.created_by
+        )
 
         self.stock_aplicado = False
         MovimientoStock.objects.filter(pk=self.pk).update(stock_aplicado=False)
@@ -757,7 +893,7 @@ class HistoricoMovimientos(models.Model):
     operacion = models.CharField(max_length=10, choices=OPERACION_CHOICES)
     saldo_post_movimiento = models.DecimalField(max_digits=12, decimal_places=3)
     referencia = models.CharField(max_length=150, blank=True, null=True)
-    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=set_null_legacy, null=True, blank=True)
 
     def __str__(self):
         return f"Legacy Hist: {self.articulo}"
@@ -0,0 +1,228 @@
+# inventario/particiones.py
+"""
+Particionado por rango mensual de MovimientoStockLedger (PostgreSQL).
+
+La tabla padre se particiona por `fecha_movimiento` (límites en UTC) con:
+  - una partición por mes:  inventario_movimientostockledger_pYYYYMM
+  - una partición DEFAULT para movimientos fuera de las particiones creadas
+    (ej. fechas retroactivas anteriores a la primera partición).
+
+Las particiones se crean por adelantado (Celery Beat) y las viejas se
+desacoplan/archivan con `manage.py archivar_ledger`. Todo opera sobre el
+schema del tenant activo (search_path de django-tenants).
+
+La PK física es (id, fecha_movimiento): PostgreSQL exige la clave de
+partición en las restricciones únicas. Para Django `id` sigue siendo la PK.
+"""
+import logging
+import os
+import re
+from datetime import date, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import MovimientoStockLedger
+
+logger = logging.getLogger(__name__)
+
+TABLA = MovimientoStockLedger._meta.db_table
+PARTICION_DEFAULT = f"{TABLA}_default"
+PATRON_PARTICION = re.compile(rf"^{TABLA}_p(\d{{4}})(\d{{2}})$")
+
+
+def nombre_particion(mes):
+    return f"{TABLA}_p{mes:%Y%m}"
+
+
+def nombre_archivo(mes):
+    return f"{TABLA}_arch_{mes:%Y%m}"
+
+
+def mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _limite(mes):
+    return f"{mes:%Y-%m}-01 00:00:00+00"
+
+
+def _q(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def ledger_particionado(conexion=None):
+    """True si la tabla del Ledger del schema activo ya es particionada."""
+    conexion = conexion or connection
+    if conexion.vendor != 'postgresql':
+        return False
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [TABLA]
+        )
+        return cursor.fetchone()[0]
+
+
+def particiones_ledger():
+    """Meses (date día 1) con partición adjunta, ordenados."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    meses = []
+    for nombre in nombres:
+        encontrado = PATRON_PARTICION.match(nombre)
+        if encontrado:
+            meses.append(date(int(encontrado.group(1)), int(encontrado.group(2)), 1))
+    return sorted(meses)
+
+
+def _crear_particion(cursor, mes):
+    """
+    Crea la partición de `mes` moviendo antes las filas que hubieran caído en DEFAULT
+    (PostgreSQL no permite adjuntar un rango que la partición DEFAULT ya contiene).
+    """
+    nombre = nombre_particion(mes)
+    desde, hasta = _limite(mes), _limite(mes_siguiente(mes))
+    cursor.execute(f"CREATE TABLE {_q(nombre)} (LIKE {_q(TABLA)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(
+        f"WITH movidas AS ("
+        f"  DELETE FROM {_q(PARTICION_DEFAULT)} WHERE fecha_movimiento >= %s AND fecha_movimiento < %s"
+        f"  RETURNING *"
+        f") INSERT INTO {_q(nombre)} SELECT * FROM movidas",
+        [desde, hasta]
+    )
+    # ATTACH crea en la partición los índices de la tabla padre
+    cursor.execute(
+        f"ALTER TABLE {_q(TABLA)} ATTACH PARTITION {_q(nombre)} FOR VALUES FROM (%s) TO (%s)",
+        [desde, hasta]
+    )
+    return nombre
+
+
+def crear_particiones_ledger(meses_adelante=None):
+    """
+    Asegura particiones desde el mes en curso hasta `meses_adelante` meses después.
+    Idempotente. Devuelve los nombres de las particiones creadas.
+    """
+    if not ledger_particionado():
+        return []
+    if meses_adelante is None:
+        meses_adelante = getattr(settings, 'LEDGER_MESES_PARTICIONES_ADELANTE', 3)
+
+    existentes = set(particiones_ledger())
+    mes = timezone.now().astimezone(dt_timezone.utc).date().replace(day=1)
+    creadas = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(meses_adelante + 1):
+            if mes not in existentes:
+                creadas.append(_crear_particion(cursor, mes))
+            mes = mes_siguiente(mes)
+    if creadas:
+        logger.info(f"Particiones de Ledger creadas: {', '.join(creadas)}")
+    return creadas
+
+
+def archivar_particion(mes, directorio=None):
+    """
+    Desacopla la partición de `mes` del Ledger.
+    - Con `directorio`: la exporta a CSV (COPY) y la elimina. Devuelve la ruta.
+    - Sin `directorio`: la conserva como tabla suelta (nombre_archivo). Devuelve el nombre.
+    """
+    nombre = nombre_particion(mes)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {_q(TABLA)} DETACH PARTITION {_q(nombre)}")
+        if directorio is None:
+            destino = nombre_archivo(mes)
+            cursor.execute(f"ALTER TABLE {_q(nombre)} RENAME TO {_q(destino)}")
+        else:
+            destino = os.path.join(directorio, f"{connection.schema_name}_{nombre}.csv")
+            with open(destino, 'w', encoding='utf-8') as archivo:
+                cursor.copy_expert(f"COPY {_q(nombre)} TO STDOUT WITH CSV HEADER", archivo)
+            cursor.execute(f"DROP TABLE {_q(nombre)}")
+    logger.info(f"Partición {nombre} archivada en {destino}.")
+    return destino
+
+
+def particionar_ledger(schema_editor):
+    """
+    Convierte la tabla del Ledger (schema activo) en particionada. Lo usa la migración 0015.
+    Copia todas las filas: en tenants con Ledger grande, correr en ventana de mantenimiento.
+    """
+    conexion = schema_editor.connection
+    if conexion.vendor != 'postgresql' or ledger_particionado(conexion):
+        return
+
+    anterior = f"{TABLA}_sinparticion"
+    with conexion.cursor() as cursor:
+        # 1. Definiciones a recrear (referencian la tabla por su nombre actual)
+        cursor.execute(
+            "SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+            "WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary",
+            [TABLA]
+        )
+        indices = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLA]
+        )
+        foraneas = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+            [TABLA]
+        )
+        pk = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT is_identity = 'YES', pg_get_serial_sequence(%s, 'id') FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'",
+            [TABLA, TABLA]
+        )
+        es_identity, secuencia = cursor.fetchone()
+
+        # 2. Tabla padre particionada con el mismo esquema de columnas
+        cursor.execute(f"ALTER TABLE {_q(TABLA)} RENAME TO {_q(anterior)}")
+        cursor.execute(f"ALTER TABLE {_q(anterior)} RENAME CONSTRAINT {_q(pk)} TO {_q(anterior + '_pkey')}")
+        identidad = " INCLUDING IDENTITY" if es_identity else ""
+        cursor.execute(
+            f"CREATE TABLE {_q(TABLA)} (LIKE {_q(anterior)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS"
+            f"{identidad}) PARTITION BY RANGE (fecha_movimiento)"
+        )
+        cursor.execute(f"ALTER TABLE {_q(TABLA)} ADD CONSTRAINT {_q(pk)} PRIMARY KEY (id, fecha_movimiento)")
+        cursor.execute(f"CREATE TABLE {_q(PARTICION_DEFAULT)} PARTITION OF {_q(TABLA)} DEFAULT")
+
+        # 3. Particiones para el rango con datos + las próximas
+        cursor.execute(f"SELECT MIN(fecha_movimiento) FROM {_q(anterior)}")
+        primero = cursor.fetchone()[0]
+        actual = timezone.now().astimezone(dt_timezone.utc).date().replace(day=1)
+        mes = primero.astimezone(dt_timezone.utc).date().replace(day=1) if primero else actual
+        tope = actual
+        for _ in range(getattr(settings, 'LEDGER_MESES_PARTICIONES_ADELANTE', 3)):
+            tope = mes_siguiente(tope)
+        while mes <= tope:
+            _crear_particion(cursor, mes)
+            mes = mes_siguiente(mes)
+
+        # 4. Copia de datos y secuencia del id
+        sobrescribir = " OVERRIDING SYSTEM VALUE" if es_identity else ""
+        cursor.execute(f"INSERT INTO {_q(TABLA)}{sobrescribir} SELECT * FROM {_q(anterior)}")
+        if es_identity:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+                f"FROM {_q(TABLA)}",
+                [TABLA]
+            )
+        elif secuencia:
+            cursor.execute(f"ALTER SEQUENCE {secuencia} OWNED BY {_q(TABLA)}.id")
+
+        # 5. Reemplazo: al borrar la tabla vieja se liberan los nombres de índices y FKs
+        cursor.execute(f"DROP TABLE {_q(anterior)}")
+        for _, definicion in indices:
+            cursor.execute(definicion)
+        for nombre, definicion in foraneas:
+            cursor.execute(f"ALTER TABLE {_q(TABLA)} ADD CONSTRAINT {_q(nombre)} {definicion}")
@@ -77,7 +77,7 @@ class TipoStockSerializer(serializers.ModelSerializer):
 class DepositoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Deposito
-        fields = ['id', 'nombre', 'direccion', 'es_principal', 'permite_stock_negativo']
+        fields = ['id', 'nombre', 'direccion', 'es_principal', 'permite_stock_negativo', 'balance_fragmentado']
 
 
 # ─────────────────────────────────────────────
@@ -408,6 +408,8 @@ class ArticuloWriteSerializer(serializers.ModelSerializer):
     is_active              = serializers.BooleanField(required=False)
     administra_stock       = serializers.BooleanField(required=False)
     permite_stock_negativo = serializers.BooleanField(required=False)
+    balance_fragmentado    = serializers.BooleanField(required=False)
+    stock_tiempo_real      = serializers.BooleanField(required=False)
     es_servicio            = serializers.BooleanField(required=False)
     es_bien_de_uso         = serializers.BooleanField(required=False)
 
@@ -429,7 +431,7 @@ class ArticuloWriteSerializer(serializers.ModelSerializer):
             # Impositivo
             'categoria_impositiva', 'impuestos',
             # Stock
-            'administra_stock', 'permite_stock_negativo',
+            'administra_stock', 'permite_stock_negativo', 'balance_fragmentado', 'stock_tiempo_real',
             'stock_minimo', 'stock_maximo', 'stock_seguridad', 'lead_time_dias',
             # Logística
             'peso_kg', 'alto_cm', 'ancho_cm', 'profundidad_cm',
@@ -453,7 +455,7 @@ class ArticuloWriteSerializer(serializers.ModelSerializer):
 
         BOOL_FIELDS = [
             'is_active', 'administra_stock', 'permite_stock_negativo',
-            'es_servicio', 'es_bien_de_uso',
+            'balance_fragmentado', 'stock_tiempo_real', 'es_servicio', 'es_bien_de_uso',
         ]
         for field in BOOL_FIELDS:
             if field in data and isinstance(data[field], str):
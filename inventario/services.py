@@ -1,17 +1,85 @@
 # inventario/services.py
 
+import calendar
 import logging
-from django.db import transaction
-from django.db.models import F, Sum
+import operator
+import random
+from collections import defaultdict
+from functools import reduce
+from django.db import connection, transaction
+from django.db.models import F, Sum, Max, Min, Q, Case, When, Value, DecimalField, OuterRef, Subquery, Window, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from django.utils import timezone
+from django.conf import settings
 
 # Modelos
-from .models import MovimientoStockLedger, BalanceStock, StockArticulo, TipoStock, Deposito, HistoricoMovimientos
+from .models import (
+    MovimientoStockLedger, BalanceStock, BalanceStockSlot, SaldoStockCorte, StockArticulo, TipoStock, Deposito, HistoricoMovimientos
+)
+from .legacy import legacy_derivado
+from .particiones import ledger_particionado, particiones_ledger
+from parametros.maestros import get_tipos_stock
 
 logger = logging.getLogger(__name__)
 
+CAMPOS_LEGACY = ('articulo_id', 'deposito_id')
+
+
+def _filtro_claves(claves, campos):
+    """OR de igualdades compuestas: selecciona exactamente las filas del lote."""
+    return reduce(operator.or_, (Q(**dict(zip(campos, clave))) for clave in claves))
+
+
+def _expresion_delta(deltas, campos):
+    """CASE WHEN por clave -> delta. Permite un único UPDATE con F() para todo el lote."""
+    whens = [
+        When(Q(**dict(zip(campos, clave))), then=Value(delta))
+        for clave, delta in deltas.items() if delta
+    ]
+    salida = DecimalField(max_digits=15, decimal_places=4)
+    if not whens:
+        return Value(Decimal(0), output_field=salida)
+    return Case(*whens, default=Value(Decimal(0)), output_field=salida)
+
+
+def _es_fecha_pura(valor):
+    return isinstance(valor, date) and not isinstance(valor, datetime)
+
+
+def _inicio_del_dia(dia):
+    """Medianoche local (aware) de `dia`."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _fin_de_mes(dia):
+    return dia.replace(day=calendar.monthrange(dia.year, dia.month)[1])
+
+
+def _suma_por_clave(modelo, referencia):
+    """Subquery correlacionada: SUM(cantidad) de `modelo` para la clave de la fila externa (0 si no hay)."""
+    suma = modelo.objects.filter(**referencia).order_by().values('articulo_id').annotate(
+        total=Sum('cantidad')
+    ).values('total')[:1]
+    salida = DecimalField(max_digits=15, decimal_places=4)
+    return Coalesce(Subquery(suma, output_field=salida), Value(Decimal(0)), output_field=salida)
+
+
+def filtro_fecha_movimiento(desde=None, hasta=None):
+    """
+    Rango de días locales (inclusivo) sobre MovimientoStockLedger.fecha_movimiento.
+    Compara la columna directamente (a diferencia de __date), así PostgreSQL puede
+    usar los índices y descartar particiones fuera del rango.
+    """
+    filtros = {}
+    if desde:
+        filtros['fecha_movimiento__gte'] = _inicio_del_dia(desde)
+    if hasta:
+        filtros['fecha_movimiento__lt'] = _inicio_del_dia(hasta + timedelta(days=1))
+    return filtros
+
 
 class StockManager:
     """
@@ -19,7 +87,7 @@ class StockManager:
     ----------------------------------------------------------------------
     Esta clase es la ÚNICA autorizada para escribir en:
     1. MovimientoStockLedger (Append-only)
-    2. BalanceStock (Vista materializada)
+    2. BalanceStock (Vista materializada) y BalanceStockSlot (contadores fragmentados)
     3. StockArticulo (Modelo Legacy)
 
     Cualquier escritura directa a estos modelos fuera de esta clase
@@ -28,12 +96,12 @@ class StockManager:
     """
 
     @staticmethod
-    @transaction.atomic
     def registrar_movimiento(articulo, deposito, codigo_tipo, cantidad,
                              origen_sistema, origen_referencia, usuario=None,
                              observaciones="", permitir_stock_negativo=None):
         """
         Registra un cambio de stock atómico con validación jerárquica de negativos.
+        Atajo de una sola línea sobre registrar_movimientos_lote().
 
         Args:
             permitir_stock_negativo (bool|None):
@@ -44,123 +112,468 @@ class StockManager:
         cantidad = Decimal(str(cantidad))
         if cantidad == Decimal(0): return Decimal(0)
 
-        # 1. Resolver Tipo (Validación de Existencia)
-        try:
-            tipo = TipoStock.objects.get(codigo=codigo_tipo)
-        except TipoStock.DoesNotExist:
-            raise ValidationError(f"Error Crítico: El Tipo de Stock '{codigo_tipo}' no existe en la configuración.")
+        StockManager.registrar_movimientos_lote(
+            [{
+                'articulo': articulo,
+                'deposito': deposito,
+                'codigo_tipo': codigo_tipo,
+                'cantidad': cantidad,
+                'permitir_stock_negativo': permitir_stock_negativo,
+            }],
+            origen_sistema=origen_sistema,
+            origen_referencia=origen_referencia,
+            usuario=usuario,
+            observaciones=observaciones,
+        )
+        return True
 
-        # ==============================================================================
-        # PARTE A: VALIDACIÓN AVANZADA DE STOCK NEGATIVO (JERARQUÍA)
-        # ==============================================================================
-        if cantidad < Decimal(0):
-            validar_saldo = False
+    @staticmethod
+    @transaction.atomic
+    def registrar_movimientos_lote(lineas, origen_sistema, origen_referencia, usuario=None, observaciones=""):
+        """
+        Registra todas las líneas de un documento con un número fijo de queries,
+        independiente de la cantidad de líneas.
 
-            # Nivel 1: Override Explícito
-            if permitir_stock_negativo is not None:
-                validar_saldo = not permitir_stock_negativo
+        Cada línea es un dict con las claves:
+            articulo, deposito, codigo_tipo, cantidad,
+            permitir_stock_negativo (opcional, misma semántica que registrar_movimiento),
+            origen_referencia / observaciones (opcionales, pisan los del documento).
 
-            else:
-                # Nivel 2: Regla por Depósito
-                if not deposito.permite_stock_negativo:
-                    validar_saldo = True
+        La validación de negativos se hace por lote y dentro del mismo UPDATE
+        que aplica el delta (ver _aplicar_deltas_condicional): el saldo final de
+        cada (articulo, deposito, tipo) no puede quedar negativo si alguna línea
+        de egreso sobre esa clave está sujeta a la regla.
 
-                # Nivel 3: Regla por Artículo
-                elif not articulo.permite_stock_negativo:
-                    validar_saldo = True
+        Returns:
+            list[MovimientoStockLedger]: Registros creados en el Ledger.
+        """
+        lineas = [dict(linea, cantidad=Decimal(str(linea['cantidad']))) for linea in lineas]
+        lineas = [linea for linea in lineas if linea['cantidad'] != Decimal(0)]
+        if not lineas:
+            return []
 
-                # Default del sistema: Si nadie lo permite explícitamente, bloqueamos.
-                else:
-                    validar_saldo = False  # Ambos flags estaban en True
+        # 1. Resolver Tipos (una sola query para todo el lote)
+        codigos = {linea['codigo_tipo'] for linea in lineas}
+        tipos_stock = get_tipos_stock()
+        tipos = {codigo: tipos_stock[codigo] for codigo in codigos if codigo in tipos_stock}
+        faltantes = sorted(codigos - set(tipos))
+        if faltantes:
+            raise ValidationError(f"Error Crítico: El Tipo de Stock '{faltantes[0]}' no existe en la configuración.")
 
-            if validar_saldo:
-                balance_actual = BalanceStock.objects.filter(
-                    articulo=articulo, deposito=deposito, tipo_stock=tipo
-                ).first()
+        # Deltas netos por clave de balance
+        deltas = defaultdict(Decimal)
+        claves_a_validar = {}
+        claves_fragmentadas = set()
+        for linea in lineas:
+            tipo = tipos[linea['codigo_tipo']]
+            clave = (linea['articulo'].pk, linea['deposito'].pk, tipo.pk)
+            deltas[clave] += linea['cantidad']
+            if StockManager._debe_validar_saldo(linea):
+                claves_a_validar.setdefault(clave, linea)
+            if linea['articulo'].balance_fragmentado or linea['deposito'].balance_fragmentado:
+                claves_fragmentadas.add(clave)
 
-                saldo = balance_actual.cantidad if balance_actual else Decimal(0)
+        # Hot SKUs: lo que no valida negativos va a un slot y no toca la fila única
+        deltas_slots = {
+            clave: delta for clave, delta in deltas.items()
+            if clave in claves_fragmentadas and clave not in claves_a_validar
+        }
+        deltas_balance = {clave: delta for clave, delta in deltas.items() if clave not in deltas_slots}
 
-                if saldo + cantidad < Decimal(0):
-                    raise ValidationError(
-                        f"Stock insuficiente en {deposito.nombre}. "
-                        f"Artículo: {articulo.cod_articulo} ({tipo.nombre}). "
-                        f"Saldo Actual: {saldo}. Solicitado: {abs(cantidad)}. "
-                        f"(Bloqueado por regla de stock negativo)."
-                    )
+        # ==============================================================================
+        # PARTE A: BALANCE + VALIDACIÓN DE NEGATIVOS EN UN ÚNICO UPDATE CONDICIONAL
+        # ==============================================================================
+        ahora = timezone.now()
+
+        # Alta de claves faltantes (saldo 0) para que el UPDATE encuentre todas las filas
+        BalanceStock.objects.bulk_create([
+            BalanceStock(articulo_id=a, deposito_id=d, tipo_stock_id=t, cantidad=Decimal(0))
+            for (a, d, t) in sorted(deltas)
+        ], ignore_conflicts=True)
+
+        # Orden de locks: primero slots, después BalanceStock (igual que la compactación)
+        if deltas_slots:
+            StockManager._acumular_en_slots(deltas_slots)
+
+        rechazadas = []
+        if deltas_balance:
+            rechazadas = StockManager._aplicar_deltas_condicional(
+                deltas_balance, set(claves_a_validar), claves_fragmentadas, ahora
+            )
+        if rechazadas:
+            clave = rechazadas[0]
+            linea = claves_a_validar[clave]
+            tipo = tipos[linea['codigo_tipo']]
+            saldo = StockManager._saldo_clave(*clave)
+            raise ValidationError(
+                f"Stock insuficiente en {linea['deposito'].nombre}. "
+                f"Artículo: {linea['articulo'].cod_articulo} ({tipo.nombre}). "
+                f"Saldo Actual: {saldo}. Solicitado: {abs(deltas[clave])}. "
+                f"(Bloqueado por regla de stock negativo)."
+            )
 
         # ==============================================================================
         # ESCRITURA
         # ==============================================================================
 
-        # 3. Insertar en Ledger (Inmutable)
-        MovimientoStockLedger.objects.create(
-            articulo=articulo,
-            deposito=deposito,
-            tipo_stock=tipo,
-            cantidad=cantidad,
-            origen_sistema=origen_sistema,
-            origen_referencia=origen_referencia,
-            usuario=usuario,
-            observaciones=observaciones,
-            fecha_movimiento=timezone.now()
-        )
+        # 2. Insertar en Ledger (Inmutable) — un solo INSERT multi-fila
+        ledger = MovimientoStockLedger.objects.bulk_create([
+            MovimientoStockLedger(
+                articulo=linea['articulo'],
+                deposito=linea['deposito'],
+                tipo_stock=tipos[linea['codigo_tipo']],
+                cantidad=linea['cantidad'],
+                origen_sistema=origen_sistema,
+                origen_referencia=linea.get('origen_referencia') or origen_referencia,
+                usuario=usuario,
+                observaciones=linea.get('observaciones', observaciones),
+                fecha_movimiento=ahora
+            )
+            for linea in lineas
+        ], batch_size=500)
 
-        # 4. Actualizar Balance Materializado (Fuente para consultas)
-        # Usamos update_or_create y luego update() con F() para garantizar atomicidad DB.
-        balance, _ = BalanceStock.objects.get_or_create(
-            articulo=articulo, deposito=deposito, tipo_stock=tipo,
-            defaults={'cantidad': Decimal(0)}
-        )
-        BalanceStock.objects.filter(pk=balance.pk).update(cantidad=F('cantidad') + cantidad)
+        # 3. Sincronización Legacy (StockArticulo)
+        # Las claves fragmentadas no se sincronizan en caliente (sería volver a contender
+        # sobre una fila única): la compactación recalcula su StockArticulo.
+        lineas_legacy = [
+            linea for linea in lineas
+            if (linea['articulo'].pk, linea['deposito'].pk, tipos[linea['codigo_tipo']].pk) not in deltas_slots
+        ]
+        StockManager._sincronizar_legacy(lineas_legacy, tipos, origen_referencia, usuario)
 
-        # 5. Sincronización Legacy (StockArticulo)
-        # El modelo legacy solo entiende de 'REAL' y 'RSRV' (Comprometido).
-        stock_legacy, _ = StockArticulo.objects.select_for_update().get_or_create(
-            articulo=articulo, deposito=deposito,
-            defaults={'cantidad_real': Decimal(0), 'cantidad_comprometida': Decimal(0)}
-        )
+        return ledger
 
-        if codigo_tipo == 'REAL':
-            StockArticulo.objects.filter(pk=stock_legacy.pk).update(cantidad_real=F('cantidad_real') + cantidad)
-        elif codigo_tipo == 'RSRV':
-            StockArticulo.objects.filter(pk=stock_legacy.pk).update(
-                cantidad_comprometida=F('cantidad_comprometida') + cantidad)
+    @staticmethod
+    def _bloquear_balances(claves):
+        """
+        SELECT ... FOR UPDATE de las filas de BalanceStock de las claves, en orden
+        determinístico (articulo, deposito, tipo): dos documentos concurrentes nunca
+        se bloquean mutuamente.
+        """
+        tabla = connection.ops.quote_name(BalanceStock._meta.db_table)
+        valores = []
+        params = []
+        for clave in sorted(claves):
+            valores.append("(%s, %s, %s)")
+            params.extend(clave)
+        sql = f"""
+            SELECT b.id FROM {tabla} b
+            JOIN (VALUES {', '.join(valores)}) AS c (articulo_id, deposito_id, tipo_stock_id)
+              USING (articulo_id, deposito_id, tipo_stock_id)
+            ORDER BY b.articulo_id, b.deposito_id, b.tipo_stock_id
+            FOR UPDATE OF b
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @staticmethod
+    def _aplicar_deltas_condicional(deltas, claves_a_validar, claves_fragmentadas, ahora):
+        """
+        Aplica todos los deltas del lote sobre BalanceStock con un UPDATE condicional:
+
+            UPDATE ... SET cantidad = cantidad + delta
+            WHERE NOT validar OR cantidad + delta (+ slots) >= 0
+            RETURNING articulo_id, deposito_id, tipo_stock_id
+
+        - Antes se bloquean las filas en orden (_bloquear_balances). El UPDATE va en
+          otra sentencia a propósito: en READ COMMITTED toma un snapshot nuevo, así
+          la fila y los slots que suma el chequeo son del mismo momento. En una sola
+          sentencia, una compactación confirmada durante la espera del lock dejaba la
+          fila ya plegada pero los slots viejos en el snapshot: se contaban dos veces.
+        - Con los locks tomados, una compactación de estas claves espera al commit.
+        - El chequeo de negativo y el decremento son atómicos (sin lectura previa
+          ni ventana de carrera: imposible sobrevender bajo concurrencia).
+
+        Returns:
+            list[tuple]: Claves sujetas a validación que fueron rechazadas (ordenadas).
+        """
+        StockManager._bloquear_balances(deltas)
+
+        tabla = connection.ops.quote_name(BalanceStock._meta.db_table)
+        tabla_slots = connection.ops.quote_name(BalanceStockSlot._meta.db_table)
+        valores = []
+        params = []
+        for clave, delta in deltas.items():
+            valores.append("(%s, %s, %s, %s::numeric, %s::boolean, %s::boolean)")
+            params.extend([*clave, delta, clave in claves_a_validar, clave in claves_fragmentadas])
+
+        sql = f"""
+            WITH deltas (articulo_id, deposito_id, tipo_stock_id, delta, validar, fragmentado) AS (
+                VALUES {', '.join(valores)}
+            )
+            UPDATE {tabla} b
+            SET cantidad = b.cantidad + d.delta, ultima_actualizacion = %s
+            FROM deltas d
+            WHERE b.articulo_id = d.articulo_id
+              AND b.deposito_id = d.deposito_id
+              AND b.tipo_stock_id = d.tipo_stock_id
+              AND (
+                  NOT d.validar
+                  OR b.cantidad + d.delta + CASE WHEN d.fragmentado THEN COALESCE((
+                      SELECT SUM(s.cantidad) FROM {tabla_slots} s
+                      WHERE s.articulo_id = b.articulo_id
+                        AND s.deposito_id = b.deposito_id
+                        AND s.tipo_stock_id = b.tipo_stock_id
+                  ), 0) ELSE 0 END >= 0
+              )
+            RETURNING b.articulo_id, b.deposito_id, b.tipo_stock_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [ahora])
+            aplicadas = {tuple(fila) for fila in cursor.fetchall()}
+
+        return sorted(set(deltas) - aplicadas)
+
+    @staticmethod
+    def _acumular_en_slots(deltas):
+        """
+        Upsert de los deltas en un slot al azar por clave (INSERT ... ON CONFLICT DO UPDATE).
+        Escritores concurrentes del mismo SKU caen en filas distintas y no se esperan.
+        """
+        tabla = connection.ops.quote_name(BalanceStockSlot._meta.db_table)
+        n_slots = getattr(settings, 'STOCK_BALANCE_SLOTS', 8)
+        valores = []
+        params = []
+        for clave in sorted(deltas):
+            valores.append("(%s, %s, %s, %s, %s::numeric)")
+            params.extend([*clave, random.randrange(n_slots), deltas[clave]])
+
+        sql = f"""
+            INSERT INTO {tabla} (articulo_id, deposito_id, tipo_stock_id, slot, cantidad)
+            VALUES {', '.join(valores)}
+            ON CONFLICT (articulo_id, deposito_id, tipo_stock_id, slot)
+            DO UPDATE SET cantidad = {tabla}.cantidad + EXCLUDED.cantidad
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @staticmethod
+    def _saldo_clave(articulo_id, deposito_id, tipo_stock_id):
+        """Saldo de una clave: fila de BalanceStock + slots pendientes de compactar."""
+        filtro = dict(articulo_id=articulo_id, deposito_id=deposito_id, tipo_stock_id=tipo_stock_id)
+        base = BalanceStock.objects.filter(**filtro).aggregate(total=Sum('cantidad'))['total'] or Decimal(0)
+        slots = BalanceStockSlot.objects.filter(**filtro).aggregate(total=Sum('cantidad'))['total'] or Decimal(0)
+        return base + slots
+
+    @staticmethod
+    def compactar_slots():
+        """
+        Pliega los slots de balance fragmentado en BalanceStock (online).
+
+        - Los slots se toman con FOR UPDATE SKIP LOCKED: lo que esté escribiendo
+          un documento en curso queda para la próxima pasada, sin bloquear ventas.
+        - Orden de locks slots -> BalanceStock, el mismo que usan los escritores.
+        - Recalcula StockArticulo (legacy) de las claves plegadas.
+
+        Returns:
+            int: Cantidad de claves (articulo, deposito, tipo) compactadas.
+        """
+        tabla = connection.ops.quote_name(BalanceStock._meta.db_table)
+        tabla_slots = connection.ops.quote_name(BalanceStockSlot._meta.db_table)
+        sql = f"""
+            WITH tomados AS (
+                SELECT id FROM {tabla_slots}
+                ORDER BY articulo_id, deposito_id, tipo_stock_id, slot
+                FOR UPDATE SKIP LOCKED
+            ),
+            plegados AS (
+                DELETE FROM {tabla_slots} s USING tomados
+                WHERE s.id = tomados.id
+                RETURNING s.articulo_id, s.deposito_id, s.tipo_stock_id, s.cantidad
+            ),
+            sumas AS (
+                SELECT articulo_id, deposito_id, tipo_stock_id, SUM(cantidad) AS cantidad
+                FROM plegados
+                GROUP BY articulo_id, deposito_id, tipo_stock_id
+                ORDER BY articulo_id, deposito_id, tipo_stock_id
+            )
+            INSERT INTO {tabla} (articulo_id, deposito_id, tipo_stock_id, cantidad, ultima_actualizacion)
+            SELECT articulo_id, deposito_id, tipo_stock_id, cantidad, %s FROM sumas
+            ON CONFLICT (articulo_id, deposito_id, tipo_stock_id)
+            DO UPDATE SET cantidad = {tabla}.cantidad + EXCLUDED.cantidad,
+                          ultima_actualizacion = EXCLUDED.ultima_actualizacion
+            RETURNING articulo_id, deposito_id
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [timezone.now()])
+                claves = {tuple(fila) for fila in cursor.fetchall()}
+            if claves:
+                StockManager._recalcular_legacy(claves)
+
+        if claves:
+            logger.info("Compactación de slots de balance completada | claves=%s", len(claves))
+        return len(claves)
+
+    @staticmethod
+    def _recalcular_legacy(claves):
+        """Reescribe StockArticulo de las claves (articulo, deposito) desde BalanceStock."""
+        if legacy_derivado():
+            return
+        saldos = {
+            (b['articulo_id'], b['deposito_id']): b
+            for b in BalanceStock.objects.filter(_filtro_claves(claves, CAMPOS_LEGACY)).values(
+                'articulo_id', 'deposito_id'
+            ).annotate(
+                real=Sum('cantidad', filter=Q(tipo_stock__codigo='REAL')),
+                comprometida=Sum('cantidad', filter=Q(tipo_stock__codigo='RSRV')),
+            )
+        }
+        StockArticulo.objects.bulk_create([
+            StockArticulo(
+                articulo_id=a, deposito_id=d,
+                cantidad_real=saldos.get((a, d), {}).get('real') or Decimal(0),
+                cantidad_comprometida=saldos.get((a, d), {}).get('comprometida') or Decimal(0),
+            )
+            for (a, d) in sorted(claves)
+        ], update_conflicts=True, unique_fields=['articulo', 'deposito'],
+            update_fields=['cantidad_real', 'cantidad_comprometida'])
+
+    @staticmethod
+    def _debe_validar_saldo(linea):
+        """
+        Jerarquía de la regla de negativos para una línea:
+        Override explícito > Depósito > Artículo.
+        """
+        if linea['cantidad'] >= Decimal(0):
+            return False
+
+        permitir_stock_negativo = linea.get('permitir_stock_negativo')
+        # Nivel 1: Override Explícito
+        if permitir_stock_negativo is not None:
+            return not permitir_stock_negativo
+
+        # Nivel 2 y 3: Depósito y Artículo. Si alguno no lo permite, bloqueamos.
+        return not (linea['deposito'].permite_stock_negativo and linea['articulo'].permite_stock_negativo)
+
+    @staticmethod
+    def _sincronizar_legacy(lineas, tipos, origen_referencia, usuario):
+        """
+        Mantiene StockArticulo e HistoricoMovimientos en sintonía con el lote.
+        El modelo legacy solo entiende de 'REAL' y 'RSRV' (Comprometido).
+        Con el tenant migrado a vistas derivadas (ver legacy.py) no hay nada que escribir.
+        """
+        if legacy_derivado():
+            return
+        lineas_legacy = [l for l in lineas if l['codigo_tipo'] in ('REAL', 'RSRV')]
+        if not lineas_legacy:
+            return
 
-        # 6. Compatibilidad Auditoría Vieja (Robustez Operativa)
+        delta_real = defaultdict(Decimal)
+        delta_comprometida = defaultdict(Decimal)
+        for linea in lineas_legacy:
+            clave = (linea['articulo'].pk, linea['deposito'].pk)
+            destino = delta_real if linea['codigo_tipo'] == 'REAL' else delta_comprometida
+            destino[clave] += linea['cantidad']
+
+        claves = set(delta_real) | set(delta_comprometida)
+        StockArticulo.objects.bulk_create([
+            StockArticulo(articulo_id=a, deposito_id=d,
+                          cantidad_real=Decimal(0), cantidad_comprometida=Decimal(0))
+            for (a, d) in sorted(claves)
+        ], ignore_conflicts=True)
+
+        # Lock en orden determinístico: leemos los saldos previos para el log legacy
+        previos = {
+            (s['articulo_id'], s['deposito_id']): s
+            for s in StockArticulo.objects.select_for_update().filter(
+                _filtro_claves(claves, CAMPOS_LEGACY)
+            ).order_by('articulo_id', 'deposito_id').values(
+                'articulo_id', 'deposito_id', 'cantidad_real', 'cantidad_comprometida'
+            )
+        }
+
+        StockArticulo.objects.filter(_filtro_claves(claves, CAMPOS_LEGACY)).update(
+            cantidad_real=F('cantidad_real') + _expresion_delta(delta_real, CAMPOS_LEGACY),
+            cantidad_comprometida=F('cantidad_comprometida') + _expresion_delta(delta_comprometida, CAMPOS_LEGACY),
+        )
+
+        # 4. Compatibilidad Auditoría Vieja (Robustez Operativa)
         try:
-            operacion_legacy = 'SUMAR' if cantidad > Decimal(0) else 'RESTAR'
-            if codigo_tipo in ['REAL', 'RSRV']:
-                tipo_legacy = 'REAL' if codigo_tipo == 'REAL' else 'COMPROMETIDO'
-                # Recargamos para obtener valor actualizado exacto para el log
-                stock_legacy.refresh_from_db()
-                saldo_legacy = stock_legacy.cantidad_real if codigo_tipo == 'REAL' else stock_legacy.cantidad_comprometida
-
-                HistoricoMovimientos.objects.create(
-                    articulo=articulo, deposito=deposito, cantidad=abs(cantidad),
-                    tipo_stock=tipo_legacy, operacion=operacion_legacy,
-                    saldo_post_movimiento=saldo_legacy, referencia=origen_referencia, usuario=usuario
-                )
+            historico = []
+            for linea in lineas_legacy:
+                clave = (linea['articulo'].pk, linea['deposito'].pk)
+                campo = 'cantidad_real' if linea['codigo_tipo'] == 'REAL' else 'cantidad_comprometida'
+                previos[clave][campo] += linea['cantidad']
+                historico.append(HistoricoMovimientos(
+                    articulo=linea['articulo'], deposito=linea['deposito'], cantidad=abs(linea['cantidad']),
+                    tipo_stock='REAL' if linea['codigo_tipo'] == 'REAL' else 'COMPROMETIDO',
+                    operacion='SUMAR' if linea['cantidad'] > Decimal(0) else 'RESTAR',
+                    saldo_post_movimiento=previos[clave][campo],
+                    referencia=linea.get('origen_referencia') or origen_referencia, usuario=usuario
+                ))
+            # Savepoint: un fallo del log legacy no debe abortar la transacción principal
+            with transaction.atomic():
+                HistoricoMovimientos.objects.bulk_create(historico, batch_size=500)
         except Exception as e:
             # No rompemos la transacción si falla el log legacy, pero lo registramos
             logger.warning(f"Error escribiendo HistoricoMovimientos (Legacy): {e}")
 
-        return True
-
     @staticmethod
     def validar_disponibilidad(articulo, deposito, cantidad_requerida):
         """
         Verifica disponibilidad usando la nueva lógica de balances.
         """
-        vendible = BalanceStock.objects.filter(
-            articulo=articulo, deposito=deposito, tipo_stock__es_vendible=True
-        ).aggregate(total=Sum('cantidad'))['total'] or Decimal(0)
+        resultado = StockManager.disponibilidad_lote([(articulo, cantidad_requerida)], depositos=[deposito])
+        return next(iter(resultado.values()))['alcanza']
+
+    @staticmethod
+    def disponibilidad_lote(items, depositos=None):
+        """
+        Disponibilidad de muchos artículos en una sola consulta (carrito POS, comprobantes).
 
-        reservado = BalanceStock.objects.filter(
-            articulo=articulo, deposito=deposito, tipo_stock__es_reservado=True
-        ).aggregate(total=Sum('cantidad'))['total'] or Decimal(0)
+        Args:
+            items: iterable de (articulo, cantidad); articulo instancia o id. Los repetidos se suman.
+            depositos: instancias o ids a considerar (None = todos).
 
-        disponible = vendible - reservado
-        return disponible >= Decimal(str(cantidad_requerida))
+        Returns:
+            dict {articulo_id: {
+                'cantidad': requerida, 'disponible_total': Decimal, 'alcanza': bool,
+                'depositos': {deposito_id: {'real', 'fisico', 'reservado', 'en_transito',
+                                            'disponible', 'alcanza'}},
+            }}
+            disponible = Σ vendibles - Σ reservados (BalanceStock + slots).
+        """
+        requerido = defaultdict(Decimal)
+        for articulo, cantidad in items:
+            requerido[getattr(articulo, 'pk', articulo)] += Decimal(str(cantidad))
+        if not requerido:
+            return {}
+
+        def _agregado(modelo):
+            filas = modelo.objects.filter(articulo_id__in=list(requerido))
+            if depositos is not None:
+                filas = filas.filter(deposito__in=depositos)
+            return filas.order_by().values('articulo_id', 'deposito_id').annotate(
+                real=Sum('cantidad', filter=Q(tipo_stock__codigo='REAL')),
+                fisico=Sum('cantidad', filter=Q(tipo_stock__es_fisico=True)),
+                vendible=Sum('cantidad', filter=Q(tipo_stock__es_vendible=True)),
+                reservado=Sum('cantidad', filter=Q(tipo_stock__es_reservado=True)),
+                en_transito=Sum('cantidad', filter=Q(tipo_stock__es_en_transito=True)),
+            )
+
+        campos = ('real', 'fisico', 'vendible', 'reservado', 'en_transito')
+        saldos = defaultdict(lambda: dict.fromkeys(campos, Decimal(0)))
+        # Fila principal + slots de balance fragmentado, en una única consulta UNION ALL
+        for fila in _agregado(BalanceStock).union(_agregado(BalanceStockSlot), all=True):
+            saldo = saldos[(fila['articulo_id'], fila['deposito_id'])]
+            for campo in campos:
+                saldo[campo] += fila[campo] or Decimal(0)
+
+        resultado = {
+            articulo_id: {'cantidad': cantidad, 'disponible_total': Decimal(0), 'alcanza': False, 'depositos': {}}
+            for articulo_id, cantidad in requerido.items()
+        }
+        for (articulo_id, deposito_id), saldo in sorted(saldos.items()):
+            item = resultado[articulo_id]
+            disponible = saldo.pop('vendible') - saldo['reservado']
+            item['depositos'][deposito_id] = {
+                **saldo, 'disponible': disponible, 'alcanza': disponible >= item['cantidad'],
+            }
+            item['disponible_total'] += disponible
+        for item in resultado.values():
+            item['alcanza'] = item['disponible_total'] >= item['cantidad']
+        return resultado
 
     # --- NUEVO MÉTODO PARA VALIDACIÓN EN FORMULARIOS ---
     @staticmethod
@@ -170,15 +583,169 @@ class StockManager:
         Devuelve Decimal.
         """
         try:
-            balance = BalanceStock.objects.filter(
-                articulo=articulo,
-                deposito=deposito,
-                tipo_stock__codigo=codigo_tipo_stock
-            ).first()
-            return balance.cantidad if balance else Decimal(0)
+            total = Decimal(0)
+            # Incluye slots de balance fragmentado pendientes de compactar
+            for modelo in (BalanceStock, BalanceStockSlot):
+                total += modelo.objects.filter(
+                    articulo=articulo,
+                    deposito=deposito,
+                    tipo_stock__codigo=codigo_tipo_stock
+                ).aggregate(total=Sum('cantidad'))['total'] or Decimal(0)
+            return total
         except Exception:
             return Decimal(0)
 
+    # --- STOCK A FECHA (Snapshots + delta del Ledger) ---
+    @staticmethod
+    def saldos_a_fecha(fecha, articulos=None, depositos=None, tipos_stock=None):
+        """
+        Saldos históricos por (articulo_id, deposito_id, tipo_stock_id).
+        - `fecha` date: saldo al cierre de ese día.
+        - `fecha` datetime: saldo con los movimientos estrictamente anteriores.
+        Parte del SaldoStockCorte más cercano y suma solo el Ledger posterior.
+        Los filtros aceptan instancias, ids o querysets. Omite claves en 0.
+        """
+        limite = _inicio_del_dia(fecha + timedelta(days=1)) if _es_fecha_pura(fecha) else fecha
+        if timezone.is_naive(limite):
+            limite = timezone.make_aware(limite)
+
+        filtros = {}
+        if articulos is not None:
+            filtros['articulo__in'] = articulos
+        if depositos is not None:
+            filtros['deposito__in'] = depositos
+        if tipos_stock is not None:
+            filtros['tipo_stock__in'] = tipos_stock
+
+        # Corte más cercano cuyo cierre no supere el límite (los cortes son globales)
+        fecha_corte = (
+            SaldoStockCorte.objects.filter(fecha_corte__lt=timezone.localtime(limite).date())
+            .order_by('-fecha_corte').values_list('fecha_corte', flat=True).first()
+        )
+
+        saldos = defaultdict(Decimal)
+        ledger = MovimientoStockLedger.objects.filter(fecha_movimiento__lt=limite, **filtros)
+        if fecha_corte is not None:
+            for fila in SaldoStockCorte.objects.filter(fecha_corte=fecha_corte, **filtros).values_list(
+                'articulo_id', 'deposito_id', 'tipo_stock_id', 'cantidad'
+            ):
+                saldos[fila[:3]] += fila[3]
+            ledger = ledger.filter(fecha_movimiento__gte=_inicio_del_dia(fecha_corte + timedelta(days=1)))
+
+        for fila in ledger.values('articulo_id', 'deposito_id', 'tipo_stock_id').annotate(
+            total=Sum('cantidad')
+        ).values_list('articulo_id', 'deposito_id', 'tipo_stock_id', 'total'):
+            saldos[fila[:3]] += fila[3]
+
+        return {clave: cantidad for clave, cantidad in saldos.items() if cantidad}
+
+    @staticmethod
+    def saldo_a_fecha(articulo, deposito, codigo_tipo, fecha):
+        """Saldo histórico de una clave. Ver saldos_a_fecha()."""
+        saldos = StockManager.saldos_a_fecha(
+            fecha, articulos=[articulo], depositos=[deposito],
+            tipos_stock=TipoStock.objects.filter(codigo=codigo_tipo),
+        )
+        return sum(saldos.values(), Decimal(0))
+
+    @staticmethod
+    def kardex(articulo, deposito=None, desde=None, hasta=None, despues_de=None):
+        """
+        Kardex del artículo en orden (fecha_movimiento, pk) con saldo físico acumulado en SQL.
+        - `desde`/`hasta`: días locales inclusivos. El saldo de apertura sale de
+          saldos_a_fecha() (snapshot + delta), sin recorrer los movimientos previos.
+        - `despues_de`: (fecha_movimiento, pk, saldo) de la última fila ya entregada
+          (paginación keyset); el saldo viaja con el cursor.
+        Devuelve (saldo_inicial, queryset). Cada fila trae `saldo` = saldo_inicial +
+        acumulado de la ventana (Decimal), calculado por la base.
+        """
+        movimientos = MovimientoStockLedger.objects.filter(
+            articulo=articulo, **filtro_fecha_movimiento(desde, hasta)
+        )
+        if deposito:
+            movimientos = movimientos.filter(deposito=deposito)
+
+        if despues_de is not None:
+            fecha, pk, saldo_inicial = despues_de
+            movimientos = movimientos.filter(
+                Q(fecha_movimiento__gt=fecha) | Q(fecha_movimiento=fecha, pk__gt=pk)
+            )
+        elif desde:
+            saldos = StockManager.saldos_a_fecha(
+                desde - timedelta(days=1),
+                articulos=[articulo],
+                depositos=[deposito] if deposito else None,
+                tipos_stock=TipoStock.objects.filter(es_fisico=True),
+            )
+            saldo_inicial = sum(saldos.values(), Decimal(0))
+        else:
+            saldo_inicial = Decimal(0)
+
+        salida = DecimalField(max_digits=15, decimal_places=4)
+        impacto = Case(
+            When(tipo_stock__es_fisico=True, then=F('cantidad')),
+            default=Value(Decimal(0)), output_field=salida,
+        )
+        movimientos = movimientos.select_related('deposito', 'tipo_stock', 'usuario').annotate(
+            saldo=ExpressionWrapper(
+                Value(saldo_inicial, output_field=salida) + Window(
+                    expression=Sum(impacto),
+                    order_by=[F('fecha_movimiento').asc(), F('pk').asc()],
+                ),
+                output_field=salida,
+            )
+        ).order_by('fecha_movimiento', 'pk')
+        return saldo_inicial, movimientos
+
+    @staticmethod
+    def actualizar_cortes_stock(hasta=None):
+        """
+        Mantiene SaldoStockCorte al día (job periódico, idempotente).
+        1. Invalida los cortes alcanzados por movimientos con fecha retroactiva
+           registrados después del último cálculo.
+        2. Genera los cierres de mes faltantes hasta `hasta` (por defecto, el
+           último mes cerrado), cada uno a partir del anterior + delta del mes.
+        Devuelve la cantidad de cortes generados.
+        """
+        if hasta is None:
+            hasta = timezone.localdate().replace(day=1) - timedelta(days=1)
+
+        ultimo = SaldoStockCorte.objects.aggregate(
+            fecha_corte=Max('fecha_corte'), calculado_en=Max('calculado_en')
+        )
+        if ultimo['fecha_corte'] is not None:
+            retroactivo = MovimientoStockLedger.objects.filter(
+                fecha_registro__gt=ultimo['calculado_en'],
+                fecha_movimiento__lt=_inicio_del_dia(ultimo['fecha_corte'] + timedelta(days=1)),
+            ).aggregate(desde=Min('fecha_movimiento'))['desde']
+            if retroactivo is not None:
+                desde = timezone.localtime(retroactivo).date()
+                invalidados, _ = SaldoStockCorte.objects.filter(fecha_corte__gte=desde).delete()
+                logger.info(f"Cortes de stock invalidados desde {desde} ({invalidados} filas).")
+
+        ultimo_corte = SaldoStockCorte.objects.aggregate(f=Max('fecha_corte'))['f']
+        if ultimo_corte is None:
+            primero = MovimientoStockLedger.objects.aggregate(f=Min('fecha_movimiento'))['f']
+            if primero is None:
+                return 0
+            siguiente = _fin_de_mes(timezone.localtime(primero).date())
+        else:
+            siguiente = _fin_de_mes(ultimo_corte + timedelta(days=1))
+
+        generados = 0
+        while siguiente <= hasta:
+            with transaction.atomic():
+                saldos = StockManager.saldos_a_fecha(siguiente)
+                SaldoStockCorte.objects.bulk_create([
+                    SaldoStockCorte(fecha_corte=siguiente, articulo_id=a, deposito_id=d,
+                                    tipo_stock_id=t, cantidad=cantidad)
+                    for (a, d, t), cantidad in sorted(saldos.items())
+                ], batch_size=1000, ignore_conflicts=True)
+            logger.info(f"Corte de stock {siguiente}: {len(saldos)} saldos.")
+            generados += 1
+            siguiente = _fin_de_mes(siguiente + timedelta(days=1))
+        return generados
+
 
 # --- WRAPPER DE COMPATIBILIDAD ---
 class StockService:
@@ -235,31 +802,30 @@ class TransferenciaService:
 
         ref = f"Envío TRF #{transferencia.pk} a {transferencia.destino}"
 
-        for item in transferencia.items.all():
+        lineas = []
+        for item in transferencia.items.select_related('articulo'):
             # 1. Restar Físico en Origen (Puede fallar si no hay stock)
             # Nota: Usamos permitir_stock_negativo=None para que aplique las reglas del depósito.
-            StockManager.registrar_movimiento(
-                articulo=item.articulo,
-                deposito=transferencia.origen,
-                codigo_tipo='REAL',
-                cantidad=-item.cantidad, # Resta
-                origen_sistema='TRANSFERENCIA',
-                origen_referencia=ref,
-                usuario=transferencia.created_by,
-                permitir_stock_negativo=None
-            )
+            lineas.append({
+                'articulo': item.articulo,
+                'deposito': transferencia.origen,
+                'codigo_tipo': 'REAL',
+                'cantidad': -item.cantidad,  # Resta
+                'permitir_stock_negativo': None,
+            })
 
             # 2. Sumar 'En Tránsito' en Destino
             # (El stock viaja "hacia" el destino, así que se imputa allí como pendiente)
-            StockManager.registrar_movimiento(
-                articulo=item.articulo,
-                deposito=transferencia.destino,
-                codigo_tipo='TRNS', # Stock virtual de tránsito
-                cantidad=item.cantidad, # Suma
-                origen_sistema='TRANSFERENCIA',
-                origen_referencia=ref,
-                usuario=transferencia.created_by
-            )
+            lineas.append({
+                'articulo': item.articulo,
+                'deposito': transferencia.destino,
+                'codigo_tipo': 'TRNS',  # Stock virtual de tránsito
+                'cantidad': item.cantidad,  # Suma
+            })
+
+        StockManager.registrar_movimientos_lote(
+            lineas, origen_sistema='TRANSFERENCIA', origen_referencia=ref, usuario=transferencia.created_by
+        )
 
         # Actualizar estado
         transferencia.estado = 'TR' # En Tránsito
@@ -279,29 +845,28 @@ class TransferenciaService:
 
         ref = f"Recepción TRF #{transferencia.pk} desde {transferencia.origen}"
 
-        for item in transferencia.items.all():
+        lineas = []
+        for item in transferencia.items.select_related('articulo'):
             # 1. Restar del Tránsito (Ya llegó)
-            StockManager.registrar_movimiento(
-                articulo=item.articulo,
-                deposito=transferencia.destino,
-                codigo_tipo='TRNS',
-                cantidad=-item.cantidad, # Resta lo que estaba viajando
-                origen_sistema='TRANSFERENCIA',
-                origen_referencia=ref,
-                usuario=transferencia.created_by,
-                permitir_stock_negativo=True # Permitimos porque es un clearing técnico
-            )
+            lineas.append({
+                'articulo': item.articulo,
+                'deposito': transferencia.destino,
+                'codigo_tipo': 'TRNS',
+                'cantidad': -item.cantidad,  # Resta lo que estaba viajando
+                'permitir_stock_negativo': True,  # Permitimos porque es un clearing técnico
+            })
 
             # 2. Sumar al Físico Real
-            StockManager.registrar_movimiento(
-                articulo=item.articulo,
-                deposito=transferencia.destino,
-                codigo_tipo='REAL',
-                cantidad=item.cantidad, # Suma al stock disponible
-                origen_sistema='TRANSFERENCIA',
-                origen_referencia=ref,
-                usuario=transferencia.created_by
-            )
+            lineas.append({
+                'articulo': item.articulo,
+                'deposito': transferencia.destino,
+                'codigo_tipo': 'REAL',
+                'cantidad': item.cantidad,  # Suma al stock disponible
+            })
+
+        StockManager.registrar_movimientos_lote(
+            lineas, origen_sistema='TRANSFERENCIA', origen_referencia=ref, usuario=transferencia.created_by
+        )
 
         # Actualizar estado
         transferencia.estado = 'CP' # Completada
@@ -324,9 +889,8 @@ class AjusteService:
 
         ref = f"Ajuste #{ajuste.pk}: {ajuste.motivo.nombre}"
 
-        for item in ajuste.items.all():
-            cantidad_final = item.cantidad
-
+        lineas = []
+        for item in ajuste.items.select_related('articulo'):
             # Si es SALIDA, invertimos el signo a negativo
             if item.tipo_movimiento == 'S':
                 cantidad_final = -abs(item.cantidad)
@@ -334,22 +898,192 @@ class AjusteService:
                 cantidad_final = abs(item.cantidad)
 
             # Impactamos en Stock REAL
-            StockManager.registrar_movimiento(
-                articulo=item.articulo,
-                deposito=ajuste.deposito,
-                codigo_tipo='REAL',
-                cantidad=cantidad_final,
-                origen_sistema='AJUSTE_MANUAL',
-                origen_referencia=ref,
-                usuario=ajuste.created_by,
-                observaciones=ajuste.observaciones,
-                # IMPORTANTE: Permitimos negativo si es una corrección de stock,
-                # pero el StockManager igual validará si el depósito/artículo lo prohíben
-                # a menos que pasemos True.
-                # Estrategia: Pasamos None para respetar la config del artículo.
-                permitir_stock_negativo=None
-            )
+            # Pasamos None para respetar la config del depósito/artículo.
+            lineas.append({
+                'articulo': item.articulo,
+                'deposito': ajuste.deposito,
+                'codigo_tipo': 'REAL',
+                'cantidad': cantidad_final,
+                'permitir_stock_negativo': None,
+            })
+
+        StockManager.registrar_movimientos_lote(
+            lineas, origen_sistema='AJUSTE_MANUAL', origen_referencia=ref,
+            usuario=ajuste.created_by, observaciones=ajuste.observaciones
+        )
 
         ajuste.estado = 'CN'
         ajuste.stock_aplicado = True
-        ajuste.save()
\ No newline at end of file
+        ajuste.save()
+
+
+class ConciliacionStockService:
+    """
+    Motor de reconstrucción Ledger -> vistas materializadas.
+    -------------------------------------------------------------------------
+    Invariantes (por articulo, deposito, tipo_stock):
+      BalanceStock.cantidad + Σ BalanceStockSlot   == Σ Ledger
+      StockArticulo.cantidad_real / _comprometida == Σ Ledger REAL / RSRV - Σ slots
+    Con particiones archivadas (archivar_ledger), Σ Ledger es el SaldoStockCorte
+    de corte_base() + el Ledger adjunto posterior a ese corte.
+    detectar_desvios() recorre el Ledger agregado con cursor server-side
+    (memoria acotada a los balances del depósito) y reconstruir_claves()
+    reescribe desde el Ledger solo las claves desviadas.
+    -------------------------------------------------------------------------
+    """
+    CAMPOS_BALANCE = ('articulo_id', 'deposito_id', 'tipo_stock_id')
+    CAMPOS_LEGACY = {'REAL': 'cantidad_real', 'RSRV': 'cantidad_comprometida'}
+    PRECISION_LEGACY = Decimal('0.001')
+
+    @staticmethod
+    def corte_base():
+        """
+        Fecha del último SaldoStockCorte anterior a la primera partición adjunta del
+        Ledger, o None. Si hay uno, los meses previos pueden estar archivados: el
+        saldo parte de ese corte (archivar_ledger exige que exista) y no de Σ Ledger.
+        """
+        if not ledger_particionado():
+            return None
+        meses = particiones_ledger()
+        if not meses:
+            return None
+        return SaldoStockCorte.objects.filter(fecha_corte__lt=meses[0]).aggregate(f=Max('fecha_corte'))['f']
+
+    @staticmethod
+    def detectar_desvios(deposito_id):
+        """
+        Compara el Ledger del depósito contra BalanceStock (+ slots) y StockArticulo.
+        Devuelve una lista de dicts: modelo, articulo_id, deposito_id, tipo,
+        tipo_stock_id, esperado, actual, diferencia.
+        """
+        codigos = dict(TipoStock.objects.values_list('pk', 'codigo'))
+        campos_legacy = ConciliacionStockService.CAMPOS_LEGACY
+        precision = ConciliacionStockService.PRECISION_LEGACY
+
+        actual = defaultdict(Decimal)
+        slots_legacy = defaultdict(Decimal)
+        for modelo in (BalanceStock, BalanceStockSlot):
+            for a, t, cantidad in modelo.objects.filter(deposito_id=deposito_id).values_list(
+                'articulo_id', 'tipo_stock_id', 'cantidad'
+            ).iterator(chunk_size=5000):
+                actual[(a, t)] += cantidad
+                if modelo is BalanceStockSlot and codigos.get(t) in campos_legacy:
+                    slots_legacy[(a, campos_legacy[codigos[t]])] += cantidad
+
+        # Con StockArticulo servido por una vista derivada no hay copia legacy que pueda desviarse
+        derivado = legacy_derivado()
+        legacy_actual = {}
+        consulta_legacy = StockArticulo.objects.none() if derivado else StockArticulo.objects.filter(deposito_id=deposito_id)
+        for a, real, comprometida in consulta_legacy.values_list(
+            'articulo_id', 'cantidad_real', 'cantidad_comprometida'
+        ).iterator(chunk_size=5000):
+            legacy_actual[(a, 'cantidad_real')] = real
+            legacy_actual[(a, 'cantidad_comprometida')] = comprometida
+
+        desvios = []
+
+        def _desvio(modelo, a, t, tipo, esperado, valor):
+            desvios.append({
+                'modelo': modelo, 'articulo_id': a, 'deposito_id': deposito_id,
+                'tipo': tipo, 'tipo_stock_id': t,
+                'esperado': esperado, 'actual': valor, 'diferencia': valor - esperado,
+            })
+
+        # Con meses archivados, el saldo parte del corte base y suma el Ledger posterior
+        ledger = MovimientoStockLedger.objects.filter(deposito_id=deposito_id)
+        base = {}
+        fecha_corte = ConciliacionStockService.corte_base()
+        if fecha_corte is not None:
+            for a, t, cantidad in SaldoStockCorte.objects.filter(
+                fecha_corte=fecha_corte, deposito_id=deposito_id
+            ).values_list('articulo_id', 'tipo_stock_id', 'cantidad').iterator(chunk_size=5000):
+                base[(a, t)] = cantidad
+            ledger = ledger.filter(fecha_movimiento__gte=_inicio_del_dia(fecha_corte + timedelta(days=1)))
+
+        legacy_esperado = defaultdict(Decimal)
+
+        def _comparar(a, t, total):
+            valor = actual.pop((a, t), Decimal(0))
+            if valor != total:
+                _desvio('BalanceStock', a, t, codigos.get(t), total, valor)
+            if not derivado and codigos.get(t) in campos_legacy:
+                legacy_esperado[(a, campos_legacy[codigos[t]])] += total
+
+        # Streaming: una fila agregada por (articulo, tipo) del depósito
+        ledger = ledger.order_by().values(
+            'articulo_id', 'tipo_stock_id'
+        ).annotate(total=Sum('cantidad')).values_list('articulo_id', 'tipo_stock_id', 'total')
+        for a, t, total in ledger.iterator(chunk_size=5000):
+            _comparar(a, t, total + base.pop((a, t), Decimal(0)))
+        for (a, t), total in base.items():
+            _comparar(a, t, total)
+
+        for (a, t), valor in actual.items():
+            if valor:
+                _desvio('BalanceStock', a, t, codigos.get(t), Decimal(0), valor)
+
+        tipo_por_campo = {campo: codigo for codigo, campo in campos_legacy.items()}
+        pk_por_codigo = {codigo: pk for pk, codigo in codigos.items()}
+        for clave in set(legacy_esperado) | set(legacy_actual):
+            a, campo = clave
+            esperado = (legacy_esperado.get(clave, Decimal(0)) - slots_legacy.get(clave, Decimal(0))).quantize(precision)
+            valor = legacy_actual.get(clave, Decimal(0)).quantize(precision)
+            if valor != esperado:
+                codigo = tipo_por_campo[campo]
+                _desvio('StockArticulo', a, pk_por_codigo.get(codigo), codigo, esperado, valor)
+
+        return desvios
+
+    @staticmethod
+    @transaction.atomic
+    def reconstruir_claves(claves):
+        """
+        Reescribe BalanceStock (y StockArticulo) de las claves (articulo_id, deposito_id,
+        tipo_stock_id) desde el Ledger (y el corte base, si lo hay), respetando los
+        slots pendientes de compactar.
+        Toma los locks de BalanceStock en orden: los registros concurrentes esperan y
+        la reconstrucción ve todo lo confirmado antes.
+        """
+        campos = ConciliacionStockService.CAMPOS_BALANCE
+        claves = sorted({tuple(clave) for clave in claves})
+        if not claves:
+            return 0
+
+        BalanceStock.objects.bulk_create([
+            BalanceStock(articulo_id=a, deposito_id=d, tipo_stock_id=t, cantidad=Decimal(0))
+            for (a, d, t) in claves
+        ], ignore_conflicts=True)
+
+        filtro = _filtro_claves(claves, campos)
+        list(BalanceStock.objects.select_for_update().filter(filtro).order_by(*campos).values_list('pk', flat=True))
+
+        # Ledger y slots en la misma sentencia: un único snapshot para ambos
+        referencia = {campo: OuterRef(campo) for campo in campos}
+        esperado = _suma_por_clave(MovimientoStockLedger, referencia)
+        fecha_corte = ConciliacionStockService.corte_base()
+        if fecha_corte is not None:
+            desde = _inicio_del_dia(fecha_corte + timedelta(days=1))
+            esperado = (
+                _suma_por_clave(SaldoStockCorte, {**referencia, 'fecha_corte': fecha_corte})
+                + _suma_por_clave(MovimientoStockLedger, {**referencia, 'fecha_movimiento__gte': desde})
+            )
+        BalanceStock.objects.filter(filtro).update(
+            cantidad=esperado - _suma_por_clave(BalanceStockSlot, referencia),
+            ultima_actualizacion=timezone.now(),
+        )
+
+        StockManager._recalcular_legacy({(a, d) for (a, d, _) in claves})
+        logger.info(f"Balances reconstruidos desde el Ledger: {len(claves)} claves.")
+        return len(claves)
+
+    @staticmethod
+    def conciliar_deposito(deposito_id, reparar=False):
+        """Detecta (y opcionalmente repara) los desvíos de un depósito. Devuelve un resumen."""
+        desvios = ConciliacionStockService.detectar_desvios(deposito_id)
+        reparados = 0
+        if reparar and desvios:
+            reparados = ConciliacionStockService.reconstruir_claves(
+                (d['articulo_id'], d['deposito_id'], d['tipo_stock_id'])
+                for d in desvios if d['tipo_stock_id'] is not None
+            )
+        return {'deposito_id': deposito_id, 'desvios': desvios, 'reparados': reparados}
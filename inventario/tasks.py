@@ -1,8 +1,114 @@
-from celery import shared_task
+import logging
 import time
 
+from celery import shared_task
+from django_tenants.utils import schema_context, get_tenant_model, get_public_schema_name
+
+logger = logging.getLogger(__name__)
+
+
+def schemas_de_tenants():
+    """Schemas de todos los tenants (excluye public). Para tareas periódicas de Celery Beat."""
+    return list(
+        get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        .values_list('schema_name', flat=True)
+    )
+
+
 @shared_task
 def sumar_numeros(x, y):
     # Simulamos una tarea que tarda 5 segundos
     time.sleep(5)
-    return x + y
\ No newline at end of file
+    return x + y
+
+
+@shared_task
+def compactar_balances_fragmentados_task(schema_name=None):
+    """
+    Pliega los slots de BalanceStockSlot en BalanceStock.
+    Sin schema_name, despacha una tarea por tenant (uso desde Celery Beat).
+    """
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            compactar_balances_fragmentados_task.delay(schema)
+        return None
+
+    from inventario.services import StockManager
+
+    with schema_context(schema_name):
+        claves = StockManager.compactar_slots()
+    logger.info("Slots compactados | tenant=%s | claves=%s", schema_name, claves)
+    return claves
+
+
+@shared_task
+def actualizar_cortes_stock_task(schema_name=None):
+    """
+    Genera/repara los snapshots mensuales de SaldoStockCorte (stock a fecha).
+    Sin schema_name, despacha una tarea por tenant (uso desde Celery Beat).
+    """
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            actualizar_cortes_stock_task.delay(schema)
+        return None
+
+    from inventario.services import StockManager
+
+    with schema_context(schema_name):
+        generados = StockManager.actualizar_cortes_stock()
+    logger.info("Cortes de stock actualizados | tenant=%s | cortes=%s", schema_name, generados)
+    return generados
+
+
+@shared_task
+def crear_particiones_ledger_task(schema_name=None):
+    """
+    Crea por adelantado las particiones mensuales del Ledger.
+    Sin schema_name, despacha una tarea por tenant (uso desde Celery Beat).
+    """
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            crear_particiones_ledger_task.delay(schema)
+        return None
+
+    from inventario.particiones import crear_particiones_ledger
+
+    with schema_context(schema_name):
+        creadas = crear_particiones_ledger()
+    logger.info("Particiones de Ledger | tenant=%s | creadas=%s", schema_name, creadas)
+    return creadas
+
+
+@shared_task
+def conciliar_stock_task(schema_name=None, reparar=False):
+    """
+    Conciliación nocturna Ledger -> BalanceStock / StockArticulo.
+    Sin schema_name, despacha una tarea por tenant; por tenant, una por depósito.
+    """
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            conciliar_stock_task.delay(schema, reparar)
+        return None
+
+    from inventario.models import Deposito
+
+    with schema_context(schema_name):
+        depositos = list(Deposito.objects.values_list('pk', flat=True))
+    for deposito_id in depositos:
+        conciliar_deposito_task.delay(schema_name, deposito_id, reparar)
+    return len(depositos)
+
+
+@shared_task
+def conciliar_deposito_task(schema_name, deposito_id, reparar=False):
+    from inventario.services import ConciliacionStockService
+
+    with schema_context(schema_name):
+        resumen = ConciliacionStockService.conciliar_deposito(deposito_id, reparar=reparar)
+    desvios = len(resumen['desvios'])
+    if desvios:
+        logger.warning(
+            "Desvíos de stock | tenant=%s | deposito=%s | desvios=%s | reparados=%s",
+            schema_name, deposito_id, desvios, resumen['reparados']
+        )
+    return {'deposito_id': deposito_id, 'desvios': desvios, 'reparados': resumen['reparados']}
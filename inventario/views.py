@@ -1,15 +1,22 @@
 # inventario/views.py
 # VERSIÓN COMPLETA — reemplaza el archivo existente
 
+import base64
+import binascii
+import itertools
+import json
+
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404
-from django.db.models import F, Q, Sum, DecimalField, Prefetch
+from django.db.models import F, Q, Sum, Count, DecimalField, Prefetch
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
@@ -47,7 +54,7 @@ from .serializers import (
     ProveedorArticuloSerializer,
 )
 from .filters import ArticuloSearchFilter
-from .services import AjusteService, TransferenciaService
+from .services import AjusteService, TransferenciaService, StockManager, filtro_fecha_movimiento
 
 from parametros.models import CategoriaImpositiva
 
@@ -56,6 +63,86 @@ from parametros.models import CategoriaImpositiva
 #  ARTÍCULOS
 # ─────────────────────────────────────────────
 
+KARDEX_LIMITE_PAGINA = 200
+KARDEX_COLUMNAS = [
+    'Fecha', 'Depósito', 'Tipo', 'Origen', 'Referencia', 'Entrada', 'Salida', 'Saldo', 'Usuario', 'Observaciones',
+]
+
+
+def _fecha_param(params, campo):
+    """Fecha AAAA-MM-DD del query param `campo` (None si no viene). ValueError si es inválida."""
+    valor = params.get(campo)
+    if not valor:
+        return None
+    try:
+        fecha = parse_date(valor)
+    except ValueError:  # bien formada pero inexistente (ej. 2025-02-30)
+        fecha = None
+    if fecha is None:
+        raise ValueError(f"Fecha '{campo}' inválida (formato AAAA-MM-DD).")
+    return fecha
+
+
+def _filtros_kardex(params):
+    """(deposito_id, desde, hasta) desde los query params. ValueError si una fecha es inválida."""
+    return params.get('deposito') or None, _fecha_param(params, 'desde'), _fecha_param(params, 'hasta')
+
+
+def _codificar_cursor_kardex(mov):
+    datos = {'f': mov.fecha_movimiento.isoformat(), 'id': mov.pk, 's': str(mov.saldo)}
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+
+def _decodificar_cursor_kardex(cursor):
+    """Cursor keyset -> (fecha_movimiento, pk, saldo acumulado) o None."""
+    if not cursor:
+        return None
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        fecha = parse_datetime(datos['f'])
+        if fecha is None:
+            raise ValueError
+        return fecha, int(datos['id']), Decimal(datos['s'])
+    except (ValueError, KeyError, TypeError, ArithmeticError, binascii.Error):
+        raise ValueError("Cursor de kardex inválido.")
+
+
+def _usuario_kardex(mov):
+    return (mov.usuario.get_full_name() or mov.usuario.username) if mov.usuario else None
+
+
+def _fila_kardex(mov):
+    return {
+        'id': mov.pk,
+        'fecha': mov.fecha_movimiento,
+        'deposito': mov.deposito.nombre if mov.deposito else '',
+        'tipo_codigo': mov.tipo_stock.codigo if mov.tipo_stock else '',
+        'tipo_nombre': mov.tipo_stock.nombre if mov.tipo_stock else '',
+        'origen_sistema': mov.origen_sistema,
+        'origen_referencia': mov.origen_referencia,
+        'entrada': mov.cantidad if mov.cantidad > 0 else Decimal(0),
+        'salida': abs(mov.cantidad) if mov.cantidad < 0 else Decimal(0),
+        'saldo': mov.saldo,
+        'usuario': _usuario_kardex(mov),
+        'observaciones': mov.observaciones,
+    }
+
+
+def _fila_kardex_exportable(mov):
+    return [
+        timezone.localtime(mov.fecha_movimiento).strftime('%d/%m/%Y %H:%M'),
+        mov.deposito.nombre if mov.deposito else '',
+        mov.tipo_stock.codigo if mov.tipo_stock else '',
+        mov.origen_sistema,
+        mov.origen_referencia,
+        mov.cantidad if mov.cantidad > 0 else Decimal(0),
+        abs(mov.cantidad) if mov.cantidad < 0 else Decimal(0),
+        mov.saldo,
+        _usuario_kardex(mov) or '',
+        mov.observaciones,
+    ]
+
+
 class ArticuloViewSet(viewsets.ModelViewSet):
     """
     ViewSet completo para Artículos.
@@ -76,7 +163,7 @@ class ArticuloViewSet(viewsets.ModelViewSet):
             'stocks__deposito',
             'balances_stock__tipo_stock',
             'balances_stock__deposito',
-        ).order_by('cod_articulo')
+        ).with_disponible().order_by('cod_articulo')
 
         # Filtros adicionales por querystring
         rubro_id = self.request.query_params.get('rubro')
@@ -102,7 +189,9 @@ class ArticuloViewSet(viewsets.ModelViewSet):
         if proveedor_id:
             qs = qs.filter(proveedores__pk=proveedor_id).distinct()
 
-        # bajo_minimo requiere proceso en Python (propiedad calculada)
+        if bajo_minimo is not None and bajo_minimo != '':
+            qs = qs.filter(bajo_minimo=(bajo_minimo.lower() == 'true'))
+
         return qs
 
     def get_serializer_class(self):
@@ -164,62 +253,81 @@ class ArticuloViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='kardex')
     def kardex(self, request, pk=None):
         """
-        Kardex del artículo: historial de movimientos con saldo acumulado.
+        Kardex del artículo: movimientos con saldo físico acumulado (calculado en SQL).
+        Paginado por keyset: pasar `cursor` (campo `siguiente` de la respuesta) para
+        la página siguiente. `limite` filas por página (entre 1 y 1000).
         """
         articulo = self.get_object()
-        movimientos = MovimientoStockLedger.objects.filter(
-            articulo=articulo
-        ).select_related('deposito', 'tipo_stock', 'usuario')
-
-        # Filtros opcionales
-        deposito_id = request.query_params.get('deposito')
-        desde = request.query_params.get('desde')
-        hasta = request.query_params.get('hasta')
-
-        if deposito_id:
-            movimientos = movimientos.filter(deposito_id=deposito_id)
-        if desde:
-            movimientos = movimientos.filter(fecha_movimiento__date__gte=desde)
-        if hasta:
-            movimientos = movimientos.filter(fecha_movimiento__date__lte=hasta)
-
-        movimientos = movimientos.order_by('fecha_movimiento', 'pk')
-
-        # Calcular saldo acumulado (solo stock REAL/físico)
-        filas = []
-        saldo = 0
-        for mov in movimientos:
-            impacto = 0
-            if mov.tipo_stock and mov.tipo_stock.es_fisico:
-                impacto = float(mov.cantidad)
-            saldo += impacto
-
-            filas.append({
-                'id': mov.pk,
-                'fecha': mov.fecha_movimiento,
-                'deposito': mov.deposito.nombre if mov.deposito else '',
-                'tipo_codigo': mov.tipo_stock.codigo if mov.tipo_stock else '',
-                'tipo_nombre': mov.tipo_stock.nombre if mov.tipo_stock else '',
-                'origen_sistema': mov.origen_sistema,
-                'origen_referencia': mov.origen_referencia,
-                'entrada': float(mov.cantidad) if mov.cantidad > 0 else 0,
-                'salida': float(abs(mov.cantidad)) if mov.cantidad < 0 else 0,
-                'saldo': round(saldo, 3),
-                'usuario': (
-                    mov.usuario.get_full_name() or mov.usuario.username
-                ) if mov.usuario else None,
-                'observaciones': mov.observaciones,
-            })
+        try:
+            deposito_id, desde, hasta = _filtros_kardex(request.query_params)
+            despues_de = _decodificar_cursor_kardex(request.query_params.get('cursor'))
+            limite = max(1, min(int(request.query_params.get('limite', KARDEX_LIMITE_PAGINA)), 1000))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        saldo_inicial, movimientos = StockManager.kardex(
+            articulo, deposito=deposito_id, desde=desde, hasta=hasta, despues_de=despues_de
+        )
+        pagina = list(movimientos[:limite + 1])
+        hay_mas = len(pagina) > limite
+        pagina = pagina[:limite]
 
+        ultimo = pagina[-1] if pagina else None
         return Response({
             'articulo_id': articulo.pk,
             'cod_articulo': articulo.cod_articulo,
             'descripcion': articulo.descripcion,
-            'saldo_final': round(saldo, 3),
-            'total_movimientos': len(filas),
-            'kardex': filas,
+            'saldo_inicial': saldo_inicial,
+            'saldo_final': ultimo.saldo if ultimo else saldo_inicial,
+            'total_movimientos': len(pagina),
+            'siguiente': _codificar_cursor_kardex(ultimo) if hay_mas else None,
+            'kardex': [_fila_kardex(mov) for mov in pagina],
         })
 
+    @action(detail=True, methods=['get'], url_path='kardex/exportar')
+    def exportar_kardex(self, request, pk=None):
+        """
+        Exporta el kardex completo (mismos filtros) sin cargarlo en memoria.
+        ?formato=csv (streaming, por defecto) | xlsx (openpyxl write-only).
+        """
+        import csv
+        import tempfile
+        from django.http import FileResponse, StreamingHttpResponse
+
+        articulo = self.get_object()
+        try:
+            deposito_id, desde, hasta = _filtros_kardex(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        _, movimientos = StockManager.kardex(articulo, deposito=deposito_id, desde=desde, hasta=hasta)
+        # Cursor server-side: las filas se leen de a bloques
+        filas = (_fila_kardex_exportable(mov) for mov in movimientos.iterator(chunk_size=2000))
+        nombre = f"kardex_{articulo.cod_articulo}"
+
+        if request.query_params.get('formato', 'csv') == 'xlsx':
+            import openpyxl
+
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet('Kardex')
+            ws.append(KARDEX_COLUMNAS)
+            for fila in filas:
+                ws.append(fila)
+            archivo = tempfile.TemporaryFile()
+            wb.save(archivo)
+            archivo.seek(0)
+            return FileResponse(archivo, as_attachment=True, filename=f"{nombre}.xlsx")
+
+        class _Eco:
+            def write(self, valor):
+                return valor
+
+        writer = csv.writer(_Eco())
+        contenido = (writer.writerow(fila) for fila in itertools.chain([KARDEX_COLUMNAS], filas))
+        response = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+        return response
+
     @action(detail=False, methods=['get'], url_path='choices')
     def choices(self, request):
         return Response({
@@ -229,55 +337,98 @@ class ArticuloViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='alertas')
     def alertas(self, request):
         """
-        Devuelve artículos que necesitan reposición (stock <= stock_minimo).
+        Artículos que necesitan reposición (disponible <= stock_minimo), paginados.
+        Ordenados por faltante: los más comprometidos primero.
         """
         articulos = self.get_queryset().filter(
-            administra_stock=True,
             is_active=True,
-            stock_minimo__gt=0,
-        )
-        # Filtrar con la propiedad calculada en Python
-        alertas = [a for a in articulos if a.necesita_reposicion]
-        serializer = ArticuloListSerializer(alertas, many=True)
+            bajo_minimo=True,
+        ).order_by(F('disponible') - F('stock_minimo'), 'cod_articulo')
+
+        pagina = self.paginate_queryset(articulos)
+        serializer = ArticuloListSerializer(pagina, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='disponibilidad')
+    def disponibilidad(self, request):
+        """
+        Disponibilidad de un carrito completo en una sola consulta.
+        Body: {"items": [{"articulo": <id> | "cod_articulo": "...", "cantidad": "2"}], "depositos": [1, 2]}
+        Devuelve real/físico/reservado/en tránsito/disponible por depósito para cada artículo.
+        """
+        items = request.data.get('items') or []
+        depositos = request.data.get('depositos') or None
+        if not isinstance(items, list) or not items:
+            return Response({'error': "Se requiere una lista 'items'."}, status=status.HTTP_400_BAD_REQUEST)
+        if depositos is not None:
+            try:
+                if not isinstance(depositos, list):
+                    raise TypeError
+                depositos = [int(deposito_id) for deposito_id in depositos]
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': "'depositos' debe ser una lista de ids de depósito."}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+        codigos = {i['cod_articulo'] for i in items if isinstance(i, dict) and i.get('cod_articulo')}
+        por_codigo = dict(Articulo.objects.filter(cod_articulo__in=codigos).values_list('cod_articulo', 'pk'))
+
+        lineas = []
+        for item in items:
+            try:
+                articulo_id = int(item['articulo']) if item.get('articulo') else por_codigo[item['cod_articulo']]
+                lineas.append((articulo_id, Decimal(str(item.get('cantidad', 1)))))
+            except (KeyError, TypeError, ValueError, ArithmeticError, AttributeError):
+                return Response({'error': f"Ítem inválido: {item}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado = StockManager.disponibilidad_lote(lineas, depositos=depositos)
         return Response({
-            'count': len(alertas),
-            'results': serializer.data,
+            'alcanza': all(item['alcanza'] for item in resultado.values()),
+            'items': [
+                {
+                    'articulo_id': articulo_id,
+                    'cantidad': item['cantidad'],
+                    'disponible_total': item['disponible_total'],
+                    'alcanza': item['alcanza'],
+                    'depositos': [
+                        {'deposito_id': deposito_id, **saldo}
+                        for deposito_id, saldo in item['depositos'].items()
+                    ],
+                }
+                for articulo_id, item in resultado.items()
+            ],
         })
 
     @action(detail=False, methods=['get'], url_path='dashboard')
     def dashboard(self, request):
         """
         KPIs de inventario para el panel principal.
-        Responde todas las métricas en una sola llamada.
+        Responde todas las métricas en una sola llamada (agregación en SQL).
         """
         total_articulos = Articulo.objects.filter(is_active=True).count()
-        sin_stock = 0
-        bajo_minimo = 0
-        valor_total = 0
 
-        articulos_con_stock = Articulo.objects.filter(
+        kpis = Articulo.objects.filter(
             is_active=True, administra_stock=True
-        ).prefetch_related('stocks', 'balances_stock__tipo_stock')
-
-        for a in articulos_con_stock:
-            disp = float(a.stock_disponible_calculado)
-            if disp <= 0:
-                sin_stock += 1
-            if a.necesita_reposicion:
-                bajo_minimo += 1
-            valor_total += disp * float(a.precio_costo_monto or 0)
+        ).with_disponible().aggregate(
+            sin_stock=Count('pk', filter=Q(disponible__lte=0)),
+            bajo_minimo=Count('pk', filter=Q(bajo_minimo=True)),
+            valor_total=Sum(
+                F('disponible') * F('precio_costo_monto'),
+                output_field=DecimalField(max_digits=20, decimal_places=4),
+            ),
+        )
 
         ultimos_movimientos = MovimientoStockLedger.objects.select_related(
             'articulo', 'deposito', 'tipo_stock'
-        ).order_by('-fecha_registro')[:8]
+        ).order_by('-fecha_movimiento', '-id')[:8]
 
         movimientos_data = LedgerSerializer(ultimos_movimientos, many=True).data
 
         return Response({
             'total_articulos_activos': total_articulos,
-            'articulos_sin_stock': sin_stock,
-            'articulos_bajo_minimo': bajo_minimo,
-            'valor_stock_total': round(valor_total, 2),
+            'articulos_sin_stock': kpis['sin_stock'],
+            'articulos_bajo_minimo': kpis['bajo_minimo'],
+            'valor_stock_total': round(float(kpis['valor_total'] or 0), 2),
             'ultimos_movimientos': movimientos_data,
         })
 
@@ -586,13 +737,16 @@ class LedgerViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         qs = MovimientoStockLedger.objects.select_related(
             'articulo', 'deposito', 'tipo_stock', 'usuario'
-        ).order_by('-fecha_registro')
+        ).order_by('-fecha_movimiento', '-id')
 
         articulo_id = self.request.query_params.get('articulo')
         deposito_id = self.request.query_params.get('deposito')
         origen = self.request.query_params.get('origen_sistema')
-        desde = self.request.query_params.get('desde')
-        hasta = self.request.query_params.get('hasta')
+        try:
+            desde = _fecha_param(self.request.query_params, 'desde')
+            hasta = _fecha_param(self.request.query_params, 'hasta')
+        except ValueError as exc:
+            raise ParseError({'error': str(exc)})
 
         if articulo_id:
             qs = qs.filter(articulo_id=articulo_id)
@@ -600,10 +754,7 @@ class LedgerViewSet(viewsets.ReadOnlyModelViewSet):
             qs = qs.filter(deposito_id=deposito_id)
         if origen:
             qs = qs.filter(origen_sistema=origen)
-        if desde:
-            qs = qs.filter(fecha_movimiento__date__gte=desde)
-        if hasta:
-            qs = qs.filter(fecha_movimiento__date__lte=hasta)
+        qs = qs.filter(**filtro_fecha_movimiento(desde, hasta))
 
         return qs
 
@@ -647,37 +798,43 @@ class BalanceStockViewSet(viewsets.ReadOnlyModelViewSet):
 @staff_member_required
 def kardex_articulo_view(request, articulo_id):
     articulo = get_object_or_404(Articulo, pk=articulo_id)
-    movimientos = MovimientoStockLedger.objects.filter(
-        articulo=articulo
-    ).select_related('deposito', 'tipo_stock', 'usuario').order_by('fecha_movimiento', 'pk')
-
-    deposito_id = request.GET.get('deposito')
-    if deposito_id:
-        movimientos = movimientos.filter(deposito_id=deposito_id)
-
-    filas = []
-    saldo_acumulado = 0
-    for mov in movimientos:
-        impacto = 0
-        if mov.tipo_stock and mov.tipo_stock.es_fisico:
-            impacto = float(mov.cantidad)
-        saldo_acumulado += impacto
-        filas.append({
-            'fecha': mov.fecha_movimiento,
-            'origen': mov.origen_sistema,
-            'referencia': mov.origen_referencia,
-            'deposito': mov.deposito.nombre if mov.deposito else '',
-            'tipo': mov.tipo_stock.nombre if mov.tipo_stock else '',
-            'entrada': float(mov.cantidad) if mov.cantidad > 0 else 0,
-            'salida': float(abs(mov.cantidad)) if mov.cantidad < 0 else 0,
-            'saldo': round(saldo_acumulado, 3),
-            'usuario': mov.usuario,
-        })
+    try:
+        deposito_id, desde, hasta = _filtros_kardex(request.GET)
+        despues_de = _decodificar_cursor_kardex(request.GET.get('cursor'))
+    except ValueError:
+        deposito_id, desde, hasta, despues_de = request.GET.get('deposito'), None, None, None
+
+    saldo_inicial, movimientos = StockManager.kardex(
+        articulo, deposito=deposito_id, desde=desde, hasta=hasta, despues_de=despues_de
+    )
+    pagina = list(movimientos[:KARDEX_LIMITE_PAGINA + 1])
+    hay_mas = len(pagina) > KARDEX_LIMITE_PAGINA
+    pagina = pagina[:KARDEX_LIMITE_PAGINA]
+
+    filas = [{
+        'fecha': mov.fecha_movimiento,
+        'origen': mov.origen_sistema,
+        'referencia': mov.origen_referencia,
+        'deposito': mov.deposito.nombre if mov.deposito else '',
+        'tipo': mov.tipo_stock.nombre if mov.tipo_stock else '',
+        'entrada': mov.cantidad if mov.cantidad > 0 else 0,
+        'salida': abs(mov.cantidad) if mov.cantidad < 0 else 0,
+        'saldo': mov.saldo,
+        'usuario': mov.usuario,
+    } for mov in pagina]
+
+    siguiente = None
+    if hay_mas:
+        parametros = request.GET.copy()
+        parametros['cursor'] = _codificar_cursor_kardex(pagina[-1])
+        siguiente = f"?{parametros.urlencode()}"
 
     context = {
         'articulo': articulo,
         'filas': filas,
-        'saldo_final': saldo_acumulado,
+        'saldo_inicial': saldo_inicial,
+        'saldo_final': pagina[-1].saldo if pagina else saldo_inicial,
+        'siguiente': siguiente,
         'title': f"Ficha de Stock (Kardex): {articulo.descripcion}",
     }
     return render(request, 'admin/inventario/articulo/kardex.html', context)
@@ -742,21 +899,29 @@ class ValorizacionView(viewsets.ViewSet):
         deposito_id  = request.query_params.get('deposito')
         rubro_id     = request.query_params.get('rubro')
         solo_positivo = request.query_params.get('solo_positivo', 'true').lower() == 'true'
+        try:
+            fecha = _fecha_param(request.query_params, 'fecha')
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if fecha:
+            # Valorización histórica: stock REAL al cierre de 'fecha'
+            qs = self._balances_a_fecha(fecha, deposito_id, rubro_id, solo_positivo)
+        else:
+            qs = BalanceStock.objects.filter(
+                tipo_stock__codigo='REAL',
+            ).select_related(
+                'articulo', 'deposito',
+                'articulo__rubro', 'articulo__marca',
+                'articulo__precio_costo_moneda', 'articulo__precio_venta_moneda',
+            )
 
-        qs = BalanceStock.objects.filter(
-            tipo_stock__codigo='REAL',
-        ).select_related(
-            'articulo', 'deposito',
-            'articulo__rubro', 'articulo__marca',
-            'articulo__precio_costo_moneda', 'articulo__precio_venta_moneda',
-        )
-
-        if solo_positivo:
-            qs = qs.filter(cantidad__gt=0)
-        if deposito_id:
-            qs = qs.filter(deposito_id=deposito_id)
-        if rubro_id:
-            qs = qs.filter(articulo__rubro_id=rubro_id)
+            if solo_positivo:
+                qs = qs.filter(cantidad__gt=0)
+            if deposito_id:
+                qs = qs.filter(deposito_id=deposito_id)
+            if rubro_id:
+                qs = qs.filter(articulo__rubro_id=rubro_id)
 
         lineas = []
         total_cantidad  = Decimal('0')
@@ -796,10 +961,33 @@ class ValorizacionView(viewsets.ViewSet):
             'total_costo':    str(total_costo.quantize(Decimal('0.01'))),
             'total_venta':    str(total_venta.quantize(Decimal('0.01'))),
             'fecha_emision':  timezone.now().isoformat(),
+            'fecha_saldo':    fecha.isoformat() if fecha else None,
             'depositos':      [{'id': d.id, 'nombre': d.nombre}
                                for d in Deposito.objects.all().order_by('nombre')],
         })
 
+    @staticmethod
+    def _balances_a_fecha(fecha, deposito_id, rubro_id, solo_positivo):
+        """Saldos REAL al cierre de 'fecha' (snapshot + delta del Ledger) con la forma de BalanceStock."""
+        saldos = StockManager.saldos_a_fecha(
+            fecha,
+            articulos=Articulo.objects.filter(rubro_id=rubro_id) if rubro_id else None,
+            depositos=[deposito_id] if deposito_id else None,
+            tipos_stock=TipoStock.objects.filter(codigo='REAL'),
+        )
+        if solo_positivo:
+            saldos = {clave: cantidad for clave, cantidad in saldos.items() if cantidad > 0}
+
+        articulos = Articulo.objects.select_related(
+            'rubro', 'marca', 'precio_costo_moneda', 'precio_venta_moneda',
+        ).in_bulk({a for a, _, _ in saldos})
+        depositos = Deposito.objects.in_bulk({d for _, d, _ in saldos})
+        return [
+            BalanceStock(articulo=articulos[a], deposito=depositos[d], tipo_stock_id=t, cantidad=cantidad)
+            for (a, d, t), cantidad in saldos.items()
+            if a in articulos and d in depositos
+        ]
+
     @action(detail=False, methods=['get'], url_path='exportar_excel')
     def exportar_excel(self, request):
         import openpyxl
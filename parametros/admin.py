@@ -131,6 +131,9 @@ class ConfiguracionEmpresaAdmin(admin.ModelAdmin):
         ('Facturación Electrónica', {
             'fields': ('usar_factura_electronica', 'modo_facturacion'),
             'description': 'Configure si desea emitir facturas con CAE y si el proceso debe ser automático.'
+        }),
+        ('Stock', {
+            'fields': ('stock_posteo_diferido',),
         })
     )
 
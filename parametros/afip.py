@@ -16,7 +16,8 @@ from urllib3.util.ssl_ import create_urllib3_context
 from pyafipws.wsaa import WSAA
 from pyafipws.wsfev1 import WSFEv1
 # Modelos
-from .models import AfipCertificado, AfipToken, ConfiguracionEmpresa
+from .models import AfipCertificado, AfipToken
+from .maestros import get_config_empresa
 
 # Logs para verificar el XML
 logging.basicConfig(level=logging.INFO)
@@ -38,7 +39,7 @@ class AfipManager:
         self.cache_dir = os.path.join(settings.BASE_DIR, 'afip_cache')
         os.makedirs(self.cache_dir, exist_ok=True)
 
-        config = ConfiguracionEmpresa.objects.first()
+        config = get_config_empresa()
         if not config or not config.usar_factura_electronica:
             raise Exception("Facturación Electrónica desactivada.")
 
@@ -208,7 +209,7 @@ class AfipManager:
 
         pto_vta = 1
         try:
-            config = ConfiguracionEmpresa.objects.first()
+            config = get_config_empresa()
             if config and config.punto_venta_afip: pto_vta = config.punto_venta_afip
         except:
             pass
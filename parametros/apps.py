@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ParametrosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parametros'
+
+    def ready(self):
+        from .maestros import conectar_signals
+        conectar_signals()
@@ -1,6 +1,7 @@
 # parametros/importers/stock_inicial.py
 from .base import BaseImporter
-from inventario.models import Articulo, Deposito, TipoStock, BalanceStock, MovimientoStockLedger, StockArticulo
+from inventario.models import Articulo, Deposito, TipoStock, MovimientoStockLedger
+from inventario.services import ConciliacionStockService
 from parametros.models import CargaMasiva
 from decimal import Decimal
 
@@ -13,8 +14,7 @@ class StockInicialImporter(BaseImporter):
         self.tipo_real = None
 
         self.ledgers_a_crear = []
-        self.balances_a_actualizar = []
-        self.legacies_a_actualizar = []
+        self.claves_afectadas = set()
 
     def pre_procesar(self, columnas):
         columnas = [col.replace('*', '') for col in columnas]
@@ -71,30 +71,14 @@ class StockInicialImporter(BaseImporter):
             )
         )
 
-        # 2. Preparamos las Vistas Materializadas para Upsert
-        self.balances_a_actualizar.append(
-            BalanceStock(articulo_id=art_id, deposito_id=dep_id, tipo_stock=self.tipo_real, cantidad=cantidad)
-        )
-        self.legacies_a_actualizar.append(
-            StockArticulo(articulo_id=art_id, deposito_id=dep_id, cantidad_real=cantidad)
-        )
+        # 2. Clave cuyas vistas materializadas se reconstruyen al final
+        self.claves_afectadas.add((art_id, dep_id, self.tipo_real.pk))
 
     def post_procesar(self):
         # 1. Guardar el historial inmutable
         if self.ledgers_a_crear:
             MovimientoStockLedger.objects.bulk_create(self.ledgers_a_crear, batch_size=500)
 
-        # 2. Actualizar las vistas materializadas (con Upsert nativo)
-        if self.balances_a_actualizar:
-            BalanceStock.objects.bulk_create(
-                self.balances_a_actualizar, batch_size=500, update_conflicts=True,
-                unique_fields=['articulo', 'deposito', 'tipo_stock'],
-                update_fields=['cantidad', 'ultima_actualizacion']
-            )
-
-        if self.legacies_a_actualizar:
-            StockArticulo.objects.bulk_create(
-                self.legacies_a_actualizar, batch_size=500, update_conflicts=True,
-                unique_fields=['articulo', 'deposito'],
-                update_fields=['cantidad_real']
-            )
\ No newline at end of file
+        # 2. BalanceStock y StockArticulo se derivan del Ledger (no se pisan con el valor importado)
+        if self.claves_afectadas:
+            ConciliacionStockService.reconstruir_claves(self.claves_afectadas)
@@ -0,0 +1,258 @@
+# parametros/maestros.py
+"""
+Caché de datos maestros por tenant (TipoStock, ConfiguracionEmpresa, Moneda,
+Impuesto, SerieDocumento, la lista de precios por defecto y los impuestos de cada artículo).
+
+Dos niveles:
+  1. Diccionario en memoria del proceso, revalidado cada MAESTROS_CACHE_TTL_LOCAL
+     segundos contra la versión del grupo (una lectura al caché compartido).
+  2. Alias 'maestros' del caché de Django (Redis en producción), con las claves
+     `maestros:<schema>:<grupo>:<version>`.
+
+Invalidación por versión: los signals post_save/post_delete de cada modelo
+incrementan la versión de su grupo (al momento y de nuevo en el commit, para que
+ningún lector concurrente deje cacheado el valor previo con la versión nueva).
+
+Los objetos devueltos son compartidos: se leen, no se modifican ni se guardan.
+`SerieDocumento.ultimo_numero` no es confiable desde acá (la numeración bloquea la fila).
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+_FALTANTE = object()
+_local = {}
+
+
+def _ttl():
+    return getattr(settings, 'MAESTROS_CACHE_TTL', 3600)
+
+
+def _ttl_local():
+    return getattr(settings, 'MAESTROS_CACHE_TTL_LOCAL', 5)
+
+
+def _cache():
+    return caches['maestros']
+
+
+def _clave_version(schema, grupo):
+    return f"maestros:{schema}:{grupo}:version"
+
+
+def _version(schema, grupo):
+    clave = _clave_version(schema, grupo)
+    cache = _cache()
+    version = cache.get(clave)
+    if version is None:
+        # Arranca en el reloj: si la clave se desaloja, la nueva versión no reutiliza valores viejos
+        cache.add(clave, int(time.time() * 1000), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def _obtener(grupo, cargar):
+    schema = connection.schema_name
+    ahora = time.monotonic()
+    local = _local.get((schema, grupo))
+    if local is not None and ahora - local[1] < _ttl_local():
+        return local[2]
+
+    version = _version(schema, grupo)
+    if local is not None and local[0] == version:
+        _local[(schema, grupo)] = (version, ahora, local[2])
+        return local[2]
+
+    clave = f"maestros:{schema}:{grupo}:{version}"
+    cache = _cache()
+    valor = cache.get(clave, _FALTANTE)
+    if valor is _FALTANTE:
+        valor = cargar()
+        cache.set(clave, valor, _ttl())
+    _local[(schema, grupo)] = (version, ahora, valor)
+    return valor
+
+
+def invalidar(grupo, schema=None):
+    """Descarta el grupo en este proceso y publica una versión nueva para el resto."""
+    schema = schema or connection.schema_name
+    _local.pop((schema, grupo), None)
+    clave = _clave_version(schema, grupo)
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, int(time.time() * 1000), timeout=None)
+
+
+# ─── Accesores tipados ─────────────────────────────────────────────────────
+
+def get_tipos_stock():
+    """{codigo: TipoStock}"""
+    TipoStock = apps.get_model('inventario', 'TipoStock')
+    return _obtener('tipos_stock', lambda: {t.codigo: t for t in TipoStock.objects.all()})
+
+
+def get_tipo_stock(codigo):
+    return get_tipos_stock().get(codigo)
+
+
+def get_config_empresa():
+    ConfiguracionEmpresa = apps.get_model('parametros', 'ConfiguracionEmpresa')
+    return _obtener(
+        'config_empresa',
+        lambda: ConfiguracionEmpresa.objects.select_related('entidad', 'moneda_principal').first()
+    )
+
+
+def get_monedas():
+    """{pk: Moneda}"""
+    Moneda = apps.get_model('parametros', 'Moneda')
+    return _obtener('monedas', lambda: {m.pk: m for m in Moneda.objects.all()})
+
+
+def get_moneda(pk):
+    return get_monedas().get(pk)
+
+
+def get_moneda_por_simbolo(simbolo):
+    return next((m for m in get_monedas().values() if m.simbolo == simbolo), None)
+
+
+def get_moneda_base():
+    return next((m for m in get_monedas().values() if m.es_base), None)
+
+
+def get_impuestos():
+    """{pk: Impuesto}"""
+    Impuesto = apps.get_model('parametros', 'Impuesto')
+    return _obtener('impuestos', lambda: {i.pk: i for i in Impuesto.objects.all()})
+
+
+def get_impuesto(pk):
+    return get_impuestos().get(pk)
+
+
+def get_series():
+    """{pk: SerieDocumento} con tipo_comprobante y deposito_defecto resueltos."""
+    SerieDocumento = apps.get_model('parametros', 'SerieDocumento')
+    return _obtener('series', lambda: {
+        s.pk: s for s in SerieDocumento.objects.select_related('tipo_comprobante', 'deposito_defecto')
+    })
+
+
+def get_serie(pk):
+    return get_series().get(pk)
+
+
+def get_lista_precios_default():
+    PriceList = apps.get_model('ventas', 'PriceList')
+    return _obtener('lista_precios_default', lambda: PriceList.objects.filter(is_default=True).first())
+
+
+def _clave_impuestos_articulo(schema, version, articulo_id):
+    return f"maestros:{schema}:impuestos_articulo:{version}:{articulo_id}"
+
+
+def get_impuestos_articulos(articulo_ids):
+    """
+    {articulo_id: (impuesto_id, ...)} para los artículos pedidos.
+    Una lectura al caché compartido y, para los que falten, una sola consulta.
+    Se cachea por artículo (no el catálogo entero); resolver los Impuesto con get_impuestos().
+    """
+    schema = connection.schema_name
+    version = _version(schema, 'impuestos_articulo')
+    claves = {pk: _clave_impuestos_articulo(schema, version, pk) for pk in set(articulo_ids)}
+    if not claves:
+        return {}
+
+    cache = _cache()
+    encontrados = cache.get_many(list(claves.values()))
+    resultado = {pk: encontrados[clave] for pk, clave in claves.items() if clave in encontrados}
+
+    faltantes = [pk for pk in claves if pk not in resultado]
+    if faltantes:
+        Through = apps.get_model('inventario', 'Articulo').impuestos.through
+        cargados = {pk: [] for pk in faltantes}
+        filas = Through.objects.filter(articulo_id__in=faltantes).values_list('articulo_id', 'impuesto_id')
+        for articulo_id, impuesto_id in filas:
+            cargados[articulo_id].append(impuesto_id)
+        cargados = {pk: tuple(sorted(ids)) for pk, ids in cargados.items()}
+        cache.set_many({claves[pk]: ids for pk, ids in cargados.items()}, _ttl())
+        resultado.update(cargados)
+    return resultado
+
+
+def invalidar_impuestos_articulos(articulo_ids, schema=None):
+    schema = schema or connection.schema_name
+    version = _version(schema, 'impuestos_articulo')
+    _cache().delete_many([_clave_impuestos_articulo(schema, version, pk) for pk in articulo_ids])
+
+
+# ─── Invalidación por signals ──────────────────────────────────────────────
+
+GRUPOS_POR_MODELO = {
+    'inventario.TipoStock': ('tipos_stock',),
+    'parametros.ConfiguracionEmpresa': ('config_empresa',),
+    'parametros.Moneda': ('monedas', 'config_empresa'),
+    # Borrar un Impuesto limpia la tabla intermedia sin m2m_changed
+    'parametros.Impuesto': ('impuestos', 'impuestos_articulo'),
+    'parametros.SerieDocumento': ('series',),
+    'parametros.TipoComprobante': ('series',),
+    'ventas.PriceList': ('lista_precios_default',),
+}
+
+
+def _invalidar_grupos(grupos):
+    schema = connection.schema_name
+    for grupo in grupos:
+        invalidar(grupo, schema)
+    transaction.on_commit(lambda: [invalidar(grupo, schema) for grupo in grupos])
+
+
+def _al_cambiar(sender, instance, **kwargs):
+    # El avance de numeración no cambia nada de lo que se lee desde el caché
+    if sender._meta.label == 'parametros.SerieDocumento' and kwargs.get('update_fields') == frozenset({'ultimo_numero'}):
+        return
+    _invalidar_grupos(GRUPOS_POR_MODELO[sender._meta.label])
+
+
+def _al_cambiar_entidad(sender, instance, **kwargs):
+    # Solo la entidad de la empresa vive dentro de config_empresa
+    config = get_config_empresa()
+    if config is not None and config.entidad_id == instance.pk:
+        _invalidar_grupos(('config_empresa',))
+
+
+def _al_cambiar_impuestos_articulo(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    schema = connection.schema_name
+    if reverse and action == 'post_clear':
+        # impuesto.articulo_set.clear(): no se sabe qué artículos tenía
+        _invalidar_grupos(('impuestos_articulo',))
+        return
+    ids = tuple(pk_set) if reverse else (instance.pk,)
+    invalidar_impuestos_articulos(ids, schema)
+    transaction.on_commit(lambda: invalidar_impuestos_articulos(ids, schema))
+
+
+def conectar_signals():
+    """Lo llama ParametrosConfig.ready()."""
+    for label in GRUPOS_POR_MODELO:
+        modelo = apps.get_model(label)
+        post_save.connect(_al_cambiar, sender=modelo, dispatch_uid=f'maestros_save_{label}')
+        post_delete.connect(_al_cambiar, sender=modelo, dispatch_uid=f'maestros_delete_{label}')
+    Entidad = apps.get_model('entidades', 'Entidad')
+    post_save.connect(_al_cambiar_entidad, sender=Entidad, dispatch_uid='maestros_save_entidad')
+    m2m_changed.connect(
+        _al_cambiar_impuestos_articulo, sender=apps.get_model('inventario', 'Articulo').impuestos.through,
+        dispatch_uid='maestros_impuestos_articulo'
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parametros', '0018_alter_cargamasiva_entidad'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracionempresa',
+            name='stock_legacy_derivado',
+            field=models.BooleanField(default=False, editable=False, help_text="StockArticulo e HistoricoMovimientos son vistas de solo lectura sobre BalanceStock y el Ledger. Se cambia con 'manage.py migrar_stock_legacy', nunca a mano.", verbose_name='Stock Legacy Derivado'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parametros', '0019_configuracionempresa_stock_legacy_derivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracionempresa',
+            name='stock_posteo_diferido',
+            field=models.BooleanField(default=False, help_text='Las ventas confirmadas encolan su movimiento de stock y un proceso en segundo plano lo registra por lotes. Los artículos con stock en tiempo real se siguen descontando al confirmar.', verbose_name='Posteo de Stock Diferido'),
+        ),
+    ]
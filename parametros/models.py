@@ -152,19 +152,33 @@ class TipoComprobante(models.Model):
         verbose_name_plural = "Tipos de Comprobante"
         ordering = ['nombre']
 
+    CODIGOS_NOTA_CREDITO = ('003', '008', '013', '020', '021', '025', '112', '117')
+
     @property
     def es_nota_credito(self):
         """
         Devuelve True si el código AFIP corresponde a una Nota de Crédito.
         Códigos comunes: 003 (A), 008 (B), 013 (C), 020 (A Mipyme), etc.
         """
-        codigos_nc = ['003', '008', '013', '020', '021', '025', '112', '117']
         if self.codigo_afip:
-            return self.codigo_afip in codigos_nc
+            return self.codigo_afip in self.CODIGOS_NOTA_CREDITO
 
         # Fallback por nombre si no hay código AFIP
         return 'NOTA DE CREDITO' in self.nombre.upper() or 'N/C' in self.nombre.upper()
 
+    @classmethod
+    def q_nota_credito(cls, prefijo=''):
+        """
+        es_nota_credito como filtro de consulta. `prefijo`: camino desde el modelo
+        consultado, p. ej. 'tipo_comprobante__'.
+        """
+        def _q(**filtro):
+            return models.Q(**{f'{prefijo}{campo}': valor for campo, valor in filtro.items()})
+
+        sin_codigo = _q(codigo_afip__isnull=True) | _q(codigo_afip='')
+        por_nombre = _q(nombre__icontains='NOTA DE CREDITO') | _q(nombre__icontains='N/C')
+        return _q(codigo_afip__in=cls.CODIGOS_NOTA_CREDITO) | (sin_codigo & por_nombre)
+
 
 class Contador(models.Model):
     nombre = models.CharField(max_length=100, unique=True, help_text="Nombre clave del contador, ej: 'codigo_articulo'")
@@ -433,6 +447,21 @@ class ConfiguracionEmpresa(models.Model):
         help_text="Automático: Intenta obtener CAE al guardar. Manual: Requiere acción del usuario."
     )
 
+    stock_legacy_derivado = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Stock Legacy Derivado",
+        help_text="StockArticulo e HistoricoMovimientos son vistas de solo lectura sobre BalanceStock y el Ledger. "
+                  "Se cambia con 'manage.py migrar_stock_legacy', nunca a mano."
+    )
+
+    stock_posteo_diferido = models.BooleanField(
+        default=False,
+        verbose_name="Posteo de Stock Diferido",
+        help_text="Las ventas confirmadas encolan su movimiento de stock y un proceso en segundo plano lo registra "
+                  "por lotes. Los artículos con stock en tiempo real se siguen descontando al confirmar."
+    )
+
     class Meta:
         verbose_name = "Configuración de Empresa"
         verbose_name_plural = "Configuración de Empresa"
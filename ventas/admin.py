@@ -12,15 +12,17 @@ from decimal import Decimal, ROUND_HALF_UP
 from djmoney.money import Money
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import F
 from django.apps import apps  # <--- Necesario para cargar modelos dinámicamente
 
 # Modelos
 from .models import (
     Cliente, ComprobanteVenta, ComprobanteVentaItem,
     ComprobanteCobroItem,
-    PriceList, ProductPrice,
+    PriceList, ProductPrice, PrecioEfectivo,
     Recibo, ReciboImputacion, ReciboValor,
-    ComprobantePendienteCAE, DisenoImpresion
+    ComprobantePendienteCAE, DisenoImpresion, PosteoStockPendiente, IngestaComprobante,
+    ConversionMasiva, SaldoCierreMensual, SaldoCliente
 )
 
 # Modelos Finanzas (Para Tarjetas y Cajas)
@@ -343,12 +345,15 @@ class ComprobanteVentaAdmin(admin.ModelAdmin):
             self.message_user(request, f"❌ NO SE PUDO CONFIRMAR: {error_msg}", level=messages.ERROR)
 
             if obj.pk:
-                ComprobanteVenta.objects.filter(pk=obj.pk).update(estado=ComprobanteVenta.Estado.BORRADOR)
+                if ComprobanteVenta.objects.filter(pk=obj.pk).update(
+                    estado=ComprobanteVenta.Estado.BORRADOR, version=F('version') + 1
+                ):
+                    obj.refresh_from_db(fields=['version'])
                 obj.estado = ComprobanteVenta.Estado.BORRADOR
 
     def _intentar_facturar_safe(self, obj):
-        from parametros.models import ConfiguracionEmpresa
-        config = ConfiguracionEmpresa.objects.first()
+        from parametros.maestros import get_config_empresa
+        config = get_config_empresa()
 
         # Validación 1: Si no hay config o la factura electrónica está apagada
         if not config or not getattr(config, 'usar_factura_electronica', True):
@@ -365,6 +370,8 @@ class ComprobanteVentaAdmin(admin.ModelAdmin):
 
         # Si todo es correcto, intentamos emitir
         try:
+            # on_commit: el cobro automático pudo actualizar el comprobante (versión) desde el save_model
+            obj.refresh_from_db()
             manager = AfipManager()
             manager.emitir_comprobante(obj)
         except:
@@ -451,8 +458,9 @@ class ComprobanteVentaAdmin(admin.ModelAdmin):
         obj.subtotal = subtotal_calculado.amount
         obj.total = total_money.amount
 
-        # Ajuste de saldo inicial
-        if obj.saldo_pendiente == 0 or abs(obj.saldo_pendiente - obj.total) < 10:
+        # Ajuste de saldo inicial (si ya tiene cobros imputados, el saldo es el que dejaron)
+        if not ReciboImputacion.objects.filter(comprobante=obj).exists() and \
+                (obj.saldo_pendiente == 0 or abs(obj.saldo_pendiente - obj.total) < 10):
             obj.saldo_pendiente = obj.total
 
         try:
@@ -469,7 +477,10 @@ class ComprobanteVentaAdmin(admin.ModelAdmin):
             self.message_user(request, f"⚠️ ERROR: {error_msg}. Se guardó como BORRADOR.",
                               level=messages.ERROR)
 
-            ComprobanteVenta.objects.filter(pk=obj.pk).update(estado=ComprobanteVenta.Estado.BORRADOR)
+            if ComprobanteVenta.objects.filter(pk=obj.pk).update(
+                estado=ComprobanteVenta.Estado.BORRADOR, version=F('version') + 1
+            ):
+                obj.refresh_from_db(fields=['version'])
             obj.estado = ComprobanteVenta.Estado.BORRADOR
 
     def _procesar_cobro_multiple(self, request, comprobante, cobros):
@@ -544,6 +555,8 @@ class ComprobanteVentaAdmin(admin.ModelAdmin):
 
             # 4. Mover Fondos
             recibo.aplicar_finanzas()
+            # aplicar_finanzas actualiza el comprobante (saldo y versión): el formset siguiente lo vuelve a guardar
+            comprobante.refresh_from_db()
 
             self.message_user(request, f"✅ Cobro registrado (Recibo #{recibo.numero}): ${total_cobrado:,.2f}",
                               level=messages.SUCCESS)
@@ -910,5 +923,99 @@ class DisenoImpresionAdmin(admin.ModelAdmin):
         return bool(obj.cuerpo_email)
 
 
+@admin.register(PosteoStockPendiente)
+class PosteoStockPendienteAdmin(admin.ModelAdmin):
+    """Outbox del posteo de stock diferido. Solo lectura, salvo reintentar los bloqueados."""
+    list_display = ('comprobante', 'creado_en', 'procesado_en', 'intentos', 'ultimo_error')
+    list_filter = (('procesado_en', admin.EmptyFieldListFilter),)
+    search_fields = ('comprobante__numero',)
+    list_select_related = ('comprobante',)
+    actions = ['reintentar']
+
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+    def has_delete_permission(self, request, obj=None): return False
+
+    @admin.action(description="Reintentar posteos con error")
+    def reintentar(self, request, queryset):
+        cantidad = queryset.filter(procesado_en__isnull=True).update(intentos=0)
+        self.message_user(request, f"{cantidad} posteos vuelven a la cola.", messages.SUCCESS)
+
+
+@admin.register(PrecioEfectivo)
+class PrecioEfectivoAdmin(admin.ModelAdmin):
+    """Tabla materializada de precios: solo lectura (la mantienen los signals de precios)."""
+    list_display = ('price_list', 'articulo', 'min_quantity', 'max_quantity', 'precio_neto', 'precio_final',
+                    'moneda', 'actualizado_en')
+    list_filter = ('price_list', 'es_base')
+    search_fields = ('articulo__cod_articulo', 'articulo__descripcion')
+    list_select_related = ('price_list', 'articulo', 'moneda')
+
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+    def has_delete_permission(self, request, obj=None): return False
+
+
+@admin.register(SaldoCliente)
+class SaldoClienteAdmin(admin.ModelAdmin):
+    """Proyección de saldos por cliente: solo lectura (la mantiene SaldoClienteService)."""
+    list_display = ('cliente', 'saldo', 'vencido', 'credito_disponible', 'ventas_30d', 'ventas_90d',
+                    'ultima_compra', 'actualizado_en')
+    search_fields = ('cliente__codigo_cliente', 'cliente__entidad__razon_social')
+    list_select_related = ('cliente__entidad',)
+
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+    def has_delete_permission(self, request, obj=None): return False
+
+
+@admin.register(SaldoCierreMensual)
+class SaldoCierreMensualAdmin(admin.ModelAdmin):
+    """Cierres mensuales de cuenta corriente: solo lectura (los mantiene SaldoCierreMensualService)."""
+    list_display = ('cliente', 'mes', 'saldo', 'calculado_en')
+    list_filter = ('mes',)
+    search_fields = ('cliente__codigo_cliente', 'cliente__entidad__razon_social')
+    list_select_related = ('cliente__entidad',)
+
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+    def has_delete_permission(self, request, obj=None): return False
+
+
+@admin.register(IngestaComprobante)
+class IngestaComprobanteAdmin(admin.ModelAdmin):
+    """Claves de idempotencia de la ingesta masiva: solo lectura."""
+    list_display = ('clave', 'comprobante', 'creado_en')
+    search_fields = ('clave', 'comprobante__numero')
+    list_select_related = ('comprobante__tipo_comprobante',)
+
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+    def has_delete_permission(self, request, obj=None): return False
+
+
+@admin.register(ConversionMasiva)
+class ConversionMasivaAdmin(admin.ModelAdmin):
+    """Corridas de conversión masiva y su avance: solo lectura (se lanzan desde la API)."""
+    list_display = ('pk', 'regla', 'cliente', 'fecha_desde', 'fecha_hasta', 'estado', 'total', 'procesados',
+                    'convertidos', 'omitidos', 'con_error', 'creado_en')
+    list_filter = ('estado', 'regla')
+    list_select_related = ('regla__tipo_origen', 'regla__tipo_destino', 'cliente__entidad')
+
+    def has_add_permission(self, request): return False
+
+    def has_change_permission(self, request, obj=None): return False
+
+
 auditlog.register(ComprobanteVenta)
 auditlog.register(Cliente)
\ No newline at end of file
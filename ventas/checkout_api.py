@@ -0,0 +1,299 @@
+# ventas/checkout_api.py
+#
+# ═══════════════════════════════════════════════════════════════════════════
+#  MÓDULO: Checkout exprés de POS (tickets CONTADO)
+#
+#  Camino rápido para el alta de una venta contado ya cobrada: comprobante
+#  CONFIRMADO + ítems + stock + recibo con valores, en una sola transacción,
+#  con inserts masivos y totales calculados antes de escribir. No pasa por el
+#  serializer anidado ni por el recálculo/refresh del ComprobanteVentaViewSet.
+#
+#  PRESUPUESTO DE CONSULTAS (cachés de maestros calientes, pagos con tipo_valor
+#  y destino explícitos): CheckoutService.PRESUPUESTO_CONSULTAS por ticket, sin
+#  importar la cantidad de líneas ni de pagos, más un UPDATE por cada cuenta
+#  destino adicional. Fuera del presupuesto:
+#    - ítems sin precio (se cotizan con PricingService.cotizar_lote),
+#    - pagos con 'metodo' en lugar de tipo_valor/destino (se infieren como en el alta general).
+#  Pagos en cuotas (recargo) y con cheque no entran al camino rápido: usar
+#  POST comprobantes-venta/.
+#
+#  Benchmark de latencia p50/p99 por ticket: manage.py benchmark_checkout.
+# ═══════════════════════════════════════════════════════════════════════════
+
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from finanzas.models import CuentaFondo, MovimientoFondo, TipoValor
+from inventario.models import Articulo, Deposito
+from inventario.services import StockManager
+from parametros.maestros import get_serie, get_series
+
+from .models import Cliente, ComprobanteVenta, ComprobanteVentaItem, Recibo, ReciboImputacion, ReciboValor
+from .services import PosteoStockService, PricingService, TaxCalculatorService
+
+CENTAVO = Decimal('0.01')
+
+
+def _q2(valor):
+    return Decimal(str(valor or 0)).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+class CheckoutService:
+    PRESUPUESTO_CONSULTAS = 30
+    TOLERANCIA_PAGO = Decimal('0.05')  # la misma que Recibo.aplicar_finanzas
+
+    @staticmethod
+    def _serie(datos):
+        if datos.get('serie'):
+            serie = get_serie(int(datos['serie']))
+        else:
+            tipo_id = int(datos.get('tipo_comprobante') or 0)
+            punto_venta = int(datos.get('punto_venta') or 1)
+            serie = next((
+                s for s in get_series().values()
+                if s.tipo_comprobante_id == tipo_id and s.punto_venta == punto_venta and s.activo
+            ), None)
+        if serie is None:
+            raise ValidationError("No hay una serie activa para el tipo de comprobante y punto de venta.")
+        return serie
+
+    @staticmethod
+    def _deposito(datos, serie):
+        if datos.get('deposito'):
+            return Deposito.objects.get(pk=datos['deposito'])
+        return serie.deposito_defecto or Deposito.objects.filter(es_principal=True).first()
+
+    @staticmethod
+    def _items(datos, cliente, comprobante, articulos=None):
+        """Ítems en memoria. `articulos` ({cod_articulo: Articulo}) evita la consulta si ya se resolvieron."""
+        lineas = datos.get('items') or []
+        if not lineas:
+            raise ValidationError("El ticket no tiene ítems.")
+        if articulos is None:
+            articulos = {
+                a.cod_articulo: a
+                for a in Articulo.objects.filter(cod_articulo__in={l.get('articulo') for l in lineas})
+            }
+        faltantes = {l.get('articulo') for l in lineas} - set(articulos)
+        if faltantes:
+            raise ValidationError(f"Artículos inexistentes: {', '.join(sorted(map(str, faltantes)))}.")
+
+        items = [
+            ComprobanteVentaItem(
+                comprobante=comprobante,
+                articulo=articulos[l['articulo']],
+                cantidad=Decimal(str(l.get('cantidad', '1'))),
+                precio_unitario_original=(
+                    Decimal(str(l['precio_unitario_original'])) if l.get('precio_unitario_original') not in (None, '')
+                    else None
+                ),
+                descuento_pct=Decimal(str(l.get('descuento_pct') or 0)),
+            )
+            for l in lineas
+        ]
+        sin_precio = [item for item in items if item.precio_unitario_original is None]
+        if sin_precio:
+            cotizados = PricingService.cotizar_lote(cliente, [(i.articulo_id, i.cantidad) for i in sin_precio])
+            for item, precio in zip(sin_precio, cotizados):
+                item.precio_unitario_original = _q2(precio.precio_venta_neto.amount)
+        return items
+
+    @staticmethod
+    def _totales(comprobante, items):
+        """Mismo criterio que el recálculo del alta general, sobre los ítems en memoria."""
+        subtotal = sum((item.subtotal for item in items), Decimal('0.00'))
+        impuestos = TaxCalculatorService.calcular_impuestos_lineas(
+            [(item.articulo_id, item.cantidad, item.subtotal) for item in items], 'venta'
+        )
+        total_impuestos = sum(impuestos.values(), Decimal('0.00'))
+        desc_pct = comprobante.descuento_global_pct or Decimal('0')
+        if desc_pct > 0:
+            factor = Decimal('1') - desc_pct / Decimal('100')
+            subtotal = _q2(subtotal * factor)
+            total_impuestos = _q2(total_impuestos * factor)
+        comprobante.subtotal = _q2(subtotal)
+        comprobante.impuestos = {k: str(_q2(v)) for k, v in impuestos.items()}
+        comprobante.total = _q2(subtotal + total_impuestos)
+
+    @staticmethod
+    def _pagos(datos, total, tipos=None, destinos=None):
+        """`tipos` / `destinos` ({pk: objeto}) evitan las consultas si ya se resolvieron para un lote."""
+        pagos = [p for p in (datos.get('pagos') or []) if _q2(p.get('monto')) > 0]
+        if not pagos:
+            raise ValidationError("El ticket contado requiere al menos un pago.")
+        if any(p.get('opcion_cuota') for p in pagos):
+            raise ValidationError("Pagos en cuotas: usar el alta general de comprobantes.")
+
+        if tipos is None:
+            tipos = TipoValor.objects.in_bulk({p['tipo_valor'] for p in pagos if p.get('tipo_valor')})
+        if destinos is None:
+            destinos = CuentaFondo.objects.in_bulk({p['destino'] for p in pagos if p.get('destino')})
+
+        resueltos = []
+        for pago in pagos:
+            if pago.get('tipo_valor') and pago.get('destino'):
+                tipo, destino = tipos.get(int(pago['tipo_valor'])), destinos.get(int(pago['destino']))
+                if tipo is None or destino is None:
+                    raise ValidationError("Tipo de valor o cuenta destino inexistente.")
+            else:
+                # Mismo criterio de inferencia que el alta general (fuera del presupuesto de consultas)
+                from .views import _infer_tipo_valor_from_pago, _resolve_destino_from_pago
+                tipo, destino = _infer_tipo_valor_from_pago(pago), _resolve_destino_from_pago(pago)
+            if tipo.es_cheque:
+                raise ValidationError("Pagos con cheque: usar el alta general de comprobantes.")
+            if tipo.requiere_banco and not pago.get('banco_origen'):
+                raise ValidationError(f"El tipo de valor '{tipo.nombre}' requiere banco de origen.")
+            resueltos.append((pago, tipo, destino, _q2(pago['monto'])))
+
+        total_pagado = sum((monto for _, _, _, monto in resueltos), Decimal('0.00'))
+        if abs(total_pagado - total) > CheckoutService.TOLERANCIA_PAGO:
+            raise ValidationError(f"Desbalance: Valores ${total_pagado} vs Total ${total}.")
+        return resueltos, total_pagado
+
+    @staticmethod
+    def _postear_stock(comprobante, items):
+        if not comprobante.stock_aplicado:
+            return 'no_aplica'
+        if PosteoStockService.usa_posteo_diferido(items):
+            PosteoStockService.encolar(comprobante)
+            return 'diferido'
+        lineas = PosteoStockService.lineas_comprobante(comprobante, items, asociados=())
+        if lineas:
+            StockManager.registrar_movimientos_lote(
+                lineas, origen_sistema='VENTAS', origen_referencia=PosteoStockService.referencia(comprobante)
+            )
+        return 'aplicado'
+
+    @staticmethod
+    def _registrar_cobros(cobros, usuario):
+        """
+        Recibos ya aplicados para muchos comprobantes contado: recibos, valores,
+        imputaciones y movimientos de fondo en bloque, y un UPDATE de saldo por cuenta.
+
+        Args:
+            cobros: [(comprobante, pagos resueltos por _pagos, total_pagado)]
+        Returns:
+            list[Recibo] en el mismo orden.
+        """
+        recibos = Recibo.objects.bulk_create([
+            Recibo(
+                cliente=comprobante.cliente,
+                fecha=comprobante.fecha,
+                estado=Recibo.Estado.CONFIRMADO,
+                origen=Recibo.Origen.CONTADO,
+                observaciones=f"Cobro auto. Factura {comprobante.numero_completo}",
+                monto_total=total_pagado,
+                finanzas_aplicadas=True,
+                created_by=usuario,
+            )
+            for comprobante, _, total_pagado in cobros
+        ])
+        valores, imputaciones, movimientos = [], [], []
+        por_cuenta = defaultdict(Decimal)
+        for recibo, (comprobante, pagos, _) in zip(recibos, cobros):
+            imputaciones.append(
+                ReciboImputacion(recibo=recibo, comprobante=comprobante, monto_imputado=comprobante.total)
+            )
+            concepto = f"Cobro Recibo #{recibo.numero} - {comprobante.cliente}"
+            for pago, tipo, destino, monto in pagos:
+                valores.append(ReciboValor(
+                    recibo=recibo, tipo=tipo, monto=monto, destino=destino,
+                    observaciones=(pago.get('observaciones') or pago.get('nota') or '').strip()[:150],
+                    banco_origen_id=pago.get('banco_origen') or None,
+                    referencia=(pago.get('referencia') or pago.get('nota') or pago.get('tarjeta_cupon') or '')[:100],
+                    fecha_cobro=pago.get('fecha_cobro') or None,
+                ))
+                movimientos.append(MovimientoFondo(
+                    fecha=recibo.fecha, cuenta=destino, tipo_movimiento=MovimientoFondo.TipoMov.INGRESO,
+                    tipo_valor=tipo, monto_ingreso=monto, monto_egreso=0, concepto=concepto[:200], usuario=usuario,
+                ))
+                por_cuenta[destino.pk] += monto
+
+        ReciboValor.objects.bulk_create(valores)
+        ReciboImputacion.objects.bulk_create(imputaciones)
+        MovimientoFondo.objects.bulk_create(movimientos)
+        for cuenta_id, monto in sorted(por_cuenta.items()):
+            CuentaFondo.objects.filter(pk=cuenta_id).update(saldo_monto=F('saldo_monto') + monto)
+        return recibos
+
+    @staticmethod
+    @transaction.atomic
+    def checkout_contado(datos, usuario):
+        """
+        Alta de un ticket contado cobrado. Devuelve (comprobante, recibo, estado_stock).
+        ValidationError si algo no cierra (nada queda escrito).
+        """
+        cliente = Cliente.objects.select_related('entidad').get(pk=datos.get('cliente'))
+        serie = CheckoutService._serie(datos)
+        comprobante = ComprobanteVenta(
+            serie=serie,
+            tipo_comprobante=serie.tipo_comprobante,
+            cliente=cliente,
+            fecha=timezone.now(),
+            estado=ComprobanteVenta.Estado.CONFIRMADO,
+            condicion_venta=ComprobanteVenta.CondicionVenta.CONTADO,
+            descuento_global_pct=Decimal(str(datos.get('descuento_global_pct') or 0)),
+            deposito=CheckoutService._deposito(datos, serie),
+            observaciones=datos.get('observaciones') or None,
+        )
+        items = CheckoutService._items(datos, cliente, comprobante)
+        CheckoutService._totales(comprobante, items)
+        pagos, total_pagado = CheckoutService._pagos(datos, comprobante.total)
+        ComprobanteVentaItem.validar_stock_lote(comprobante, items)
+
+        # Se inserta ya pagado y con el stock reclamado: el signal de stock no vuelve a
+        # postearlo y el de CAE lo encola al commit como cualquier comprobante confirmado.
+        comprobante.saldo_pendiente = Decimal('0.00')
+        comprobante.stock_aplicado = bool(serie.tipo_comprobante.mueve_stock)
+        comprobante.save()
+
+        ComprobanteVentaItem.objects.bulk_create(items)
+        estado_stock = CheckoutService._postear_stock(comprobante, items)
+        recibo, = CheckoutService._registrar_cobros([(comprobante, pagos, total_pagado)], usuario)
+        return comprobante, recibo, estado_stock
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def checkout_contado_api(request):
+    """
+    Body JSON:
+        {
+          "cliente": 1, "serie": 3,            (o "tipo_comprobante" + "punto_venta")
+          "deposito": 1, "descuento_global_pct": "0",            (opcionales)
+          "items": [{"articulo": "A0001", "cantidad": "2", "precio_unitario_original": "150.00",
+                     "descuento_pct": "0"}],                     (sin precio: se cotiza)
+          "pagos": [{"tipo_valor": 1, "destino": 1, "monto": "363.00"}]
+        }
+    Respuesta 201 compacta con el comprobante, el recibo y el estado del stock.
+    """
+    try:
+        comprobante, recibo, estado_stock = CheckoutService.checkout_contado(request.data, request.user)
+    except Cliente.DoesNotExist:
+        return Response({'error': 'Cliente no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+    except ValidationError as e:
+        return Response({'error': '; '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+    except (Deposito.DoesNotExist, KeyError, TypeError, ValueError, ArithmeticError) as e:
+        return Response({'error': f'Datos inválidos: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'id': comprobante.pk,
+        'numero': comprobante.numero,
+        'numero_completo': comprobante.numero_completo,
+        'fecha': comprobante.fecha.isoformat(),
+        'subtotal': str(comprobante.subtotal),
+        'impuestos': comprobante.impuestos,
+        'total': str(comprobante.total),
+        'saldo_pendiente': str(comprobante.saldo_pendiente),
+        'recibo': recibo.pk,
+        'stock': estado_stock,
+    }, status=status.HTTP_201_CREATED)
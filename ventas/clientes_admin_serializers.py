@@ -1,6 +1,5 @@
 # clientes_admin_serializers.py
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
 from rest_framework import serializers
 
 from entidades.models import (
@@ -10,7 +9,7 @@ from entidades.models import (
     EntidadEmail,
     SituacionIVA,
 )
-from ventas.models import Cliente, PriceList, ComprobanteVenta
+from ventas.models import Cliente, PriceList
 
 
 User = get_user_model()
@@ -187,13 +186,9 @@ class ClienteAdminListSerializer(serializers.ModelSerializer):
         return str(price_list)
 
     def get_saldo(self, obj):
+        # Proyección SaldoCliente (select_related en la vista): sin agregar comprobantes por fila
         try:
-            result = ComprobanteVenta.objects.filter(
-                cliente=obj,
-                estado=ComprobanteVenta.Estado.CONFIRMADO,
-                condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE,
-            ).aggregate(total=Sum('saldo_pendiente'))
-            return float(result['total'] or 0)
+            return float(obj.saldo_cuenta.saldo_cta_cte)
         except Exception:
             return 0.0
 
@@ -287,13 +282,9 @@ class ClienteAdminDetailSerializer(serializers.ModelSerializer):
         }
 
     def get_saldo(self, obj):
+        # Proyección SaldoCliente (select_related en la vista): sin agregar comprobantes por fila
         try:
-            result = ComprobanteVenta.objects.filter(
-                cliente=obj,
-                estado=ComprobanteVenta.Estado.CONFIRMADO,
-                condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE,
-            ).aggregate(total=Sum('saldo_pendiente'))
-            return float(result['total'] or 0)
+            return float(obj.saldo_cuenta.saldo_cta_cte)
         except Exception:
             return 0.0
 
@@ -39,6 +39,7 @@ class ClienteAdminViewSet(viewsets.ModelViewSet):
         'entidad__situacion_iva',
         'price_list',
         'vendedor',
+        'saldo_cuenta',
     ).order_by('entidad__razon_social')
 
     filter_backends = [filters.OrderingFilter]
@@ -0,0 +1,147 @@
+# ventas/clientes_dashboard_cache.py
+"""
+Caché del dashboard de clientes por (tenant, cliente), en el alias 'reportes'
+(las claves quedan prefijadas por el schema).
+
+- Versión por cliente (`dashboard_cliente:<pk>:version`): la incrementan, en el
+  commit, los signals de ComprobanteVenta, Recibo, ReciboImputacion y Cliente de
+  ese cliente. Solo en el commit: un lector concurrente que todavía ve los datos
+  viejos los guarda con la versión vieja, nunca con la nueva.
+- `dashboard_cliente:<pk>` guarda (versión, datos, vence_en) del último cálculo.
+  Si la versión cambió o venció el TTL se sirve igual (stale-while-revalidate) y
+  una tarea de Celery lo rehace en segundo plano, una sola por versión.
+- Sin ningún valor, lo calcula el pedido (un proceso a la vez, erp_project.cache).
+
+Los aciertos, vencidos y fallos se cuentan por tenant: ver estadisticas().
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django_tenants.utils import schema_context
+
+from erp_project.cache import obtener_o_calcular
+from .clientes_dashboard_service import ClienteDashboardService
+
+logger = logging.getLogger(__name__)
+
+EVENTOS = ('aciertos', 'vencidos', 'fallos')
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_CLIENTE_CACHE_TTL', 300)
+
+
+def _gracia():
+    return getattr(settings, 'DASHBOARD_CLIENTE_CACHE_GRACIA', 86400)
+
+
+def _cache():
+    return caches['reportes']
+
+
+def _clave(cliente_id):
+    return f"dashboard_cliente:{cliente_id}"
+
+
+def _clave_version(cliente_id):
+    return f"dashboard_cliente:{cliente_id}:version"
+
+
+def _clave_contador(evento):
+    return f"dashboard_cliente:estadisticas:{evento}"
+
+
+def _version(cliente_id):
+    clave = _clave_version(cliente_id)
+    cache = _cache()
+    version = cache.get(clave)
+    if version is None:
+        # Arranca en el reloj: si la clave se desaloja, la versión nueva no coincide con valores viejos
+        cache.add(clave, int(time.time() * 1000), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def _contar(evento):
+    clave = _clave_contador(evento)
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+
+def invalidar(cliente_id):
+    """Publica una versión nueva del dashboard del cliente."""
+    clave = _clave_version(cliente_id)
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, int(time.time() * 1000), timeout=None)
+
+
+def invalidar_al_confirmar(cliente_id):
+    """invalidar() cuando confirma la transacción en curso (o ya, si no hay ninguna)."""
+    if not cliente_id:
+        return
+    schema = connection.schema_name
+
+    def _invalidar():
+        with schema_context(schema):
+            invalidar(cliente_id)
+
+    transaction.on_commit(_invalidar)
+
+
+def recalcular(cliente, version=None):
+    """Calcula el dashboard y lo deja como último valor, salvo que ya haya uno de una versión más nueva."""
+    version = _version(cliente.pk) if version is None else version
+    datos = ClienteDashboardService.build_dashboard(cliente)
+    cache = _cache()
+    actual = cache.get(_clave(cliente.pk))
+    if actual is None or actual[0] <= version:
+        cache.set(_clave(cliente.pk), (version, datos, time.time() + _ttl()), _ttl() + _gracia())
+    return datos
+
+
+def _encolar(cliente_id, version):
+    if not _cache().add(f"{_clave(cliente_id)}:encolado:{version}", 1, 60):
+        return
+    from .tasks import recalcular_dashboard_cliente_task
+    try:
+        recalcular_dashboard_cliente_task.delay(connection.schema_name, cliente_id)
+    except Exception as exc:
+        logger.warning("Dashboard de cliente %s: no se pudo encolar el recálculo (%s)", cliente_id, exc)
+
+
+def obtener(cliente):
+    """Dashboard del cliente desde el caché (ver el docstring del módulo)."""
+    version = _version(cliente.pk)
+    entrada = _cache().get(_clave(cliente.pk))
+    if entrada is not None:
+        version_datos, datos, vence_en = entrada
+        if version_datos == version and time.time() < vence_en:
+            _contar('aciertos')
+        else:
+            _contar('vencidos')
+            _encolar(cliente.pk, version)
+        return datos
+
+    _contar('fallos')
+    return obtener_o_calcular(
+        f"{_clave(cliente.pk)}:calculo:{version}", lambda: recalcular(cliente, version), ttl=_ttl(), gracia=0
+    )
+
+
+def estadisticas():
+    """Contadores del tenant y tasa de aciertos (servidos desde el caché, frescos o vencidos)."""
+    valores = _cache().get_many([_clave_contador(evento) for evento in EVENTOS])
+    conteo = {evento: valores.get(_clave_contador(evento), 0) for evento in EVENTOS}
+    total = sum(conteo.values())
+    conteo['tasa_aciertos'] = round((conteo['aciertos'] + conteo['vencidos']) / total, 4) if total else None
+    return conteo
@@ -1,8 +1,9 @@
 from decimal import Decimal
-from django.db.models import Sum, Avg
 from django.utils import timezone
 
-from .models import Cliente, ComprobanteVenta, Recibo
+from .cuenta_corriente_api import CuentaCorrienteService
+from .models import Cliente, ComprobanteVenta
+from .services import AntiguedadSaldosService, SaldoClienteService
 
 
 def _to_decimal(value):
@@ -83,34 +84,27 @@ def _clasificar_condicion(comp, cliente):
 
 
 class ClienteDashboardService:
+    MOVIMIENTOS_CTA_CTE = 50
+
     @classmethod
     def build_dashboard(cls, cliente: Cliente):
         hoy = timezone.localdate()
 
+        # Totales desde la proyección SaldoCliente; el aging por tramos, del índice de abiertos
+        saldo_cliente = SaldoClienteService.de_cliente(cliente)
+        saldo_total = saldo_cliente.saldo
+        deuda_vencida = saldo_cliente.vencido
+        deuda_no_vencida = saldo_cliente.no_vencido
+        comprobantes_impagos = saldo_cliente.comprobantes_impagos
+        antiguedad = AntiguedadSaldosService.de_cliente(cliente, al=hoy)
+        aging_90_plus = antiguedad['90_plus']
+
         comprobantes_con_saldo = (
-            ComprobanteVenta.objects
-            .filter(
-                cliente=cliente,
-                estado=ComprobanteVenta.Estado.CONFIRMADO,
-                saldo_pendiente__gt=0,
-            )
+            AntiguedadSaldosService.abiertos(clientes=[cliente])
             .select_related('tipo_comprobante')
             .order_by('fecha', 'numero')
         )
 
-        saldo_total = _to_decimal(
-            comprobantes_con_saldo.aggregate(total=Sum('saldo_pendiente')).get('total')
-        )
-
-        deuda_vencida = Decimal("0.00")
-        deuda_no_vencida = Decimal("0.00")
-        comprobantes_impagos = 0
-
-        aging_0_30 = Decimal("0.00")
-        aging_31_60 = Decimal("0.00")
-        aging_61_90 = Decimal("0.00")
-        aging_90_plus = Decimal("0.00")
-
         deuda_cta_cte = Decimal("0.00")
         deuda_contado = Decimal("0.00")
 
@@ -118,11 +112,6 @@ class ClienteDashboardService:
 
         for comp in comprobantes_con_saldo:
             saldo = _to_decimal(comp.saldo_pendiente)
-            if saldo <= 0:
-                continue
-
-            comprobantes_impagos += 1
-
             clasificacion = _clasificar_condicion(comp, cliente)
 
             if clasificacion == "CC":
@@ -138,25 +127,6 @@ class ClienteDashboardService:
                 'saldo': _to_float(saldo),
             })
 
-            fecha_base = comp.fecha.date() if comp.fecha else hoy
-            dias_venc = int(cliente.dias_vencimiento or 0)
-            fecha_vencimiento = fecha_base + timezone.timedelta(days=dias_venc)
-
-            if fecha_vencimiento < hoy:
-                deuda_vencida += saldo
-                dias_mora = (hoy - fecha_vencimiento).days
-
-                if dias_mora <= 30:
-                    aging_0_30 += saldo
-                elif dias_mora <= 60:
-                    aging_31_60 += saldo
-                elif dias_mora <= 90:
-                    aging_61_90 += saldo
-                else:
-                    aging_90_plus += saldo
-            else:
-                deuda_no_vencida += saldo
-
         # Si por datos legacy quedó todo en cero pero existe saldo,
         # forzamos consistencia para que el tablero nunca quede incoherente.
         if saldo_total > 0 and deuda_cta_cte == 0 and deuda_contado == 0:
@@ -166,7 +136,7 @@ class ClienteDashboardService:
                 deuda_contado = saldo_total
 
         limite_credito = _to_decimal(cliente.limite_credito or 0)
-        credito_disponible = limite_credito - saldo_total
+        credito_disponible = saldo_cliente.credito_disponible
 
         if credito_disponible < 0 or aging_90_plus > 0:
             riesgo = "EXCEDIDO"
@@ -198,25 +168,15 @@ class ClienteDashboardService:
                 'estado': ultima_venta_obj.estado,
             }
 
-        fecha_30d = hoy - timezone.timedelta(days=30)
-        fecha_90d = hoy - timezone.timedelta(days=90)
-
-        comprobantes_30d = comprobantes_confirmados.filter(fecha__date__gte=fecha_30d)
-        comprobantes_90d = comprobantes_confirmados.filter(fecha__date__gte=fecha_90d)
-
-        total_vendido_30d = _to_decimal(
-            comprobantes_30d.aggregate(total=Sum('total')).get('total')
-        )
-
-        cantidad_comprobantes_90d = comprobantes_90d.count()
-
-        ticket_promedio_90d = _to_decimal(
-            comprobantes_90d.aggregate(avg=Avg('total')).get('avg')
+        total_vendido_30d = saldo_cliente.ventas_30d
+        cantidad_comprobantes_90d = saldo_cliente.comprobantes_90d
+        ticket_promedio_90d = (
+            saldo_cliente.ventas_90d / cantidad_comprobantes_90d if cantidad_comprobantes_90d > 0 else Decimal("0.00")
         )
 
         dias_desde_ultima_compra = None
-        if ultima_venta_obj and ultima_venta_obj.fecha:
-            dias_desde_ultima_compra = (hoy - ultima_venta_obj.fecha.date()).days
+        if saldo_cliente.ultima_compra:
+            dias_desde_ultima_compra = (hoy - timezone.localdate(saldo_cliente.ultima_compra)).days
 
         ultimos_comprobantes = []
         for comp in comprobantes_confirmados[:8]:
@@ -232,68 +192,13 @@ class ClienteDashboardService:
                 'estado_pago': comp.estado_pago,
             })
 
-        # Para cuenta corriente histórica del panel lateral
-        facturas_cta_cte = [
-            f for f in comprobantes_confirmados
-            if _clasificar_condicion(f, cliente) == "CC"
+        # Panel lateral: los últimos movimientos de cuenta corriente con su saldo,
+        # resueltos en SQL; el extracto completo se pagina en /cuenta-corriente/
+        movimientos_cta_cte = [
+            {campo: mov[campo] for campo in ('id', 'fecha', 'tipo', 'numero', 'debe', 'haber', 'saldo')}
+            for mov in CuentaCorrienteService.ultimos_movimientos(cliente, limite=cls.MOVIMIENTOS_CTA_CTE)
         ]
 
-        recibos = list(
-            Recibo.objects.filter(
-                cliente=cliente,
-                estado=Recibo.Estado.CONFIRMADO,
-                origen=Recibo.Origen.COBRANZA,
-            ).values(
-                'id',
-                'fecha',
-                'numero',
-                'monto_total',
-            )
-        )
-
-        movimientos = []
-
-        for f in facturas_cta_cte:
-            numero = f"{(f.letra or '').strip()} {int(f.punto_venta or 0):05d}-{int(f.numero or 0):08d}".strip()
-            movimientos.append({
-                'id': f.pk,
-                'fecha': f.fecha,
-                'tipo': 'Factura',
-                'numero': numero,
-                'debe': _to_decimal(f.total),
-                'haber': Decimal("0.00"),
-            })
-
-        for r in recibos:
-            movimientos.append({
-                'id': r.get('id'),
-                'fecha': r.get('fecha'),
-                'tipo': 'Recibo',
-                'numero': f"X {int(r.get('numero') or 0):08d}",
-                'debe': Decimal("0.00"),
-                'haber': _to_decimal(r.get('monto_total')),
-            })
-
-        movimientos = sorted(movimientos, key=lambda x: x['fecha'] or timezone.now())
-
-        saldo_acumulado = Decimal("0.00")
-        movimientos_cta_cte = []
-
-        for mov in movimientos:
-            saldo_acumulado += _to_decimal(mov['debe']) - _to_decimal(mov['haber'])
-            movimientos_cta_cte.append({
-                'id': mov['id'],
-                'fecha': _format_datetime(mov['fecha']),
-                'tipo': mov['tipo'],
-                'numero': mov['numero'],
-                'debe': _to_float(mov['debe']),
-                'haber': _to_float(mov['haber']),
-                'saldo': _to_float(saldo_acumulado),
-            })
-
-        # Sin límite — el frontend pagina o filtra según necesite
-        # movimientos_cta_cte = movimientos_cta_cte[-10:]
-
         return {
             'cliente_id': cliente.pk,
             'saldo_total': _to_float(saldo_total),
@@ -306,9 +211,9 @@ class ClienteDashboardService:
             'comprobantes_impagos': comprobantes_impagos,
             'riesgo': riesgo,
             'aging': {
-                'bucket_0_30': _to_float(aging_0_30),
-                'bucket_31_60': _to_float(aging_31_60),
-                'bucket_61_90': _to_float(aging_61_90),
+                'bucket_0_30': _to_float(antiguedad['0_30']),
+                'bucket_31_60': _to_float(antiguedad['31_60']),
+                'bucket_61_90': _to_float(antiguedad['61_90']),
                 'bucket_90_plus': _to_float(aging_90_plus),
             },
             'ultima_venta': ultima_venta,
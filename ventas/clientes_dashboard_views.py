@@ -1,12 +1,12 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
 from django.shortcuts import get_object_or_404
 
 from .models import Cliente
-from .clientes_dashboard_service import ClienteDashboardService
+from . import clientes_dashboard_cache
 from .clientes_dashboard_serializers import ClienteDashboardSerializer
 
 
@@ -18,7 +18,14 @@ def cliente_dashboard_api(request, pk):
         pk=pk
     )
 
-    data = ClienteDashboardService.build_dashboard(cliente)
+    data = clientes_dashboard_cache.obtener(cliente)
     serializer = ClienteDashboardSerializer(data)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cliente_dashboard_cache_api(request):
+    """Aciertos, vencidos (servidos mientras se rehacen) y fallos del caché de dashboards del tenant."""
+    return Response(clientes_dashboard_cache.estadisticas(), status=status.HTTP_200_OK)
\ No newline at end of file
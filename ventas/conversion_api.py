@@ -0,0 +1,326 @@
+# ventas/conversion_api.py
+#
+# ═══════════════════════════════════════════════════════════════════════════
+#  MÓDULO: Conversión masiva de comprobantes (ReglaConversionComprobante)
+#
+#  Versión por lotes de convertir_comprobante_api para los cierres de mes
+#  (cientos de notas de pedido → facturas / remitos). Una ConversionMasiva
+#  guarda el filtro (regla, cliente, rango de fechas) y el avance; Celery la
+#  parte en tramos de TRAMO orígenes que corren en paralelo, cada uno en su
+#  transacción:
+#    - orígenes bloqueados (FOR UPDATE) y re-chequeados: un origen que ya tiene
+#      comprobante destino no se vuelve a convertir, así repetir una corrida es seguro,
+#    - numeración con un bloqueo por serie, bulk_create de comprobantes, ítems y
+#      vínculos con el origen,
+#    - si la regla confirma: control de stock del tramo en una consulta y un único
+#      posteo que descuenta y libera las reservas RSRV de todos los pedidos,
+#    - CAE agrupados por punto de venta (CaeLoteService).
+# ═══════════════════════════════════════════════════════════════════════════
+
+import datetime
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from inventario.models import Deposito
+from parametros.maestros import get_serie, get_series
+from parametros.models import ReglaConversionComprobante
+
+from .checkout_api import CheckoutService
+from .clientes_dashboard_cache import invalidar_al_confirmar as invalidar_dashboard_cliente
+from .ingesta_api import IngestaComprobantesService
+from .models import Cliente, ComprobanteVenta, ComprobanteVentaItem, ConversionMasiva
+from .services import CaeLoteService, SaldoClienteService
+
+logger = logging.getLogger(__name__)
+
+Asociacion = ComprobanteVenta.comprobantes_asociados.through
+
+
+class ConversionMasivaService:
+    TRAMO = 100          # orígenes por tarea / transacción
+    MAX_ERRORES = 200    # detalle guardado en ConversionMasiva.errores
+
+    @staticmethod
+    def _ya_convertidos(regla):
+        """Vínculos origen → destino vigente (no anulado) del tipo destino de la regla."""
+        return Asociacion.objects.filter(
+            from_comprobanteventa__tipo_comprobante=regla.tipo_destino
+        ).exclude(from_comprobanteventa__estado=ComprobanteVenta.Estado.ANULADO)
+
+    @staticmethod
+    def origenes(conversion):
+        """ids de los orígenes del filtro que todavía no tienen destino, en orden cronológico."""
+        regla = conversion.regla
+        qs = ComprobanteVenta.objects.filter(tipo_comprobante=regla.tipo_origen).exclude(
+            estado=ComprobanteVenta.Estado.ANULADO
+        )
+        if conversion.cliente_id:
+            qs = qs.filter(cliente_id=conversion.cliente_id)
+        if conversion.fecha_desde:
+            qs = qs.filter(fecha__date__gte=conversion.fecha_desde)
+        if conversion.fecha_hasta:
+            qs = qs.filter(fecha__date__lte=conversion.fecha_hasta)
+        qs = qs.exclude(Exists(
+            ConversionMasivaService._ya_convertidos(regla).filter(to_comprobanteventa=OuterRef('pk'))
+        ))
+        return list(qs.order_by('fecha', 'numero', 'pk').values_list('pk', flat=True))
+
+    @staticmethod
+    def iniciar(conversion_id):
+        """Fija el total y devuelve los tramos de ids a despachar (vacío si no hay nada que convertir)."""
+        conversion = ConversionMasiva.objects.select_related('regla__tipo_origen', 'regla__tipo_destino').get(
+            pk=conversion_id
+        )
+        ids = ConversionMasivaService.origenes(conversion)
+        conversion.total = len(ids)
+        conversion.iniciado_en = timezone.now()
+        if ids:
+            conversion.estado = ConversionMasiva.Estado.EN_CURSO
+        else:
+            conversion.estado = ConversionMasiva.Estado.TERMINADA
+            conversion.terminado_en = conversion.iniciado_en
+        conversion.save(update_fields=['total', 'iniciado_en', 'estado', 'terminado_en'])
+        tramo = ConversionMasivaService.TRAMO
+        return [ids[i:i + tramo] for i in range(0, len(ids), tramo)]
+
+    @staticmethod
+    def _serie_destino(conversion, origen):
+        if conversion.serie_destino_id:
+            return get_serie(conversion.serie_destino_id)
+        # Mismo criterio que la conversión individual: el punto de venta del origen, si no cualquiera
+        activas = [
+            s for s in get_series().values()
+            if s.tipo_comprobante_id == conversion.regla.tipo_destino_id and s.activo
+        ]
+        return next((s for s in activas if s.punto_venta == origen.punto_venta), None) or next(iter(activas), None)
+
+    @staticmethod
+    def _armar(conversion, origen, ahora, deposito_principal, usuario):
+        regla = conversion.regla
+        serie = ConversionMasivaService._serie_destino(conversion, origen)
+        if serie is None:
+            raise ValueError(f'No hay ninguna serie activa configurada para "{regla.tipo_destino.nombre}".')
+        tipo = serie.tipo_comprobante
+        condicion = (
+            origen.condicion_venta if regla.copia_condicion_venta
+            else conversion.condicion_venta or ComprobanteVenta.CondicionVenta.CONTADO
+        )
+        estado = ComprobanteVenta.Estado.CONFIRMADO if regla.confirmar_automaticamente else ComprobanteVenta.Estado.BORRADOR
+        nuevo = ComprobanteVenta(
+            serie=serie,
+            tipo_comprobante=tipo,
+            letra=tipo.letra or '',
+            punto_venta=serie.punto_venta,
+            cliente=origen.cliente,
+            fecha=ahora,
+            estado=estado,
+            condicion_venta=condicion,
+            deposito=origen.deposito or serie.deposito_defecto or deposito_principal,
+            observaciones=origen.observaciones or '',
+            descuento_global_pct=origen.descuento_global_pct,
+            cliente_nombre_override=origen.cliente_nombre_override,
+            cliente_cuit_override=origen.cliente_cuit_override,
+            cliente_email_override=origen.cliente_email_override,
+            created_by=usuario,
+        )
+        nuevo.asignar_vencimiento()
+        items = [
+            ComprobanteVentaItem(
+                comprobante=nuevo,
+                articulo=item.articulo,
+                cantidad=item.cantidad,
+                precio_unitario_original=item.precio_unitario_original,
+                descuento_pct=item.descuento_pct,
+            )
+            for item in origen.items.all()
+            if regla.copia_items and item.articulo.cod_articulo != 'RECARGO_FIN'  # Excluir recargos financieros
+        ]
+        CheckoutService._totales(nuevo, items)
+        nuevo.saldo_pendiente = nuevo.total
+        # Mismo criterio que el signal de stock: confirmado, tipo que mueve stock y con ítems
+        nuevo.stock_aplicado = estado == ComprobanteVenta.Estado.CONFIRMADO and bool(tipo.mueve_stock) and bool(items)
+        return nuevo, items, [], 0
+
+    @staticmethod
+    @transaction.atomic
+    def convertir_tramo(conversion, origen_ids):
+        """
+        Convierte un tramo en una transacción.
+        Devuelve {'convertidos': n, 'omitidos': n, 'errores': [{'origen', 'numero', 'error'}]}.
+        """
+        regla = conversion.regla
+        origenes = list(
+            ComprobanteVenta.objects.select_for_update(of=('self',))
+            .select_related('cliente', 'deposito', 'tipo_comprobante')
+            .prefetch_related(Prefetch(
+                'items', queryset=ComprobanteVentaItem.objects.select_related('articulo').order_by('pk')
+            ))
+            .filter(pk__in=origen_ids, tipo_comprobante=regla.tipo_origen)
+            .exclude(estado=ComprobanteVenta.Estado.ANULADO)
+            .order_by('fecha', 'numero', 'pk')
+        )
+        # Re-chequeo con los orígenes bloqueados: otra corrida o una conversión manual pudo ganarles
+        convertidos = set(
+            ConversionMasivaService._ya_convertidos(regla).filter(
+                to_comprobanteventa_id__in=[o.pk for o in origenes]
+            ).values_list('to_comprobanteventa_id', flat=True)
+        )
+        origenes = [o for o in origenes if o.pk not in convertidos]
+
+        ahora = timezone.now()
+        deposito_principal = Deposito.objects.filter(es_principal=True).first()
+        usuario = conversion.creado_por
+        errores, armados, aceptados = [], [], []
+        for origen in origenes:
+            try:
+                armados.append(ConversionMasivaService._armar(conversion, origen, ahora, deposito_principal, usuario))
+                aceptados.append(origen)
+            except ValueError as exc:
+                errores.append({'origen': origen.pk, 'numero': origen.numero_completo, 'error': str(exc)})
+
+        faltas = IngestaComprobantesService._validar_stock(armados)
+        for indice in sorted(faltas, reverse=True):
+            origen = aceptados.pop(indice)
+            armados.pop(indice)
+            errores.append({'origen': origen.pk, 'numero': origen.numero_completo, 'error': ' '.join(faltas[indice])})
+        excedidos = SaldoClienteService.verificar_credito_lote([nuevo for nuevo, _, _, _ in armados])
+        for indice in sorted(excedidos, reverse=True):
+            origen = aceptados.pop(indice)
+            armados.pop(indice)
+            errores.append({'origen': origen.pk, 'numero': origen.numero_completo, 'error': ' '.join(excedidos[indice])})
+
+        if armados:
+            nuevos = [nuevo for nuevo, _, _, _ in armados]
+            IngestaComprobantesService._numerar(nuevos)
+            ComprobanteVenta.objects.bulk_create(nuevos)
+            ComprobanteVentaItem.objects.bulk_create([item for _, items, _, _ in armados for item in items])
+            Asociacion.objects.bulk_create([
+                Asociacion(from_comprobanteventa_id=nuevo.pk, to_comprobanteventa_id=origen.pk)
+                for nuevo, origen in zip(nuevos, aceptados)
+            ])
+            IngestaComprobantesService._postear_stock(armados, usuario, asociados=[[origen] for origen in aceptados])
+            SaldoClienteService.registrar(nuevos)
+            for cliente_id in {comprobante.cliente_id for comprobante in nuevos}:
+                invalidar_dashboard_cliente(cliente_id)
+            CaeLoteService.encolar(nuevos)
+
+        return {
+            'convertidos': len(armados),
+            'omitidos': len(origen_ids) - len(armados) - len(errores),
+            'errores': errores,
+        }
+
+    @staticmethod
+    def ejecutar_tramo(conversion_id, origen_ids):
+        """Convierte un tramo y suma su resultado al avance. Un tramo que falla entero cuenta como errores."""
+        conversion = ConversionMasiva.objects.select_related(
+            'regla__tipo_origen', 'regla__tipo_destino', 'creado_por'
+        ).get(pk=conversion_id)
+        try:
+            resultado = ConversionMasivaService.convertir_tramo(conversion, origen_ids)
+        except Exception as exc:
+            logger.error("Conversión masiva #%s: falló un tramo de %s orígenes: %s",
+                         conversion_id, len(origen_ids), exc, exc_info=True)
+            resultado = {
+                'convertidos': 0, 'omitidos': 0,
+                'errores': [{'origen': pk, 'numero': None, 'error': str(exc)} for pk in origen_ids],
+            }
+        ConversionMasivaService._registrar_avance(conversion_id, len(origen_ids), resultado)
+        return resultado
+
+    @staticmethod
+    @transaction.atomic
+    def _registrar_avance(conversion_id, procesados, resultado):
+        conversion = ConversionMasiva.objects.select_for_update().get(pk=conversion_id)
+        conversion.procesados += procesados
+        conversion.convertidos += resultado['convertidos']
+        conversion.omitidos += resultado['omitidos']
+        conversion.con_error += len(resultado['errores'])
+        conversion.errores = (conversion.errores + resultado['errores'])[:ConversionMasivaService.MAX_ERRORES]
+        if conversion.procesados >= conversion.total:
+            conversion.estado = ConversionMasiva.Estado.TERMINADA
+            conversion.terminado_en = timezone.now()
+        conversion.save()
+
+    @staticmethod
+    def avance(conversion):
+        return {
+            'id': conversion.pk,
+            'regla': str(conversion.regla),
+            'estado': conversion.estado,
+            'estado_display': conversion.get_estado_display(),
+            'total': conversion.total,
+            'procesados': conversion.procesados,
+            'porcentaje': conversion.porcentaje,
+            'convertidos': conversion.convertidos,
+            'omitidos': conversion.omitidos,
+            'con_error': conversion.con_error,
+            'errores': conversion.errores,
+            'iniciado_en': conversion.iniciado_en.isoformat() if conversion.iniciado_en else None,
+            'terminado_en': conversion.terminado_en.isoformat() if conversion.terminado_en else None,
+        }
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def conversion_masiva_api(request):
+    """
+    Lanza una conversión masiva. Body JSON:
+    {
+        "regla_id": <int>,
+        "cliente": <int|null>, "fecha_desde": "2026-10-01", "fecha_hasta": "2026-10-31",   (filtros opcionales)
+        "serie_id": <int|null>,          # serie destino (opcional)
+        "condicion_venta": "CO"|"CC"     # solo si la regla no copia la condición
+    }
+    Respuesta 202 con el id; el avance se consulta en GET .../conversion-masiva/<id>/.
+    """
+    regla = get_object_or_404(
+        ReglaConversionComprobante.objects.select_related('tipo_origen', 'tipo_destino'),
+        pk=request.data.get('regla_id') or 0, activo=True,
+    )
+    try:
+        fecha_desde = request.data.get('fecha_desde')
+        fecha_hasta = request.data.get('fecha_hasta')
+        fecha_desde = datetime.date.fromisoformat(fecha_desde) if fecha_desde else None
+        fecha_hasta = datetime.date.fromisoformat(fecha_hasta) if fecha_hasta else None
+    except (TypeError, ValueError):
+        return Response({'error': 'Fechas inválidas (formato AAAA-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+
+    cliente = None
+    if request.data.get('cliente'):
+        cliente = get_object_or_404(Cliente, pk=request.data['cliente'])
+    serie = None
+    if request.data.get('serie_id'):
+        serie = get_serie(int(request.data['serie_id']))
+        if serie is None or not serie.activo or serie.tipo_comprobante_id != regla.tipo_destino_id:
+            return Response(
+                {'error': f'La serie no es una serie activa de "{regla.tipo_destino.nombre}".'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    condicion = request.data.get('condicion_venta') or ''
+    if condicion and condicion not in ComprobanteVenta.CondicionVenta.values:
+        return Response({'error': 'Condición de venta inválida.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    conversion = ConversionMasiva.objects.create(
+        regla=regla, cliente=cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+        serie_destino_id=serie.pk if serie else None, condicion_venta=condicion, creado_por=request.user,
+    )
+    from ventas.tasks import conversion_masiva_task
+    schema = connection.schema_name
+    transaction.on_commit(lambda: conversion_masiva_task.delay(schema, conversion.pk))
+    return Response(ConversionMasivaService.avance(conversion), status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def conversion_masiva_avance_api(request, pk):
+    conversion = get_object_or_404(ConversionMasiva.objects.select_related('regla__tipo_destino'), pk=pk)
+    return Response(ConversionMasivaService.avance(conversion))
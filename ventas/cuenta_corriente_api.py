@@ -19,7 +19,8 @@
 # ═══════════════════════════════════════════════════════════════════════════
 
 from decimal import Decimal
-from django.db.models import Sum, Count, Q
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
@@ -27,7 +28,10 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
+from erp_project.cuenta_corriente import ExtractoCuentaCorriente, rama, respuesta_csv
+from parametros.models import TipoComprobante
 from .models import Cliente, ComprobanteVenta, Recibo, ReciboImputacion, ReciboValor
+from .services import AntiguedadSaldosService, SaldoCierreMensualService
 
 
 # ─── utilidades ────────────────────────────────────────────────────────────
@@ -62,15 +66,35 @@ def _num_comp(comp):
 def _num_recibo(rec):
     return f"X {int(rec.numero or 0):08d}"
 
-def _signo_comp(comp):
-    """
-    Retorna +1 si el comprobante es DEBE (factura, ND) o -1 si es HABER (NC).
-    Usa el campo es_nota_credito del TipoComprobante.
-    """
-    tc = comp.tipo_comprobante
-    if tc and tc.es_nota_credito:
-        return -1
-    return 1
+def _estado_pago(total, saldo_pendiente):
+    # Mismo criterio que ComprobanteVenta.estado_pago
+    if saldo_pendiente == 0:
+        return "PAGADO"
+    if saldo_pendiente == total:
+        return "IMPAGO"
+    return "PARCIAL"
+
+def _mov_dict(m):
+    """Movimiento del motor de extractos → fila de la API."""
+    es_comp = m['clase'] == 'comprobante'
+    numero = (
+        f"{(m['letra'] or '').strip()} {int(m['punto_venta'] or 0):05d}-{int(m['numero'] or 0):08d}".strip()
+        if es_comp else f"X {int(m['numero'] or 0):08d}"
+    )
+    return {
+        'id': m['id'],
+        'fecha': _iso(m['fecha']),
+        'tipo': m['tipo'],
+        'clase': m['clase'],
+        'es_nc': es_comp and m['haber'] > 0,
+        'numero': numero,
+        'debe': _f(m['debe']),
+        'haber': _f(m['haber']),
+        'saldo': _f(m['saldo']),
+        'ref_id': m['id'],
+        'estado_pago': _estado_pago(m['total'], m['saldo_pendiente']) if es_comp else None,
+        'saldo_pendiente': _f(m['saldo_pendiente']) if es_comp else None,
+    }
 
 
 # ─── CuentaCorrienteService ────────────────────────────────────────────────
@@ -80,214 +104,133 @@ class CuentaCorrienteService:
     # ── Punto de entrada ──────────────────────────────────────────────────
     @classmethod
     def build_extracto(cls, cliente, *, fecha_desde=None, fecha_hasta=None,
-                       tipo_filtro='', page=1, page_size=50):
-        hoy = timezone.localdate()
-
+                       tipo_filtro='', page=1, page_size=50, cursor=None):
+        """
+        Página del extracto con saldo acumulado, resuelta en SQL. Con `cursor`
+        (paginacion.siguiente de la página anterior) pagina por keyset; `page`
+        queda para la paginación por número. ValueError si el cursor no corresponde.
+        """
         saldo_anterior = Decimal('0')
         if fecha_desde:
             saldo_anterior = cls._saldo_al_cierre(cliente, hasta=fecha_desde - timezone.timedelta(days=1))
 
-        movs = cls._movimientos(cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
-                                tipo_filtro=tipo_filtro)
-
-        acum = saldo_anterior
-        for m in movs:
-            acum += _dec(m['debe']) - _dec(m['haber'])
-            m['saldo'] = _f(acum)
+        extracto = cls._extracto(cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                                 tipo_filtro=tipo_filtro)
+        totales = extracto.totales()
 
-        total_movs = len(movs)
-        page_size  = min(max(1, page_size), 200)
-        page       = max(1, page)
+        total_movs  = totales['cantidad']
+        page_size   = min(max(1, page_size), 200)
         total_pages = max(1, -(-total_movs // page_size))
-        page        = min(page, total_pages)
-        movs_pagina = movs[(page-1)*page_size : page*page_size]
-
-        saldo_final = _f(acum)
+        page        = min(max(1, page), total_pages)
+        movs, siguiente = extracto.pagina(
+            limite=page_size, cursor=cursor, saldo_inicial=saldo_anterior, desplazamiento=(page-1)*page_size
+        )
 
         return {
             'saldo_anterior':  _f(saldo_anterior),
-            'saldo_final':     saldo_final,
-            'movimientos':     movs_pagina,
+            'saldo_final':     _f(saldo_anterior + totales['debe'] - totales['haber']),
+            'movimientos':     [_mov_dict(m) for m in movs],
             'paginacion': {
                 'total':       total_movs,
                 'page':        page,
                 'page_size':   page_size,
                 'total_pages': total_pages,
+                'siguiente':   siguiente,
             },
         }
 
     @classmethod
     def build_resumen(cls, cliente, *, fecha_desde=None, fecha_hasta=None):
-        hoy = timezone.localdate()
-
         saldo_anterior = Decimal('0')
         if fecha_desde:
             saldo_anterior = cls._saldo_al_cierre(cliente, hasta=fecha_desde - timezone.timedelta(days=1))
 
-        movs = cls._movimientos(cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+        desglose = cls._extracto(cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta).desglose()
 
-        total_debe  = sum(_dec(m['debe'])  for m in movs)
-        total_haber = sum(_dec(m['haber']) for m in movs)
+        total_debe  = sum((d['debe'] for d in desglose), Decimal('0'))
+        total_haber = sum((d['haber'] for d in desglose), Decimal('0'))
         saldo_periodo  = total_debe - total_haber
         saldo_final    = saldo_anterior + saldo_periodo
 
-        desglose = {}
-        for m in movs:
-            key = m['tipo']
-            if key not in desglose:
-                desglose[key] = {'tipo': key, 'clase': m['clase'], 'cantidad': 0, 'debe': 0.0, 'haber': 0.0}
-            desglose[key]['cantidad'] += 1
-            desglose[key]['debe']     = round(desglose[key]['debe']  + _f(m['debe']),  2)
-            desglose[key]['haber']    = round(desglose[key]['haber'] + _f(m['haber']), 2)
-
         return {
             'saldo_anterior':  _f(saldo_anterior),
             'total_debe':      _f(total_debe),
             'total_haber':     _f(total_haber),
             'saldo_periodo':   _f(saldo_periodo),
             'saldo_final':     _f(saldo_final),
-            'cantidad_movimientos': len(movs),
-            'desglose':        sorted(desglose.values(), key=lambda x: x['tipo']),
+            'cantidad_movimientos': sum(d['cantidad'] for d in desglose),
+            'desglose':        [
+                {'tipo': d['tipo'], 'clase': d['clase'], 'cantidad': d['cantidad'],
+                 'debe': _f(d['debe']), 'haber': _f(d['haber'])}
+                for d in desglose
+            ],
         }
 
+    @classmethod
+    def ultimos_movimientos(cls, cliente, limite=50):
+        """Los últimos movimientos hasta hoy con su saldo (panel del dashboard)."""
+        hoy = timezone.localdate()
+        movs = cls._extracto(cliente, fecha_hasta=hoy).ultimos(limite, saldo_final=cls._saldo_al_cierre(cliente, hasta=hoy))
+        return [_mov_dict(m) for m in movs]
+
     # ── Saldo al cierre de una fecha ──────────────────────────────────────
     @classmethod
     def _saldo_al_cierre(cls, cliente, hasta):
-        comps = ComprobanteVenta.objects.filter(
-            cliente=cliente,
-            estado=ComprobanteVenta.Estado.CONFIRMADO,
-            condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE,
-            fecha__date__lte=hasta,
-        ).select_related('tipo_comprobante')
-
-        debe_total = Decimal('0')
-        haber_total = Decimal('0')
-        for c in comps:
-            codigo_afip = getattr(c.tipo_comprobante, 'codigo_afip', '')
-            if codigo_afip in ['091', '092', '991', '992', 'remito', 'pedido']:
-                continue
-
-            signo = _signo_comp(c)
-            if signo > 0:
-                debe_total += _dec(c.total)
-            else:
-                haber_total += _dec(c.total)
-
-        recibos = Recibo.objects.filter(
-            cliente=cliente,
-            estado=Recibo.Estado.CONFIRMADO,
-            origen=Recibo.Origen.COBRANZA,
-            fecha__date__lte=hasta,
-        ).aggregate(total=Sum('monto_total'))
-
-        haber_total += _dec(recibos.get('total'))
-        return debe_total - haber_total
+        # Cierre mensual más cercano + suma en SQL de los días que faltan
+        return SaldoCierreMensualService.saldo_al(cliente, hasta)
 
     # ── Movimientos del período ───────────────────────────────────────────
     @classmethod
-    def _movimientos(cls, cliente, *, fecha_desde=None, fecha_hasta=None, tipo_filtro=''):
-        movs = []
-        incl_comp = tipo_filtro in ('', 'comprobante')
-        incl_recibo = tipo_filtro in ('', 'recibo')
-
-        if incl_comp:
-            qs = (
-                ComprobanteVenta.objects
-                .filter(
-                    cliente=cliente,
-                    estado=ComprobanteVenta.Estado.CONFIRMADO,
-                    condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE,
-                )
-                .select_related('tipo_comprobante')
-                .order_by('fecha', 'numero')
-            )
+    def _extracto(cls, cliente, *, fecha_desde=None, fecha_hasta=None, tipo_filtro=''):
+        """Comprobantes CTA_CTE (DEBE, o HABER las NC) y recibos de cobranza (HABER), unidos en SQL."""
+        def _periodo(qs):
             if fecha_desde:
                 qs = qs.filter(fecha__date__gte=fecha_desde)
             if fecha_hasta:
                 qs = qs.filter(fecha__date__lte=fecha_hasta)
-
-            for c in qs:
-                codigo_afip = getattr(c.tipo_comprobante, 'codigo_afip', '')
-                if codigo_afip in ['091', '092', '991', '992', 'remito', 'pedido']:
-                    continue
-
-                signo = _signo_comp(c)
-                tipo_nom = c.tipo_comprobante.nombre if c.tipo_comprobante else 'Comprobante'
-                debe = _f(c.total) if signo > 0 else 0.0
-                haber = _f(c.total) if signo < 0 else 0.0
-                movs.append({
-                    'id': c.pk,
-                    'fecha': _iso(c.fecha),
-                    'tipo': tipo_nom,
-                    'clase': 'comprobante',
-                    'es_nc': signo < 0,
-                    'numero': _num_comp(c),
-                    'debe': debe,
-                    'haber': haber,
-                    'saldo': 0.0,
-                    'ref_id': c.pk,
-                    'estado_pago': c.estado_pago,
-                    'saldo_pendiente': _f(c.saldo_pendiente),
-                })
-
-        if incl_recibo:
-            qs = (
-                Recibo.objects
-                .filter(
-                    cliente=cliente,
-                    estado=Recibo.Estado.CONFIRMADO,
-                    origen=Recibo.Origen.COBRANZA,
-                )
-                .order_by('fecha', 'numero')
+            return qs
+
+        ramas = []
+        if tipo_filtro in ('', 'comprobante'):
+            es_nc = TipoComprobante.q_nota_credito('tipo_comprobante__')
+            comprobantes = ComprobanteVenta.objects.filter(
+                cliente=cliente,
+                estado=ComprobanteVenta.Estado.CONFIRMADO,
+                condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE,
+            ).exclude(tipo_comprobante__codigo_afip__in=AntiguedadSaldosService.CODIGOS_SIN_DEUDA)
+            ramas.append(rama(
+                _periodo(comprobantes), clase='comprobante',
+                tipo=Coalesce('tipo_comprobante__nombre', Value('Comprobante')),
+                debe=Case(When(es_nc, then=Value(0)), default=F('total'), output_field=DecimalField()),
+                haber=Case(When(es_nc, then=F('total')), default=Value(0), output_field=DecimalField()),
+                letra=F('letra'), punto_venta=F('punto_venta'),
+                total=F('total'), saldo_pendiente=F('saldo_pendiente'),
+            ))
+        if tipo_filtro in ('', 'recibo'):
+            recibos = Recibo.objects.filter(
+                cliente=cliente,
+                estado=Recibo.Estado.CONFIRMADO,
+                origen=Recibo.Origen.COBRANZA,
             )
-            if fecha_desde:
-                qs = qs.filter(fecha__date__gte=fecha_desde)
-            if fecha_hasta:
-                qs = qs.filter(fecha__date__lte=fecha_hasta)
+            ramas.append(rama(_periodo(recibos), clase='recibo', tipo='Recibo', debe=0, haber=F('monto_total')))
 
-            for r in qs:
-                movs.append({
-                    'id': r.pk,
-                    'fecha': _iso(r.fecha),
-                    'tipo': 'Recibo',
-                    'clase': 'recibo',
-                    'es_nc': False,
-                    'numero': _num_recibo(r),
-                    'debe': 0.0,
-                    'haber': _f(r.monto_total),
-                    'saldo': 0.0,
-                    'ref_id': r.pk,
-                    'estado_pago': None,
-                    'saldo_pendiente': None,
-                })
-
-        movs.sort(key=lambda x: (x['fecha'] or '', x['id']))
-        return movs
+        alcance = f"cliente:{cliente.pk}:{fecha_desde}:{fecha_hasta}:{tipo_filtro}"
+        return ExtractoCuentaCorriente(ramas, alcance=alcance)
 
     # ── Comprobantes impagos ──────────────────────────────────────────────
     @classmethod
     def comprobantes_impagos(cls, cliente):
         hoy      = timezone.localdate()
-        dias_vec = int(cliente.dias_vencimiento or 0)
         result   = []
 
         for c in (
-            ComprobanteVenta.objects
-            .filter(cliente=cliente,
-                    estado=ComprobanteVenta.Estado.CONFIRMADO,
-                    saldo_pendiente__gt=0)
+            AntiguedadSaldosService.abiertos(clientes=[cliente])
             .select_related('tipo_comprobante')
             .order_by('fecha', 'numero')
         ):
-            # Escudo: Evitamos que notas de pedido con saldo muestren como impagos
-            codigo_afip = getattr(c.tipo_comprobante, 'codigo_afip', '')
-            if codigo_afip in ['091', '092', '991', '992', 'remito', 'pedido']:
-                continue
-
-            fecha_base = c.fecha.date() if c.fecha else hoy
-            fecha_venc = fecha_base + timezone.timedelta(days=dias_vec)
+            fecha_venc = c.fecha_vencimiento or hoy
             vencido    = fecha_venc < hoy
-            dias_mora  = max(0, (hoy - fecha_venc).days) if vencido else 0
+            dias_mora  = (hoy - fecha_venc).days if vencido else 0
 
             result.append({
                 'id':                c.pk,
@@ -353,38 +296,12 @@ class CuentaCorrienteService:
         hoy      = timezone.localdate()
         dias_vec = int(cliente.dias_vencimiento or 0)
 
-        saldo_total      = Decimal('0')
-        deuda_vencida    = Decimal('0')
-        deuda_no_vencida = Decimal('0')
-        aging = {'0_30': Decimal('0'), '31_60': Decimal('0'), '61_90': Decimal('0'), '90_plus': Decimal('0')}
-        n_impagos = 0
-
-        for c in ComprobanteVenta.objects.filter(
-            cliente=cliente,
-            estado=ComprobanteVenta.Estado.CONFIRMADO,
-            saldo_pendiente__gt=0,
-        ):
-            # Escudo para no contar KPIs de remitos
-            codigo_afip = getattr(c.tipo_comprobante, 'codigo_afip', '')
-            if codigo_afip in ['091', '092', '991', '992', 'remito', 'pedido']:
-                continue
-
-            s = _dec(c.saldo_pendiente)
-            if s <= 0:
-                continue
-            n_impagos  += 1
-            saldo_total += s
-            fecha_base   = c.fecha.date() if c.fecha else hoy
-            fecha_venc   = fecha_base + timezone.timedelta(days=dias_vec)
-            if fecha_venc < hoy:
-                deuda_vencida += s
-                dias_mora = (hoy - fecha_venc).days
-                if   dias_mora <= 30: aging['0_30']    += s
-                elif dias_mora <= 60: aging['31_60']   += s
-                elif dias_mora <= 90: aging['61_90']   += s
-                else:                 aging['90_plus'] += s
-            else:
-                deuda_no_vencida += s
+        antiguedad       = AntiguedadSaldosService.de_cliente(cliente, al=hoy)
+        saldo_total      = antiguedad['saldo']
+        deuda_vencida    = antiguedad['vencido']
+        deuda_no_vencida = antiguedad['no_vencido']
+        aging            = {tramo: antiguedad[tramo] for tramo in AntiguedadSaldosService.TRAMOS}
+        n_impagos        = antiguedad['comprobantes']
 
         limite    = _dec(cliente.limite_credito or 0)
         disponible = limite - saldo_total
@@ -479,10 +396,14 @@ def cuenta_corriente_api(request, pk):
             cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta
         )
     else:
-        extracto = CuentaCorrienteService.build_extracto(
-            cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
-            tipo_filtro=tipo_filtro, page=page, page_size=page_size
-        )
+        try:
+            extracto = CuentaCorrienteService.build_extracto(
+                cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                tipo_filtro=tipo_filtro, page=page, page_size=page_size,
+                cursor=request.query_params.get('cursor'),
+            )
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         data.update(extracto)
 
     data['kpis']                 = CuentaCorrienteService.kpis_cliente(cliente)
@@ -506,6 +427,34 @@ def cuenta_corriente_api(request, pk):
     return Response(data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cuenta_corriente_exportar_api(request, pk):
+    """Extracto completo del período en CSV, generado y enviado por tramos."""
+    cliente = get_object_or_404(Cliente.objects.select_related('entidad'), pk=pk)
+    fecha_desde = _parse_date(request.query_params.get('fecha_desde'))
+    fecha_hasta = _parse_date(request.query_params.get('fecha_hasta'))
+    tipo_filtro = (request.query_params.get('tipo') or '').lower().strip()
+
+    saldo_anterior = Decimal('0')
+    if fecha_desde:
+        saldo_anterior = CuentaCorrienteService._saldo_al_cierre(cliente, hasta=fecha_desde - timezone.timedelta(days=1))
+    extracto = CuentaCorrienteService._extracto(
+        cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta, tipo_filtro=tipo_filtro
+    )
+
+    def _fila(m):
+        mov = _mov_dict(m)
+        return [timezone.localtime(m['fecha']).strftime('%d/%m/%Y'), mov['tipo'], mov['numero'],
+                m['debe'], m['haber'], m['saldo']]
+
+    return respuesta_csv(
+        f"cuenta_corriente_{cliente.codigo_cliente or cliente.pk}.csv",
+        ['fecha', 'tipo', 'numero', 'debe', 'haber', 'saldo'],
+        (_fila(m) for m in extracto.iterar(saldo_inicial=saldo_anterior)),
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def comprobantes_impagos_api(request, pk):
@@ -551,6 +500,9 @@ def resumen_cartera_api(request):
         .select_related('entidad', 'entidad__situacion_iva')
     )
 
+    # Deuda vencida de toda la cartera en una sola consulta agrupada
+    antiguedad = AntiguedadSaldosService.por_cliente(al=fecha_hasta, hasta=fecha_hasta)
+
     resultado = []
     for c in clientes_qs:
         saldo = CuentaCorrienteService._saldo_al_cierre(c, hasta=fecha_hasta)
@@ -558,21 +510,7 @@ def resumen_cartera_api(request):
         if con_saldo and saldo <= 0:
             continue
 
-        deuda_vencida = Decimal('0')
-        dias_vec = int(c.dias_vencimiento or 0)
-        for comp in ComprobanteVenta.objects.filter(
-            cliente=c,
-            estado=ComprobanteVenta.Estado.CONFIRMADO,
-            saldo_pendiente__gt=0,
-            fecha__date__lte=fecha_hasta,
-        ):
-            codigo_afip = getattr(comp.tipo_comprobante, 'codigo_afip', '')
-            if codigo_afip in ['091', '092', '991', '992', 'remito', 'pedido']:
-                continue
-
-            fecha_venc = (comp.fecha.date() if comp.fecha else hoy) + timezone.timedelta(days=dias_vec)
-            if fecha_venc < fecha_hasta:
-                deuda_vencida += _dec(comp.saldo_pendiente)
+        deuda_vencida = antiguedad.get(c.pk, {}).get('vencido', Decimal('0'))
 
         limite = _dec(c.limite_credito or 0)
         if limite > 0 and saldo > limite:
@@ -0,0 +1,441 @@
+# ventas/ingesta_api.py
+#
+# ═══════════════════════════════════════════════════════════════════════════
+#  MÓDULO: Ingesta masiva de comprobantes de venta (marketplaces / POS offline)
+#
+#  Alta set-based de lotes de documentos, cada uno con una clave de
+#  idempotencia del cliente: validación conjunta (clientes, artículos, series,
+#  valores y stock en consultas por lote), numeración con un solo bloqueo por
+#  serie, bulk_create de comprobantes e ítems, un único posteo de stock y los
+#  cobros contado en bloque (mismo criterio que el checkout de POS). Los CAE
+#  se piden agrupados por punto de venta (CaeLoteService).
+#
+#  IDEMPOTENCIA: IngestaComprobante (clave única) se escribe en la misma
+#  transacción que el comprobante. Un documento ya ingerido vuelve como
+#  'duplicado' con el comprobante existente; la misma clave con otro contenido
+#  es un error. Si dos ingestas concurrentes registran la misma clave, la que
+#  pierde la carrera repite su tramo y la ve como duplicado.
+#
+#  Resultado por documento, en el orden recibido: 'creado' | 'duplicado' |
+#  'error' (con los motivos). Un documento con error no frena al resto.
+# ═══════════════════════════════════════════════════════════════════════════
+
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from finanzas.models import CuentaFondo, TipoValor
+from inventario.models import Articulo, Deposito
+from inventario.services import StockManager
+from parametros.models import SerieDocumento
+
+from .checkout_api import CheckoutService, _q2
+from .clientes_dashboard_cache import invalidar_al_confirmar as invalidar_dashboard_cliente
+from .models import (
+    Cliente, ComprobanteVenta, ComprobanteVentaItem, IngestaComprobante, PosteoStockPendiente,
+)
+from .services import CaeLoteService, PosteoStockService, SaldoCierreMensualService, SaldoClienteService
+
+logger = logging.getLogger(__name__)
+
+
+def _resultado(clave, estado, comprobante=None, errores=None):
+    resultado = {'clave': clave, 'estado': estado}
+    if comprobante is not None:
+        resultado.update({
+            'comprobante': comprobante.pk,
+            'numero_completo': comprobante.numero_completo,
+            'total': str(comprobante.total),
+            'saldo_pendiente': str(comprobante.saldo_pendiente),
+        })
+    if errores:
+        resultado['errores'] = errores
+    return resultado
+
+
+class IngestaComprobantesService:
+    LOTE = 500             # documentos por transacción
+    MAX_DOCUMENTOS = 5000  # por llamada
+    MAX_SINCRONO = 200     # más documentos que esto: la API los deriva a Celery
+
+    @staticmethod
+    def huella(documento):
+        contenido = {k: v for k, v in documento.items() if k != 'clave'}
+        return hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def ingerir(documentos, usuario=None):
+        """
+        Alta idempotente de un lote de documentos. Devuelve un resultado por
+        documento, en el orden recibido. Repetir la llamada con el mismo lote es seguro.
+        """
+        if len(documentos) > IngestaComprobantesService.MAX_DOCUMENTOS:
+            raise ValidationError(
+                f"Máximo {IngestaComprobantesService.MAX_DOCUMENTOS} documentos por lote."
+            )
+
+        resultados = [None] * len(documentos)
+        claves = set()
+        pendientes = []
+        for posicion, documento in enumerate(documentos):
+            clave = str(documento.get('clave') or '').strip() if isinstance(documento, dict) else ''
+            if not clave or len(clave) > 100:
+                resultados[posicion] = _resultado(clave, 'error', errores=["Clave de idempotencia inválida."])
+            elif clave in claves:
+                resultados[posicion] = _resultado(clave, 'error', errores=["Clave repetida dentro del lote."])
+            else:
+                claves.add(clave)
+                pendientes.append((posicion, clave, documento))
+
+        lote = IngestaComprobantesService.LOTE
+        for inicio in range(0, len(pendientes), lote):
+            for posicion, resultado in IngestaComprobantesService._ingerir_tramo(pendientes[inicio:inicio + lote], usuario):
+                resultados[posicion] = resultado
+        return resultados
+
+    @staticmethod
+    def _ingerir_tramo(tramo, usuario):
+        for intento in range(2):
+            try:
+                return IngestaComprobantesService._procesar(tramo, usuario)
+            except IntegrityError:
+                # Otra ingesta registró alguna de estas claves en paralelo
+                if intento:
+                    raise
+            except ValidationError as exc:
+                if len(tramo) == 1:
+                    posicion, clave, _ = tramo[0]
+                    return [(posicion, _resultado(clave, 'error', errores=exc.messages))]
+                # Falló la escritura conjunta (ej. stock consumido en paralelo): de a uno aísla al culpable
+                logger.warning("Ingesta: tramo de %s documentos reprocesado de a uno (%s)", len(tramo), exc)
+                return [
+                    fila for documento in tramo
+                    for fila in IngestaComprobantesService._ingerir_tramo([documento], usuario)
+                ]
+        return []
+
+    # ─── Resolución por lote ───────────────────────────────────────────────
+
+    @staticmethod
+    def _referencias(documentos):
+        """Clientes, artículos, depósitos, tipos de valor y cuentas de todo el tramo (una consulta c/u)."""
+        def ids(campo, fuente):
+            return {fila[campo] for fila in fuente if isinstance(fila, dict) and fila.get(campo)}
+
+        pagos = [pago for doc in documentos for pago in (doc.get('pagos') or [])]
+        lineas = [linea for doc in documentos for linea in (doc.get('items') or [])]
+        return {
+            'clientes': Cliente.objects.select_related('entidad').in_bulk(ids('cliente', documentos)),
+            'articulos': {
+                a.cod_articulo: a for a in Articulo.objects.filter(cod_articulo__in=ids('articulo', lineas))
+            },
+            'depositos': Deposito.objects.in_bulk(ids('deposito', documentos)),
+            'tipos': TipoValor.objects.in_bulk(ids('tipo_valor', pagos)),
+            'destinos': CuentaFondo.objects.in_bulk(ids('destino', pagos)),
+        }
+
+    @staticmethod
+    def _armar(documento, refs, usuario):
+        """Comprobante e ítems en memoria, con totales y pagos resueltos. ValidationError si no cierra."""
+        cliente = refs['clientes'].get(int(documento.get('cliente') or 0))
+        if cliente is None:
+            raise ValidationError("Cliente no encontrado.")
+        serie = CheckoutService._serie(documento)
+        estado = documento.get('estado') or ComprobanteVenta.Estado.CONFIRMADO
+        if estado not in (ComprobanteVenta.Estado.BORRADOR, ComprobanteVenta.Estado.CONFIRMADO):
+            raise ValidationError("Estado inválido: solo BR o CN.")
+        condicion = documento.get('condicion_venta') or ComprobanteVenta.CondicionVenta.CONTADO
+        if condicion not in ComprobanteVenta.CondicionVenta.values:
+            raise ValidationError("Condición de venta inválida.")
+
+        if documento.get('deposito'):
+            deposito = refs['depositos'].get(int(documento['deposito']))
+            if deposito is None:
+                raise ValidationError("Depósito inexistente.")
+        else:
+            deposito = serie.deposito_defecto or refs['deposito_principal']
+
+        fecha = timezone.now()
+        if documento.get('fecha'):
+            fecha = parse_datetime(str(documento['fecha']))
+            if fecha is None:
+                raise ValidationError("Fecha inválida.")
+            if timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha)
+
+        numero = None
+        if serie.es_manual:
+            numero = int(documento.get('numero') or 0)
+            if numero <= 0:
+                raise ValidationError(f"La serie {serie} es manual: el documento debe traer 'numero'.")
+
+        tipo = serie.tipo_comprobante
+        comprobante = ComprobanteVenta(
+            serie=serie,
+            tipo_comprobante=tipo,
+            letra=tipo.letra or '',
+            punto_venta=serie.punto_venta,
+            numero=numero,
+            cliente=cliente,
+            fecha=fecha,
+            estado=estado,
+            condicion_venta=condicion,
+            descuento_global_pct=_q2(documento.get('descuento_global_pct')),
+            deposito=deposito,
+            observaciones=documento.get('observaciones') or None,
+            created_by=usuario,
+        )
+        comprobante.clean()
+        comprobante.asignar_vencimiento()
+        articulos = refs['articulos']
+        faltantes = {l.get('articulo') for l in (documento.get('items') or [])} - set(articulos)
+        if faltantes:
+            raise ValidationError(f"Artículos inexistentes: {', '.join(sorted(map(str, faltantes)))}.")
+        items = CheckoutService._items(documento, cliente, comprobante, articulos=articulos)
+        CheckoutService._totales(comprobante, items)
+
+        pagos, pagado = [], _q2(0)
+        if documento.get('pagos'):
+            if not (estado == ComprobanteVenta.Estado.CONFIRMADO
+                    and condicion == ComprobanteVenta.CondicionVenta.CONTADO):
+                raise ValidationError("Los pagos solo aplican a comprobantes contado confirmados.")
+            pagos, pagado = CheckoutService._pagos(
+                documento, comprobante.total, tipos=refs['tipos'], destinos=refs['destinos']
+            )
+        comprobante.saldo_pendiente = _q2(0) if pagos else comprobante.total
+        # Mismo criterio que el signal de stock: confirmado de un tipo que mueve stock
+        comprobante.stock_aplicado = estado == ComprobanteVenta.Estado.CONFIRMADO and bool(tipo.mueve_stock)
+        return comprobante, items, pagos, pagado
+
+    @staticmethod
+    def _validar_stock(armados):
+        """
+        Control preventivo de stock REAL de todo el tramo en una consulta, con el
+        criterio de ComprobanteVentaItem.validar_stock_lote. Los documentos se
+        asignan en orden: cada egreso consume el saldo que ven los siguientes.
+        Devuelve {indice: [faltas]} de los que no alcanzan.
+        """
+        sujetos = []
+        for indice, (comprobante, items, _, _) in enumerate(armados):
+            tipo, deposito = comprobante.tipo_comprobante, comprobante.deposito
+            if not (comprobante.estado == ComprobanteVenta.Estado.CONFIRMADO and tipo.mueve_stock
+                    and getattr(tipo, 'afecta_stock_fisico', True) and deposito):
+                continue
+            requerido = defaultdict(lambda: _q2(0))
+            for item in items:
+                if not (item.articulo.permite_stock_negativo or deposito.permite_stock_negativo):
+                    requerido[item.articulo_id] += item.cantidad
+            if requerido:
+                sujetos.append((indice, comprobante, requerido))
+        if not sujetos:
+            return {}
+
+        disponibilidad = StockManager.disponibilidad_lote(
+            [(art_id, cantidad) for _, _, requerido in sujetos for art_id, cantidad in requerido.items()],
+            depositos={comprobante.deposito_id for _, comprobante, _ in sujetos},
+        )
+        consumido = defaultdict(lambda: _q2(0))
+        faltas = {}
+        for indice, comprobante, requerido in sujetos:
+            deposito = comprobante.deposito
+            errores = []
+            for art_id, cantidad in requerido.items():
+                saldo = disponibilidad.get(art_id, {}).get('depositos', {}).get(deposito.pk, {}).get('real', _q2(0))
+                saldo -= consumido[(art_id, deposito.pk)]
+                if saldo < cantidad:
+                    errores.append(f"Stock insuficiente en {deposito}. Disponible: {saldo}. Solicitado: {cantidad}.")
+            if errores:
+                faltas[indice] = errores
+            elif comprobante.tipo_comprobante.signo_stock < 0:
+                for art_id, cantidad in requerido.items():
+                    consumido[(art_id, deposito.pk)] += cantidad
+        return faltas
+
+    # ─── Escritura ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _numerar(comprobantes):
+        """Un bloqueo por serie (en orden de pk) y un UPDATE de ultimo_numero por serie."""
+        por_serie = defaultdict(list)
+        for comprobante in comprobantes:
+            if not comprobante.serie.es_manual:
+                por_serie[comprobante.serie_id].append(comprobante)
+        if not por_serie:
+            return
+        ultimos = dict(
+            SerieDocumento.objects.select_for_update().filter(pk__in=por_serie)
+            .order_by('pk').values_list('pk', 'ultimo_numero')
+        )
+        for serie_id, asignados in por_serie.items():
+            for desplazamiento, comprobante in enumerate(asignados, start=1):
+                comprobante.numero = ultimos[serie_id] + desplazamiento
+            SerieDocumento.objects.filter(pk=serie_id).update(ultimo_numero=ultimos[serie_id] + len(asignados))
+
+    @staticmethod
+    def _postear_stock(armados, usuario, asociados=None):
+        """
+        Outbox en bloque para los diferidos y un único registrar_movimientos_lote para el resto.
+        `asociados`: comprobantes de origen de cada armado (misma posición), para liberar sus reservas.
+        """
+        diferidos, lineas = [], []
+        for indice, (comprobante, items, _, _) in enumerate(armados):
+            if not comprobante.stock_aplicado:
+                continue
+            if PosteoStockService.usa_posteo_diferido(items):
+                diferidos.append(PosteoStockPendiente(comprobante=comprobante))
+            else:
+                lineas.extend(PosteoStockService.lineas_comprobante(
+                    comprobante, items, asociados=asociados[indice] if asociados else ()
+                ))
+        if diferidos:
+            PosteoStockPendiente.objects.bulk_create(diferidos, ignore_conflicts=True)
+        if lineas:
+            StockManager.registrar_movimientos_lote(
+                lineas, origen_sistema='VENTAS', origen_referencia='Ingesta masiva', usuario=usuario
+            )
+
+    @staticmethod
+    @transaction.atomic
+    def _procesar(tramo, usuario):
+        """Un tramo en una transacción. Devuelve [(posicion, resultado)]."""
+        salida = []
+        huellas = {clave: IngestaComprobantesService.huella(documento) for _, clave, documento in tramo}
+        previas = {
+            ingesta.clave: ingesta
+            for ingesta in IngestaComprobante.objects.select_related('comprobante').filter(clave__in=huellas)
+        }
+
+        nuevos = []
+        for posicion, clave, documento in tramo:
+            previa = previas.get(clave)
+            if previa is None:
+                nuevos.append((posicion, clave, documento))
+            elif previa.huella == huellas[clave]:
+                salida.append((posicion, _resultado(clave, 'duplicado', previa.comprobante)))
+            else:
+                salida.append((posicion, _resultado(clave, 'error', errores=["La clave ya se usó con otro contenido."])))
+        if not nuevos:
+            return salida
+
+        refs = IngestaComprobantesService._referencias([documento for _, _, documento in nuevos])
+        refs['deposito_principal'] = Deposito.objects.filter(es_principal=True).first()
+        armados, aceptados = [], []
+        for posicion, clave, documento in nuevos:
+            try:
+                armados.append(IngestaComprobantesService._armar(documento, refs, usuario))
+                aceptados.append((posicion, clave))
+            except ValidationError as exc:
+                salida.append((posicion, _resultado(clave, 'error', errores=exc.messages)))
+            except (KeyError, TypeError, ValueError, ArithmeticError) as exc:
+                salida.append((posicion, _resultado(clave, 'error', errores=[f"Datos inválidos: {exc}"])))
+
+        faltas = IngestaComprobantesService._validar_stock(armados)
+        for indice in sorted(faltas, reverse=True):
+            posicion, clave = aceptados.pop(indice)
+            armados.pop(indice)
+            salida.append((posicion, _resultado(clave, 'error', errores=faltas[indice])))
+        excedidos = SaldoClienteService.verificar_credito_lote([comprobante for comprobante, _, _, _ in armados])
+        for indice in sorted(excedidos, reverse=True):
+            posicion, clave = aceptados.pop(indice)
+            armados.pop(indice)
+            salida.append((posicion, _resultado(clave, 'error', errores=excedidos[indice])))
+        if not armados:
+            return salida
+
+        comprobantes = [comprobante for comprobante, _, _, _ in armados]
+        IngestaComprobantesService._numerar(comprobantes)
+        ComprobanteVenta.objects.bulk_create(comprobantes)
+        ComprobanteVentaItem.objects.bulk_create([item for _, items, _, _ in armados for item in items])
+        IngestaComprobante.objects.bulk_create([
+            IngestaComprobante(clave=clave, huella=huellas[clave], comprobante=comprobante)
+            for (_, clave), comprobante in zip(aceptados, comprobantes)
+        ])
+        IngestaComprobantesService._postear_stock(armados, usuario)
+        cobros = [(comprobante, pagos, pagado) for comprobante, _, pagos, pagado in armados if pagos]
+        if cobros:
+            CheckoutService._registrar_cobros(cobros, usuario)
+        SaldoClienteService.registrar(comprobantes)
+        for cliente_id in {comprobante.cliente_id for comprobante in comprobantes}:
+            invalidar_dashboard_cliente(cliente_id)
+        SaldoCierreMensualService.invalidar([
+            (comprobante.cliente_id, comprobante.fecha) for comprobante in comprobantes
+            if comprobante.condicion_venta == ComprobanteVenta.CondicionVenta.CTA_CTE
+            and comprobante.estado == ComprobanteVenta.Estado.CONFIRMADO
+        ])
+        CaeLoteService.encolar(comprobantes)
+
+        salida.extend(
+            (posicion, _resultado(clave, 'creado', comprobante))
+            for (posicion, clave), comprobante in zip(aceptados, comprobantes)
+        )
+        return salida
+
+    @staticmethod
+    def estado(claves):
+        """{clave: resultado} de las claves ya ingeridas (las ausentes no figuran)."""
+        return {
+            ingesta.clave: _resultado(ingesta.clave, 'creado', ingesta.comprobante)
+            for ingesta in IngestaComprobante.objects.select_related('comprobante').filter(clave__in=claves)
+        }
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def ingesta_comprobantes_api(request):
+    """
+    POST, body JSON:
+        {
+          "documentos": [
+            {"clave": "meli-2000001234", "cliente": 1, "serie": 3,   (o "tipo_comprobante" + "punto_venta")
+             "fecha": "2026-10-18T10:15:00-03:00", "estado": "CN", "condicion_venta": "CO",   (opcionales)
+             "numero": 120,                                          (solo series manuales)
+             "items": [{"articulo": "A0001", "cantidad": "2", "precio_unitario_original": "150.00"}],
+             "pagos": [{"tipo_valor": 1, "destino": 1, "monto": "363.00"}]}   (opcional, solo contado)
+          ],
+          "asincrono": false
+        }
+    Hasta MAX_SINCRONO documentos (y sin "asincrono"): 200 con un resultado por documento.
+    Si no, 202: se procesa en Celery y el avance se consulta con GET ?claves=a,b,c
+    (una clave sin comprobante figura 'pendiente': los documentos con error no se
+    registran y pueden reenviarse corregidos con la misma clave).
+    Reenviar el mismo lote es seguro.
+    """
+    if request.method == 'GET':
+        claves = [c.strip() for c in (request.query_params.get('claves') or '').split(',') if c.strip()]
+        ingeridas = IngestaComprobantesService.estado(claves)
+        return Response({
+            'resultados': [ingeridas.get(clave, {'clave': clave, 'estado': 'pendiente'}) for clave in claves]
+        })
+
+    documentos = request.data.get('documentos')
+    if not isinstance(documentos, list) or not documentos:
+        return Response({'error': "Se espera una lista 'documentos'."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(documentos) > IngestaComprobantesService.MAX_DOCUMENTOS:
+        return Response(
+            {'error': f"Máximo {IngestaComprobantesService.MAX_DOCUMENTOS} documentos por lote."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if request.data.get('asincrono') or len(documentos) > IngestaComprobantesService.MAX_SINCRONO:
+        from ventas.tasks import ingerir_comprobantes_task
+        tarea = ingerir_comprobantes_task.delay(connection.schema_name, documentos, request.user.pk)
+        return Response({
+            'tarea': tarea.id,
+            'claves': [d.get('clave') for d in documentos if isinstance(d, dict)],
+        }, status=status.HTTP_202_ACCEPTED)
+
+    resultados = IngestaComprobantesService.ingerir(documentos, request.user)
+    resumen = defaultdict(int)
+    for resultado in resultados:
+        resumen[resultado['estado']] += 1
+    return Response({'resultados': resultados, 'resumen': dict(resumen)})
@@ -0,0 +1,115 @@
+# ventas/management/commands/benchmark_checkout.py
+"""
+Benchmark del checkout exprés de POS (CheckoutService.checkout_contado).
+
+Emite N tickets contado contra el tenant indicado y reporta la latencia por
+ticket (p50 / p99 / máx.) y las consultas SQL de un ticket frente al
+presupuesto documentado en ventas/checkout_api.py. El artículo debe tener
+stock suficiente (o permitir negativos) para todos los tickets.
+
+Todo corre dentro de una transacción que se deshace al final: no quedan
+comprobantes, recibos, movimientos de stock ni de caja, y la numeración de la
+serie vuelve a su valor (tampoco se encola ningún CAE).
+
+Uso:
+    python manage.py benchmark_checkout --schema demo --cliente 1 --serie 3 \
+        --articulo A00001 --tipo-valor 1 --destino 1 --tickets 200 --lineas 5
+"""
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+
+from inventario.models import Articulo
+from ventas.checkout_api import CheckoutService
+from ventas.services import PricingService
+
+
+class _Deshacer(Exception):
+    pass
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia p50/p99 por ticket del checkout exprés de POS (sin dejar datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', required=True, help='Schema del tenant sobre el que se ejecuta.')
+        parser.add_argument('--cliente', type=int, required=True)
+        parser.add_argument('--serie', type=int, required=True, help='Serie de tickets (contado).')
+        parser.add_argument('--articulo', required=True, help='cod_articulo vendido en cada línea.')
+        parser.add_argument('--tipo-valor', type=int, required=True)
+        parser.add_argument('--destino', type=int, required=True, help='CuentaFondo destino del cobro.')
+        parser.add_argument('--tickets', type=int, default=200)
+        parser.add_argument('--lineas', type=int, default=5, help='Líneas por ticket.')
+        parser.add_argument('--usuario', help='username que registra los tickets (por defecto, el primer superusuario).')
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        usuario = (
+            User.objects.filter(username=opts['usuario']).first() if opts['usuario']
+            else User.objects.filter(is_superuser=True).first()
+        )
+        if usuario is None:
+            raise CommandError("No se encontró el usuario.")
+
+        latencias = []
+        consultas = None
+        with schema_context(opts['schema']):
+            try:
+                with transaction.atomic():
+                    articulo = Articulo.objects.get(cod_articulo=opts['articulo'])
+                    datos = self._ticket(opts, articulo)
+                    for numero in range(opts['tickets']):
+                        inicio = time.perf_counter()
+                        if numero == 0:
+                            with CaptureQueriesContext(connection) as capturadas:
+                                CheckoutService.checkout_contado(datos, usuario)
+                            consultas = len(capturadas.captured_queries)
+                        else:
+                            CheckoutService.checkout_contado(datos, usuario)
+                        latencias.append((time.perf_counter() - inicio) * 1000)
+                    raise _Deshacer()
+            except _Deshacer:
+                pass
+            except (Articulo.DoesNotExist, ValidationError) as exc:
+                raise CommandError(str(exc))
+
+        presupuesto = CheckoutService.PRESUPUESTO_CONSULTAS
+        self.stdout.write(f"Tickets: {len(latencias)} | Líneas por ticket: {opts['lineas']}")
+        self.stdout.write(
+            f"Latencia por ticket: p50 {_percentil(latencias, 50):.1f} ms | "
+            f"p99 {_percentil(latencias, 99):.1f} ms | máx. {max(latencias):.1f} ms"
+        )
+        self.stdout.write(f"Throughput: {len(latencias) / (sum(latencias) / 1000):.1f} tickets/s (un proceso)")
+        estilo = self.style.SUCCESS if consultas <= presupuesto else self.style.WARNING
+        self.stdout.write(estilo(
+            f"Consultas por ticket: {consultas} | presupuesto: {presupuesto}"
+        ))
+
+    def _ticket(self, opts, articulo):
+        """Ticket de `lineas` unidades del artículo, con el pago exacto por el total calculado."""
+        from ventas.models import Cliente, ComprobanteVenta
+        cliente = Cliente.objects.get(pk=opts['cliente'])
+        precio = PricingService.get_product_pricing(articulo, cliente).precio_venta_neto.amount
+        datos = {
+            'cliente': opts['cliente'],
+            'serie': opts['serie'],
+            'items': [
+                {'articulo': articulo.cod_articulo, 'cantidad': '1', 'precio_unitario_original': str(precio)}
+                for _ in range(opts['lineas'])
+            ],
+        }
+        borrador = ComprobanteVenta(cliente=cliente, descuento_global_pct=Decimal('0'))
+        CheckoutService._totales(borrador, CheckoutService._items(datos, cliente, borrador))
+        datos['pagos'] = [{'tipo_valor': opts['tipo_valor'], 'destino': opts['destino'], 'monto': str(borrador.total)}]
+        return datos
@@ -0,0 +1,33 @@
+# ventas/management/commands/cerrar_saldos_mensuales.py
+"""
+Completa los cierres mensuales de cuenta corriente (SaldoCierreMensual) desde
+los comprobantes y recibos: alta inicial después de migrar, o --rehacer para
+borrarlos y calcularlos de nuevo. Es lo mismo que corre Celery Beat cada día.
+
+Uso:
+    python manage.py cerrar_saldos_mensuales                      # todos los tenants
+    python manage.py cerrar_saldos_mensuales --schema demo --rehacer
+"""
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context
+
+from inventario.tasks import schemas_de_tenants
+from ventas.models import SaldoCierreMensual
+from ventas.services import SaldoCierreMensualService
+
+
+class Command(BaseCommand):
+    help = 'Completa los cierres mensuales de cuenta corriente por cliente (SaldoCierreMensual)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Schema del tenant. Por defecto, todos los tenants.')
+        parser.add_argument('--rehacer', action='store_true', help='Borra los cierres existentes antes de calcular.')
+
+    def handle(self, *args, **opts):
+        schemas = [opts['schema']] if opts['schema'] else schemas_de_tenants()
+        for schema in schemas:
+            with schema_context(schema):
+                if opts['rehacer']:
+                    SaldoCierreMensual.objects.all().delete()
+                cierres = SaldoCierreMensualService.cerrar()
+            self.stdout.write(self.style.SUCCESS(f"{schema}: {cierres} cierres mensuales escritos."))
@@ -0,0 +1,29 @@
+# ventas/management/commands/reconstruir_saldos_clientes.py
+"""
+Reconstruye la proyección SaldoCliente desde los comprobantes (alta inicial
+después de migrar, o para reparar desvíos). Procesa los clientes por lotes,
+una transacción por lote; se puede correr con el sistema en uso.
+
+Uso:
+    python manage.py reconstruir_saldos_clientes                  # todos los tenants
+    python manage.py reconstruir_saldos_clientes --schema demo
+"""
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context
+
+from inventario.tasks import schemas_de_tenants
+from ventas.services import SaldoClienteService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la proyección de saldos por cliente (SaldoCliente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Schema del tenant. Por defecto, todos los tenants.')
+
+    def handle(self, *args, **opts):
+        schemas = [opts['schema']] if opts['schema'] else schemas_de_tenants()
+        for schema in schemas:
+            with schema_context(schema):
+                filas = SaldoClienteService.reconstruir()
+            self.stdout.write(self.style.SUCCESS(f"{schema}: {filas} clientes reconstruidos."))
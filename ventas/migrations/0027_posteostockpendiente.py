@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0026_remove_cliente_creado_por_remove_cliente_esta_activo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosteoStockPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('comprobante', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='posteo_stock', to='ventas.comprobanteventa')),
+            ],
+            options={
+                'verbose_name': 'Posteo de Stock Pendiente',
+                'verbose_name_plural': 'Posteos de Stock Pendientes',
+                'indexes': [models.Index(condition=models.Q(('procesado_en__isnull', True)), fields=['creado_en'], name='ventas_posteo_pendiente_idx')],
+            },
+        ),
+    ]
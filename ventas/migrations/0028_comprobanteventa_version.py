@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0027_posteostockpendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comprobanteventa',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_articulo_stock_tiempo_real'),
+        ('parametros', '0020_configuracionempresa_stock_posteo_diferido'),
+        ('ventas', '0028_comprobanteventa_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioEfectivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_quantity', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('max_quantity', models.DecimalField(blank=True, decimal_places=3, max_digits=10, null=True)),
+                ('es_base', models.BooleanField(default=False)),
+                ('precio_neto', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('impuestos', models.JSONField(blank=True, default=dict)),
+                ('precio_final', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios_efectivos', to='inventario.articulo')),
+                ('moneda', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='parametros.moneda')),
+                ('price_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios_efectivos', to='ventas.pricelist')),
+            ],
+            options={
+                'verbose_name': 'Precio Efectivo',
+                'verbose_name_plural': 'Precios Efectivos',
+                'constraints': [models.UniqueConstraint(fields=('price_list', 'articulo', 'min_quantity', 'es_base'), name='ventas_precio_efectivo_unico')],
+            },
+        ),
+    ]
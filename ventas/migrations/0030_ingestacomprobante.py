@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0029_precioefectivo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestaComprobante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100, unique=True, verbose_name='Clave de idempotencia')),
+                ('huella', models.CharField(help_text='SHA-256 del documento recibido.', max_length=64)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('comprobante', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ingesta', to='ventas.comprobanteventa')),
+            ],
+            options={
+                'verbose_name': 'Ingesta de Comprobante',
+                'verbose_name_plural': 'Ingestas de Comprobantes',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parametros', '0020_configuracionempresa_stock_posteo_diferido'),
+        ('ventas', '0030_ingestacomprobante'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversionMasiva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_desde', models.DateField(blank=True, null=True)),
+                ('fecha_hasta', models.DateField(blank=True, null=True)),
+                ('condicion_venta', models.CharField(blank=True, choices=[('CO', 'Contado'), ('CC', 'Cuenta Corriente')], help_text='Solo si la regla no copia la condición de venta.', max_length=2)),
+                ('estado', models.CharField(choices=[('PE', 'Pendiente'), ('EC', 'En curso'), ('OK', 'Terminada'), ('ER', 'Fallida')], default='PE', max_length=2)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('procesados', models.PositiveIntegerField(default=0)),
+                ('convertidos', models.PositiveIntegerField(default=0)),
+                ('omitidos', models.PositiveIntegerField(default=0, help_text='Orígenes que ya tenían un comprobante destino.')),
+                ('con_error', models.PositiveIntegerField(default=0)),
+                ('errores', models.JSONField(blank=True, default=list)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('terminado_en', models.DateTimeField(blank=True, null=True)),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='ventas.cliente')),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('regla', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='parametros.reglaconversioncomprobante')),
+                ('serie_destino', models.ForeignKey(blank=True, help_text='Vacío: la serie activa del tipo destino con el punto de venta del origen.', null=True, on_delete=django.db.models.deletion.PROTECT, to='parametros.seriedocumento')),
+            ],
+            options={
+                'verbose_name': 'Conversión Masiva',
+                'verbose_name_plural': 'Conversiones Masivas',
+            },
+        ),
+    ]
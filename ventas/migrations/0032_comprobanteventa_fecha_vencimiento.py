@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def completar_vencimientos(apps, schema_editor):
+    """fecha local del comprobante + días de vencimiento del cliente, en un solo UPDATE."""
+    ComprobanteVenta = apps.get_model('ventas', 'ComprobanteVenta')
+    Cliente = apps.get_model('ventas', 'Cliente')
+    q = schema_editor.connection.ops.quote_name
+    pk = q(Cliente._meta.pk.column)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {q(ComprobanteVenta._meta.db_table)} AS c
+            SET fecha_vencimiento = CAST(c.fecha AT TIME ZONE %s AS date) + COALESCE(cl.dias_vencimiento, 0)
+            FROM {q(Cliente._meta.db_table)} AS cl
+            WHERE cl.{pk} = c.cliente_id AND c.fecha_vencimiento IS NULL
+        """, [settings.TIME_ZONE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0031_conversionmasiva'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comprobanteventa',
+            name='fecha_vencimiento',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Fecha de Vencimiento'),
+        ),
+        migrations.RunPython(completar_vencimientos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comprobanteventa',
+            index=models.Index(condition=models.Q(('estado', 'CN'), ('saldo_pendiente__gt', 0)), fields=['cliente', 'fecha_vencimiento'], include=('saldo_pendiente',), name='ventas_cv_abiertos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comprobanteventa',
+            index=models.Index(condition=models.Q(('estado', 'CN'), ('saldo_pendiente__gt', 0)), fields=['fecha_vencimiento'], include=('cliente', 'saldo_pendiente'), name='ventas_cv_abiertos_vto_idx'),
+        ),
+    ]
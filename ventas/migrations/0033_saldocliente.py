@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0032_comprobanteventa_fecha_vencimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoCliente',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo_cuenta', serialize=False, to='ventas.cliente')),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo_cta_cte', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('comprobantes_impagos', models.PositiveIntegerField(default=0)),
+                ('vencimiento_mas_antiguo', models.DateField(blank=True, null=True)),
+                ('proximo_vencimiento', models.DateField(blank=True, null=True)),
+                ('credito_disponible', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ventas_30d', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ventas_90d', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('comprobantes_90d', models.IntegerField(default=0)),
+                ('ultima_compra', models.DateTimeField(blank=True, null=True)),
+                ('calculado_al', models.DateField(blank=True, null=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo de Cliente',
+                'verbose_name_plural': 'Saldos de Clientes',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0033_saldocliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoCierreMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes cerrado.')),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('calculado_en', models.DateTimeField(auto_now=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres_mensuales', to='ventas.cliente')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Cierre Mensual',
+                'verbose_name_plural': 'Saldos de Cierre Mensual',
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'mes'), name='ventas_saldo_cierre_mensual_unico')],
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@
 from django.db import models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from collections import defaultdict
+from datetime import timedelta
 from decimal import Decimal
 from djmoney.money import Money
 from django.conf import settings
@@ -157,6 +159,13 @@ class Cliente(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
         verbose_name_plural = "Clientes"
 
 
+class ConflictoDeVersion(ValidationError):
+    """
+    El comprobante cambió en la base desde que se leyó en memoria
+    (control de concurrencia optimista sobre ComprobanteVenta.version).
+    """
+
+
 class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
     class Estado(models.TextChoices):
         BORRADOR = 'BR', 'Borrador'
@@ -204,9 +213,14 @@ class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
 
     # ✅ saldo_pendiente debe respetar pagos/imputaciones
     saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    # Fecha + días de vencimiento del cliente, fijada al emitir: base del aging (AntiguedadSaldosService)
+    fecha_vencimiento = models.DateField(null=True, blank=True, editable=False, verbose_name="Fecha de Vencimiento")
 
     deposito = models.ForeignKey('inventario.Deposito', on_delete=models.PROTECT, null=True, blank=True)
     stock_aplicado = models.BooleanField(default=False, editable=False)
+    # Control optimista: cada UPDATE exige la versión leída y la incrementa.
+    # Los .update() masivos sobre comprobantes deben incrementarla también.
+    version = models.PositiveIntegerField(default=0, editable=False)
     observaciones = models.TextField(blank=True, null=True, verbose_name="Observaciones / Notas")
 
     comprobantes_asociados = models.ManyToManyField(
@@ -281,6 +295,27 @@ class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
                 f"El cliente {self.cliente} NO está habilitado para operar en Cuenta Corriente. Debe ser CONTADO."
             )
 
+    CAMPOS_SALDO = ('estado', 'total', 'saldo_pendiente')
+    # Además: el mes, la condición y el cliente anteriores, para invalidar los cierres mensuales
+    CAMPOS_LEIDOS = CAMPOS_SALDO + ('fecha', 'condicion_venta', 'cliente_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Lo que hay en la base: SaldoClienteService aplica la diferencia al guardar
+        instancia._leido = {campo: instancia.__dict__.get(campo) for campo in cls.CAMPOS_LEIDOS}
+        return instancia
+
+    def asignar_vencimiento(self):
+        """
+        fecha_vencimiento = fecha (local) + días de vencimiento del cliente.
+        save() lo resuelve solo; las altas en bloque lo llaman antes de bulk_create.
+        """
+        if not (self.fecha and self.cliente_id):
+            return
+        fecha = timezone.localdate(self.fecha) if timezone.is_aware(self.fecha) else self.fecha.date()
+        self.fecha_vencimiento = fecha + timedelta(days=int(self.cliente.dias_vencimiento or 0))
+
     # ✅ Helper: recalcular totales y saldo sin romper pagos
     def recalcular_totales_y_saldo(self, *, nuevo_subtotal: Decimal, nuevos_impuestos: dict, nuevo_total: Decimal):
         """
@@ -311,7 +346,24 @@ class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
                 saldo_nuevo = Decimal("0")
             self.saldo_pendiente = saldo_nuevo
 
+    def _deuda_nueva(self, update_fields=None):
+        """Deuda en cuenta corriente que agrega este save(): al confirmar, o si sube el total de un confirmado."""
+        if self.estado != self.Estado.CONFIRMADO or self.condicion_venta != self.CondicionVenta.CTA_CTE:
+            return Decimal("0")
+        if update_fields is not None and not {'estado', 'total'} & set(update_fields):
+            return Decimal("0")
+        leido = getattr(self, '_leido', None) or {}
+        if leido.get('estado') != self.Estado.CONFIRMADO:
+            return Decimal(str(self.saldo_pendiente or 0))
+        return Decimal(str(self.total or 0)) - Decimal(str(leido.get('total') or 0))
+
     def save(self, *args, **kwargs):
+        # Límite de crédito contra la fila de SaldoCliente, antes de consumir numeración
+        deuda_nueva = self._deuda_nueva(kwargs.get('update_fields'))
+        if deuda_nueva > 0:
+            from .services import SaldoClienteService
+            SaldoClienteService.verificar_credito(self, deuda_nueva)
+
         if self.serie:
             self.tipo_comprobante = self.serie.tipo_comprobante
             self.letra = self.serie.tipo_comprobante.letra
@@ -325,7 +377,7 @@ class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
                     serie_lock = SerieDocumento.objects.select_for_update().get(pk=self.serie.pk)
                     self.numero = serie_lock.ultimo_numero + 1
                     serie_lock.ultimo_numero = self.numero
-                    serie_lock.save()
+                    serie_lock.save(update_fields=['ultimo_numero'])
 
         if self.tipo_comprobante and not (self.letra or '').strip():
             self.letra = self.tipo_comprobante.letra
@@ -337,7 +389,58 @@ class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
             if deposito_principal:
                 self.deposito = deposito_principal
 
-        super().save(*args, **kwargs)
+        # Vencimiento: sigue a fecha y cliente mientras es borrador, queda fijo al emitir
+        update_fields = kwargs.get('update_fields')
+        if (self.fecha_vencimiento is None or self.estado == self.Estado.BORRADOR
+                or {'fecha', 'cliente'} & set(update_fields or ())):
+            self.asignar_vencimiento()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'fecha_vencimiento'}
+
+        # Compare-and-swap: el UPDATE solo aplica si la fila sigue en la versión leída
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            self._marcar_leido(kwargs.get('update_fields'))
+            return
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        self._version_esperada = self.version
+        self.version += 1
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = self._version_esperada
+            raise
+        finally:
+            self._version_esperada = None
+        self._marcar_leido(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._marcar_leido(fields)
+
+    def _marcar_leido(self, update_fields=None):
+        leido = getattr(self, '_leido', None) or dict.fromkeys(self.CAMPOS_LEIDOS)
+        # update_fields trae nombres de campo ('cliente'); _leido, columnas ('cliente_id')
+        escritos = None if update_fields is None else {self._meta.get_field(campo).attname for campo in update_fields}
+        for campo in self.CAMPOS_LEIDOS:
+            if escritos is None or campo in escritos:
+                leido[campo] = getattr(self, campo)
+        self._leido = leido
+
+    def _do_update(self, base_qs, using, pk_val, values, *args, **kwargs):
+        esperada = getattr(self, '_version_esperada', None)
+        if esperada is None:
+            return super()._do_update(base_qs, using, pk_val, values, *args, **kwargs)
+        if super()._do_update(base_qs.filter(version=esperada), using, pk_val, values, *args, **kwargs):
+            return True
+        # Solo en el caso de conflicto se paga la lectura extra
+        if base_qs.filter(pk=pk_val).exists():
+            raise ConflictoDeVersion(
+                f"El comprobante {self.numero_completo} fue modificado por otro proceso. "
+                f"Recargue los datos e intente nuevamente."
+            )
+        return False
 
     def __str__(self):
         fecha_str = self.fecha.strftime('%d/%m/%Y %H:%M:%S') if self.fecha else 'S/F'
@@ -347,6 +450,17 @@ class ComprobanteVenta(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
     class Meta:
         verbose_name = "Comprobante de Venta"
         verbose_name_plural = "Comprobantes de Venta"
+        indexes = [
+            # Partidas abiertas (confirmados con saldo): aging y deuda por cliente sin leer la tabla
+            models.Index(
+                fields=['cliente', 'fecha_vencimiento'], include=['saldo_pendiente'],
+                name='ventas_cv_abiertos_idx', condition=models.Q(estado='CN', saldo_pendiente__gt=0),
+            ),
+            models.Index(
+                fields=['fecha_vencimiento'], include=['cliente', 'saldo_pendiente'],
+                name='ventas_cv_abiertos_vto_idx', condition=models.Q(estado='CN', saldo_pendiente__gt=0),
+            ),
+        ]
 
 
 class ComprobanteVentaItem(models.Model):  # Mantenido como Model básico (Detalle de comprobante)
@@ -369,35 +483,62 @@ class ComprobanteVentaItem(models.Model):  # Mantenido como Model básico (Detal
     def clean(self):
         super().clean()
 
+        # El serializer ya validó todas las líneas juntas con validar_stock_lote()
+        if getattr(self, '_stock_validado', False):
+            return
         if self.comprobante and hasattr(self.comprobante, 'estado') and hasattr(self.comprobante, 'tipo_comprobante'):
-            if self.comprobante.estado == ComprobanteVenta.Estado.CONFIRMADO:
-                tipo = self.comprobante.tipo_comprobante
-                deposito = self.comprobante.deposito
+            ComprobanteVentaItem.validar_stock_lote(self.comprobante, [self])
 
-                # ✅ FIX: no asumir que existe afecta_stock_fisico
-                afecta_fisico = getattr(tipo, "afecta_stock_fisico", True)
+    @staticmethod
+    def validar_stock_lote(comprobante, items):
+        """
+        Control preventivo de stock REAL para las líneas de un comprobante confirmado.
+        Una sola consulta para todas las líneas (StockManager.disponibilidad_lote);
+        informa todas las faltas juntas. Marca los ítems como validados.
+        """
+        for item in items:
+            item._stock_validado = True
 
-                if tipo and getattr(tipo, "mueve_stock", False) and afecta_fisico and deposito:
-                    puede_negativo = bool(
-                        getattr(self.articulo, "permite_stock_negativo", False) or
-                        getattr(deposito, "permite_stock_negativo", False)
-                    )
+        if comprobante.estado != ComprobanteVenta.Estado.CONFIRMADO:
+            return
+        tipo = comprobante.tipo_comprobante
+        deposito = comprobante.deposito
 
-                    if not puede_negativo:
-                        saldo_actual = StockManager.obtener_saldo_actual(self.articulo, deposito, 'REAL')
+        # ✅ FIX: no asumir que existe afecta_stock_fisico
+        afecta_fisico = getattr(tipo, "afecta_stock_fisico", True)
+        if not (tipo and getattr(tipo, "mueve_stock", False) and afecta_fisico and deposito):
+            return
 
-                        if self.pk:
-                            try:
-                                old_item = ComprobanteVentaItem.objects.get(pk=self.pk)
-                                saldo_actual += old_item.cantidad
-                            except ComprobanteVentaItem.DoesNotExist:
-                                pass
+        a_validar = [
+            item for item in items
+            if not (getattr(item.articulo, "permite_stock_negativo", False) or
+                    getattr(deposito, "permite_stock_negativo", False))
+        ]
+        if not a_validar:
+            return
 
-                        if saldo_actual < self.cantidad:
-                            raise ValidationError(
-                                f"Stock insuficiente en {deposito}. Disponible: {saldo_actual}. "
-                                f"Solicitado: {self.cantidad}."
-                            )
+        # Las líneas ya guardadas liberan su cantidad anterior
+        anteriores = defaultdict(Decimal)
+        for articulo_id, cantidad in ComprobanteVentaItem.objects.filter(
+            pk__in=[item.pk for item in a_validar if item.pk]
+        ).values_list('articulo_id', 'cantidad'):
+            anteriores[articulo_id] += cantidad
+
+        disponibilidad = StockManager.disponibilidad_lote(
+            [(item.articulo_id, item.cantidad) for item in a_validar], depositos=[deposito]
+        )
+        articulos = {item.articulo_id: item.articulo for item in a_validar}
+        faltas = []
+        for articulo_id, dato in disponibilidad.items():
+            saldo_actual = dato['depositos'].get(deposito.pk, {}).get('real', Decimal(0)) + anteriores[articulo_id]
+            if saldo_actual < dato['cantidad']:
+                prefijo = f"{articulos[articulo_id].descripcion}: " if len(articulos) > 1 else ""
+                faltas.append(
+                    f"{prefijo}Stock insuficiente en {deposito}. Disponible: {saldo_actual}. "
+                    f"Solicitado: {dato['cantidad']}."
+                )
+        if faltas:
+            raise ValidationError(faltas)
 
 
 class PriceList(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
@@ -449,7 +590,45 @@ class ProductPrice(models.Model):  # Mantenido como Model básico (Detalle de li
         verbose_name_plural = "Precios de Productos"
 
 
+class PrecioEfectivo(models.Model):
+    """
+    Precio efectivo materializado por (lista, artículo, escala de cantidad).
+    Lo mantiene PrecioEfectivoService desde los signals de precios: no se edita a mano.
+    La fila base (es_base, min_quantity=0) es el precio del artículo con el descuento
+    de la lista; las demás salen de ProductPrice. Guarda neto, impuestos por unidad y final.
+    """
+    price_list = models.ForeignKey(PriceList, on_delete=models.CASCADE, related_name='precios_efectivos')
+    articulo = models.ForeignKey('inventario.Articulo', on_delete=models.CASCADE, related_name='precios_efectivos')
+    min_quantity = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    max_quantity = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
+    es_base = models.BooleanField(default=False)
+    precio_neto = models.DecimalField(max_digits=14, decimal_places=4)
+    impuestos = models.JSONField(default=dict, blank=True)
+    precio_final = models.DecimalField(max_digits=14, decimal_places=4)
+    moneda = models.ForeignKey('parametros.Moneda', on_delete=models.PROTECT)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.price_list} | {self.articulo_id} x{self.min_quantity}: {self.precio_final}"
+
+    class Meta:
+        verbose_name = "Precio Efectivo"
+        verbose_name_plural = "Precios Efectivos"
+        constraints = [
+            # También es el índice de lectura: (lista, artículo) y la escala por min_quantity
+            models.UniqueConstraint(
+                fields=['price_list', 'articulo', 'min_quantity', 'es_base'], name='ventas_precio_efectivo_unico'
+            ),
+        ]
+
+
 # --- RECIBOS ---
+def _actualizar_saldos_clientes(cliente_ids):
+    """Las imputaciones de un recibo se proyectan juntas en SaldoCliente (una vez por cliente)."""
+    from .services import SaldoClienteService
+    SaldoClienteService.actualizar_abiertos(cliente_ids)
+
+
 class Recibo(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
     class Estado(models.TextChoices):
         BORRADOR = 'BR', 'Borrador'
@@ -543,12 +722,16 @@ class Recibo(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
                         saldo_monto=F('saldo_monto') + valor.monto
                     )
 
+            clientes = set()
             for imputacion in self.imputaciones.all():
                 comp = imputacion.comprobante
                 comp.saldo_pendiente -= imputacion.monto_imputado
                 if comp.saldo_pendiente < 0:
                     comp.saldo_pendiente = 0
+                comp._saldo_cliente_diferido = True
                 comp.save()
+                clientes.add(comp.cliente_id)
+            _actualizar_saldos_clientes(clientes)
 
             self.finanzas_aplicadas = True
             self.save(update_fields=['finanzas_aplicadas'])
@@ -565,7 +748,9 @@ class Recibo(ERPBaseModel):  # <-- HEREDA DE ERPBaseModel
             for imputacion in imputaciones:
                 comp = imputacion.comprobante
                 comp.saldo_pendiente += imputacion.monto_imputado
+                comp._saldo_cliente_diferido = True
                 comp.save()
+            _actualizar_saldos_clientes({imputacion.comprobante.cliente_id for imputacion in imputaciones})
 
             from django.db.models import F
             for valor in valores:
@@ -686,4 +871,176 @@ class ComprobanteCobroItem(models.Model):
     tarjeta_cupon = models.CharField(max_length=50, blank=True, verbose_name="Cupón")
 
     def __str__(self):
-        return f"{self.tipo_valor}: ${self.monto}"
\ No newline at end of file
+        return f"{self.tipo_valor}: ${self.monto}"
+
+
+class PosteoStockPendiente(models.Model):
+    """
+    Outbox del posteo de stock diferido (ConfiguracionEmpresa.stock_posteo_diferido).
+    Se crea en la misma transacción que confirma el comprobante; el consumidor de
+    Celery (PosteoStockService.procesar_pendientes) lo registra en el Ledger por
+    lotes y lo marca procesado en la misma transacción que el posteo.
+    Una fila por comprobante: el posteo es idempotente por documento.
+    """
+    comprobante = models.OneToOneField(
+        ComprobanteVenta, on_delete=models.CASCADE, related_name='posteo_stock'
+    )
+    creado_en = models.DateTimeField(auto_now_add=True, db_index=True)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Posteo stock {self.comprobante_id} ({'procesado' if self.procesado_en else 'pendiente'})"
+
+    class Meta:
+        verbose_name = "Posteo de Stock Pendiente"
+        verbose_name_plural = "Posteos de Stock Pendientes"
+        indexes = [
+            models.Index(
+                fields=['creado_en'], name='ventas_posteo_pendiente_idx',
+                condition=models.Q(procesado_en__isnull=True)
+            ),
+        ]
+
+
+class IngestaComprobante(models.Model):
+    """
+    Registro de idempotencia de la ingesta masiva de comprobantes (marketplaces,
+    POS offline). Se escribe en la misma transacción que el comprobante: reenviar
+    un documento con la misma clave devuelve el comprobante ya creado.
+    `huella` detecta la reutilización de una clave con otro contenido.
+    """
+    clave = models.CharField(max_length=100, unique=True, verbose_name="Clave de idempotencia")
+    huella = models.CharField(max_length=64, help_text="SHA-256 del documento recibido.")
+    comprobante = models.OneToOneField(
+        ComprobanteVenta, on_delete=models.CASCADE, related_name='ingesta'
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Ingesta {self.clave} → {self.comprobante_id}"
+
+    class Meta:
+        verbose_name = "Ingesta de Comprobante"
+        verbose_name_plural = "Ingestas de Comprobantes"
+
+
+class ConversionMasiva(models.Model):
+    """
+    Corrida de conversión masiva según una ReglaConversionComprobante (ej. notas
+    de pedido → facturas a fin de mes). La ejecutan tareas de Celery por tramos
+    en paralelo (ver ConversionMasivaService); los contadores son el avance.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PE', 'Pendiente'
+        EN_CURSO = 'EC', 'En curso'
+        TERMINADA = 'OK', 'Terminada'
+        FALLIDA = 'ER', 'Fallida'
+
+    regla = models.ForeignKey('parametros.ReglaConversionComprobante', on_delete=models.PROTECT)
+    cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT, null=True, blank=True)
+    fecha_desde = models.DateField(null=True, blank=True)
+    fecha_hasta = models.DateField(null=True, blank=True)
+    serie_destino = models.ForeignKey(
+        'parametros.SerieDocumento', on_delete=models.PROTECT, null=True, blank=True,
+        help_text="Vacío: la serie activa del tipo destino con el punto de venta del origen."
+    )
+    condicion_venta = models.CharField(
+        max_length=2, choices=ComprobanteVenta.CondicionVenta.choices, blank=True,
+        help_text="Solo si la regla no copia la condición de venta."
+    )
+
+    estado = models.CharField(max_length=2, choices=Estado.choices, default=Estado.PENDIENTE)
+    total = models.PositiveIntegerField(default=0)
+    procesados = models.PositiveIntegerField(default=0)
+    convertidos = models.PositiveIntegerField(default=0)
+    omitidos = models.PositiveIntegerField(default=0, help_text="Orígenes que ya tenían un comprobante destino.")
+    con_error = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+
+    creado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def porcentaje(self):
+        if not self.total:
+            return 100.0 if self.estado == self.Estado.TERMINADA else 0.0
+        return round(100 * self.procesados / self.total, 1)
+
+    def __str__(self):
+        return f"Conversión masiva #{self.pk} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = "Conversión Masiva"
+        verbose_name_plural = "Conversiones Masivas"
+
+
+class SaldoCliente(models.Model):
+    """
+    Proyección por cliente de su deuda y actividad: lo que leen el control de límite
+    de crédito, el listado y el dashboard de clientes y el informe de saldos, sin
+    agregar ComprobanteVenta en cada pedido. La mantiene SaldoClienteService en la
+    misma transacción que la confirmación/anulación del comprobante y la aplicación
+    o reversión de recibos; no se edita a mano.
+
+    `vencido` deja de valer cuando `proximo_vencimiento` queda atrás
+    (SaldoClienteService.vigentes lo rehace). Las ventanas de 30/90 días se
+    anclan a `calculado_al` y las recorre la corrida diaria.
+    """
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name='saldo_cuenta')
+    saldo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo_cta_cte = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vencido = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    comprobantes_impagos = models.PositiveIntegerField(default=0)
+    vencimiento_mas_antiguo = models.DateField(null=True, blank=True)
+    proximo_vencimiento = models.DateField(null=True, blank=True)
+    credito_disponible = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ventas_30d = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ventas_90d = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    comprobantes_90d = models.IntegerField(default=0)
+    ultima_compra = models.DateTimeField(null=True, blank=True)
+    calculado_al = models.DateField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    @property
+    def no_vencido(self):
+        return self.saldo - self.vencido
+
+    def __str__(self):
+        return f"Saldo {self.cliente_id}: {self.saldo}"
+
+    class Meta:
+        verbose_name = "Saldo de Cliente"
+        verbose_name_plural = "Saldos de Clientes"
+
+
+class SaldoCierreMensual(models.Model):
+    """
+    Saldo de cuenta corriente de un cliente al cierre de cada mes (DEBE - HABER
+    hasta el último día de `mes`, inclusive). CuentaCorrienteService arranca el
+    saldo anterior del cierre más cercano y suma en SQL solo los días que faltan.
+
+    Lo completa la corrida diaria (SaldoCierreMensualService.cerrar); un comprobante
+    o recibo con fecha en un mes ya cerrado borra los cierres desde ese mes y la
+    próxima corrida los rehace. No se edita a mano.
+    """
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='cierres_mensuales')
+    mes = models.DateField(help_text="Primer día del mes cerrado.")
+    saldo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cierre {self.cliente_id} {self.mes:%Y-%m}: {self.saldo}"
+
+    class Meta:
+        verbose_name = "Saldo de Cierre Mensual"
+        verbose_name_plural = "Saldos de Cierre Mensual"
+        constraints = [
+            # También es el índice de lectura: el cierre más cercano de un cliente
+            models.UniqueConstraint(fields=['cliente', 'mes'], name='ventas_saldo_cierre_mensual_unico'),
+        ]
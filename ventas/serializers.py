@@ -14,7 +14,7 @@ from entidades.serializers import ClienteSerializer
 from parametros.serializers import TipoComprobanteSerializer
 
 # --- MODELOS DE ESTA APP ---
-from .models import ComprobanteVenta, ComprobanteVentaItem, Cliente
+from .models import ComprobanteVenta, ComprobanteVentaItem, Cliente, ConflictoDeVersion
 
 # --- SERVICIOS (para recalcular totales en update) ---
 from .services import TaxCalculatorService
@@ -61,6 +61,8 @@ class ComprobanteVentaCreateSerializer(serializers.ModelSerializer):
 
     # ✅ En PATCH no siempre mandan items
     items = ComprobanteVentaItemCreateSerializer(many=True, required=False)
+    # Versión leída por el cliente: si el comprobante cambió desde entonces, el UPDATE da conflicto
+    version = serializers.IntegerField(required=False, write_only=True)
 
     class Meta:
         model = ComprobanteVenta
@@ -78,6 +80,7 @@ class ComprobanteVentaCreateSerializer(serializers.ModelSerializer):
             'cliente_nombre_override',
             'cliente_cuit_override',
             'cliente_email_override',
+            'version',
         ]
 
     def update(self, instance, validated_data):
@@ -90,6 +93,12 @@ class ComprobanteVentaCreateSerializer(serializers.ModelSerializer):
           (respeta pagos si está confirmado).
         """
         items_data = validated_data.pop('items', None)
+        version = validated_data.pop('version', None)
+        if version is not None and version != instance.version:
+            raise ConflictoDeVersion(
+                f"El comprobante {instance.numero_completo} fue modificado por otro proceso. "
+                f"Recargue los datos e intente nuevamente."
+            )
 
         with transaction.atomic():
             # 1) Update de campos simples
@@ -104,13 +113,13 @@ class ComprobanteVentaCreateSerializer(serializers.ModelSerializer):
 
                 subtotal_acumulado = Decimal("0")
 
+                nuevos_items = [ComprobanteVentaItem(comprobante=instance, **item_data) for item_data in items_data]
+                # ✅ Stock preventivo de todas las líneas en una sola consulta
+                ComprobanteVentaItem.validar_stock_lote(instance, nuevos_items)
+
                 # Creamos items nuevos
-                for item_data in items_data:
-                    item_obj = ComprobanteVentaItem(
-                        comprobante=instance,
-                        **item_data
-                    )
-                    # ✅ dispara clean() del item (stock preventivo, etc.) cuando corresponda
+                for item_obj in nuevos_items:
+                    # ✅ dispara clean() del item cuando corresponda (el stock ya quedó validado)
                     item_obj.full_clean()
                     item_obj.save()
 
@@ -180,4 +189,5 @@ class ComprobanteVentaSerializer(serializers.ModelSerializer):
             'cliente_nombre_override',
             'cliente_cuit_override',
             'cliente_email_override',
+            'version',
         ]
\ No newline at end of file
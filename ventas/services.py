@@ -1,16 +1,34 @@
 # ventas/services.py (VERSIÓN FINAL CORREGIDA)
 
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Avg, Count, DateField, F, Max, Min, Prefetch, Q, Sum
+from django.db.models.functions import TruncMonth
 from decimal import Decimal
 from djmoney.money import Money
 from collections import defaultdict
+from itertools import islice
 from dataclasses import dataclass, field
 from typing import Dict, Any
 
-from .models import PriceList, ProductPrice, Cliente
-from inventario.models import Articulo
-from compras.services import CostCalculatorService
+from .models import (
+    PriceList, ProductPrice, PrecioEfectivo, Cliente, ComprobanteVenta, ComprobanteVentaItem, PosteoStockPendiente,
+    Recibo, SaldoCierreMensual, SaldoCliente,
+)
+from inventario.models import Articulo, ProveedorArticulo
+from inventario.services import StockManager
+from compras.services import CostCalculatorService, PriceListService
+from parametros.models import TipoComprobante
+from parametros.maestros import (
+    get_config_empresa, get_impuestos, get_impuestos_articulos, get_lista_precios_default, get_moneda, get_serie
+)
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -24,126 +42,1079 @@ class PricingResult:
 
 
 class TaxCalculatorService:
-    # ... (sin cambios en TaxCalculatorService, déjalo como estaba) ...
+    """
+    Motor de impuestos por lote.
+
+    Los impuestos de todos los artículos del documento se resuelven juntos desde
+    el caché de maestros (get_impuestos_articulos + get_impuestos). Cada conjunto
+    de impuestos se compila una vez por (tenant, operación, fecha) a una tupla de
+    reglas (nombre, es_porcentaje, factor), así el cálculo por línea es solo
+    aritmética Decimal. Las reglas compiladas se descartan cuando cambia algún
+    Impuesto (get_impuestos devuelve un objeto nuevo).
+    """
+    MAX_REGLAS_COMPILADAS = 5000
+    _compiladas = {}  # schema -> (dict de impuestos de origen, {(ids, tipo, fecha): reglas})
+
     @staticmethod
-    def calcular_impuestos_comprobante(comprobante, tipo_operacion: str):
+    def _compilar(impuestos, ids, tipo_operacion, fecha):
+        reglas = []
+        for pk in ids:
+            impuesto = impuestos.get(pk)
+            if impuesto is None or impuesto.aplica_a not in (tipo_operacion, 'ambos'):
+                continue
+            if impuesto.vigente_desde > fecha or (impuesto.vigente_hasta and impuesto.vigente_hasta < fecha):
+                continue
+            factor = impuesto.tasa / Decimal(100) if impuesto.es_porcentaje else impuesto.tasa
+            reglas.append((impuesto.nombre, impuesto.es_porcentaje, factor))
+        return tuple(reglas)
+
+    @staticmethod
+    def reglas_articulos(articulo_ids, tipo_operacion, fecha=None):
+        """{articulo_id: ((nombre, es_porcentaje, factor), ...)} vigentes en `fecha`."""
+        fecha = fecha or timezone.now().date()
+        impuestos = get_impuestos()
+        schema = connection.schema_name
+        origen, compiladas = TaxCalculatorService._compiladas.get(schema, (None, None))
+        if origen is not impuestos or len(compiladas) > TaxCalculatorService.MAX_REGLAS_COMPILADAS:
+            compiladas = {}
+            TaxCalculatorService._compiladas[schema] = (impuestos, compiladas)
+
+        resultado = {}
+        for articulo_id, ids in get_impuestos_articulos(articulo_ids).items():
+            clave = (ids, tipo_operacion, fecha)
+            reglas = compiladas.get(clave)
+            if reglas is None:
+                reglas = compiladas[clave] = TaxCalculatorService._compilar(impuestos, ids, tipo_operacion, fecha)
+            resultado[articulo_id] = reglas
+        return resultado
+
+    @staticmethod
+    def calcular_impuestos_lineas(lineas, tipo_operacion: str, fecha=None):
+        """
+        lineas: iterable de (articulo_id, cantidad, subtotal) en Decimal.
+        Devuelve {nombre_impuesto: monto} redondeado a centavos.
+        """
+        lineas = [linea for linea in lineas if linea[2] and linea[2] > 0]
+        reglas = TaxCalculatorService.reglas_articulos({linea[0] for linea in lineas}, tipo_operacion, fecha)
+
         impuestos_agrupados = defaultdict(Decimal)
-        today = timezone.now().date()
+        for articulo_id, cantidad, subtotal in lineas:
+            for nombre, es_porcentaje, factor in reglas.get(articulo_id, ()):
+                impuestos_agrupados[nombre] += subtotal * factor if es_porcentaje else factor * cantidad
 
+        return {nombre: monto.quantize(Decimal('0.01')) for nombre, monto in impuestos_agrupados.items()}
+
+    @staticmethod
+    def calcular_impuestos_comprobante(comprobante, tipo_operacion: str):
         items_iter = comprobante.items.all() if hasattr(comprobante.items, 'all') else comprobante.items
 
+        lineas = []
         for item in items_iter:
-            subtotal_item_raw = item.subtotal
+            subtotal_item = item.subtotal
             # Robustez: obtener amount si es Money
-            subtotal_item = subtotal_item_raw.amount if hasattr(subtotal_item_raw, 'amount') else subtotal_item_raw
+            subtotal_item = subtotal_item.amount if hasattr(subtotal_item, 'amount') else subtotal_item
+            articulo_id = getattr(item, 'articulo_id', None) or item.articulo.pk
+            lineas.append((articulo_id, item.cantidad, subtotal_item))
 
-            if not subtotal_item or subtotal_item <= 0: continue
+        return TaxCalculatorService.calcular_impuestos_lineas(lineas, tipo_operacion)
 
-            impuestos_aplicables = item.articulo.impuestos.filter(
-                Q(aplica_a=tipo_operacion) | Q(aplica_a='ambos'),
-                vigente_desde__lte=today
-            ).filter(Q(vigente_hasta__isnull=True) | Q(vigente_hasta__gte=today))
 
-            for impuesto in impuestos_aplicables:
-                monto_impuesto = Decimal('0.00')
-                if impuesto.es_porcentaje:
-                    monto_impuesto = subtotal_item * (impuesto.tasa / Decimal(100))
-                else:
-                    monto_impuesto = impuesto.tasa * item.cantidad
-                impuestos_agrupados[impuesto.nombre] += monto_impuesto
+class PricingService:
+    """
+    Precios de venta por cliente. `cotizar_lote` resuelve muchos artículos con un
+    número fijo de consultas (artículos, proveedor fuente, ítems de listas del
+    proveedor, conversiones de unidad, precios efectivos de la lista); los impuestos
+    salen del caché de maestros. `get_product_pricing` es el caso de un solo artículo.
+    """
+    MAX_ITEMS_LOTE = 5000
 
-        return {nombre: monto.quantize(Decimal('0.01')) for nombre, monto in impuestos_agrupados.items()}
+    @staticmethod
+    def _lista_vigente(lista, fecha):
+        if not lista:
+            return None
+        if lista.valid_from and fecha < lista.valid_from: return None
+        if lista.valid_until and fecha > lista.valid_until: return None
+        return lista
 
+    @staticmethod
+    def lista_para_cliente(customer: Cliente, fecha=None):
+        """La lista del cliente si está vigente; si no, la lista por defecto vigente."""
+        fecha = fecha or timezone.now().date()
+        return (
+            PricingService._lista_vigente(customer.price_list, fecha)
+            or PricingService._lista_vigente(get_lista_precios_default(), fecha)
+        )
 
-class PricingService:
     @staticmethod
     def get_product_pricing(product: Articulo, customer: Cliente, quantity: Decimal = Decimal(1)) -> "PricingResult":
-        date = timezone.now().date()
+        return PricingService.cotizar_lote(customer, [(product.pk, quantity)])[0]
+
+    @staticmethod
+    def cotizar_lote(customer: Cliente, pares, fecha=None):
+        """
+        pares: lista de (articulo_id, cantidad). Devuelve una lista de PricingResult en
+        el mismo orden (None para artículos inexistentes).
+        """
+        date = fecha or timezone.now().date()
+        pares = [(articulo_id, Decimal(str(cantidad))) for articulo_id, cantidad in pares]
+        ids = {articulo_id for articulo_id, _ in pares}
 
-        # 1. COSTO
-        costo_efectivo = product.precio_costo
-        proveedor_fuente = product.proveedor_actualiza_precio
+        articulos = Articulo.objects.filter(pk__in=ids).only(
+            'pk', 'precio_costo_monto', 'precio_costo_moneda_id', 'precio_venta_monto', 'precio_venta_moneda_id'
+        ).in_bulk()
 
-        if proveedor_fuente:
-            item_costo = CostCalculatorService.get_latest_price(
-                proveedor_pk=proveedor_fuente.pk,
-                articulo_pk=product.pk,
-                cantidad=quantity
-            )
-            if item_costo:
-                costo_efectivo = CostCalculatorService.calculate_effective_cost(item_costo)
-
-        # 2. PRECIO VENTA NETO
-        precio_venta_neto = product.precio_venta
-        price_list_to_use = None
-
-        if customer.price_list:
-            lista = customer.price_list
-            is_valid = True
-            if lista.valid_from and date < lista.valid_from: is_valid = False
-            if lista.valid_until and date > lista.valid_until: is_valid = False
-            if is_valid: price_list_to_use = lista
-
-        if not price_list_to_use:
-            default_list = PriceList.objects.filter(is_default=True).first()
-            if default_list:
-                is_valid = True
-                if default_list.valid_from and date < default_list.valid_from: is_valid = False
-                if default_list.valid_until and date > default_list.valid_until: is_valid = False
-                if is_valid: price_list_to_use = default_list
+        # 1. COSTO: proveedor fuente de cada artículo y su ítem de lista vigente
+        fuentes = dict(ProveedorArticulo.objects.filter(
+            articulo_id__in=ids, es_fuente_de_verdad=True
+        ).values_list('articulo_id', 'proveedor_id'))
+        items_costo = PriceListService.get_active_price_items_lote(
+            ((fuentes[a], a, c) for a, c in pares if a in fuentes), date
+        )
+        conversiones = CostCalculatorService.factores_conversion(items_costo.values())
 
+        # 2. LISTA DE PRECIOS de venta: la del cliente si está vigente, si no la default
+        price_list_to_use = PricingService.lista_para_cliente(customer, date)
+        efectivos = {}
         if price_list_to_use:
-            price_obj = ProductPrice.objects.filter(
-                product=product,
-                price_list=price_list_to_use,
-                min_quantity__lte=quantity
-            ).filter(Q(max_quantity__isnull=True) | Q(max_quantity__gte=quantity)).order_by('-min_quantity').first()
-
-            if price_obj:
-                precio_venta_neto = Money(price_obj.price_monto, price_obj.price_moneda.simbolo)
-
-            if price_list_to_use.discount_percentage > 0:
-                factor = Decimal(1) - (price_list_to_use.discount_percentage / Decimal(100))
-                precio_venta_neto = precio_venta_neto * factor
-
-        # 3. MÁRGENES
-        costo_monto = costo_efectivo.amount
-        venta_neta_monto = precio_venta_neto.amount
-        utilidad = Decimal('0.00')
-        markup = Decimal('0.00')
-
-        if venta_neta_monto > 0:
-            utilidad = ((venta_neta_monto - costo_monto) / venta_neta_monto) * 100
-        if costo_monto > 0:
-            markup = ((venta_neta_monto - costo_monto) / costo_monto) * 100
-
-        # 4. IMPUESTOS
-        class FakeItem:
-            subtotal = precio_venta_neto
-            articulo = product
-            cantidad = quantity
-
-        class FakeComprobante:
-            items = [FakeItem()]
-
-        impuestos_calculados_dict = TaxCalculatorService.calcular_impuestos_comprobante(FakeComprobante(), 'venta')
-        total_impuestos = sum(impuestos_calculados_dict.values(), Decimal('0.00'))
-
-        # 5. FINAL
-        precio_final = precio_venta_neto + Money(total_impuestos, precio_venta_neto.currency)
-
-        # --- CORRECCIÓN DEL ERROR ATTRIBUTE ERROR ---
-        # En lugar de .quantize() directo al objeto Money, usamos round() que django-money soporta
-        # O redondeamos el .amount y recreamos el Money.
-
-        def round_money(money_obj):
-            return Money(money_obj.amount.quantize(Decimal('0.01')), money_obj.currency)
-
-        return PricingResult(
-            costo=round_money(costo_efectivo),
-            utilidad=utilidad.quantize(Decimal('0.01')),
-            markup=markup.quantize(Decimal('0.01')),
-            precio_venta_neto=round_money(precio_venta_neto),
-            impuestos={k: Money(v, precio_venta_neto.currency) for k, v in impuestos_calculados_dict.items()},
-            precio_final=round_money(precio_final)
-        )
\ No newline at end of file
+            efectivos = PrecioEfectivoService.precios(price_list_to_use, ids)
+            faltantes = [
+                (a.pk, a.precio_venta_monto, a.precio_venta_moneda_id)
+                for pk, a in articulos.items() if pk not in efectivos
+            ]
+            if faltantes:
+                # Aún no materializados (ej. antes de la primera reconstrucción): se calculan en memoria
+                filas = PrecioEfectivoService.construir([price_list_to_use], faltantes, date)
+                efectivos.update(PrecioEfectivoService.agrupar(filas))
+
+        # 3. IMPUESTOS ya compilados por artículo
+        reglas = TaxCalculatorService.reglas_articulos(ids, 'venta', date)
+
+        def round_money(monto, moneda):
+            return Money(monto.quantize(Decimal('0.01')), moneda)
+
+        resultados = []
+        for articulo_id, quantity in pares:
+            product = articulos.get(articulo_id)
+            if product is None:
+                resultados.append(None)
+                continue
+
+            item_costo = items_costo.get((fuentes.get(articulo_id), articulo_id, quantity))
+            if item_costo:
+                costo = CostCalculatorService.calculate_effective_cost(item_costo, conversiones)
+                costo_monto, moneda_costo = costo.amount, costo.currency
+            else:
+                costo_monto = product.precio_costo_monto
+                moneda_costo = get_moneda(product.precio_costo_moneda_id).simbolo
+
+            fila = PrecioEfectivoService.elegir(efectivos.get(articulo_id, ()), quantity)
+            if fila:
+                venta_neta_monto = fila.precio_neto
+                moneda_venta = get_moneda(fila.moneda_id).simbolo
+            else:
+                venta_neta_monto = product.precio_venta_monto
+                moneda_venta = get_moneda(product.precio_venta_moneda_id).simbolo
+
+            # MÁRGENES
+            utilidad = Decimal('0.00')
+            markup = Decimal('0.00')
+            if venta_neta_monto > 0:
+                utilidad = ((venta_neta_monto - costo_monto) / venta_neta_monto) * 100
+            if costo_monto > 0:
+                markup = ((venta_neta_monto - costo_monto) / costo_monto) * 100
+
+            # IMPUESTOS sobre el precio unitario neto (los montos fijos, por cantidad)
+            impuestos = defaultdict(Decimal)
+            if venta_neta_monto > 0:
+                for nombre, es_porcentaje, factor in reglas.get(articulo_id, ()):
+                    impuestos[nombre] += venta_neta_monto * factor if es_porcentaje else factor * quantity
+            impuestos = {nombre: monto.quantize(Decimal('0.01')) for nombre, monto in impuestos.items()}
+            total_impuestos = sum(impuestos.values(), Decimal('0.00'))
+
+            resultados.append(PricingResult(
+                costo=round_money(costo_monto, moneda_costo),
+                utilidad=utilidad.quantize(Decimal('0.01')),
+                markup=markup.quantize(Decimal('0.01')),
+                precio_venta_neto=round_money(venta_neta_monto, moneda_venta),
+                impuestos={k: Money(v, moneda_venta) for k, v in impuestos.items()},
+                precio_final=round_money(venta_neta_monto + total_impuestos, moneda_venta),
+            ))
+        return resultados
+
+
+class PrecioEfectivoService:
+    """
+    Tabla materializada de precios efectivos (PrecioEfectivo).
+
+    Por cada lista activa y artículo: una fila base (precio del artículo con el
+    descuento de la lista) y una fila por escala de ProductPrice, con los impuestos
+    de venta por unidad y el precio final ya calculados. Leer un precio es una
+    búsqueda por índice; la vigencia de la lista y el fallback a la default se
+    resuelven antes (PricingService.lista_para_cliente).
+
+    Se mantiene en forma incremental desde ventas/signals.py. Los cambios que tocan
+    una lista entera o los impuestos se recalculan en Celery, y una corrida diaria
+    rehace la tabla (la vigencia de los impuestos depende de la fecha).
+    """
+    LOTE = 2000
+
+    @staticmethod
+    def _fila(lista, articulo_id, monto, moneda_id, reglas, min_quantity=Decimal(0), max_quantity=None,
+              es_base=False):
+        neto = (monto * (Decimal(1) - lista.discount_percentage / Decimal(100))).quantize(Decimal('0.0001'))
+        impuestos = defaultdict(Decimal)
+        if neto > 0:
+            for nombre, es_porcentaje, factor in reglas:
+                impuestos[nombre] += neto * factor if es_porcentaje else factor
+        impuestos = {nombre: monto.quantize(Decimal('0.01')) for nombre, monto in impuestos.items()}
+        return PrecioEfectivo(
+            price_list_id=lista.pk, articulo_id=articulo_id, min_quantity=min_quantity,
+            max_quantity=max_quantity, es_base=es_base, precio_neto=neto,
+            impuestos={nombre: str(monto) for nombre, monto in impuestos.items()},
+            precio_final=neto + sum(impuestos.values(), Decimal(0)), moneda_id=moneda_id,
+        )
+
+    @staticmethod
+    def construir(listas, articulos, fecha=None):
+        """
+        Filas (sin guardar) para las listas y artículos dados.
+        articulos: lista de (articulo_id, precio_venta_monto, precio_venta_moneda_id).
+        """
+        ids = [articulo_id for articulo_id, _, _ in articulos]
+        escalas = defaultdict(list)
+        for precio in ProductPrice.objects.filter(price_list__in=listas, product_id__in=ids).values_list(
+                'price_list_id', 'product_id', 'price_monto', 'price_moneda_id', 'min_quantity', 'max_quantity'):
+            escalas[precio[:2]].append(precio[2:])
+        reglas = TaxCalculatorService.reglas_articulos(ids, 'venta', fecha)
+
+        filas = []
+        for lista in listas:
+            for articulo_id, monto, moneda_id in articulos:
+                reglas_articulo = reglas.get(articulo_id, ())
+                filas.append(PrecioEfectivoService._fila(
+                    lista, articulo_id, monto, moneda_id, reglas_articulo, es_base=True
+                ))
+                for monto_escala, moneda_escala, desde, hasta in escalas.get((lista.pk, articulo_id), ()):
+                    filas.append(PrecioEfectivoService._fila(
+                        lista, articulo_id, monto_escala, moneda_escala, reglas_articulo, desde, hasta
+                    ))
+        return filas
+
+    @staticmethod
+    @transaction.atomic
+    def recalcular(price_list_ids=None, articulo_ids=None):
+        """
+        Rehace las filas de las listas y/o artículos indicados (None = todos).
+        Devuelve la cantidad de filas escritas.
+        """
+        borrar = PrecioEfectivo.objects.all()
+        listas = PriceList.objects.all()
+        articulos = Articulo.objects.order_by('pk')
+        if price_list_ids is not None:
+            borrar = borrar.filter(price_list_id__in=price_list_ids)
+            listas = listas.filter(pk__in=price_list_ids)
+        if articulo_ids is not None:
+            borrar = borrar.filter(articulo_id__in=articulo_ids)
+            articulos = articulos.filter(pk__in=articulo_ids)
+        borrar.delete()
+
+        listas = list(listas)
+        if not listas:
+            return 0
+
+        total = 0
+        valores = articulos.values_list('pk', 'precio_venta_monto', 'precio_venta_moneda_id').iterator(
+            chunk_size=PrecioEfectivoService.LOTE
+        )
+        while True:
+            lote = list(islice(valores, PrecioEfectivoService.LOTE))
+            if not lote:
+                break
+            filas = PrecioEfectivoService.construir(listas, lote)
+            # ignore_conflicts: dos recálculos concurrentes del mismo artículo no se pisan
+            PrecioEfectivo.objects.bulk_create(filas, batch_size=PrecioEfectivoService.LOTE, ignore_conflicts=True)
+            total += len(filas)
+        return total
+
+    @staticmethod
+    def agrupar(filas):
+        """{articulo_id: [filas de mayor a menor escala]}."""
+        por_articulo = defaultdict(list)
+        for fila in filas:
+            por_articulo[fila.articulo_id].append(fila)
+        for escalas in por_articulo.values():
+            escalas.sort(key=lambda f: (-f.min_quantity, f.es_base))
+        return por_articulo
+
+    @staticmethod
+    def precios(price_list, articulo_ids):
+        """Filas de la lista para muchos artículos, en una consulta (ver agrupar)."""
+        return PrecioEfectivoService.agrupar(
+            PrecioEfectivo.objects.filter(price_list=price_list, articulo_id__in=articulo_ids)
+        )
+
+    @staticmethod
+    def elegir(escalas, cantidad):
+        """La escala que aplica a la cantidad (la base si ninguna otra)."""
+        return next((
+            f for f in escalas
+            if f.min_quantity <= cantidad and (f.max_quantity is None or f.max_quantity >= cantidad)
+        ), None)
+
+    @staticmethod
+    def precio(price_list, articulo_id, cantidad=Decimal(1)):
+        """Precio efectivo de un artículo: una búsqueda por el índice único."""
+        return PrecioEfectivo.objects.filter(
+            price_list=price_list, articulo_id=articulo_id, min_quantity__lte=cantidad
+        ).filter(
+            Q(max_quantity__isnull=True) | Q(max_quantity__gte=cantidad)
+        ).order_by('-min_quantity', 'es_base').first()
+
+
+class PosteoStockService:
+    """
+    Impacto en stock de los comprobantes de venta confirmados.
+
+    - Síncrono: el signal post_save registra el documento en el Ledger al confirmar.
+    - Diferido (ConfiguracionEmpresa.stock_posteo_diferido): la confirmación solo
+      escribe una fila PosteoStockPendiente (outbox) en su misma transacción, y
+      procesar_pendientes() la registra después, agrupando muchos documentos en un
+      único posteo set-based. Los artículos con `stock_tiempo_real` fuerzan el camino
+      síncrono para todo el documento.
+    """
+    CODIGOS_NC = ('003', '008', '013')
+
+    @staticmethod
+    def referencia(comprobante):
+        return f"Venta: {comprobante.tipo_comprobante.nombre} {comprobante.numero_completo}"
+
+    @staticmethod
+    def lineas_comprobante(comprobante, items, asociados=None):
+        """
+        Líneas para StockManager.registrar_movimientos_lote(). Cada línea lleva su
+        origen_referencia, así varios documentos pueden postearse en un mismo lote.
+        Devuelve [] si el comprobante no mueve stock (ej. NC financiera).
+        """
+        tipo = comprobante.tipo_comprobante
+        if not tipo or not tipo.mueve_stock:
+            return []
+
+        # ── Signo del movimiento ──────────────────────────────────────────────
+        signo = tipo.signo_stock
+        if tipo.codigo_afip in PosteoStockService.CODIGOS_NC:
+            if comprobante.concepto_nota_credito == ComprobanteVenta.ConceptoNC.FINANCIERO:
+                logger.info("Stock no movido: NC financiera | comprobante=%s", comprobante.numero_completo)
+                return []
+            if comprobante.concepto_nota_credito in [
+                ComprobanteVenta.ConceptoNC.DEVOLUCION,
+                ComprobanteVenta.ConceptoNC.ANULACION,
+            ]:
+                signo = 1
+
+        ref = PosteoStockService.referencia(comprobante)
+        lineas = []
+
+        # ── A. Stock REAL (físico) ─────────────────────────────────────────────
+        if getattr(tipo, 'afecta_stock_fisico', False):
+            for item in items:
+                lineas.append({
+                    'articulo': item.articulo,
+                    'deposito': comprobante.deposito,
+                    'codigo_tipo': 'REAL',
+                    'cantidad': abs(item.cantidad) * signo,
+                    'origen_referencia': ref,
+                    'permitir_stock_negativo': None,
+                })
+
+        # ── B. Stock RSRV (comprometido) ──────────────────────────────────────
+        if getattr(tipo, 'afecta_stock_comprometido', False):
+            for item in items:
+                lineas.append({
+                    'articulo': item.articulo,
+                    'deposito': comprobante.deposito,
+                    'codigo_tipo': 'RSRV',
+                    'cantidad': abs(item.cantidad) * signo,
+                    'origen_referencia': ref,
+                    'permitir_stock_negativo': True,
+                })
+
+        # ── C. Descompromiso RSRV desde nota de pedido ────────────────────────
+        if getattr(tipo, 'afecta_stock_fisico', False) and not getattr(tipo, 'afecta_stock_comprometido', False):
+            if asociados is None:
+                asociados = comprobante.comprobantes_asociados.select_related('tipo_comprobante')
+            for origen in asociados:
+                tipo_origen = origen.tipo_comprobante
+                if not (tipo_origen and getattr(tipo_origen, 'mueve_stock', False)
+                        and getattr(tipo_origen, 'afecta_stock_comprometido', False)):
+                    continue
+
+                logger.info(
+                    "Liberando reserva RSRV | factura=%s | pedido=%s",
+                    comprobante.numero_completo,
+                    origen.numero_completo,
+                )
+
+                for item_factura in items:
+                    lineas.append({
+                        'articulo': item_factura.articulo,
+                        'deposito': comprobante.deposito,
+                        'codigo_tipo': 'RSRV',
+                        'cantidad': -abs(item_factura.cantidad),
+                        'origen_referencia': (
+                            f"Descompromiso {comprobante.numero_completo} "
+                            f"(Ref: {origen.numero_completo})"
+                        ),
+                        'permitir_stock_negativo': True,
+                    })
+
+        return lineas
+
+    @staticmethod
+    def usa_posteo_diferido(items):
+        """True si el tenant difiere el posteo y ningún artículo del documento exige tiempo real."""
+        if any(item.articulo.stock_tiempo_real for item in items):
+            return False
+        config = get_config_empresa()
+        return bool(config and config.stock_posteo_diferido)
+
+    @staticmethod
+    def encolar(comprobante):
+        """Alta en el outbox. Idempotente: una sola fila por comprobante."""
+        PosteoStockPendiente.objects.bulk_create(
+            [PosteoStockPendiente(comprobante=comprobante)], ignore_conflicts=True
+        )
+
+    @staticmethod
+    def procesar_pendientes(limite=None):
+        """
+        Consume un lote del outbox. Los documentos se registran juntos en un único
+        registrar_movimientos_lote(); si el lote falla (ej. stock insuficiente en un
+        documento), se reintenta de a uno para aislar al documento culpable.
+        Cada fila se marca procesada en la misma transacción que su posteo y el lote
+        se toma con SKIP LOCKED: dos consumidores nunca postean el mismo documento.
+
+        Returns:
+            dict: procesados, fallidos.
+        """
+        limite = limite or getattr(settings, 'STOCK_OUTBOX_LOTE', 500)
+        max_intentos = getattr(settings, 'STOCK_OUTBOX_MAX_INTENTOS', 5)
+
+        with transaction.atomic():
+            pendientes = list(
+                PosteoStockPendiente.objects.select_for_update(skip_locked=True).filter(
+                    procesado_en__isnull=True, intentos__lt=max_intentos
+                ).order_by('creado_en', 'pk')[:limite]
+            )
+            if not pendientes:
+                return {'procesados': 0, 'fallidos': 0}
+
+            comprobantes = ComprobanteVenta.objects.select_related('tipo_comprobante', 'deposito').prefetch_related(
+                Prefetch('items', queryset=ComprobanteVentaItem.objects.select_related('articulo').order_by('pk')),
+                Prefetch('comprobantes_asociados', queryset=ComprobanteVenta.objects.select_related('tipo_comprobante')),
+            ).in_bulk([p.comprobante_id for p in pendientes])
+
+            lineas_por_posteo = {}
+            for posteo in pendientes:
+                comprobante = comprobantes[posteo.comprobante_id]
+                lineas_por_posteo[posteo.pk] = PosteoStockService.lineas_comprobante(
+                    comprobante, comprobante.items.all(), comprobante.comprobantes_asociados.all()
+                )
+
+            procesados, fallidos = [], {}
+            try:
+                with transaction.atomic():
+                    StockManager.registrar_movimientos_lote(
+                        [linea for lineas in lineas_por_posteo.values() for linea in lineas],
+                        origen_sistema='VENTAS',
+                        origen_referencia='Posteo diferido',
+                    )
+                procesados = [p.pk for p in pendientes]
+            except ValidationError as exc:
+                logger.warning("Lote de posteo diferido rechazado, se reintenta por documento | error=%s", exc)
+                for posteo in pendientes:
+                    try:
+                        with transaction.atomic():
+                            StockManager.registrar_movimientos_lote(
+                                lineas_por_posteo[posteo.pk],
+                                origen_sistema='VENTAS',
+                                origen_referencia=PosteoStockService.referencia(
+                                    comprobantes[posteo.comprobante_id]
+                                ),
+                            )
+                        procesados.append(posteo.pk)
+                    except ValidationError as error:
+                        fallidos[posteo.pk] = '; '.join(error.messages)
+
+            PosteoStockPendiente.objects.filter(pk__in=procesados).update(
+                procesado_en=timezone.now(), ultimo_error=''
+            )
+            for posteo in pendientes:
+                if posteo.pk not in fallidos:
+                    continue
+                PosteoStockPendiente.objects.filter(pk=posteo.pk).update(
+                    intentos=F('intentos') + 1, ultimo_error=fallidos[posteo.pk]
+                )
+                logger.error(
+                    "Posteo diferido fallido | comprobante=%s | intento=%s | error=%s",
+                    comprobantes[posteo.comprobante_id].numero_completo, posteo.intentos + 1, fallidos[posteo.pk]
+                )
+
+        return {'procesados': len(procesados), 'fallidos': len(fallidos)}
+
+    @staticmethod
+    def metricas():
+        """
+        Estado del outbox: pendientes, los que ya fallaron al menos una vez, los
+        bloqueados (agotaron los reintentos), el lag del más antiguo y la demora
+        media de la última hora.
+        """
+        ahora = timezone.now()
+        max_intentos = getattr(settings, 'STOCK_OUTBOX_MAX_INTENTOS', 5)
+        pendientes = PosteoStockPendiente.objects.filter(procesado_en__isnull=True).aggregate(
+            cantidad=Count('pk'),
+            con_error=Count('pk', filter=Q(intentos__gt=0, intentos__lt=max_intentos)),
+            bloqueados=Count('pk', filter=Q(intentos__gte=max_intentos)),
+            mas_antiguo=Min('creado_en'),
+        )
+        recientes = PosteoStockPendiente.objects.filter(procesado_en__gte=ahora - timedelta(hours=1)).aggregate(
+            cantidad=Count('pk'),
+            demora=Avg(F('procesado_en') - F('creado_en')),
+        )
+        return {
+            'pendientes': pendientes['cantidad'],
+            'con_error': pendientes['con_error'],
+            'bloqueados': pendientes['bloqueados'],
+            'lag_segundos': (ahora - pendientes['mas_antiguo']).total_seconds() if pendientes['mas_antiguo'] else 0,
+            'procesados_ultima_hora': recientes['cantidad'],
+            'demora_media_segundos': recientes['demora'].total_seconds() if recientes['demora'] else 0,
+        }
+
+
+class CaeLoteService:
+    """
+    Solicitud de CAE de comprobantes dados de alta en bloque (bulk_create no
+    dispara el signal intentar_cae_automatico). Mismas reglas de empresa y serie
+    que el signal, pero agrupadas: una tarea por punto de venta, que los emite en
+    orden de número con una sola sesión WSFE (AFIP exige numeración correlativa).
+    """
+
+    @staticmethod
+    def habilitado():
+        config = get_config_empresa()
+        if not (config and getattr(config, 'usar_factura_electronica', True)):
+            return False
+        return str(getattr(config, 'modo_facturacion', 'MANUAL')).strip().upper() not in ['MANUAL', 'FALSE', '0']
+
+    @staticmethod
+    def encolar(comprobantes):
+        """Encola al commit una tarea_solicitar_cae_lote por punto de venta. Devuelve {punto_venta: [ids]}."""
+        if not CaeLoteService.habilitado():
+            return {}
+        grupos = defaultdict(list)
+        for comprobante in sorted(comprobantes, key=lambda c: (c.punto_venta, c.numero or 0)):
+            if (comprobante.estado == ComprobanteVenta.Estado.CONFIRMADO and not comprobante.cae
+                    and getattr(get_serie(comprobante.serie_id), 'solicitar_cae_automaticamente', False)):
+                grupos[comprobante.punto_venta].append(comprobante.pk)
+        if grupos:
+            from ventas.tasks import tarea_solicitar_cae_lote
+            schema = connection.schema_name
+            transaction.on_commit(lambda: [tarea_solicitar_cae_lote.delay(ids, schema) for ids in grupos.values()])
+        return dict(grupos)
+
+
+class AntiguedadSaldosService:
+    """
+    Aging de partidas abiertas (comprobantes confirmados con saldo), set-based
+    sobre ComprobanteVenta.fecha_vencimiento y sus índices parciales: una sola
+    consulta agrupada por cliente con los tramos de mora 0-30 / 31-60 / 61-90 / 90+.
+    Remitos y notas de pedido no son deuda y quedan afuera.
+    """
+    CODIGOS_SIN_DEUDA = ['091', '092', '991', '992', 'remito', 'pedido']
+    TRAMOS = ('0_30', '31_60', '61_90', '90_plus')
+
+    @staticmethod
+    def abiertos(clientes=None, hasta=None):
+        """Partidas abiertas; `hasta` limita por fecha de emisión."""
+        qs = ComprobanteVenta.objects.filter(
+            estado=ComprobanteVenta.Estado.CONFIRMADO, saldo_pendiente__gt=0
+        ).exclude(tipo_comprobante__codigo_afip__in=AntiguedadSaldosService.CODIGOS_SIN_DEUDA)
+        if clientes is not None:
+            qs = qs.filter(cliente__in=clientes)
+        if hasta is not None:
+            qs = qs.filter(fecha__date__lte=hasta)
+        return qs
+
+    @staticmethod
+    def _vacio():
+        return dict(
+            {'saldo': Decimal('0.00'), 'vencido': Decimal('0.00'), 'no_vencido': Decimal('0.00'),
+             'cta_cte': Decimal('0.00'), 'comprobantes': 0, 'vencimiento_mas_antiguo': None,
+             'proximo_vencimiento': None},
+            **{tramo: Decimal('0.00') for tramo in AntiguedadSaldosService.TRAMOS}
+        )
+
+    @staticmethod
+    def por_cliente(clientes=None, al=None, hasta=None):
+        """
+        {cliente_id: {'saldo', 'vencido', 'no_vencido', '0_30', '31_60', '61_90', '90_plus', 'cta_cte',
+                      'comprobantes', 'vencimiento_mas_antiguo', 'proximo_vencimiento'}}
+        para los clientes con partidas abiertas. `al`: fecha contra la que se mide la mora (hoy).
+        """
+        al = al or timezone.localdate()
+
+        def _antes_de(dias):
+            return al - timedelta(days=dias)
+
+        def _saldo(condicion):
+            return Sum('saldo_pendiente', filter=condicion)
+
+        filas = AntiguedadSaldosService.abiertos(clientes, hasta).order_by().values('cliente_id').annotate(
+            saldo=Sum('saldo_pendiente'),
+            comprobantes=Count('id'),
+            vencido=_saldo(Q(fecha_vencimiento__lt=al)),
+            tramo_0_30=_saldo(Q(fecha_vencimiento__lt=al, fecha_vencimiento__gte=_antes_de(30))),
+            tramo_31_60=_saldo(Q(fecha_vencimiento__lt=_antes_de(30), fecha_vencimiento__gte=_antes_de(60))),
+            tramo_61_90=_saldo(Q(fecha_vencimiento__lt=_antes_de(60), fecha_vencimiento__gte=_antes_de(90))),
+            tramo_90_plus=_saldo(Q(fecha_vencimiento__lt=_antes_de(90))),
+            cta_cte=_saldo(Q(condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE)),
+            vencimiento_mas_antiguo=Min('fecha_vencimiento'),
+            proximo_vencimiento=Min('fecha_vencimiento', filter=Q(fecha_vencimiento__gte=al)),
+        )
+        resultado = {}
+        for fila in filas:
+            dato = AntiguedadSaldosService._vacio()
+            dato['saldo'] = fila['saldo'] or Decimal('0.00')
+            dato['vencido'] = fila['vencido'] or Decimal('0.00')
+            dato['no_vencido'] = dato['saldo'] - dato['vencido']
+            dato['cta_cte'] = fila['cta_cte'] or Decimal('0.00')
+            dato['comprobantes'] = fila['comprobantes']
+            dato['vencimiento_mas_antiguo'] = fila['vencimiento_mas_antiguo']
+            dato['proximo_vencimiento'] = fila['proximo_vencimiento']
+            for tramo in AntiguedadSaldosService.TRAMOS:
+                dato[tramo] = fila[f'tramo_{tramo}'] or Decimal('0.00')
+            resultado[fila['cliente_id']] = dato
+        return resultado
+
+    @staticmethod
+    def de_cliente(cliente, al=None, hasta=None):
+        """Aging de un cliente (ceros si no tiene partidas abiertas)."""
+        return AntiguedadSaldosService.por_cliente([cliente], al=al, hasta=hasta).get(
+            cliente.pk, AntiguedadSaldosService._vacio()
+        )
+
+
+class SaldoClienteService:
+    """
+    Mantiene la proyección SaldoCliente en la misma transacción que el cambio que
+    la mueve (confirmación/anulación de comprobantes, aplicación y reversión de recibos).
+
+    - Partidas abiertas (saldo, vencido, impagos): se rehacen por cliente desde el
+      índice parcial de abiertos, con la fila de SaldoCliente bloqueada: dos
+      transacciones sobre el mismo cliente se serializan y ninguna pisa a la otra.
+    - Ventas 30/90 días y última compra: se suman por diferencia (sin leer el
+      historial del cliente). recalcular() las rehace desde cero: filas nuevas,
+      reconstrucción y la corrida diaria que recorre las ventanas.
+    """
+    LOTE = 500
+    CAMPOS_ABIERTOS = [
+        'saldo', 'saldo_cta_cte', 'vencido', 'comprobantes_impagos', 'vencimiento_mas_antiguo',
+        'proximo_vencimiento', 'credito_disponible', 'actualizado_en',
+    ]
+    CAMPOS_VENTAS = ['ventas_30d', 'ventas_90d', 'comprobantes_90d', 'ultima_compra', 'actualizado_en']
+
+    @staticmethod
+    def _suma_ventas(comprobante, estado):
+        """El comprobante, en ese estado, ¿es una venta (confirmado y no remito/pedido)?"""
+        if estado != ComprobanteVenta.Estado.CONFIRMADO:
+            return False
+        tipo = comprobante.tipo_comprobante
+        return not (tipo and tipo.codigo_afip in AntiguedadSaldosService.CODIGOS_SIN_DEUDA)
+
+    @staticmethod
+    def _abiertos(filas, al=None):
+        """Partidas abiertas y crédito disponible de las filas (una consulta agrupada)."""
+        ids = [fila.cliente_id for fila in filas]
+        antiguedad = AntiguedadSaldosService.por_cliente(ids, al=al)
+        limites = dict(Cliente.objects.filter(pk__in=ids).values_list('pk', 'limite_credito'))
+        ahora = timezone.now()
+        for fila in filas:
+            dato = antiguedad.get(fila.cliente_id) or AntiguedadSaldosService._vacio()
+            fila.saldo = dato['saldo']
+            fila.saldo_cta_cte = dato['cta_cte']
+            fila.vencido = dato['vencido']
+            fila.comprobantes_impagos = dato['comprobantes']
+            fila.vencimiento_mas_antiguo = dato['vencimiento_mas_antiguo']
+            fila.proximo_vencimiento = dato['proximo_vencimiento']
+            fila.credito_disponible = Decimal(str(limites.get(fila.cliente_id) or 0)) - fila.saldo
+            fila.actualizado_en = ahora
+
+    @staticmethod
+    @transaction.atomic
+    def recalcular(cliente_ids, al=None):
+        """Rehace desde cero las filas de los clientes (las crea si faltan). Devuelve las filas."""
+        al = al or timezone.localdate()
+        ids = sorted(set(cliente_ids))
+        SaldoCliente.objects.bulk_create([SaldoCliente(cliente_id=pk) for pk in ids], ignore_conflicts=True)
+        filas = list(SaldoCliente.objects.select_for_update().filter(cliente_id__in=ids).order_by('cliente_id'))
+
+        def _desde(dias):
+            return Q(fecha__date__gte=al - timedelta(days=dias))
+
+        ventas = {
+            fila['cliente_id']: fila
+            for fila in ComprobanteVenta.objects.filter(
+                cliente_id__in=ids, estado=ComprobanteVenta.Estado.CONFIRMADO
+            ).exclude(
+                tipo_comprobante__codigo_afip__in=AntiguedadSaldosService.CODIGOS_SIN_DEUDA
+            ).order_by().values('cliente_id').annotate(
+                ventas_30d=Sum('total', filter=_desde(30)),
+                ventas_90d=Sum('total', filter=_desde(90)),
+                comprobantes_90d=Count('id', filter=_desde(90)),
+                ultima_compra=Max('fecha'),
+            )
+        }
+        for fila in filas:
+            venta = ventas.get(fila.cliente_id, {})
+            fila.ventas_30d = venta.get('ventas_30d') or Decimal('0.00')
+            fila.ventas_90d = venta.get('ventas_90d') or Decimal('0.00')
+            fila.comprobantes_90d = venta.get('comprobantes_90d') or 0
+            fila.ultima_compra = venta.get('ultima_compra')
+            fila.calculado_al = al
+        SaldoClienteService._abiertos(filas)
+        SaldoCliente.objects.bulk_update(
+            filas, SaldoClienteService.CAMPOS_ABIERTOS + SaldoClienteService.CAMPOS_VENTAS + ['calculado_al'],
+            batch_size=SaldoClienteService.LOTE
+        )
+        return filas
+
+    @staticmethod
+    def _bloquear(cliente_ids):
+        """({cliente_id: fila bloqueada}, ids creados ahora desde cero)."""
+        ids = sorted(set(cliente_ids))
+        filas = {
+            fila.cliente_id: fila
+            for fila in SaldoCliente.objects.select_for_update().filter(cliente_id__in=ids).order_by('cliente_id')
+        }
+        nuevas = set(ids) - set(filas)
+        if nuevas:
+            filas.update({fila.cliente_id: fila for fila in SaldoClienteService.recalcular(nuevas)})
+        return filas, nuevas
+
+    @staticmethod
+    @transaction.atomic
+    def actualizar_abiertos(cliente_ids):
+        """Rehace las partidas abiertas de los clientes. Devuelve {cliente_id: fila}."""
+        ids = {pk for pk in cliente_ids if pk}
+        if not ids:
+            return {}
+        filas, nuevas = SaldoClienteService._bloquear(ids)
+        existentes = [fila for pk, fila in filas.items() if pk not in nuevas]
+        if existentes:
+            SaldoClienteService._abiertos(existentes)
+            SaldoCliente.objects.bulk_update(existentes, SaldoClienteService.CAMPOS_ABIERTOS)
+        return filas
+
+    @staticmethod
+    @transaction.atomic
+    def registrar(comprobantes):
+        """
+        Proyecta el cambio de los comprobantes desde que se leyeron de la base
+        (ComprobanteVenta._leido; los recién creados, desde cero).
+        """
+        cambios = defaultdict(list)
+        abiertos, anulados = set(), set()
+        for comp in comprobantes:
+            leido = getattr(comp, '_leido', None) or {}
+            if leido and all(leido[campo] == getattr(comp, campo) for campo in ComprobanteVenta.CAMPOS_SALDO):
+                continue
+
+            antes = SaldoClienteService._suma_ventas(comp, leido.get('estado'))
+            ahora = SaldoClienteService._suma_ventas(comp, comp.estado)
+            diferencia = (comp.total if ahora else 0) - ((leido.get('total') or 0) if antes else 0)
+            if diferencia or antes != ahora:
+                dia = timezone.localdate(comp.fecha) if timezone.is_aware(comp.fecha) else comp.fecha.date()
+                cambios[comp.cliente_id].append((dia, diferencia, int(ahora) - int(antes), comp.fecha if ahora else None))
+                if antes and not ahora:
+                    anulados.add(comp.cliente_id)
+
+            saldo_antes = leido.get('saldo_pendiente') or 0
+            abierto_antes = leido.get('estado') == ComprobanteVenta.Estado.CONFIRMADO and saldo_antes > 0
+            abierto_ahora = comp.estado == ComprobanteVenta.Estado.CONFIRMADO and comp.saldo_pendiente > 0
+            if abierto_antes or abierto_ahora:
+                if abierto_antes != abierto_ahora or saldo_antes != comp.saldo_pendiente:
+                    abiertos.add(comp.cliente_id)
+
+        if not (cambios or abiertos):
+            return
+        filas, nuevas = SaldoClienteService._bloquear(set(cambios) | abiertos)
+        hoy = timezone.localdate()
+
+        for cliente_id, lista in cambios.items():
+            if cliente_id in nuevas:
+                continue
+            fila = filas[cliente_id]
+            ancla = fila.calculado_al or hoy
+            for dia, diferencia, cantidad, fecha in lista:
+                if dia >= ancla - timedelta(days=30):
+                    fila.ventas_30d += diferencia
+                if dia >= ancla - timedelta(days=90):
+                    fila.ventas_90d += diferencia
+                    fila.comprobantes_90d += cantidad
+                if fecha and (fila.ultima_compra is None or fecha > fila.ultima_compra):
+                    fila.ultima_compra = fecha
+            fila.actualizado_en = timezone.now()
+
+        # Una anulación puede haber sido la última compra
+        anulados -= nuevas
+        if anulados:
+            ultimas = dict(
+                ComprobanteVenta.objects.filter(cliente_id__in=anulados, estado=ComprobanteVenta.Estado.CONFIRMADO)
+                .exclude(tipo_comprobante__codigo_afip__in=AntiguedadSaldosService.CODIGOS_SIN_DEUDA)
+                .order_by().values('cliente_id').annotate(ultima=Max('fecha')).values_list('cliente_id', 'ultima')
+            )
+            for cliente_id in anulados:
+                filas[cliente_id].ultima_compra = ultimas.get(cliente_id)
+
+        campos = SaldoClienteService.CAMPOS_VENTAS if set(cambios) - nuevas else []
+        abiertos -= nuevas
+        if abiertos:
+            SaldoClienteService._abiertos([filas[pk] for pk in abiertos])
+            campos = sorted({*campos, *SaldoClienteService.CAMPOS_ABIERTOS})
+        if campos:
+            SaldoCliente.objects.bulk_update(
+                [fila for pk, fila in filas.items() if pk not in nuevas and (pk in cambios or pk in abiertos)], campos
+            )
+
+    @staticmethod
+    def verificar_credito(comprobante, monto):
+        """
+        Límite de crédito al facturar en cuenta corriente: lee una fila (bloqueada
+        hasta el commit, así dos ventas simultáneas no pasan las dos) en lugar de
+        agregar los comprobantes del cliente. Límite 0 = sin límite.
+        """
+        cliente = comprobante.cliente
+        limite = Decimal(str(cliente.limite_credito or 0))
+        tipo = comprobante.serie.tipo_comprobante if comprobante.serie_id else comprobante.tipo_comprobante
+        if limite <= 0 or (tipo and (tipo.es_nota_credito or tipo.codigo_afip in AntiguedadSaldosService.CODIGOS_SIN_DEUDA)):
+            return
+        with transaction.atomic():
+            filas, _ = SaldoClienteService._bloquear([cliente.pk])
+            deuda = filas[cliente.pk].saldo
+        if deuda + monto > limite:
+            raise ValidationError(
+                f"El cliente {cliente} supera su límite de crédito: deuda ${deuda} + comprobante ${monto} "
+                f"> límite ${limite}."
+            )
+
+    @staticmethod
+    @transaction.atomic
+    def verificar_credito_lote(comprobantes):
+        """
+        verificar_credito() de comprobantes nuevos creados con bulk_create (ingesta,
+        conversión masiva), que no pasan por save(): bloquea las filas de los clientes
+        de una vez y asigna en orden, cada comprobante suma a la deuda que ven los
+        siguientes del mismo cliente. Devuelve {indice: [errores]} de los que superan el límite.
+        """
+        sujetos = []
+        for indice, comprobante in enumerate(comprobantes):
+            monto = comprobante._deuda_nueva()
+            limite = Decimal(str(comprobante.cliente.limite_credito or 0))
+            tipo = comprobante.tipo_comprobante
+            if monto <= 0 or limite <= 0 or (
+                tipo and (tipo.es_nota_credito or tipo.codigo_afip in AntiguedadSaldosService.CODIGOS_SIN_DEUDA)
+            ):
+                continue
+            sujetos.append((indice, comprobante, monto, limite))
+        if not sujetos:
+            return {}
+
+        filas, _ = SaldoClienteService._bloquear({comprobante.cliente_id for _, comprobante, _, _ in sujetos})
+        consumido = defaultdict(Decimal)
+        excedidos = {}
+        for indice, comprobante, monto, limite in sujetos:
+            deuda = filas[comprobante.cliente_id].saldo + consumido[comprobante.cliente_id]
+            if deuda + monto > limite:
+                excedidos[indice] = [
+                    f"El cliente {comprobante.cliente} supera su límite de crédito: deuda ${deuda} + "
+                    f"comprobante ${monto} > límite ${limite}."
+                ]
+            else:
+                consumido[comprobante.cliente_id] += monto
+        return excedidos
+
+    @staticmethod
+    def vigentes(filas, al=None):
+        """{cliente_id: fila} con el vencido al día: rehace las filas cuyo próximo vencimiento ya pasó."""
+        al = al or timezone.localdate()
+        filas = {fila.cliente_id: fila for fila in filas}
+        vencidas = [pk for pk, fila in filas.items() if fila.proximo_vencimiento and fila.proximo_vencimiento < al]
+        if vencidas:
+            filas.update(SaldoClienteService.actualizar_abiertos(vencidas))
+        return filas
+
+    @staticmethod
+    def de_cliente(cliente):
+        fila = SaldoCliente.objects.filter(cliente=cliente).first()
+        if fila is None:
+            return SaldoClienteService.actualizar_abiertos([cliente.pk])[cliente.pk]
+        return SaldoClienteService.vigentes([fila])[cliente.pk]
+
+    @staticmethod
+    def reconstruir(al=None):
+        """Rehace la proyección de todos los clientes, por lotes (una transacción por lote)."""
+        ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+        total = 0
+        for inicio in range(0, len(ids), SaldoClienteService.LOTE):
+            total += len(SaldoClienteService.recalcular(ids[inicio:inicio + SaldoClienteService.LOTE], al))
+        return total
+
+
+class SaldoCierreMensualService:
+    """
+    Cierres mensuales de cuenta corriente (SaldoCierreMensual). El saldo a una fecha
+    es el cierre más cercano más la suma en SQL de los días que faltan, en lugar de
+    recorrer todo el historial del cliente.
+
+    Mismo criterio que CuentaCorrienteService: DEBE las facturas y notas de débito
+    en cuenta corriente, HABER las notas de crédito y los recibos de cobranza.
+    """
+    LOTE = 500
+
+    @staticmethod
+    def _mes(dia):
+        return dia.replace(day=1)
+
+    @staticmethod
+    def _mes_siguiente(mes):
+        return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+    @staticmethod
+    def _neto(cliente_ids, desde=None, hasta=None, por_mes=False):
+        """
+        {cliente_id: DEBE - HABER} de los movimientos entre `desde` y `hasta` (inclusive);
+        con `por_mes`, {(cliente_id, mes): DEBE - HABER}. Dos consultas agrupadas.
+        """
+        comprobantes = ComprobanteVenta.objects.filter(
+            cliente_id__in=cliente_ids,
+            estado=ComprobanteVenta.Estado.CONFIRMADO,
+            condicion_venta=ComprobanteVenta.CondicionVenta.CTA_CTE,
+        ).exclude(tipo_comprobante__codigo_afip__in=AntiguedadSaldosService.CODIGOS_SIN_DEUDA)
+        recibos = Recibo.objects.filter(
+            cliente_id__in=cliente_ids, estado=Recibo.Estado.CONFIRMADO, origen=Recibo.Origen.COBRANZA
+        )
+
+        def _agrupar(qs):
+            if desde:
+                qs = qs.filter(fecha__date__gte=desde)
+            if hasta:
+                qs = qs.filter(fecha__date__lte=hasta)
+            if por_mes:
+                return qs.annotate(mes=TruncMonth('fecha', output_field=DateField())).order_by().values('cliente_id', 'mes')
+            return qs.order_by().values('cliente_id')
+
+        def _clave(fila):
+            return (fila['cliente_id'], fila['mes']) if por_mes else fila['cliente_id']
+
+        neto = defaultdict(Decimal)
+        filas = _agrupar(comprobantes).annotate(
+            total=Sum('total'), haber=Sum('total', filter=TipoComprobante.q_nota_credito('tipo_comprobante__'))
+        )
+        for fila in filas:
+            haber = fila['haber'] or Decimal('0')
+            debe = (fila['total'] or Decimal('0')) - haber
+            neto[_clave(fila)] += debe - haber
+        for fila in _agrupar(recibos).annotate(haber=Sum('monto_total')):
+            neto[_clave(fila)] -= fila['haber'] or Decimal('0')
+        return neto
+
+    @staticmethod
+    def saldo_al(cliente, hasta):
+        """Saldo de cuenta corriente del cliente al cierre de `hasta` (inclusive)."""
+        cierre = SaldoCierreMensual.objects.filter(
+            cliente=cliente, mes__lt=SaldoCierreMensualService._mes(hasta + timedelta(days=1))
+        ).order_by('-mes').first()
+        saldo, desde = Decimal('0'), None
+        if cierre is not None:
+            saldo, desde = cierre.saldo, SaldoCierreMensualService._mes_siguiente(cierre.mes)
+        if desde is None or desde <= hasta:
+            saldo += SaldoCierreMensualService._neto([cliente.pk], desde, hasta).get(cliente.pk, Decimal('0'))
+        return saldo
+
+    @staticmethod
+    def _cerrar_lote(cliente_ids, ultimo_mes):
+        """Cierres que faltan a los clientes hasta `ultimo_mes`, cada uno desde su último cierre."""
+        ultimos = {
+            fila.cliente_id: fila
+            for fila in SaldoCierreMensual.objects.filter(cliente_id__in=cliente_ids)
+            .order_by('cliente_id', '-mes').distinct('cliente_id')
+        }
+        # Agrupados por el mes desde el que les falta cerrar (casi siempre uno solo: el anterior)
+        pendientes = defaultdict(list)
+        for pk in cliente_ids:
+            ultimo = ultimos.get(pk)
+            if ultimo is None:
+                pendientes[None].append(pk)
+            elif ultimo.mes < ultimo_mes:
+                pendientes[SaldoCierreMensualService._mes_siguiente(ultimo.mes)].append(pk)
+
+        fin = SaldoCierreMensualService._mes_siguiente(ultimo_mes) - timedelta(days=1)
+        nuevos = []
+        for desde, ids in pendientes.items():
+            neto = SaldoCierreMensualService._neto(ids, desde, fin, por_mes=True)
+            primeros = {}
+            for cliente_id, mes in neto:
+                primeros[cliente_id] = min(mes, primeros.get(cliente_id, mes))
+            for pk in ids:
+                mes = desde or primeros.get(pk)
+                if mes is None:
+                    continue
+                saldo = ultimos[pk].saldo if pk in ultimos else Decimal('0')
+                while mes <= ultimo_mes:
+                    saldo += neto.get((pk, mes), Decimal('0'))
+                    nuevos.append(SaldoCierreMensual(cliente_id=pk, mes=mes, saldo=saldo))
+                    mes = SaldoCierreMensualService._mes_siguiente(mes)
+        SaldoCierreMensual.objects.bulk_create(nuevos, ignore_conflicts=True, batch_size=SaldoCierreMensualService.LOTE)
+        return len(nuevos)
+
+    @staticmethod
+    def cerrar(al=None):
+        """
+        Completa los cierres de todos los clientes hasta el último mes terminado antes
+        de `al` (hoy), por lotes. Los clientes sin cierres arrancan en su primer
+        movimiento. Devuelve la cantidad de cierres escritos.
+        """
+        mes_actual = SaldoCierreMensualService._mes(al or timezone.localdate())
+        ultimo_mes = SaldoCierreMensualService._mes(mes_actual - timedelta(days=1))
+        ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+        total = 0
+        for inicio in range(0, len(ids), SaldoCierreMensualService.LOTE):
+            total += SaldoCierreMensualService._cerrar_lote(ids[inicio:inicio + SaldoCierreMensualService.LOTE], ultimo_mes)
+        return total
+
+    @staticmethod
+    def invalidar(movimientos):
+        """
+        Movimientos [(cliente_id, fecha)] con fecha en un mes ya cerrado: borra los
+        cierres del cliente desde ese mes (los rehace la próxima corrida). Se borra
+        al momento y de nuevo en el commit, para que una corrida concurrente no deje
+        escrito un cierre calculado sin el movimiento.
+        """
+        mes_actual = SaldoCierreMensualService._mes(timezone.localdate())
+        desde = {}
+        for cliente_id, fecha in movimientos:
+            dia = timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+            mes = SaldoCierreMensualService._mes(dia)
+            if cliente_id and mes < mes_actual:
+                desde[cliente_id] = min(mes, desde.get(cliente_id, mes))
+        if not desde:
+            return
+
+        condicion = Q()
+        for cliente_id, mes in desde.items():
+            condicion |= Q(cliente_id=cliente_id, mes__gte=mes)
+
+        def _borrar():
+            SaldoCierreMensual.objects.filter(condicion).delete()
+
+        _borrar()
+        transaction.on_commit(_borrar)
@@ -7,22 +7,35 @@ Cambios respecto a la versión anterior:
     eliminando el bloqueo de respuesta web si AFIP está lento o caído.
   - REGLA NEGOCIO: Ahora respeta los parámetros de ConfiguracionEmpresa (modo manual/auto).
   - Refactorización de aplicar_movimiento_stock utilizando filtros atómicos.
-  - Se agregó 'proteger_stock_aplicado' (pre_save) para prevenir el bug de doble
-    descuento causado por Stale Objects (sobreescritura de memoria).
+  - El bug de doble descuento por Stale Objects (sobreescritura de memoria) lo
+    previene el control optimista de ComprobanteVenta.version: el save() de una
+    copia vieja lanza ConflictoDeVersion en lugar de pisar stock_aplicado.
   - Logger propio por módulo con trazabilidad granular restaurada.
+  - Posteo de stock diferido opcional (outbox PosteoStockPendiente, ver PosteoStockService).
+  - Proyección SaldoCliente en la misma transacción del comprobante (ver SaldoClienteService).
+  - Cierres mensuales de cuenta corriente invalidados por movimientos con fecha en meses cerrados.
+  - Versión del dashboard cacheado de cada cliente (ver clientes_dashboard_cache).
+  - Precios efectivos de un artículo rehechos al confirmar, solo si cambió su precio de venta.
 """
 
 import logging
 
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from django.db import transaction
+from django.db import connection, transaction
+from django_tenants.utils import schema_context
 
-from .models import ComprobanteVenta, Recibo, PriceList, ProductPrice
+from .models import Cliente, ComprobanteVenta, Recibo, ReciboImputacion, PriceList, ProductPrice, SaldoCliente
 from inventario.models import Articulo
 from finanzas.models import Cheque
 from inventario.services import StockManager
-from parametros.models import ConfiguracionEmpresa
+from .clientes_dashboard_cache import invalidar_al_confirmar as invalidar_dashboard_cliente
+from .services import PosteoStockService, PrecioEfectivoService, SaldoCierreMensualService, SaldoClienteService
+from parametros.maestros import (
+    get_config_empresa, get_lista_precios_default, get_serie, invalidar_impuestos_articulos
+)
+from parametros.models import Impuesto
 
 logger = logging.getLogger(__name__)
 
@@ -49,7 +62,7 @@ def intentar_cae_automatico(sender, instance, created, raw=False, **kwargs):
         return
 
     # 2. Consultar la Configuración Global de la Empresa
-    config = ConfiguracionEmpresa.objects.first()
+    config = get_config_empresa()
     if not config:
         logger.warning("Abortando solicitud automática: No se encontró Configuración de Empresa para este esquema.")
         return
@@ -60,7 +73,7 @@ def intentar_cae_automatico(sender, instance, created, raw=False, **kwargs):
     # Normalización absoluta de los datos leídos para evitar fallas por tipos o espacios
     modo_fact = str(getattr(config, 'modo_facturacion', 'MANUAL')).strip().upper()
     usar_fe = getattr(config, 'usar_factura_electronica', True)
-    serie_auto = getattr(instance.serie, 'solicitar_cae_automaticamente', False)
+    serie_auto = getattr(get_serie(instance.serie_id), 'solicitar_cae_automaticamente', False)
 
     # Trazabilidad granular: Esto te imprimirá en la consola de Django qué valores reales existen en la BD
     logger.info(
@@ -111,32 +124,12 @@ def intentar_cae_automatico(sender, instance, created, raw=False, **kwargs):
 # 2. MOVIMIENTO DE STOCK (PROTECCIÓN DOBLE DESCUENTO)
 # ═══════════════════════════════════════════════════════════════════════════
 
-@receiver(pre_save, sender=ComprobanteVenta)
-def proteger_stock_aplicado(sender, instance, **kwargs):
-    """
-    ESCUDO PROTECTOR: Previene que una instancia vieja (stale object) en memoria
-    vuelva a guardar stock_aplicado=False en la base de datos, lo que causa
-    el bug del doble descuento de stock.
-    """
-    if instance.pk:
-        try:
-            db_instance = ComprobanteVenta.objects.get(pk=instance.pk)
-            if db_instance.stock_aplicado and not instance.stock_aplicado:
-                logger.warning(
-                    "Stale Object detectado y bloqueado | comprobante=%s. "
-                    "Evitando reversión de stock_aplicado a False.",
-                    instance.numero_completo
-                )
-                instance.stock_aplicado = True
-        except ComprobanteVenta.DoesNotExist:
-            pass
-
-
 @receiver(post_save, sender=ComprobanteVenta, dispatch_uid='stock_movement_signal')
 def aplicar_movimiento_stock(sender, instance, created, raw=False, **kwargs):
     """
     Maneja el impacto en stock al confirmar un comprobante.
     Implementa un candado (lock) atómico basado en el campo `stock_aplicado`.
+    Con posteo diferido, `stock_aplicado` marca que el documento ya está en el outbox.
     """
     if raw:
         return
@@ -162,7 +155,7 @@ def aplicar_movimiento_stock(sender, instance, created, raw=False, **kwargs):
         filas_actualizadas = ComprobanteVenta.objects.filter(
             pk=instance.pk,
             stock_aplicado=False
-        ).update(stock_aplicado=True)
+        ).update(stock_aplicado=True, version=F('version') + 1)
 
         if filas_actualizadas == 0:
             logger.info(
@@ -171,135 +164,52 @@ def aplicar_movimiento_stock(sender, instance, created, raw=False, **kwargs):
             )
             return
 
-        # Actualizamos la memoria
+        # Actualizamos la memoria (la versión también: esta instancia sigue vigente,
+        # cualquier otra copia en memoria queda vieja y su save() dará conflicto)
         instance.stock_aplicado = True
+        instance.version += 1
         instance._stock_procesado = True
 
-        # ── Signo del movimiento ──────────────────────────────────────────────
-        signo = tipo.signo_stock
-        if tipo.codigo_afip in ['003', '008', '013']:  # NC
-            if instance.concepto_nota_credito == ComprobanteVenta.ConceptoNC.FINANCIERO:
-                logger.info(
-                    "Stock no movido: NC financiera | comprobante=%s",
-                    instance.numero_completo,
-                )
-                return
-            if instance.concepto_nota_credito in [
-                ComprobanteVenta.ConceptoNC.DEVOLUCION,
-                ComprobanteVenta.ConceptoNC.ANULACION,
-            ]:
-                signo = 1
+        items = list(instance.items.select_related('articulo'))
+
+        # ── Posteo diferido: solo el outbox, en esta misma transacción ────────
+        if PosteoStockService.usa_posteo_diferido(items):
+            PosteoStockService.encolar(instance)
+            logger.info(
+                "Movimiento de stock encolado (posteo diferido) | comprobante=%s | items=%s",
+                instance.numero_completo,
+                len(items),
+            )
+            return
 
-        ref = f"Venta: {tipo.nombre} {instance.numero_completo}"
+        lineas = PosteoStockService.lineas_comprobante(instance, items)
+        if not lineas:
+            return
 
         logger.info(
-            "Aplicando movimiento de stock | comprobante=%s | tipo=%s | signo=%s | items=%s",
+            "Aplicando movimiento de stock | comprobante=%s | tipo=%s | lineas=%s",
             instance.numero_completo,
             tipo.nombre,
-            signo,
-            instance.items.count(),
+            len(lineas),
         )
 
-        # ── A. Stock REAL (físico) ─────────────────────────────────────────────
-        if getattr(tipo, 'afecta_stock_fisico', False):
-            for item in instance.items.all():
-                cantidad_final = abs(item.cantidad) * signo
-                try:
-                    StockManager.registrar_movimiento(
-                        articulo=item.articulo,
-                        deposito=instance.deposito,
-                        codigo_tipo='REAL',
-                        cantidad=cantidad_final,
-                        origen_sistema='VENTAS',
-                        origen_referencia=ref,
-                        usuario=None,
-                        permitir_stock_negativo=None,
-                    )
-                    logger.debug(
-                        "Stock REAL movido | articulo=%s | cantidad=%s | deposito=%s",
-                        item.articulo.cod_articulo,
-                        cantidad_final,
-                        instance.deposito.nombre if instance.deposito else '—',
-                    )
-                except Exception as exc:
-                    logger.error(
-                        "Error al mover stock REAL | comprobante=%s | articulo=%s | error=%s",
-                        instance.numero_completo,
-                        item.articulo.cod_articulo,
-                        exc,
-                        exc_info=True,
-                    )
-                    raise
-
-        # ── B. Stock RSRV (comprometido) ──────────────────────────────────────
-        if getattr(tipo, 'afecta_stock_comprometido', False):
-            for item in instance.items.all():
-                cantidad_final = abs(item.cantidad) * signo
-                try:
-                    StockManager.registrar_movimiento(
-                        articulo=item.articulo,
-                        deposito=instance.deposito,
-                        codigo_tipo='RSRV',
-                        cantidad=cantidad_final,
-                        origen_sistema='VENTAS',
-                        origen_referencia=ref,
-                        usuario=None,
-                        permitir_stock_negativo=True,
-                    )
-                    logger.debug(
-                        "Stock RSRV movido | articulo=%s | cantidad=%s",
-                        item.articulo.cod_articulo,
-                        cantidad_final,
-                    )
-                except Exception as exc:
-                    logger.error(
-                        "Error al mover stock RSRV | comprobante=%s | articulo=%s | error=%s",
-                        instance.numero_completo,
-                        item.articulo.cod_articulo,
-                        exc,
-                        exc_info=True,
-                    )
-                    raise
-
-        # ── C. Descompromiso RSRV desde nota de pedido ────────────────────────
-        if getattr(tipo, 'afecta_stock_fisico', False) and not getattr(tipo, 'afecta_stock_comprometido', False):
-            for origen in instance.comprobantes_asociados.all():
-                tipo_origen = origen.tipo_comprobante
-                if not (tipo_origen and getattr(tipo_origen, 'mueve_stock', False) and getattr(tipo_origen,
-                                                                                               'afecta_stock_comprometido',
-                                                                                               False)):
-                    continue
-
-                logger.info(
-                    "Liberando reserva RSRV | factura=%s | pedido=%s",
-                    instance.numero_completo,
-                    origen.numero_completo,
-                )
-
-                for item_factura in instance.items.all():
-                    try:
-                        StockManager.registrar_movimiento(
-                            articulo=item_factura.articulo,
-                            deposito=instance.deposito,
-                            codigo_tipo='RSRV',
-                            cantidad=-abs(item_factura.cantidad),
-                            origen_sistema='VENTAS',
-                            origen_referencia=(
-                                f"Descompromiso {instance.numero_completo} "
-                                f"(Ref: {origen.numero_completo})"
-                            ),
-                            usuario=None,
-                            permitir_stock_negativo=True,
-                        )
-                    except Exception as exc:
-                        logger.error(
-                            "Error al liberar reserva RSRV | factura=%s | articulo=%s | error=%s",
-                            instance.numero_completo,
-                            item_factura.articulo.cod_articulo,
-                            exc,
-                            exc_info=True,
-                        )
-                        raise
+        # ── Un único posteo set-based para todo el documento ──────────────────
+        try:
+            StockManager.registrar_movimientos_lote(
+                lineas,
+                origen_sistema='VENTAS',
+                origen_referencia=PosteoStockService.referencia(instance),
+                usuario=None,
+            )
+        except Exception as exc:
+            logger.error(
+                "Error al mover stock | comprobante=%s | lineas=%s | error=%s",
+                instance.numero_completo,
+                len(lineas),
+                exc,
+                exc_info=True,
+            )
+            raise
 
         logger.info(
             "Movimiento de stock completado exitosamente | comprobante=%s | stock_aplicado=True",
@@ -308,7 +218,95 @@ def aplicar_movimiento_stock(sender, instance, created, raw=False, **kwargs):
 
 
 # ═══════════════════════════════════════════════════════════════════════════
-# 3. FINANZAS
+# 3. SALDO DE CLIENTES (PROYECCIÓN)
+# ═══════════════════════════════════════════════════════════════════════════
+
+@receiver(post_save, sender=ComprobanteVenta, dispatch_uid='saldo_cliente_signal')
+def proyectar_saldo_cliente(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Confirmación, anulación o cambio de total/saldo: se proyecta en SaldoCliente
+    dentro de la misma transacción. Los recibos lo hacen una vez por cliente al
+    final de sus imputaciones (`_saldo_cliente_diferido`).
+    """
+    if raw or getattr(instance, '_saldo_cliente_diferido', False):
+        return
+    if update_fields is not None and not set(update_fields) & set(ComprobanteVenta.CAMPOS_SALDO):
+        return
+    SaldoClienteService.registrar([instance])
+
+
+@receiver(post_save, sender=Cliente)
+def actualizar_credito_disponible(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created or (update_fields is not None and 'limite_credito' not in update_fields):
+        return
+    SaldoCliente.objects.filter(cliente=instance).update(credito_disponible=instance.limite_credito - F('saldo'))
+
+
+@receiver(post_save, sender=ComprobanteVenta, dispatch_uid='cierre_mensual_comprobante_signal')
+@receiver(post_delete, sender=ComprobanteVenta, dispatch_uid='cierre_mensual_comprobante_delete_signal')
+def invalidar_cierres_comprobante(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Comprobante de cuenta corriente que entra o sale del saldo en un mes ya cerrado.
+    Con lo leído de la base (ComprobanteVenta._leido): si cambió la fecha, el cliente
+    o la condición, se invalida desde el mes más antiguo para el cliente anterior y el actual.
+    """
+    if raw:
+        return
+    if update_fields is not None and not {'estado', 'total', 'fecha', 'condicion_venta', 'cliente'} & set(update_fields):
+        return
+    leido = getattr(instance, '_leido', None) or {}
+
+    def _en_cta_cte(estado, condicion):
+        return estado == ComprobanteVenta.Estado.CONFIRMADO and condicion == ComprobanteVenta.CondicionVenta.CTA_CTE
+
+    versiones = []
+    if _en_cta_cte(leido.get('estado'), leido.get('condicion_venta')):
+        versiones.append((leido.get('cliente_id'), leido.get('fecha')))
+    if _en_cta_cte(instance.estado, instance.condicion_venta):
+        versiones.append((instance.cliente_id, instance.fecha))
+    fechas = [fecha for _, fecha in versiones if fecha is not None]
+    if not fechas:
+        return
+    desde = min(fechas)
+    SaldoCierreMensualService.invalidar([(cliente_id, desde) for cliente_id, _ in versiones])
+
+
+@receiver(post_save, sender=Recibo, dispatch_uid='cierre_mensual_recibo_signal')
+@receiver(post_delete, sender=Recibo, dispatch_uid='cierre_mensual_recibo_delete_signal')
+def invalidar_cierres_recibo(sender, instance, raw=False, **kwargs):
+    """Cobranza confirmada, anulada o borrada en un mes ya cerrado."""
+    if raw or instance.origen != Recibo.Origen.COBRANZA or instance.estado == Recibo.Estado.BORRADOR:
+        return
+    SaldoCierreMensualService.invalidar([(instance.cliente_id, instance.fecha)])
+
+
+@receiver(post_save, sender=ComprobanteVenta, dispatch_uid='dashboard_cliente_comprobante_signal')
+@receiver(post_delete, sender=ComprobanteVenta, dispatch_uid='dashboard_cliente_comprobante_delete_signal')
+@receiver(post_save, sender=Recibo, dispatch_uid='dashboard_cliente_recibo_signal')
+@receiver(post_delete, sender=Recibo, dispatch_uid='dashboard_cliente_recibo_delete_signal')
+@receiver(post_save, sender=Cliente, dispatch_uid='dashboard_cliente_signal')
+def versionar_dashboard_cliente(sender, instance, raw=False, **kwargs):
+    """Cualquier cambio del cliente o de sus documentos publica, en el commit, una versión nueva de su dashboard."""
+    if raw:
+        return
+    invalidar_dashboard_cliente(instance.pk if sender is Cliente else instance.cliente_id)
+
+
+@receiver(post_save, sender=ReciboImputacion, dispatch_uid='dashboard_cliente_imputacion_signal')
+@receiver(post_delete, sender=ReciboImputacion, dispatch_uid='dashboard_cliente_imputacion_delete_signal')
+def versionar_dashboard_imputacion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if ReciboImputacion.recibo.is_cached(instance):
+        cliente_id = instance.recibo.cliente_id
+    else:
+        # Borrado en cascada del recibo: si ya no está, lo cubre el signal del Recibo
+        cliente_id = Recibo.objects.filter(pk=instance.recibo_id).values_list('cliente_id', flat=True).first()
+    invalidar_dashboard_cliente(cliente_id)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# 4. FINANZAS
 # ═══════════════════════════════════════════════════════════════════════════
 
 @receiver(post_save, sender=Recibo)
@@ -349,36 +347,92 @@ def reversar_al_eliminar_recibo(sender, instance, **kwargs):
 
 
 # ═══════════════════════════════════════════════════════════════════════════
-# 4. PRECIOS
+# 5. PRECIOS
 # ═══════════════════════════════════════════════════════════════════════════
 
+def _recalcular_precios_articulo_al_confirmar(articulo_id):
+    """PrecioEfectivoService.recalcular del artículo cuando confirma la transacción en curso."""
+    schema = connection.schema_name
+
+    def _recalcular():
+        with schema_context(schema):
+            PrecioEfectivoService.recalcular(articulo_ids=[articulo_id])
+
+    transaction.on_commit(_recalcular)
+
+
 @receiver(post_save, sender=Articulo)
-def manage_default_product_price(sender, instance, **kwargs):
-    """Sincroniza el precio del artículo a la lista de precios por defecto."""
-    if getattr(instance, '_from_pricelist_sync', False):
+def manage_default_product_price(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Si cambió el precio de venta: lo sincroniza a la lista de precios por defecto y,
+    al confirmar, rehace sus precios efectivos en todas las listas (la fila base
+    depende del precio del artículo). El resto de las ediciones no los tocan.
+    """
+    if raw:
         return
-    default_list = PriceList.objects.filter(is_default=True).first()
-    if not default_list:
+    precio = tuple(getattr(instance, campo) for campo in Articulo.CAMPOS_PRECIO)
+    if not created and precio == getattr(instance, '_precio_leido', None):
         return
-    ProductPrice.objects.update_or_create(
-        product=instance,
-        price_list=default_list,
-        min_quantity=1,
-        defaults={
-            'price_monto': instance.precio_venta_monto,
-            'price_moneda': instance.precio_venta_moneda,
-        }
-    )
+    if not getattr(instance, '_from_pricelist_sync', False):
+        default_list = get_lista_precios_default()
+        if default_list:
+            ProductPrice.objects.update_or_create(
+                product=instance,
+                price_list=default_list,
+                min_quantity=1,
+                defaults={
+                    'price_monto': instance.precio_venta_monto,
+                    'price_moneda': instance.precio_venta_moneda,
+                }
+            )
+    _recalcular_precios_articulo_al_confirmar(instance.pk)
 
 
 @receiver(post_save, sender=ProductPrice)
 def sync_product_price_to_article(sender, instance, **kwargs):
-    """Refleja el cambio de precio en la lista default de vuelta al artículo."""
-    if not instance.price_list.is_default or instance.min_quantity > 1:
+    """
+    Refleja el cambio de precio en la lista default de vuelta al artículo (que
+    rehace sus precios efectivos); si no, rehace solo los de esta lista y artículo.
+    """
+    if instance.price_list.is_default and instance.min_quantity <= 1:
+        articulo = instance.product
+        if articulo.precio_venta_monto != instance.price_monto:
+            articulo.precio_venta_monto = instance.price_monto
+            articulo._from_pricelist_sync = True
+            articulo.save()
+            return
+    PrecioEfectivoService.recalcular(price_list_ids=[instance.price_list_id], articulo_ids=[instance.product_id])
+
+
+@receiver(post_delete, sender=ProductPrice)
+def quitar_precio_efectivo(sender, instance, **kwargs):
+    PrecioEfectivoService.recalcular(price_list_ids=[instance.price_list_id], articulo_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=PriceList)
+def recalcular_precios_lista(sender, instance, **kwargs):
+    """Descuento, alta o baja de una lista: se rehace la lista entera en Celery."""
+    from .tasks import recalcular_precios_efectivos_task
+    schema = connection.schema_name
+    transaction.on_commit(lambda: recalcular_precios_efectivos_task.delay(schema, [instance.pk]))
+
+
+@receiver(post_save, sender=Impuesto)
+@receiver(post_delete, sender=Impuesto)
+def recalcular_precios_impuesto(sender, instance, **kwargs):
+    from .tasks import recalcular_precios_efectivos_task
+    schema = connection.schema_name
+    transaction.on_commit(lambda: recalcular_precios_efectivos_task.delay(schema))
+
+
+@receiver(m2m_changed, sender=Articulo.impuestos.through)
+def recalcular_precios_impuestos_articulo(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
         return
-    articulo = instance.product
-    if articulo.precio_venta_monto == instance.price_monto:
+    if reverse and action == 'post_clear':
+        recalcular_precios_impuesto(sender, instance)
         return
-    articulo.precio_venta_monto = instance.price_monto
-    articulo._from_pricelist_sync = True
-    articulo.save()
\ No newline at end of file
+    ids = list(pk_set) if reverse else [instance.pk]
+    # El caché de impuestos por artículo se invalida antes de recalcular (el orden de los receivers no está garantizado)
+    invalidar_impuestos_articulos(ids)
+    PrecioEfectivoService.recalcular(articulo_ids=ids)
@@ -2,6 +2,7 @@
 import logging
 from celery import shared_task
 from django.db import transaction
+from django.db.models import F
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +47,222 @@ def tarea_solicitar_cae(self, comprobante_id, schema_name):
         except Exception as exc:
             logger.error(f"Fallo en AFIP para Comprobante {comprobante_id}. Reintentando... Error: {str(exc)}")
             # Guardamos el error en la base
-            ComprobanteVenta.objects.filter(pk=comprobante_id).update(afip_error=f"Reintentando... {str(exc)}")
+            ComprobanteVenta.objects.filter(pk=comprobante_id).update(
+                afip_error=f"Reintentando... {str(exc)}", version=F('version') + 1
+            )
             # Le decimos a Celery que intente de nuevo más tarde (lanza excepción Retry)
-            raise self.retry(exc=exc)
\ No newline at end of file
+            raise self.retry(exc=exc)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=300)
+def tarea_solicitar_cae_lote(self, comprobante_ids, schema_name):
+    """
+    CAE de un grupo de comprobantes del mismo punto de venta (altas en bloque, ver
+    CaeLoteService). Se emiten en orden de número con una sola sesión WSFE; si uno
+    falla, los siguientes no se envían (AFIP exige numeración correlativa) y la
+    tarea se reintenta desde ese comprobante.
+    """
+    from django.db.models import Q
+    from django_tenants.utils import schema_context
+    from ventas.models import ComprobanteVenta
+    from parametros.afip import AfipManager
+
+    with schema_context(schema_name):
+        pendientes = list(
+            ComprobanteVenta.objects.select_related('serie__tipo_comprobante', 'tipo_comprobante', 'cliente__entidad')
+            .filter(Q(cae__isnull=True) | Q(cae=''), pk__in=comprobante_ids).order_by('numero')
+        )
+        if not pendientes:
+            return "Sin pendientes"
+        logger.info(f"CAE por lote: {len(pendientes)} comprobantes del PV {pendientes[0].punto_venta} en '{schema_name}'")
+
+        emitidos = 0
+        afip = None
+        for posicion, comp in enumerate(pendientes):
+            try:
+                afip = afip or AfipManager()
+                afip.emitir_comprobante(comp)
+                comp.refresh_from_db(fields=['cae', 'afip_error'])
+                if not comp.cae:
+                    raise Exception(f"No se obtuvo CAE: {comp.afip_error}")
+                emitidos += 1
+            except Exception as exc:
+                logger.error(f"Fallo en AFIP para Comprobante {comp.pk} (lote). Reintentando... Error: {str(exc)}")
+                ComprobanteVenta.objects.filter(pk=comp.pk).update(
+                    afip_error=f"Reintentando... {str(exc)}", version=F('version') + 1
+                )
+                restantes = [c.pk for c in pendientes[posicion:]]
+                raise self.retry(exc=exc, args=(restantes, schema_name))
+
+    return f"CAE exitosos: {emitidos}"
+
+
+@shared_task
+def procesar_posteos_stock_task(schema_name=None):
+    """
+    Consumidor del outbox de posteo de stock diferido (PosteoStockPendiente).
+    Drena lotes hasta vaciarlo o agotar STOCK_OUTBOX_LOTES_POR_CORRIDA.
+    Sin schema_name, despacha una tarea por tenant (uso desde Celery Beat).
+    """
+    from django.conf import settings
+    from django_tenants.utils import schema_context
+    from inventario.tasks import schemas_de_tenants
+    from ventas.services import PosteoStockService
+
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            procesar_posteos_stock_task.delay(schema)
+        return None
+
+    lote = getattr(settings, 'STOCK_OUTBOX_LOTE', 500)
+    total = {'procesados': 0, 'fallidos': 0}
+    with schema_context(schema_name):
+        for _ in range(getattr(settings, 'STOCK_OUTBOX_LOTES_POR_CORRIDA', 20)):
+            resultado = PosteoStockService.procesar_pendientes(lote)
+            total['procesados'] += resultado['procesados']
+            total['fallidos'] += resultado['fallidos']
+            if resultado['procesados'] + resultado['fallidos'] < lote:
+                break
+        metricas = PosteoStockService.metricas()
+
+    if total['procesados'] or total['fallidos'] or metricas['pendientes']:
+        logger.info(
+            "Posteo de stock diferido | tenant=%s | procesados=%s | fallidos=%s | pendientes=%s | lag=%.1fs",
+            schema_name, total['procesados'], total['fallidos'], metricas['pendientes'], metricas['lag_segundos']
+        )
+    return dict(total, **metricas)
+
+
+@shared_task
+def recalcular_precios_efectivos_task(schema_name=None, price_list_ids=None):
+    """
+    Rehace la tabla de precios efectivos (todas las listas o las indicadas).
+    Sin schema_name, despacha una tarea por tenant (uso desde Celery Beat: la
+    vigencia de los impuestos cambia con la fecha).
+    """
+    from django_tenants.utils import schema_context
+    from inventario.tasks import schemas_de_tenants
+    from ventas.services import PrecioEfectivoService
+
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            recalcular_precios_efectivos_task.delay(schema, price_list_ids)
+        return None
+
+    with schema_context(schema_name):
+        filas = PrecioEfectivoService.recalcular(price_list_ids=price_list_ids)
+    logger.info("Precios efectivos recalculados | tenant=%s | listas=%s | filas=%s",
+                schema_name, price_list_ids or 'todas', filas)
+    return filas
+
+
+@shared_task
+def reconstruir_saldos_clientes_task(schema_name=None):
+    """
+    Rehace la proyección SaldoCliente: recorre las ventanas de ventas 30/90 días
+    y el vencido. Sin schema_name, despacha una tarea por tenant (uso desde Celery Beat).
+    """
+    from django_tenants.utils import schema_context
+    from inventario.tasks import schemas_de_tenants
+    from ventas.services import SaldoClienteService
+
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            reconstruir_saldos_clientes_task.delay(schema)
+        return None
+
+    with schema_context(schema_name):
+        filas = SaldoClienteService.reconstruir()
+    logger.info("Saldos de clientes reconstruidos | tenant=%s | clientes=%s", schema_name, filas)
+    return filas
+
+
+@shared_task
+def cerrar_saldos_mensuales_task(schema_name=None):
+    """
+    Completa los cierres mensuales de cuenta corriente (SaldoCierreMensual): el mes
+    que terminó y los que invalidaron movimientos con fecha atrasada. Sin
+    schema_name, despacha una tarea por tenant (uso desde Celery Beat).
+    """
+    from django_tenants.utils import schema_context
+    from inventario.tasks import schemas_de_tenants
+    from ventas.services import SaldoCierreMensualService
+
+    if schema_name is None:
+        for schema in schemas_de_tenants():
+            cerrar_saldos_mensuales_task.delay(schema)
+        return None
+
+    with schema_context(schema_name):
+        cierres = SaldoCierreMensualService.cerrar()
+    logger.info("Cierres mensuales de cuenta corriente | tenant=%s | cierres=%s", schema_name, cierres)
+    return cierres
+
+
+@shared_task
+def recalcular_dashboard_cliente_task(schema_name, cliente_id):
+    """Rehace en segundo plano el dashboard cacheado de un cliente (ver ventas/clientes_dashboard_cache.py)."""
+    from django_tenants.utils import schema_context
+    from ventas.clientes_dashboard_cache import recalcular
+    from ventas.models import Cliente
+
+    with schema_context(schema_name):
+        cliente = Cliente.objects.select_related('entidad', 'price_list', 'vendedor').filter(pk=cliente_id).first()
+        if cliente is None:
+            return None
+        recalcular(cliente)
+    return cliente_id
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def ingerir_comprobantes_task(self, schema_name, documentos, usuario_id=None):
+    """
+    Ingesta masiva asíncrona (lotes grandes de marketplaces / POS offline).
+    Reintentar es seguro: cada documento lleva su clave de idempotencia y los
+    ya ingeridos vuelven como 'duplicado'.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError
+    from django_tenants.utils import schema_context
+    from ventas.ingesta_api import IngestaComprobantesService
+
+    with schema_context(schema_name):
+        usuario = get_user_model().objects.filter(pk=usuario_id).first() if usuario_id else None
+        try:
+            resultados = IngestaComprobantesService.ingerir(documentos, usuario)
+        except OperationalError as exc:
+            raise self.retry(exc=exc)
+
+    resumen = {}
+    for resultado in resultados:
+        resumen[resultado['estado']] = resumen.get(resultado['estado'], 0) + 1
+    logger.info("Ingesta masiva | tenant=%s | documentos=%s | %s", schema_name, len(documentos), resumen)
+    return resultados
+
+
+@shared_task
+def conversion_masiva_task(schema_name, conversion_id):
+    """
+    Arranque de una ConversionMasiva: fija el total y despacha una
+    conversion_tramo_task por tramo (los workers las corren en paralelo).
+    """
+    from django_tenants.utils import schema_context
+    from ventas.conversion_api import ConversionMasivaService
+
+    with schema_context(schema_name):
+        tramos = ConversionMasivaService.iniciar(conversion_id)
+    for origen_ids in tramos:
+        conversion_tramo_task.delay(schema_name, conversion_id, origen_ids)
+    logger.info("Conversión masiva #%s | tenant=%s | tramos=%s", conversion_id, schema_name, len(tramos))
+    return len(tramos)
+
+
+@shared_task
+def conversion_tramo_task(schema_name, conversion_id, origen_ids):
+    from django_tenants.utils import schema_context
+    from ventas.conversion_api import ConversionMasivaService
+
+    with schema_context(schema_name):
+        resultado = ConversionMasivaService.ejecutar_tramo(conversion_id, origen_ids)
+    return {'convertidos': resultado['convertidos'], 'omitidos': resultado['omitidos'],
+            'con_error': len(resultado['errores'])}
@@ -10,8 +10,13 @@ Ejecutar con:
     python manage.py test ventas --verbosity=2
 """
 import logging
+from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
 
+from django.contrib import messages
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
@@ -19,14 +24,22 @@ from django.contrib.auth import get_user_model
 from django_tenants.test.cases import TenantTestCase
 
 from ventas.models import (
-    Cliente, ComprobanteVenta, ComprobanteVentaItem,
-    Recibo, ReciboImputacion, ReciboValor,
+    Cliente, ComprobanteVenta, ComprobanteVentaItem, ComprobanteCobroItem,
+    Recibo, ReciboImputacion, ReciboValor, PosteoStockPendiente, ConflictoDeVersion,
+    PriceList, ProductPrice, ConversionMasiva, SaldoCierreMensual, SaldoCliente,
 )
+from ventas.services import (
+    AntiguedadSaldosService, PosteoStockService, PrecioEfectivoService, PricingService, SaldoCierreMensualService,
+    TaxCalculatorService,
+)
+from ventas.checkout_api import CheckoutService
+from ventas.conversion_api import ConversionMasivaService
+from ventas.ingesta_api import IngestaComprobantesService
 from ventas.cuenta_corriente_api import CuentaCorrienteService
 from inventario.models import (
     Articulo, Deposito, TipoStock, BalanceStock,
 )
-from parametros.models import TipoComprobante
+from parametros.models import Impuesto, ReglaConversionComprobante, SerieDocumento, TipoComprobante
 from entidades.models import Entidad, SituacionIVA
 from finanzas.models import CuentaFondo, TipoValor
 
@@ -271,6 +284,86 @@ class ComprobanteBasicoTests(TenantAwareTestCase):
         )
         self.assertGreaterEqual(comp.saldo_pendiente, Decimal('0'))
 
+    def test_impuestos_por_lote_se_cachean_e_invalidan(self):
+        iva = Impuesto.objects.create(nombre='IVA 21% Test', tasa=Decimal('21'), vigente_desde=date(2000, 1, 1))
+        interno = Impuesto.objects.create(
+            nombre='Interno Test', tasa=Decimal('5'), es_porcentaje=False, vigente_desde=date(2000, 1, 1)
+        )
+        otro = make_articulo()
+        self.art.impuestos.add(iva)
+        otro.impuestos.add(iva)
+        lineas = [(self.art.pk, Decimal('2'), Decimal('1000')), (otro.pk, Decimal('1'), Decimal('500'))]
+
+        self.assertEqual(
+            TaxCalculatorService.calcular_impuestos_lineas(lineas, 'venta'), {'IVA 21% Test': Decimal('315.00')}
+        )
+        with self.assertNumQueries(0):
+            TaxCalculatorService.calcular_impuestos_lineas(lineas, 'venta')
+
+        self.art.impuestos.add(interno)
+        self.assertEqual(
+            TaxCalculatorService.calcular_impuestos_lineas(lineas, 'venta'),
+            {'IVA 21% Test': Decimal('315.00'), 'Interno Test': Decimal('10.00')}
+        )
+
+    def test_calcular_totales_ignora_lineas_invalidas(self):
+        import json
+        from django.test import RequestFactory
+        from ventas.views import calcular_totales_api
+
+        request = RequestFactory().post('/', data=json.dumps({'items': [
+            {'articulo': self.art.pk, 'cantidad': '2', 'precio_monto': '500'},
+            {'articulo': 'no-es-un-id', 'cantidad': '1', 'precio_monto': '100'},
+        ]}), content_type='application/json')
+        request.user = User.objects.create_user(username='vendedor_totales', password='123', is_staff=True)
+
+        respuesta = calcular_totales_api(request)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(json.loads(respuesta.content)['subtotal'], '1,000.00')
+
+    def test_cotizar_lote_usa_consultas_fijas(self):
+        lista = PriceList.objects.create(name='Lista Test', code='LT', is_default=True)
+        arts = [make_articulo() for _ in range(5)]
+        ProductPrice.objects.create(
+            product=arts[0], price_list=lista, price_monto=Decimal('800'), min_quantity=Decimal('10')
+        )
+        pares = [(a.pk, 10) for a in arts]
+        PricingService.cotizar_lote(self.cliente, pares)  # calienta los cachés de maestros
+
+        with CaptureQueriesContext(connection) as uno:
+            PricingService.cotizar_lote(self.cliente, pares[:1])
+        with CaptureQueriesContext(connection) as cinco:
+            resultados = PricingService.cotizar_lote(self.cliente, pares)
+
+        self.assertEqual(len(uno.captured_queries), len(cinco.captured_queries))
+        self.assertEqual(resultados[0].precio_venta_neto.amount, Decimal('800.00'))
+        self.assertEqual(resultados[1].precio_venta_neto.amount, Decimal('1000.00'))
+        self.assertEqual(
+            PricingService.get_product_pricing(arts[0], self.cliente, Decimal('1')).precio_venta_neto.amount,
+            Decimal('1000.00')
+        )
+
+    def test_precio_efectivo_se_mantiene_desde_signals(self):
+        lista = PriceList.objects.create(name='Mayorista', code='MAY', discount_percentage=Decimal('10'))
+        ProductPrice.objects.create(
+            product=self.art, price_list=lista, price_monto=Decimal('900'), min_quantity=Decimal('5')
+        )
+        self.assertEqual(PrecioEfectivoService.precio(lista, self.art.pk, Decimal('1')).precio_neto, Decimal('900'))
+        self.assertEqual(PrecioEfectivoService.precio(lista, self.art.pk, Decimal('5')).precio_neto, Decimal('810'))
+
+        # Solo un cambio de precio rehace los precios efectivos, y recién al confirmar
+        with mock.patch.object(PrecioEfectivoService, 'recalcular') as recalcular:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.art.descripcion = 'Renombrado'
+                self.art.save()
+        recalcular.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.art.precio_venta_monto = Decimal('2000')
+            self.art.save()
+            self.assertEqual(PrecioEfectivoService.precio(lista, self.art.pk, Decimal('1')).precio_neto, Decimal('900'))
+        self.assertEqual(PrecioEfectivoService.precio(lista, self.art.pk, Decimal('1')).precio_neto, Decimal('1800'))
+
     def test_cliente_sin_cta_cte_no_puede_usar_condicion_cc(self):
         from django.core.exceptions import ValidationError
         cliente_contado = make_cliente(permite_cta_cte=False)
@@ -335,6 +428,27 @@ class StockMovimientoTests(TenantAwareTestCase):
         comp.save()
         self.assertEqual(stock_tras_primera, self._stock_real())
 
+    def test_copia_vieja_da_conflicto_de_version(self):
+        tipo = make_tipo_comprobante(
+            nombre='Fac Version', mueve_stock=True,
+            afecta_stock_fisico=True, signo_stock=-1,
+        )
+        comp = make_comprobante(
+            self.cliente, tipo, self.deposito,
+            [{'articulo': self.art, 'cantidad': 3, 'precio_unitario': '100'}],
+            condicion=ComprobanteVenta.CondicionVenta.CONTADO,
+        )
+        vieja = ComprobanteVenta.objects.get(pk=comp.pk)
+        confirmar_comprobante(comp)
+        stock_tras_confirmar = self._stock_real()
+
+        vieja.observaciones = 'copia vieja'
+        with self.assertRaises(ConflictoDeVersion):
+            vieja.save()
+        comp.refresh_from_db()
+        self.assertTrue(comp.stock_aplicado)
+        self.assertEqual(stock_tras_confirmar, self._stock_real())
+
     def test_nc_financiero_no_mueve_stock(self):
         tipo_nc = make_tipo_comprobante(
             nombre='NC Fin', letra='A', codigo_afip='003',
@@ -380,6 +494,166 @@ class StockMovimientoTests(TenantAwareTestCase):
         confirmar_comprobante(comp)
         self.assertEqual(self._stock_real(), stock_antes)
 
+    def test_posteo_diferido_encola_y_consumidor_es_idempotente(self):
+        tipo = make_tipo_comprobante(
+            nombre='Fac Diferida', mueve_stock=True,
+            afecta_stock_fisico=True, signo_stock=-1,
+        )
+        comprobantes = [
+            make_comprobante(
+                self.cliente, tipo, self.deposito,
+                [{'articulo': self.art, 'cantidad': 2, 'precio_unitario': '100'}],
+                condicion=ComprobanteVenta.CondicionVenta.CONTADO,
+            )
+            for _ in range(3)
+        ]
+        stock_antes = self._stock_real()
+        with mock.patch.object(PosteoStockService, 'usa_posteo_diferido', return_value=True):
+            for comp in comprobantes:
+                confirmar_comprobante(comp)
+
+        self.assertEqual(self._stock_real(), stock_antes)
+        self.assertEqual(PosteoStockService.metricas()['pendientes'], 3)
+
+        self.assertEqual(PosteoStockService.procesar_pendientes(), {'procesados': 3, 'fallidos': 0})
+        self.assertEqual(PosteoStockService.procesar_pendientes(), {'procesados': 0, 'fallidos': 0})
+        self.assertEqual(stock_antes - self._stock_real(), Decimal('6'))
+        self.assertFalse(PosteoStockPendiente.objects.filter(procesado_en__isnull=True).exists())
+
+    def test_checkout_contado_express(self):
+        tipo = make_tipo_comprobante(
+            nombre='Ticket', mueve_stock=True, afecta_stock_fisico=True, signo_stock=-1,
+        )
+        serie = SerieDocumento.objects.create(
+            nombre='Tickets', tipo_comprobante=tipo, punto_venta=7, deposito_defecto=self.deposito
+        )
+        cuenta = make_cuenta_fondo()
+        t_valor = make_tipo_valor()
+        usuario = User.objects.create_user(username='cajero_pos', password='123')
+        stock_antes = self._stock_real()
+
+        def ticket(lineas):
+            return {
+                'cliente': self.cliente.pk, 'serie': serie.pk,
+                'items': [{'articulo': self.art.cod_articulo, 'cantidad': '1', 'precio_unitario_original': '100'}]
+                * lineas,
+                'pagos': [{'tipo_valor': t_valor.pk, 'destino': cuenta.pk, 'monto': str(100 * lineas)}],
+            }
+
+        CheckoutService.checkout_contado(ticket(1), usuario)  # calienta los cachés de maestros
+        with CaptureQueriesContext(connection) as una:
+            CheckoutService.checkout_contado(ticket(1), usuario)
+        with CaptureQueriesContext(connection) as tres:
+            comp, recibo, estado_stock = CheckoutService.checkout_contado(ticket(3), usuario)
+
+        self.assertEqual(len(una.captured_queries), len(tres.captured_queries))
+        self.assertLessEqual(len(tres.captured_queries), CheckoutService.PRESUPUESTO_CONSULTAS)
+        self.assertEqual(
+            (comp.total, comp.saldo_pendiente, estado_stock), (Decimal('300.00'), Decimal('0.00'), 'aplicado')
+        )
+        self.assertEqual(recibo.imputaciones.get().monto_imputado, Decimal('300.00'))
+        self.assertEqual(stock_antes - self._stock_real(), Decimal('5'))
+        cuenta.refresh_from_db()
+        self.assertEqual(cuenta.saldo_monto, Decimal('500.00'))
+
+    def test_ingesta_masiva_idempotente(self):
+        tipo = make_tipo_comprobante(
+            nombre='Factura Marketplace', mueve_stock=True, afecta_stock_fisico=True, signo_stock=-1,
+        )
+        serie = SerieDocumento.objects.create(
+            nombre='Marketplace', tipo_comprobante=tipo, punto_venta=9, deposito_defecto=self.deposito
+        )
+        cuenta = make_cuenta_fondo()
+        t_valor = make_tipo_valor()
+        stock_antes = self._stock_real()
+
+        def documento(clave, cantidad, articulo=None, pagos=True):
+            doc = {
+                'clave': clave, 'cliente': self.cliente.pk, 'serie': serie.pk,
+                'items': [{'articulo': articulo or self.art.cod_articulo, 'cantidad': str(cantidad),
+                           'precio_unitario_original': '100'}],
+            }
+            if pagos:
+                doc['pagos'] = [{'tipo_valor': t_valor.pk, 'destino': cuenta.pk, 'monto': str(100 * cantidad)}]
+            return doc
+
+        lote = [
+            documento('mkt-1', 1),
+            documento('mkt-2', 2, pagos=False),
+            documento('mkt-3', 60),               # supera el stock que queda
+            documento('mkt-4', 1, articulo='NO-EXISTE'),
+        ]
+        primera = IngestaComprobantesService.ingerir(lote)
+        self.assertEqual([r['estado'] for r in primera], ['creado', 'creado', 'error', 'error'])
+        comprobantes = ComprobanteVenta.objects.filter(pk__in=[primera[0]['comprobante'], primera[1]['comprobante']])
+        self.assertEqual(sorted(c.numero for c in comprobantes), [1, 2])
+        self.assertEqual(
+            {c.numero: c.saldo_pendiente for c in comprobantes}, {1: Decimal('0.00'), 2: Decimal('200.00')}
+        )
+        self.assertEqual(stock_antes - self._stock_real(), Decimal('3'))
+
+        # Reintento del mismo lote: nada se duplica
+        segunda = IngestaComprobantesService.ingerir(lote)
+        self.assertEqual([r['estado'] for r in segunda], ['duplicado', 'duplicado', 'error', 'error'])
+        self.assertEqual([r.get('comprobante') for r in segunda[:2]], [r['comprobante'] for r in primera[:2]])
+        self.assertEqual(ComprobanteVenta.objects.filter(serie=serie).count(), 2)
+        self.assertEqual(stock_antes - self._stock_real(), Decimal('3'))
+        cuenta.refresh_from_db()
+        self.assertEqual(cuenta.saldo_monto, Decimal('100.00'))
+
+        otra = IngestaComprobantesService.ingerir([documento('mkt-1', 5)])
+        self.assertEqual(otra[0]['estado'], 'error')
+
+    def test_ingesta_invalida_dashboard_del_cliente(self):
+        from ventas import clientes_dashboard_cache as dashboard_cache
+        tipo = make_tipo_comprobante(
+            nombre='Factura Ingesta', mueve_stock=True, afecta_stock_fisico=True, signo_stock=-1,
+        )
+        serie = SerieDocumento.objects.create(
+            nombre='Ingesta', tipo_comprobante=tipo, punto_venta=8, deposito_defecto=self.deposito
+        )
+        version = dashboard_cache._version(self.cliente.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = IngestaComprobantesService.ingerir([{
+                'clave': 'dash-1', 'cliente': self.cliente.pk, 'serie': serie.pk,
+                'items': [{'articulo': self.art.cod_articulo, 'cantidad': '1', 'precio_unitario_original': '100'}],
+            }])
+        self.assertEqual(resultado[0]['estado'], 'creado')
+        self.assertGreater(dashboard_cache._version(self.cliente.pk), version)
+
+    def test_ingesta_respeta_limite_de_credito(self):
+        tipo = make_tipo_comprobante(
+            nombre='Factura Ingesta CC', mueve_stock=True, afecta_stock_fisico=True, signo_stock=-1,
+        )
+        serie = SerieDocumento.objects.create(
+            nombre='Ingesta CC', tipo_comprobante=tipo, punto_venta=7, deposito_defecto=self.deposito
+        )
+        self.cliente.limite_credito = Decimal('150')
+        self.cliente.save()
+
+        def documento(clave, condicion):
+            return {
+                'clave': clave, 'cliente': self.cliente.pk, 'serie': serie.pk, 'condicion_venta': condicion,
+                'items': [{'articulo': self.art.cod_articulo, 'cantidad': '1', 'precio_unitario_original': '100'}],
+            }
+
+        # El segundo en cuenta corriente ve la deuda del primero del mismo tramo
+        resultado = IngestaComprobantesService.ingerir([
+            documento('cc-1', ComprobanteVenta.CondicionVenta.CTA_CTE),
+            documento('cc-2', ComprobanteVenta.CondicionVenta.CTA_CTE),
+            documento('cc-3', ComprobanteVenta.CondicionVenta.CONTADO),
+        ])
+        self.assertEqual([r['estado'] for r in resultado], ['creado', 'error', 'creado'])
+        self.assertIn('límite de crédito', resultado[1]['errores'][0])
+        self.assertEqual(ComprobanteVenta.objects.filter(serie=serie).count(), 2)
+
+    def test_articulo_tiempo_real_ignora_posteo_diferido(self):
+        self.art.stock_tiempo_real = True
+        self.art.save()
+        items = [ComprobanteVentaItem(articulo=self.art, cantidad=1)]
+        self.assertFalse(PosteoStockService.usa_posteo_diferido(items))
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # SUITE 3 — Recibo e imputación
@@ -480,6 +754,38 @@ class ReciboImputacionTests(TenantAwareTestCase):
         self.cuenta.refresh_from_db()
         self.assertEqual(self.cuenta.saldo_monto, Decimal('1500.00'))
 
+    def test_admin_cobro_contado_con_dos_inlines(self):
+        from django.contrib import admin
+        from django.test import RequestFactory
+        from ventas.admin import ComprobanteVentaAdmin
+
+        comp = make_comprobante(
+            self.cliente, self.tipo_fac, self.deposito,
+            [{'articulo': self.art, 'cantidad': 1, 'precio_unitario': '1000.00'}],
+            condicion=ComprobanteVenta.CondicionVenta.CONTADO,
+        )
+        comp = confirmar_comprobante(comp)
+        ComprobanteCobroItem.objects.create(
+            comprobante=comp, tipo_valor=self.t_valor, monto=comp.total, destino=self.cuenta
+        )
+        model_admin = ComprobanteVentaAdmin(ComprobanteVenta, admin.site)
+        request = RequestFactory().post('/')
+        request.user = self.user
+        form = mock.Mock(instance=comp)
+
+        # Django llama a save_formset una vez por inline (ítems y cobros), sobre la misma instancia
+        with mock.patch.object(model_admin, 'message_user') as message_user:
+            for _inline in ComprobanteVentaAdmin.inlines:
+                model_admin.save_formset(request, form, mock.Mock(), change=True)
+
+        self.assertNotIn(
+            messages.ERROR, [llamada.kwargs.get('level') for llamada in message_user.call_args_list]
+        )
+        comp.refresh_from_db()
+        self.assertEqual(comp.estado, ComprobanteVenta.Estado.CONFIRMADO)
+        self.assertEqual(comp.saldo_pendiente, Decimal('0.00'))
+        self.assertEqual(Recibo.objects.filter(cliente=self.cliente, origen=Recibo.Origen.CONTADO).count(), 1)
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # SUITE 4 — Saldo de cuenta corriente
@@ -571,6 +877,163 @@ class SaldoCuentaCorrienteTests(TenantAwareTestCase):
         self._confirmar_factura_cc('500.00')
         self.assertEqual(self._saldo(), Decimal('3500.00'))
 
+    def test_saldo_cliente_se_proyecta_y_controla_el_limite(self):
+        from django.core.exceptions import ValidationError
+        user = User.objects.create_user(username='cajero_proy', password='123')
+        comp = self._confirmar_factura_cc('3000.00')
+        fila = SaldoCliente.objects.get(cliente=self.cliente)
+        self.assertEqual(
+            (fila.saldo, fila.ventas_30d, fila.comprobantes_90d, fila.credito_disponible),
+            (Decimal('3000.00'), Decimal('3000.00'), 1, Decimal('97000.00'))
+        )
+
+        recibo = Recibo.objects.create(
+            cliente=self.cliente, estado=Recibo.Estado.CONFIRMADO, origen=Recibo.Origen.COBRANZA,
+            monto_total=Decimal('1000.00'), numero=9902, created_by=user
+        )
+        ReciboImputacion.objects.create(recibo=recibo, comprobante=comp, monto_imputado=Decimal('1000.00'))
+        ReciboValor.objects.create(recibo=recibo, tipo=self.t_valor, destino=self.cuenta, monto=Decimal('1000.00'))
+        recibo.aplicar_finanzas()
+        fila.refresh_from_db()
+        self.assertEqual((fila.saldo, fila.ventas_30d), (Decimal('2000.00'), Decimal('3000.00')))
+
+        # El control de límite lee la fila: 2000 + 1000 > 2500
+        self.cliente.limite_credito = Decimal('2500')
+        self.cliente.save()
+        with self.assertRaises(ValidationError):
+            self._confirmar_factura_cc('1000.00')
+        fila.refresh_from_db()
+        self.assertEqual((fila.saldo, fila.credito_disponible), (Decimal('2000.00'), Decimal('500.00')))
+
+        comp.refresh_from_db()
+        comp.estado = ComprobanteVenta.Estado.ANULADO
+        comp.save()
+        fila.refresh_from_db()
+        self.assertEqual((fila.saldo, fila.ventas_30d, fila.comprobantes_90d), (Decimal('0.00'), Decimal('0.00'), 0))
+
+    def test_vencimiento_guardado_y_tramos_de_antiguedad(self):
+        comp = self._confirmar_factura_cc('1000.00')
+        hoy = timezone.localdate()
+        self.assertEqual(comp.fecha_vencimiento, hoy + timedelta(days=30))
+
+        al_dia = AntiguedadSaldosService.de_cliente(self.cliente, al=hoy)
+        self.assertEqual(al_dia['no_vencido'], Decimal('1000.00'))
+        self.assertEqual(al_dia['vencido'], Decimal('0.00'))
+
+        # 15 días de mora → tramo 0-30; 70 días → tramo 61-90
+        self.assertEqual(
+            AntiguedadSaldosService.de_cliente(self.cliente, al=hoy + timedelta(days=45))['0_30'], Decimal('1000.00')
+        )
+        tardio = AntiguedadSaldosService.por_cliente(al=hoy + timedelta(days=100))[self.cliente.pk]
+        self.assertEqual(tardio['61_90'], Decimal('1000.00'))
+        self.assertEqual(tardio['vencido'], Decimal('1000.00'))
+        self.assertEqual(tardio['comprobantes'], 1)
+
+    def test_extracto_paginado_por_cursor_con_saldo_acumulado(self):
+        user = User.objects.create_user(username='cajero_cursor', password='123')
+        self._confirmar_factura_cc('1000.00')
+        self._confirmar_factura_cc('2000.00')
+        Recibo.objects.create(
+            cliente=self.cliente, estado=Recibo.Estado.CONFIRMADO, origen=Recibo.Origen.COBRANZA,
+            monto_total=Decimal('500.00'), numero=9903, created_by=user
+        )
+        self._confirmar_factura_cc('300.00')
+
+        primera = CuentaCorrienteService.build_extracto(self.cliente, page_size=2)
+        self.assertEqual([m['saldo'] for m in primera['movimientos']], [1000.0, 3000.0])
+        self.assertEqual(primera['paginacion']['total'], 4)
+        self.assertEqual(primera['saldo_final'], 2800.0)
+
+        segunda = CuentaCorrienteService.build_extracto(
+            self.cliente, page_size=2, cursor=primera['paginacion']['siguiente']
+        )
+        self.assertEqual([m['saldo'] for m in segunda['movimientos']], [2500.0, 2800.0])
+        self.assertEqual([m['clase'] for m in segunda['movimientos']], ['recibo', 'comprobante'])
+        self.assertIsNone(segunda['paginacion']['siguiente'])
+
+        # El cursor es del alcance con que se emitió
+        with self.assertRaises(ValueError):
+            CuentaCorrienteService.build_extracto(
+                self.cliente, tipo_filtro='recibo', cursor=primera['paginacion']['siguiente']
+            )
+
+        ultimos = CuentaCorrienteService.ultimos_movimientos(self.cliente, limite=2)
+        self.assertEqual([(m['haber'], m['saldo']) for m in ultimos], [(500.0, 2500.0), (0.0, 2800.0)])
+        self.assertEqual(CuentaCorrienteService.build_resumen(self.cliente)['total_debe'], 3300.0)
+        self.assertEqual(primera['movimientos'][0]['estado_pago'], 'IMPAGO')
+
+    def test_dashboard_cacheado_por_version_del_cliente(self):
+        from ventas import clientes_dashboard_cache as dashboard_cache
+        dashboard_cache._cache().delete_many([
+            dashboard_cache._clave(self.cliente.pk), dashboard_cache._clave_version(self.cliente.pk)
+        ])
+        antes = dashboard_cache.estadisticas()
+        self.assertEqual(dashboard_cache.obtener(self.cliente)['saldo_total'], 0.0)
+        with self.assertNumQueries(0):
+            dashboard_cache.obtener(self.cliente)
+
+        # La versión se publica en el commit, no antes
+        version = dashboard_cache._version(self.cliente.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self._confirmar_factura_cc('1500.00')
+        self.assertEqual(dashboard_cache._version(self.cliente.pk), version)
+        for callback in callbacks:
+            if callback.__qualname__.startswith('invalidar_al_confirmar'):
+                callback()
+        self.assertGreater(dashboard_cache._version(self.cliente.pk), version)
+
+        # Versión vieja: se sirve igual y se encola el recálculo
+        with mock.patch('ventas.tasks.recalcular_dashboard_cliente_task.delay') as encolar:
+            self.assertEqual(dashboard_cache.obtener(self.cliente)['saldo_total'], 0.0)
+        encolar.assert_called_once_with(connection.schema_name, self.cliente.pk)
+        dashboard_cache.recalcular(self.cliente)
+        self.assertEqual(dashboard_cache.obtener(self.cliente)['saldo_total'], 1500.0)
+
+        despues = dashboard_cache.estadisticas()
+        self.assertEqual([despues[e] - antes[e] for e in dashboard_cache.EVENTOS], [2, 1, 1])
+
+    def test_cierres_mensuales_y_movimiento_atrasado(self):
+        hoy = timezone.localdate()
+        mes_actual = hoy.replace(day=1)
+        hace_dos_meses = timezone.now() - timedelta(days=hoy.day + 35)
+        comp = self._confirmar_factura_cc('3000.00')
+        ComprobanteVenta.objects.filter(pk=comp.pk).update(fecha=hace_dos_meses, version=comp.version + 1)
+
+        # Dos meses cerrados con la factura; el saldo al día sale del último cierre
+        self.assertEqual(SaldoCierreMensualService.cerrar(), 2)
+        self.assertEqual(
+            list(SaldoCierreMensual.objects.filter(cliente=self.cliente).order_by('mes').values_list('saldo', flat=True)),
+            [Decimal('3000.00'), Decimal('3000.00')]
+        )
+        self.assertEqual(self._saldo(), Decimal('3000.00'))
+        self.assertEqual(SaldoCierreMensualService.cerrar(), 0)
+
+        # Una NC con fecha en un mes cerrado borra los cierres desde ese mes
+        comp_nc = make_comprobante(
+            self.cliente, self.tipo_nc, self.deposito,
+            [{'articulo': self.art, 'cantidad': 1, 'precio_unitario': '1000.00'}],
+            condicion=ComprobanteVenta.CondicionVenta.CTA_CTE,
+        )
+        comp_nc.fecha = hace_dos_meses
+        comp_nc.estado = ComprobanteVenta.Estado.CONFIRMADO
+        comp_nc.save()
+        self.assertFalse(SaldoCierreMensual.objects.filter(cliente=self.cliente).exists())
+        self.assertEqual(self._saldo(), Decimal('2000.00'))
+
+        self.assertEqual(SaldoCierreMensualService.cerrar(), 2)
+        cierre = SaldoCierreMensual.objects.get(cliente=self.cliente, mes=(mes_actual - timedelta(days=1)).replace(day=1))
+        self.assertEqual(cierre.saldo, Decimal('2000.00'))
+        self.assertEqual(
+            CuentaCorrienteService.build_resumen(self.cliente, fecha_desde=mes_actual)['saldo_anterior'], 2000.0
+        )
+
+        # Pasarla al mes en curso y a contado la saca de los meses cerrados: se invalida desde el mes anterior
+        comp = ComprobanteVenta.objects.get(pk=comp.pk)
+        comp.fecha = timezone.now()
+        comp.condicion_venta = ComprobanteVenta.CondicionVenta.CONTADO
+        comp.save()
+        self.assertFalse(SaldoCierreMensual.objects.filter(cliente=self.cliente).exists())
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # SUITE 5 — Integridad
@@ -735,4 +1198,37 @@ class CicloLogisticoCompletoTests(TenantAwareTestCase):
         # Validación de Cuenta Corriente (Capa 1):
         # Ahora sí, el saldo de la Cta. Cte. del cliente debe incrementarse en $6000 (3 unidades * $2000)
         saldo_cliente = CuentaCorrienteService._saldo_al_cierre(self.cliente, hasta=timezone.localdate())
-        self.assertEqual(saldo_cliente, Decimal('6000.00'))
\ No newline at end of file
+        self.assertEqual(saldo_cliente, Decimal('6000.00'))
+
+    def test_conversion_masiva_pedidos_libera_reservas_en_bloque(self):
+        for cantidad in (2, 3):
+            confirmar_comprobante(make_comprobante(
+                self.cliente, self.tipo_pedido, self.deposito,
+                [{'articulo': self.art, 'cantidad': cantidad, 'precio_unitario': '2000.00'}]
+            ))
+        self.assertEqual(self._get_cantidad_stock('RSRV'), Decimal('5'))
+
+        SerieDocumento.objects.create(nombre='Remitos', tipo_comprobante=self.tipo_remito, punto_venta=1)
+        regla = ReglaConversionComprobante.objects.create(
+            tipo_origen=self.tipo_pedido, tipo_destino=self.tipo_remito, confirmar_automaticamente=True
+        )
+        conversion = ConversionMasiva.objects.create(regla=regla, cliente=self.cliente)
+        for origen_ids in ConversionMasivaService.iniciar(conversion.pk):
+            ConversionMasivaService.ejecutar_tramo(conversion.pk, origen_ids)
+
+        conversion.refresh_from_db()
+        self.assertEqual(
+            (conversion.estado, conversion.total, conversion.convertidos, conversion.con_error, conversion.porcentaje),
+            (ConversionMasiva.Estado.TERMINADA, 2, 2, 0, 100.0)
+        )
+        remitos = ComprobanteVenta.objects.filter(tipo_comprobante=self.tipo_remito)
+        self.assertEqual(sorted(r.numero for r in remitos), [1, 2])
+        self.assertTrue(all(r.stock_aplicado and r.comprobantes_asociados.count() == 1 for r in remitos))
+        self.assertEqual(self._get_cantidad_stock('REAL'), Decimal('5'))
+        self.assertEqual(self._get_cantidad_stock('RSRV'), Decimal('0'))
+
+        # Repetir la corrida no vuelve a convertir
+        otra = ConversionMasiva.objects.create(regla=regla)
+        self.assertEqual(ConversionMasivaService.iniciar(otra.pk), [])
+        self.assertEqual(ComprobanteVenta.objects.filter(tipo_comprobante=self.tipo_remito).count(), 2)
+
@@ -12,8 +12,8 @@ def generar_qr_afip(comprobante):
     try:
         # Recuperamos la empresa desde la configuración global o del comprobante
         # Asumimos que tienes acceso a la configuración de la empresa
-        from parametros.models import ConfiguracionEmpresa
-        config = ConfiguracionEmpresa.objects.first()
+        from parametros.maestros import get_config_empresa
+        config = get_config_empresa()
         cuit_emisor = int(config.entidad.cuit) if config else 0
 
         # Datos requeridos por AFIP
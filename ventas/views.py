@@ -27,11 +27,10 @@ import weasyprint
 
 from inventario.models import Articulo
 from parametros.models import (
-    TipoComprobante,
     SerieDocumento,
-    ConfiguracionEmpresa,
     ConfiguracionSMTP,
 )
+from parametros.maestros import get_config_empresa
 from finanzas.models import (
     TipoValor,
     CuentaFondo,
@@ -49,8 +48,12 @@ from .models import (
     Recibo,
     ReciboValor,
     ReciboImputacion,
+    ConflictoDeVersion,
+    SaldoCliente,
+)
+from .services import (
+    TaxCalculatorService, PricingService, PosteoStockService, AntiguedadSaldosService, SaldoClienteService,
 )
-from .services import TaxCalculatorService, PricingService
 from .serializers import ComprobanteVentaSerializer, ComprobanteVentaCreateSerializer
 from rest_framework.decorators import action
 
@@ -345,66 +348,92 @@ def get_precio_articulo_cliente(request, cliente_pk, articulo_pk):
         cliente = get_object_or_404(Cliente, pk=cliente_pk)
         cantidad = Decimal(request.GET.get('cantidad', '1'))
         pricing_data = PricingService.get_product_pricing(articulo, cliente, cantidad)
-        data = dc_asdict(pricing_data)
-        def format_for_json(obj):
-            if isinstance(obj, Money):
-                return f"{obj.amount:.2f}"
-            if isinstance(obj, Decimal):
-                return f"{obj:.2f}"
-            if isinstance(obj, dict):
-                return {k: format_for_json(v) for k, v in obj.items()}
-            return obj
-        json_safe_data = {k: format_for_json(v) for k, v in data.items()}
-        return JsonResponse(json_safe_data)
+        return JsonResponse(_pricing_json(pricing_data))
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
 
+def _pricing_json(pricing_data):
+    def format_for_json(obj):
+        if isinstance(obj, Money):
+            return f"{obj.amount:.2f}"
+        if isinstance(obj, Decimal):
+            return f"{obj:.2f}"
+        if isinstance(obj, dict):
+            return {k: format_for_json(v) for k, v in obj.items()}
+        return obj
+    return {k: format_for_json(v) for k, v in dc_asdict(pricing_data).items()}
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cotizar_precios_api(request):
+    """
+    Precios de muchos artículos para un cliente (catálogo del POS).
+
+    Body JSON:
+        {"cliente": 12, "items": [{"articulo": 5, "cantidad": "2"}, ...]}
+    Respuesta: {"items": [{"articulo", "cantidad", <campos de PricingResult>}, ...]}
+    Los artículos inexistentes vuelven con "error".
+    """
+    cliente = get_object_or_404(Cliente, pk=request.data.get('cliente'))
+    items = request.data.get('items') or []
+    if len(items) > PricingService.MAX_ITEMS_LOTE:
+        return Response(
+            {'error': f'Máximo {PricingService.MAX_ITEMS_LOTE} ítems por consulta.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        pares = [(int(item['articulo']), Decimal(str(item.get('cantidad', '1')))) for item in items]
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return Response({'error': 'Ítems inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    resultados = PricingService.cotizar_lote(cliente, pares)
+    return Response({'items': [
+        {'articulo': articulo_id, 'cantidad': str(cantidad),
+         **(_pricing_json(resultado) if resultado else {'error': 'Artículo no encontrado'})}
+        for (articulo_id, cantidad), resultado in zip(pares, resultados)
+    ]})
+
+
 @staff_member_required
 @require_POST
 def calcular_totales_api(request):
     try:
         data = json.loads(request.body)
-        items_data = data.get('items', [])
-
-        class FakeItem:
-            def __init__(self, item_data):
-                self.articulo = Articulo.objects.get(pk=item_data.get('articulo'))
-                self.cantidad = Decimal(item_data.get('cantidad', '0'))
-                monto_str = item_data.get('precio_monto', item_data.get('precio', '0'))
-                monto = Decimal(str(monto_str))
-                self.precio_unitario_original = Money(monto, 'ARS')
-            @property
-            def subtotal(self):
-                return self.cantidad * self.precio_unitario_original
-
-        class FakeComprobante:
-            def __init__(self, items_list):
-                self.items_list = items_list
-                tipo_id = data.get('tipo_comprobante')
-                self.tipo_comprobante = TipoComprobante.objects.get(pk=tipo_id) if tipo_id else None
-            @property
-            def items(self):
-                return self
-            def all(self):
-                return self.items_list
-
-        fake_items = []
-        for item in items_data:
-            if item.get('articulo'):
-                try:
-                    fake_items.append(FakeItem(item))
-                except Exception:
-                    continue
-        fake_comprobante = FakeComprobante(fake_items)
-        subtotal = sum((item.subtotal for item in fake_items), Money(0, 'ARS'))
-        desglose_impuestos = TaxCalculatorService.calcular_impuestos_comprobante(fake_comprobante, 'venta')
-        total = subtotal + Money(sum(desglose_impuestos.values()), subtotal.currency)
+
+        # Las líneas mal formadas (id, cantidad o precio inválidos) se ignoran
+        items_data = []
+        for item in data.get('items', []):
+            try:
+                items_data.append((
+                    int(item['articulo']),
+                    Decimal(item.get('cantidad', '0')),
+                    Decimal(str(item.get('precio_monto', item.get('precio', '0')))),
+                ))
+            except Exception:
+                continue
+
+        # Una sola consulta para validar los artículos; los inexistentes se ignoran
+        ids = [articulo_id for articulo_id, _, _ in items_data]
+        existentes = set(Articulo.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+        lineas = []
+        subtotal = Decimal('0')
+        for articulo_id, cantidad, monto in items_data:
+            if articulo_id not in existentes:
+                continue
+            subtotal_linea = cantidad * monto
+            subtotal += subtotal_linea
+            lineas.append((articulo_id, cantidad, subtotal_linea))
+
+        desglose_impuestos = TaxCalculatorService.calcular_impuestos_lineas(lineas, 'venta')
+        total = subtotal + sum(desglose_impuestos.values(), Decimal('0'))
         return JsonResponse({
-            'subtotal': f"{subtotal.amount:,.2f}",
-            'currency_symbol': subtotal.currency.code,
+            'subtotal': f"{subtotal:,.2f}",
+            'currency_symbol': 'ARS',
             'impuestos': {k: f"{v:,.2f}" for k, v in desglose_impuestos.items()},
-            'total': f"{total.amount:,.2f}"
+            'total': f"{total:,.2f}"
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -528,12 +557,16 @@ class ComprobanteVentaViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
                 items_data = serializer.validated_data.pop('items')
                 datos_comprobante = serializer.validated_data
+                datos_comprobante.pop('version', None)
                 self._resolver_serie_y_deposito(datos_comprobante)
 
                 comprobante = ComprobanteVenta.objects.create(**datos_comprobante)
 
-                for item_data in items_data:
-                    ComprobanteVentaItem.objects.create(comprobante=comprobante, **item_data)
+                items = [ComprobanteVentaItem(comprobante=comprobante, **item_data) for item_data in items_data]
+                # Stock preventivo de todo el carrito en una sola consulta
+                ComprobanteVentaItem.validar_stock_lote(comprobante, items)
+                for item in items:
+                    item.save()
 
                 _recalcular_totales_comprobante(comprobante)
 
@@ -547,7 +580,7 @@ class ComprobanteVentaViewSet(viewsets.ModelViewSet):
 
             # 🚀 AQUÍ VA LA LÓGICA ROBUSTA DE AFIP (Fuera de la transacción para evitar bloqueos)
             if comprobante.estado == ComprobanteVenta.Estado.CONFIRMADO and not comprobante.cae and comprobante.serie:
-                config = ConfiguracionEmpresa.objects.first()
+                config = get_config_empresa()
                 if config and getattr(config, 'usar_factura_electronica', True):
                     modo_fact = str(getattr(config, 'modo_facturacion', '')).strip().upper()
                     es_auto_empresa = modo_fact in ['AUTO', 'TRUE', '1', 'T']
@@ -593,7 +626,7 @@ class ComprobanteVentaViewSet(viewsets.ModelViewSet):
 
             # 🚀 AQUÍ SE REPITE LA LÓGICA DE AFIP
             if comprobante.estado == ComprobanteVenta.Estado.CONFIRMADO and not comprobante.cae and comprobante.serie:
-                config = ConfiguracionEmpresa.objects.first()
+                config = get_config_empresa()
                 if config and getattr(config, 'usar_factura_electronica', True):
                     modo_fact = str(getattr(config, 'modo_facturacion', '')).strip().upper()
                     es_auto_empresa = modo_fact in ['AUTO', 'TRUE', '1', 'T']
@@ -606,6 +639,8 @@ class ComprobanteVentaViewSet(viewsets.ModelViewSet):
                         from ventas.tasks import tarea_solicitar_cae
                         tarea_solicitar_cae.delay(comprobante.pk, schema_name)
 
+        except ConflictoDeVersion as e:
+            return Response({'error': e.messages[0], 'conflicto': True}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -641,13 +676,21 @@ class ComprobanteVentaViewSet(viewsets.ModelViewSet):
             'mensaje': 'Solicitud enviada a AFIP. Por favor, actualice en unos segundos.'
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], url_path='posteo-stock/metricas')
+    def posteo_stock_metricas(self, request):
+        """
+        Lag del posteo de stock diferido (outbox).
+        URL generada: GET /api/comprobantes-venta/posteo-stock/metricas/
+        """
+        return Response(PosteoStockService.metricas())
+
 
 # ==============================================================================
 # --- PDF Y EMAILS ---
 # ==============================================================================
 
 def obtener_contexto_pdf(comprobante, request=None):
-    config = ConfiguracionEmpresa.objects.first()
+    config = get_config_empresa()
     discrimina_iva = comprobante.letra in ['A', 'B', 'M']
     es_monotributo = comprobante.letra == 'C'
     items_impresion = []
@@ -826,34 +869,16 @@ def enviar_email_comprobante_api(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def informe_saldos_clientes_api(request):
-    from django.db.models import Sum, Count, Avg, Max
-
     hoy = timezone.localdate()
     fecha_90d = hoy - timezone.timedelta(days=90)
 
-    saldos = (
-        ComprobanteVenta.objects
-        .filter(estado=ComprobanteVenta.Estado.CONFIRMADO, saldo_pendiente__gt=0)
-        .values('cliente_id')
-        .annotate(saldo_total=Sum('saldo_pendiente'), comprobantes_impagos=Count('id'))
+    # Saldos, vencido y ventas desde la proyección SaldoCliente; los tramos de aging, del índice de abiertos
+    saldos_map = AntiguedadSaldosService.por_cliente(al=hoy)
+    proyeccion = SaldoClienteService.vigentes(
+        SaldoCliente.objects.filter(Q(saldo__gt=0) | Q(ultima_compra__date__gte=fecha_90d)), al=hoy
     )
-    saldos_map = {s['cliente_id']: s for s in saldos}
-
-    ranking = (
-        ComprobanteVenta.objects
-        .filter(estado=ComprobanteVenta.Estado.CONFIRMADO, fecha__date__gte=fecha_90d)
-        .values('cliente_id')
-        .annotate(
-            total_vendido=Sum('total'), cantidad_comprobantes=Count('id'),
-            ticket_promedio=Avg('total'), ultima_compra=Max('fecha'),
-        )
-        .order_by('-total_vendido')
-    )
-    ranking_map = {r['cliente_id']: r for r in ranking}
-
-    all_ids = set(list(saldos_map.keys()) + [r['cliente_id'] for r in ranking])
     clientes_qs = (
-        Cliente.objects.filter(pk__in=all_ids)
+        Cliente.objects.filter(pk__in=proyeccion.keys())
         .select_related('entidad', 'entidad__situacion_iva')
         .order_by('entidad__razon_social')
     )
@@ -861,20 +886,11 @@ def informe_saldos_clientes_api(request):
     resultado = []
     for c in clientes_qs:
         s = saldos_map.get(c.pk, {})
-        r = ranking_map.get(c.pk, {})
-        saldo_total = float(s.get('saldo_total') or 0)
+        p = proyeccion[c.pk]
+        saldo_total = float(p.saldo)
         limite = float(c.limite_credito or 0)
-        dias_venc = int(c.dias_vencimiento or 0)
-        deuda_vencida = 0.0
-        if saldo_total > 0:
-            for comp in ComprobanteVenta.objects.filter(
-                cliente=c, estado=ComprobanteVenta.Estado.CONFIRMADO, saldo_pendiente__gt=0
-            ):
-                fecha_base = comp.fecha.date() if comp.fecha else hoy
-                fecha_venc = fecha_base + timezone.timedelta(days=dias_venc)
-                if fecha_venc < hoy:
-                    deuda_vencida += float(comp.saldo_pendiente)
-        ultima_compra = r.get('ultima_compra')
+        deuda_vencida = float(p.vencido)
+        ultima_compra = p.ultima_compra
         resultado.append({
             'id': c.pk,
             'codigo': c.codigo_cliente or '',
@@ -886,11 +902,15 @@ def informe_saldos_clientes_api(request):
             'saldo_total': saldo_total,
             'deuda_vencida': deuda_vencida,
             'deuda_no_vencida': saldo_total - deuda_vencida,
-            'comprobantes_impagos': s.get('comprobantes_impagos') or 0,
+            'comprobantes_impagos': p.comprobantes_impagos,
+            'deuda_0_30': float(s.get('0_30') or 0),
+            'deuda_31_60': float(s.get('31_60') or 0),
+            'deuda_61_90': float(s.get('61_90') or 0),
+            'deuda_90_plus': float(s.get('90_plus') or 0),
             'riesgo': 'EXCEDIDO' if (limite > 0 and saldo_total > limite) or deuda_vencida > 0 else 'NORMAL',
-            'total_vendido_90d': float(r.get('total_vendido') or 0),
-            'cantidad_comprobantes_90d': r.get('cantidad_comprobantes') or 0,
-            'ticket_promedio_90d': float(r.get('ticket_promedio') or 0),
+            'total_vendido_90d': float(p.ventas_90d),
+            'cantidad_comprobantes_90d': p.comprobantes_90d,
+            'ticket_promedio_90d': float(p.ventas_90d / p.comprobantes_90d) if p.comprobantes_90d > 0 else 0.0,
             'ultima_compra': ultima_compra.isoformat() if ultima_compra else None,
         })
     return Response(resultado)
@@ -1130,7 +1150,7 @@ def enviar_estado_cuenta_email_api(request, pk):
 
         config_empresa = None
         try:
-            config_empresa = ConfiguracionEmpresa.objects.select_related('entidad').first()
+            config_empresa = get_config_empresa()
         except Exception:
             pass
 